@@ -2,44 +2,80 @@ import asyncio
 from typing import Any
 from urllib.parse import urlsplit
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
 from app.core.auth import get_optional_user, verify_admin
 from app.core.supabase import supabase
 from app.services.analytics_service import analytics_buffer
+from app.services.dashboard_stats import dashboard_stats
 from app.services.sheets_logger import sheets_logger
 
 router = APIRouter()
 
+MAX_BATCH_EVENTS = 500
+MAX_BATCH_BYTES = 512 * 1024
+
 class AnalyticsEvent(BaseModel):
     event_type: str
     data: dict[str, Any] = Field(default_factory=dict)
     user_id: str | None = None
     visitor_id: str | None = None
+    session_id: str | None = None
+
+
+_EVENT_LIST = TypeAdapter(list[AnalyticsEvent])
+
+
+def _user_id(user: Any) -> str | None:
+    if not user:
+        return None
+    if isinstance(user, dict):
+        return user.get("id")
+    return getattr(user, "id", None)
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batch body exceeds {MAX_BATCH_BYTES} bytes")
+
+
+async def _read_batch_body(request: Request) -> bytes:
+    """The request body, refused as soon as it is known to exceed MAX_BATCH_BYTES."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BATCH_BYTES:
+        raise _too_large()
+    # Content-Length may be absent (chunked) or wrong; cap what is actually read.
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BATCH_BYTES:
+            raise _too_large()
+    return bytes(body)
+
+
+def _parse_batch(body: bytes) -> list[AnalyticsEvent]:
+    """A JSON array or NDJSON body, validated in a single pass."""
+    text = body.decode("utf-8").strip()
+    if not text.startswith("["):
+        # NDJSON (also what navigator.sendBeacon sends as text/plain): one object per line
+        text = "[" + ",".join(line for line in (raw.strip() for raw in text.splitlines()) if line) + "]"
+    return _EVENT_LIST.validate_json(text)
 
 
 @router.post("/log")
 async def log_event(
     event: AnalyticsEvent,
-    user: dict | None = Depends(get_optional_user)
+    user: dict | None = Depends(get_optional_user),
+    x_visitor_id: str | None = Header(default=None, alias="X-Visitor-Id"),
 ):
     """
     Log an analytics event (buffered internally).
     """
-    user_id = None
-    if user:
-        if isinstance(user, dict):
-            user_id = user.get("id")
-        else:
-            user_id = getattr(user, "id", None)
-    actor_id = user_id or event.user_id
-    # We await the buffer.log, which is fast (in-memory append) unless it triggers a flush (backgroundable?)
-    # Ideally log() puts it in queue and returns immediately. Our .log() implementation acquires lock,
-    # appends, and if full, awaits flush(). This might block briefly.
-    # Given it's a log endpoint, maybe we should fire-and-forget this too?
-    # But `analytics_buffer.log` is async, so `await` handles it nicely.
-    await analytics_buffer.log(event.event_type, event.data, actor_id)
+    actor_id = _user_id(user) or event.user_id
+    # In-memory append; flushes run in the background.
+    await analytics_buffer.log(
+        event.event_type, event.data, actor_id, event.visitor_id or x_visitor_id, event.session_id
+    )
 
     try:
         asyncio.create_task(
@@ -57,74 +93,63 @@ async def log_event(
     return {"success": True}
 
 
-@router.get("/dashboard/stats")
-async def get_dashboard_stats(user: dict = Depends(verify_admin)):
+@router.post("/batch")
+async def log_batch(
+    request: Request,
+    user: dict | None = Depends(get_optional_user),
+    x_visitor_id: str | None = Header(default=None, alias="X-Visitor-Id"),
+):
     """
-    Get aggregated estimated stats for Admin Dashboard.
+    Log up to MAX_BATCH_EVENTS events in one request. Accepts a JSON array or
+    NDJSON, including text/plain bodies sent by navigator.sendBeacon.
+    Batched events are not mirrored to the legacy Sheets webhook, which takes
+    one POST per event; the db_sync strategy picks them up from the database.
     """
+    body = await _read_batch_body(request)
     try:
-        # Run all 5 blocking supabase-py calls concurrently in threads
-        def _count_users():
-            return supabase.table("user_profiles").select("id", count="estimated").execute().count
-
-        def _count_venues():
-            return supabase.table("venues").select("id", count="estimated").execute().count
-
-        def _count_osm():
-            return (
-                supabase.table("venues")
-                .select("id", count="estimated")
-                .eq("source", "osm")
-                .execute()
-                .count
-            )
+        events = _parse_batch(body) if body.strip() else []
+    except (ValidationError, UnicodeDecodeError) as e:
+        detail = e.errors(include_url=False) if isinstance(e, ValidationError) else str(e)
+        raise HTTPException(status_code=422, detail=detail) from e
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_EVENTS} events per batch")
 
-        def _count_reviews():
-            return supabase.table("reviews").select("id", count="estimated").execute().count
-
-        def _latest_osm_sync():
-            rows = (
-                supabase.table("venues")
-                .select("last_osm_sync")
-                .eq("source", "osm")
-                .order("last_osm_sync", desc=True)
-                .limit(1)
-                .execute()
-                .data
-                or []
-            )
-            return rows[0].get("last_osm_sync") if rows else None
-
-        (
-            count_users,
-            count_venues,
-            count_osm_venues,
-            count_reviews,
-            latest_osm_sync,
-        ) = await asyncio.gather(
-            asyncio.to_thread(_count_users),
-            asyncio.to_thread(_count_venues),
-            asyncio.to_thread(_count_osm),
-            asyncio.to_thread(_count_reviews),
-            asyncio.to_thread(_latest_osm_sync),
-        )
-        supabase_url = getattr(supabase, "supabase_url", "")
-        supabase_host = (urlsplit(str(supabase_url)).hostname or "").strip()
-        supabase_project_ref = (
-            supabase_host.split(".")[0] if ".supabase." in supabase_host else supabase_host
-        )
+    user_id = _user_id(user)
+    accepted = await analytics_buffer.log_many(
+        [
+            (event.event_type, event.data, user_id or event.user_id, event.visitor_id or x_visitor_id, event.session_id)
+            for event in events
+        ]
+    )
+    return {"success": True, "accepted": accepted, "received": len(events)}
 
-        return {
-            "success": True,
-            "stats": {
-                "total_users": count_users,
-                "total_venues": count_venues,
-                "total_shops": count_venues,  # Compat
-                "total_reviews": count_reviews,
-                "total_osm_venues": count_osm_venues,
-                "latest_osm_sync": latest_osm_sync,
-                "supabase_project_ref": supabase_project_ref,
-            }
-        }
+
+@router.get("/dashboard/stats")
+async def get_dashboard_stats(
+    fresh: bool = Query(False, description="Recompute instead of serving the cached snapshot"),
+    user: dict = Depends(verify_admin),
+):
+    """
+    Get aggregated estimated stats for Admin Dashboard.
+    Served from the in-memory snapshot kept warm by a background job.
+    """
+    try:
+        stats, generated_at = await dashboard_stats.get(supabase, fresh=fresh)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard stats: {e}") from e
+
+    supabase_url = getattr(supabase, "supabase_url", "")
+    supabase_host = (urlsplit(str(supabase_url)).hostname or "").strip()
+    supabase_project_ref = (
+        supabase_host.split(".")[0] if ".supabase." in supabase_host else supabase_host
+    )
+
+    return {
+        "success": True,
+        "stats": {
+            **stats,
+            "total_shops": stats["total_venues"],  # Compat
+            "supabase_project_ref": supabase_project_ref,
+        },
+        "generated_at": generated_at,
+    }
@@ -8,11 +8,11 @@ from datetime import UTC, datetime
 from typing import Literal
 
 from fastapi import APIRouter, Header, HTTPException, Query, Request
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 
 from app.core.rate_limit import limiter
 from app.core.visitor_auth import require_valid_visitor
-from app.services.export_service import export_service
+from app.services.export_service import export_service, iter_file, prefetch
 
 router = APIRouter()
 logger = logging.getLogger("app.export")
@@ -42,44 +42,40 @@ async def export_merchant_report(
         # Validate visitor
         normalized_visitor_id = require_valid_visitor(visitor_id, x_visitor_token)
         
-        # Fetch data
-        data = await export_service.fetch_merchant_data(
-            normalized_visitor_id, report_type, start_date, end_date
+        # Fetch the first page now; the rest is read while the report is written
+        pages = await prefetch(
+            export_service.iter_merchant_pages(
+                normalized_visitor_id, report_type, start_date, end_date
+            )
         )
         
         filename = f"report_{report_type}_{datetime.now(UTC).strftime('%Y%m%d_%H%M%S')}"
         
         if format == "csv":
-            if not data:
-                headers = []
-            else:
-                headers = list(data[0].keys())
-            
-            csv_content = await export_service.generate_csv(data, headers)
-            return Response(
-                content=csv_content,
+            return StreamingResponse(
+                export_service.generate_csv(pages),
                 media_type="text/csv",
                 headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
             )
             
         elif format == "excel":
-            excel_content = await export_service.generate_excel(
-                data,
+            excel_file = await export_service.generate_excel(
+                pages,
                 sheet_name=report_type.capitalize(),
             )
-            return Response(
-                content=excel_content,
+            return StreamingResponse(
+                iter_file(excel_file),
                 media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 headers={"Content-Disposition": f"attachment; filename={filename}.xlsx"},
             )
             
         elif format == "pdf":
-            pdf_content = await export_service.generate_pdf(
-                data,
+            pdf_file = await export_service.generate_pdf(
+                pages,
                 title=f"Merchant {report_type.capitalize()} Report",
             )
-            return Response(
-                content=pdf_content,
+            return StreamingResponse(
+                iter_file(pdf_file),
                 media_type="application/pdf",
                 headers={"Content-Disposition": f"attachment; filename={filename}.pdf"},
             )
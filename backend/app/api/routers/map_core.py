@@ -7,6 +7,8 @@ from typing import Any
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 
+from app.services import venue_tiles
+
 router = APIRouter(tags=["map-core"])
 logger = logging.getLogger("app.map_core")
 
@@ -28,6 +30,28 @@ def _parse_bbox(bbox: str) -> tuple[float, float, float, float]:
     return mn_lng, mn_lat, mx_lng, mx_lat
 
 
+def _coords(row: dict[str, Any]) -> tuple[float, float]:
+    """(lat, lng) of a row; mv_venue_geodata names them latitude/longitude, get_map_pins lat/lng."""
+    lat = row.get("latitude") if row.get("latitude") is not None else row.get("lat")
+    lng = row.get("longitude") if row.get("longitude") is not None else row.get("lng")
+    return float(lat), float(lng)
+
+
+def _in_bbox(row: dict[str, Any], mn_lng: float, mn_lat: float, mx_lng: float, mx_lat: float) -> bool:
+    try:
+        lat, lng = _coords(row)
+    except (TypeError, ValueError):
+        return False
+    return mn_lat <= lat <= mx_lat and mn_lng <= lng <= mx_lng
+
+
+def _pin_coords(row: dict[str, Any]) -> tuple[float, float]:
+    try:
+        return _coords(row)
+    except (TypeError, ValueError):
+        return 0.0, 0.0
+
+
 # ── DTOs ─────────────────────────────────────────────────────────
 
 
@@ -96,8 +120,16 @@ async def get_venues(
     try:
         sb = _get_supabase()
         
+        tiles = venue_tiles.tiles_for_bbox(mn_lng, mn_lat, mx_lng, mx_lat) if use_cache else None
         # VC-101: Use Materialized View for static tile data if use_cache is True
-        if use_cache:
+        if use_cache and tiles is not None:
+            # Small viewports are assembled from cached (and pre-warmed) per-tile snapshots
+            rows = [
+                r
+                for r in await venue_tiles.get_tiles(sb, tiles)
+                if _in_bbox(r, mn_lng, mn_lat, mx_lng, mx_lat)
+            ][:limit]
+        elif use_cache:
             # Query from materialized view directly for high-performance tile generation
             # Note: This assumes the schema matches mv_venue_geodata
             resp = (
@@ -132,8 +164,8 @@ async def get_venues(
         VenuePin(
             id=str(r.get("id", "")),
             name=r.get("name", ""),
-            lat=float(r.get("lat", 0)),
-            lng=float(r.get("lng", 0)),
+            lat=_pin_coords(r)[0],
+            lng=_pin_coords(r)[1],
             category=r.get("category", ""),
             rating=r.get("rating"),
             is_live=bool(r.get("is_live", False)),
@@ -12,7 +12,9 @@ from app.core.auth import verify_admin, verify_user
 from app.core.rate_limit import limiter
 from app.core.supabase import supabase, supabase_admin
 from app.core.visitor_auth import require_valid_visitor
+from app.services.hll import HyperLogLog, union
 from app.services.venue_repository import VenueRepository
+from app.services.venue_rollups import venue_rollups
 
 router = APIRouter()
 logger = logging.getLogger("app.owner")
@@ -24,6 +26,8 @@ class OwnerStats(BaseModel):
     total_views: int
     rating: float
     is_promoted: bool
+    events_7d: int = 0
+    unique_visitors_7d: int = 0
 
 
 def _now_utc() -> datetime:
@@ -113,34 +117,16 @@ async def _fetch_owned_venues(visitor_id: str, limit: int = 200) -> list[dict]:
     return list(response.data or [])
 
 
-async def _fetch_events_for_venues(
-    venue_ids: list[str],
-    since_iso: str,
-    limit_per_chunk: int = 3000,
-) -> list[dict]:
+async def _activity_since(venue_ids: list[str], since: datetime) -> tuple[int, int]:
+    """Weighted events and unique visitors across `venue_ids` from the daily rollups."""
     client = supabase_admin or supabase
-    if client is None or not venue_ids:
-        return []
-
-    out: list[dict] = []
-    chunk_size = 25
-    for i in range(0, len(venue_ids), chunk_size):
-        chunk = venue_ids[i : i + chunk_size]
-        query = (
-            client.table("analytics_events")
-            .select("created_at,venue_id,event_type,session_id,visitor_id,user_id")
-            .in_("venue_id", chunk)
-            .gte("created_at", since_iso)
-            .order("created_at", desc=False)
-            .limit(limit_per_chunk)
-        )
-        try:
-            response = await asyncio.to_thread(query.execute)
-            out.extend(list(response.data or []))
-        except APIError as exc:
-            logger.warning("owner_events_fetch_failed", extra={"err": str(exc), "venue_ids": chunk})
-            continue
-    return out
+    try:
+        days = await venue_rollups.trend(client, venue_ids, since.date())
+    except APIError as exc:
+        logger.warning("owner_rollups_fetch_failed", extra={"err": str(exc)})
+        return 0, 0
+    events = sum(day["events"] for day in days.values())
+    return round(events), union(day["sketch"] for day in days.values()).count()
 
 
 @router.get("/stats/{shop_id}", response_model=OwnerStats)
@@ -193,6 +179,7 @@ async def get_shop_stats(
 
     pin_type = str(venue_data.get("pin_type") or "").lower()
     is_promoted = pin_type in {"giant", "boost", "boosted"}
+    events_7d, unique_visitors_7d = await _activity_since([shop_id], _now_utc() - timedelta(days=7))
 
     return {
         "shop_id": shop_id,
@@ -200,6 +187,8 @@ async def get_shop_stats(
         "total_views": int(total_views or 0),
         "rating": float(venue_data.get("rating") or 0),
         "is_promoted": is_promoted,
+        "events_7d": events_7d,
+        "unique_visitors_7d": unique_visitors_7d,
     }
 
 
@@ -238,6 +227,9 @@ async def get_owner_portfolio(
     ratings = [_safe_float(row.get("rating"), 0.0) for row in venues if row.get("rating")]
     avg_rating = round(sum(ratings) / len(ratings), 2) if ratings else 0.0
 
+    venue_ids = [str(row.get("id")) for row in venues if row.get("id")]
+    events_7d, unique_visitors_7d = await _activity_since(venue_ids, now - timedelta(days=7))
+
     expiring_keys = ["verified_until", "glow_until", "boost_until", "giant_until"]
     expiring_7d = defaultdict(int)
     for row in venues:
@@ -254,6 +246,8 @@ async def get_owner_portfolio(
             "total_views": total_views,
             "avg_rating": avg_rating,
             "promoted": promoted_count,
+            "events_7d": events_7d,
+            "unique_visitors_7d": unique_visitors_7d,
         },
         "expiring_7d": dict(expiring_7d),
         "updated_at": now.isoformat(),
@@ -326,33 +320,21 @@ async def get_owner_insights(
             "unique_visitors": 0,
         }
 
-    events = await _fetch_events_for_venues(venue_ids, since.isoformat())
-    visitors_by_day = defaultdict(set)
-    venues_by_day = defaultdict(set)
+    client = supabase_admin or supabase
+    try:
+        days_data = await venue_rollups.trend(client, venue_ids, since.date())
+    except APIError as exc:
+        logger.warning("owner_rollups_fetch_failed", extra={"err": str(exc)})
+        days_data = {}
 
-    for event in events:
-        dt = _parse_dt(event.get("created_at"))
-        if not dt:
-            continue
-        key = dt.date().isoformat()
+    visitors_by_day: dict[str, HyperLogLog] = {}
+    for key, day in days_data.items():
         if key not in trend_map:
             continue
-        trend_map[key]["events"] += 1
-        venue_id = str(event.get("venue_id") or "").strip()
-        if venue_id:
-            venues_by_day[key].add(venue_id)
-
-        visitor_key = (
-            event.get("visitor_id")
-            or event.get("user_id")
-            or event.get("session_id")
-        )
-        if visitor_key:
-            visitors_by_day[key].add(str(visitor_key))
-
-    for key, row in trend_map.items():
-        row["active_venues"] = len(venues_by_day.get(key, set()))
-        row["unique_visitors"] = len(visitors_by_day.get(key, set()))
+        trend_map[key]["events"] = round(day["events"])
+        trend_map[key]["active_venues"] = day["active_venues"]
+        trend_map[key]["unique_visitors"] = day["sketch"].count()
+        visitors_by_day[key] = day["sketch"]
 
     completeness_low = [
         row for row in venues if _compute_completeness(row).get("score", 0) < 60
@@ -408,11 +390,7 @@ async def get_owner_insights(
         "days": days,
         "summary": {
             "events_total": sum(item["events"] for item in trend),
-            "unique_visitors_total": len(
-                set().union(*[visitors_by_day.get(key, set()) for key in trend_map.keys()])
-            )
-            if trend_map
-            else 0,
+            "unique_visitors_total": union(visitors_by_day.values()).count(),
             "active_venues_total": len(venues),
         },
         "trend": trend,
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import hashlib
 import json
-import math
 
 import anyio
 from fastapi import APIRouter, Depends, Query, Request, Response
@@ -13,22 +12,14 @@ from app.api.schemas.place import Place
 from app.core.rate_limit import limiter
 from app.db.session import get_core_db, get_vector_client
 from app.services.cache import redis_client
+from app.services.places import lexical_index
 from app.services.places.provider_manager import nearby_by_provider
+from app.services.vector import embedding_cache, local_vector_index
 from app.services.vector import places_vector_service as vector_service
 
 router = APIRouter()
 
 
-def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    earth_radius_m = 6371000.0
-    p1 = math.radians(lat1)
-    p2 = math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
-    return 2 * earth_radius_m * math.asin(math.sqrt(a))
-
-
 def _nearby_cache_key(provider: str, lat: float, lng: float, radius: int, limit: int) -> str:
     return f"places:nearby:{provider}:{round(lat, 3)}:{round(lng, 3)}:{radius}:{limit}"
 
@@ -42,7 +33,8 @@ def _search_cache_key(
     province: str | None,
     category: str | None,
 ) -> str:
-    q_hash = hashlib.sha1(q.encode(), usedforsecurity=False).hexdigest()[:10]  # nosec B324
+    normalized_q = embedding_cache.normalize_query(q)
+    q_hash = hashlib.sha1(normalized_q.encode(), usedforsecurity=False).hexdigest()[:10]  # nosec B324
     filter_hash = hashlib.sha1(f"{province}|{category}".encode(), usedforsecurity=False).hexdigest()[:10]  # nosec B324
     return (
         f"places:search:{round(lat, 3)}:{round(lng, 3)}:{radius}:"
@@ -59,6 +51,25 @@ def _deserialize_cache(raw: str) -> tuple[str, list[dict]]:
     return parsed.get("provider", ""), parsed.get("data", [])
 
 
+def _authority_place(doc: dict, fallback_id: str = "") -> dict | None:
+    try:
+        place_lat = float(doc.get("lat"))
+        place_lng = float(doc.get("lng"))
+    except (TypeError, ValueError):
+        return None
+    return {
+        "id": doc.get("authority_id") or fallback_id,
+        "name": doc.get("name"),
+        "category": doc.get("category") or "Other",
+        "lat": place_lat,
+        "lng": place_lng,
+        "address": doc.get("address"),
+        "open_now": None,
+        "source": "authority",
+        "updated_at": doc.get("updated_at") or "",
+    }
+
+
 @router.get("/nearby", response_model=list[Place])
 @limiter.limit("10/minute")
 async def nearby(
@@ -110,6 +121,15 @@ async def authority(
     limit: int = Query(50, ge=1, le=100),
     db: AsyncSession = Depends(get_core_db),
 ) -> list[dict]:
+    index = lexical_index.authority_index
+    if q and index.ready:
+        # BM25 scoring is CPU-bound; keep it off the event loop
+        hits = await anyio.to_thread.run_sync(lambda: index.search(q, limit, province=province))
+        response.headers["X-Provider"] = "authority"
+        response.headers["X-Cache"] = "MISS"
+        response.headers["X-Search-Index"] = "lexical"
+        return [place for doc, _ in hits if (place := _authority_place(doc))]
+
     where_parts: list[str] = []
     params: dict[str, object] = {"limit": limit}
 
@@ -153,6 +173,24 @@ async def authority(
     return out
 
 
+async def _vector_hits(vector_client, **search_kwargs) -> tuple[str, list]:
+    """Return (provider, hits) from the first vector tier that answers.
+
+    Small filtered subsets (e.g. one province) go straight to the in-process
+    snapshot; otherwise Qdrant is tried first and the snapshot covers outages.
+    Raises RuntimeError when no tier can answer.
+    """
+    if local_vector_index.prefers_local(search_kwargs["province"], search_kwargs["category"]):
+        return "local", await local_vector_index.search_query(**search_kwargs)
+    try:
+        await vector_service.ensure_collection_once(vector_client)
+        return "qdrant", await vector_service.qdrant_search(vector_client, **search_kwargs)
+    except RuntimeError:
+        if not local_vector_index.snapshot_index.ready:
+            raise
+        return "local", await local_vector_index.search_query(**search_kwargs)
+
+
 @router.get("/search", response_model=list[Place])
 @limiter.limit("10/minute")
 async def search_places(
@@ -177,52 +215,67 @@ async def search_places(
         response.headers["X-Cache"] = "HIT"
         return cached_data
 
-    # C5: Circuit breaker — if Qdrant is down, return empty rather than hanging
+    # Lexical hits fuse with vector hits and stand in for them when Qdrant/Gemini is down.
+    lexical_hits = await anyio.to_thread.run_sync(
+        lambda: lexical_index.authority_index.search(
+            q,
+            limit * 2,
+            province=province,
+            category=category,
+            lat=lat,
+            lng=lng,
+            radius_m=radius,
+        )
+    )
+
+    # C5: Circuit breaker — if no vector tier answers, serve lexical hits rather than hanging
     try:
-        await vector_service.ensure_collection_once(vector_client)
-        hits = await vector_service.qdrant_search(
+        provider, hits = await _vector_hits(
             vector_client,
             q=q,
             limit=limit,
             province=province,
             category=category,
+            lat=lat,
+            lng=lng,
+            radius_m=radius,
         )
     except RuntimeError:
-        response.headers["X-Provider"] = "fallback"
         response.headers["X-Cache"] = "MISS"
-        return []
-
-    out: list[dict] = []
+        if not lexical_hits:
+            response.headers["X-Provider"] = "fallback"
+            return []
+        response.headers["X-Provider"] = "lexical"
+        return [
+            place for doc, _ in lexical_hits[:limit] if (place := _authority_place(doc))
+        ]
+
+    places_by_id: dict[str, dict] = {}
+    vector_ranking: list[str] = []
     for hit in hits:
         payload = getattr(hit, "payload", {}) or {}
-        try:
-            place_lat = float(payload.get("lat"))
-            place_lng = float(payload.get("lng"))
-        except (TypeError, ValueError):
+        place = _authority_place(payload, str(getattr(hit, "id", "")))
+        if place is None:
             continue
+        places_by_id.setdefault(place["id"], place)
+        vector_ranking.append(place["id"])
 
-        if _haversine_m(lat, lng, place_lat, place_lng) > radius:
+    lexical_ranking: list[str] = []
+    for doc, _ in lexical_hits:
+        place = _authority_place(doc)
+        if place is None:
             continue
+        places_by_id.setdefault(place["id"], place)
+        lexical_ranking.append(place["id"])
 
-        out.append(
-            {
-                "id": payload.get("authority_id") or str(getattr(hit, "id", "")),
-                "name": payload.get("name"),
-                "category": payload.get("category") or "Other",
-                "lat": place_lat,
-                "lng": place_lng,
-                "address": payload.get("address"),
-                "open_now": None,
-                "source": "authority",
-                "updated_at": payload.get("updated_at") or "",
-            }
-        )
-        if len(out) >= limit:
-            break
+    ranked_ids = lexical_index.reciprocal_rank_fusion(vector_ranking, lexical_ranking)
+    out = [places_by_id[place_id] for place_id in ranked_ids[:limit]]
 
+    # The local snapshot may lag Qdrant by hours; keep its answers short-lived.
+    ttl = 900 if provider == "qdrant" else 120
     await anyio.to_thread.run_sync(
-        lambda: redis_conn.setex(cache_key, 900, _serialize_cache("qdrant", out))
+        lambda: redis_conn.setex(cache_key, ttl, _serialize_cache(provider, out))
     )
-    response.headers["X-Provider"] = "qdrant"
+    response.headers["X-Provider"] = provider
     response.headers["X-Cache"] = "MISS"
     return out
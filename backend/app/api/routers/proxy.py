@@ -12,6 +12,7 @@ from cachetools import TTLCache
 from fastapi import APIRouter, Header, HTTPException, Query
 
 from app.core.config import get_settings
+from app.core.resilience import CircuitOpenError, get_breaker
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/proxy", tags=["proxy"])
@@ -33,6 +34,9 @@ OVERPASS_TIMEOUT = 30  # seconds
 MAPBOX_DIRECTIONS_BASE_URL = "https://api.mapbox.com/directions/v5/mapbox"
 MAPBOX_DIRECTIONS_TIMEOUT = 10  # seconds
 
+_overpass_breaker = get_breaker("overpass")
+_mapbox_breaker = get_breaker("mapbox")
+
 
 def _assert_allowed_url(url: str) -> None:
     """Raise 400 if the URL resolves to a host not in ALLOWED_HOSTS."""
@@ -79,9 +83,13 @@ async def osm_roads(
     )
 
     _assert_allowed_url(OVERPASS_URL)
-    async with httpx.AsyncClient(timeout=OVERPASS_TIMEOUT) as client:
-        resp = await client.get(OVERPASS_URL, params={"data": query})
-        resp.raise_for_status()
+    try:
+        with _overpass_breaker.guard():
+            async with httpx.AsyncClient(timeout=OVERPASS_TIMEOUT) as client:
+                resp = await client.get(OVERPASS_URL, params={"data": query})
+                resp.raise_for_status()
+    except CircuitOpenError as exc:
+        raise HTTPException(status_code=503, detail="Overpass temporarily unavailable") from exc
 
     routes = []
     for el in resp.json().get("elements", []):
@@ -139,16 +147,27 @@ async def mapbox_directions(
     _assert_allowed_url(directions_url)
 
     try:
-        async with httpx.AsyncClient(timeout=MAPBOX_DIRECTIONS_TIMEOUT) as client:
-            resp = await client.get(
-                directions_url,
-                params={
-                    "geometries": normalized_geometries,
-                    "access_token": access_token,
-                },
-            )
+        with _mapbox_breaker.guard():
+            async with httpx.AsyncClient(timeout=MAPBOX_DIRECTIONS_TIMEOUT) as client:
+                resp = await client.get(
+                    directions_url,
+                    params={
+                        "geometries": normalized_geometries,
+                        "access_token": access_token,
+                    },
+                )
+            if resp.status_code >= 500:
+                # Surface upstream 5xx to the breaker; 4xx are caller errors.
+                resp.raise_for_status()
+    except CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Mapbox directions temporarily unavailable",
+        ) from exc
     except httpx.TimeoutException as exc:
         raise HTTPException(status_code=504, detail="Mapbox directions timeout") from exc
+    except httpx.HTTPStatusError:
+        pass  # counted by the breaker; the upstream status is passed through below
     except httpx.HTTPError as exc:
         raise HTTPException(
             status_code=502,
@@ -10,11 +10,14 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 
 from app.core.rate_limit import limiter
+from app.services.traffic.rollups import traffic_rollups
 from app.services.traffic_service import traffic_service
 
 router = APIRouter()
 logger = logging.getLogger("app.traffic")
 
+MAX_TREND_WAYS = 50
+
 
 class TrafficIncidentInput(BaseModel):
     id: str
@@ -49,10 +52,12 @@ async def get_nearby_traffic(
     """
     Fetch nearby real-time traffic segments and incidents.
     
-    Includes data fusion from Google, TomTom, and OSM.
+    Includes data fusion from Google, TomTom, and OSM. `meta.contributors` lists
+    the providers that returned data; `meta.partial` is set when a provider missed
+    its deadline or a tile was still loading.
     """
     try:
-        segments = await traffic_service.get_nearby_traffic(lat, lng, radius)
+        segments, fusion_meta = await traffic_service.get_nearby_traffic_with_meta(lat, lng, radius)
         
         return {
             "success": True,
@@ -60,7 +65,8 @@ async def get_nearby_traffic(
             "meta": {
                 "lat": lat,
                 "lng": lng,
-                "radius": radius
+                "radius": radius,
+                **fusion_meta,
             }
         }
     except Exception as e:
@@ -68,21 +74,50 @@ async def get_nearby_traffic(
         raise HTTPException(status_code=500, detail="Unable to fetch traffic data") from e
 
 
+@router.get("/trends")
+@limiter.limit("30/minute")
+async def get_traffic_trends(
+    request: Request,
+    way_ids: list[str] = Query(..., alias="way_id"),
+):
+    """
+    Typical vs current speed per road from precomputed rollups.
+
+    `typical_speed_kmh` is the average for the current hour of week (UTC),
+    `current_speed_kmh` the latest 15-minute bucket, and `day_profile` the
+    typical speed for each hour of today.
+    """
+    if len(way_ids) > MAX_TREND_WAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TREND_WAYS} way_id values per request")
+    try:
+        trends = await traffic_rollups.trends(list(dict.fromkeys(way_ids)))
+    except Exception as e:
+        logger.exception("Traffic trends lookup failed: %s", str(e))
+        raise HTTPException(status_code=500, detail="Unable to fetch traffic trends") from e
+    return {"success": True, "trends": trends}
+
+
 @router.post("/webhook/subscribe")
 async def subscribe_traffic_webhook(
     request: Request,
     merchant_id: str = Query(...),
     webhook_url: str = Query(...),
+    lat: float | None = Query(None, ge=-90, le=90),
+    lng: float | None = Query(None, ge=-180, le=180),
     conditions: list[dict[str, Any]] | None = None,
 ):
     """
     Subscribe a merchant to real-time traffic alerts via webhook.
+    Alerts are matched against each condition's radius around (lat, lng);
+    without a location only incidents addressed to the merchant are sent.
     """
     try:
         subscription = await traffic_service.subscribe_merchant_webhook(
             merchant_id,
             webhook_url,
             conditions or [],
+            lat,
+            lng,
         )
         return {"success": True, "subscription": subscription}
     except Exception as e:
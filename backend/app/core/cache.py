@@ -1,6 +1,8 @@
 """TRIAD in-memory TTL cache — small, bounded, no Redis needed."""
 
-from cachetools import TTLCache
+from cachetools import LRUCache, TTLCache
 
 user_profile_cache: TTLCache = TTLCache(maxsize=256, ttl=60)
 vector_search_cache: TTLCache = TTLCache(maxsize=128, ttl=120)
+# Query embeddings are deterministic per (model, text), so no TTL is needed here.
+query_embedding_cache: LRUCache = LRUCache(maxsize=2048)
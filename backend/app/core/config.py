@@ -50,12 +50,22 @@ class Settings(BaseSettings):
     QDRANT_URL: str = ""
     QDRANT_API_KEY: str = ""
     QDRANT_GRPC_PORT: int = 6334
+    VECTOR_SNAPSHOT_DIR: str = ".vector_snapshot"  # empty disables the local fallback index
+    # NDJSON file for batches that failed to write; point it at a mounted volume
+    # (container filesystems are lost on redeploy). Empty keeps them in memory.
+    ANALYTICS_SPILL_PATH: str = ""
+    # Share of events kept per type; stored rows carry sample_weight = 1/rate
+    ANALYTICS_SAMPLE_RATES: dict[str, float] = {"map_pan": 0.05, "map_zoom": 0.1, "map_view": 0.25}
+    # Types only ever counted: pre-aggregated per venue per minute
+    ANALYTICS_COUNTER_EVENTS: list[str] = ["pin_impression", "venue_impression", "marker_hover"]
 
     # Redis / Queues
     REDIS_URL: str = ""
     OCR_QUEUE_STREAM: str = "slip:ocr"
     OCR_QUEUE_GROUP: str = "slip-ocr-group"
     OCR_QUEUE_CONSUMER: str = "slip-ocr-1"
+    WEBHOOK_DELIVERY_WORKERS: int = 8
+    WEBHOOK_HOST_CONCURRENCY: int = 4  # in-flight deliveries per merchant host
 
     # Frontend / Redirect Safety
     FRONTEND_URL: str = "https://vibecity.live"
@@ -107,6 +117,7 @@ class Settings(BaseSettings):
     # PayPal
     PAYPAL_CLIENT_ID: str | None = None
     TOMTOM_API_KEY: str = ""
+    TRAFFIC_FUSION_BUDGET_MS: int = 2500  # upper bound on waiting for traffic providers
 
     # Google Maps / Street View
     GOOGLE_API_KEY: str = ""
@@ -21,6 +21,10 @@ class LazyClient:
                     self._instance = self._factory()
         return self._instance
 
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
     def reset(self) -> None:
         with self._lock:
             self._instance = None
@@ -27,6 +27,89 @@ IN_PROGRESS = Gauge(
     "HTTP requests currently in progress",
     ["method", "path"],
 )
+QUERY_EMBEDDING_CACHE = Counter(
+    "query_embedding_cache_lookups_total",
+    "Search query embedding cache lookups by tier and result",
+    ["tier", "result"],
+)
+TRIAD_RECONCILE_BACKLOG = Gauge(
+    "triad_reconcile_backlog",
+    "Venues whose vector index is missing or stale",
+)
+TRIAD_RECONCILE_LAG = Gauge(
+    "triad_reconcile_lag_seconds",
+    "Age of the oldest venue change not yet reflected in the vector index",
+)
+TRIAD_RECONCILE_VENUES = Counter(
+    "triad_reconcile_venues_total",
+    "Venues processed by the TRIAD reconcile loop",
+    ["result"],
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Upstream circuit breaker state (0=closed, 1=half_open, 2=open)",
+    ["name"],
+)
+CIRCUIT_BREAKER_CALLS = Counter(
+    "circuit_breaker_calls_total",
+    "Calls through upstream circuit breakers by outcome",
+    ["name", "result"],
+)
+TRAFFIC_HISTORY_ROWS = Counter(
+    "traffic_history_rows_total",
+    "Traffic history snapshot rows by outcome (written, deduped, dropped, failed)",
+    ["result"],
+)
+TRAFFIC_ROLLUP_ROWS = Counter(
+    "traffic_rollup_rows_total",
+    "Traffic rollup and speed-profile rows merged by outcome (written, dropped, failed)",
+    ["result"],
+)
+TRAFFIC_PROVIDER_LATENCY = Histogram(
+    "traffic_provider_latency_seconds",
+    "Traffic provider response time per tile fetch",
+    ["provider"],
+)
+TRAFFIC_PROVIDER_RESULTS = Counter(
+    "traffic_provider_results_total",
+    "Traffic provider tile fetches by outcome (ok, timeout, error)",
+    ["provider", "status"],
+)
+PREWARM_TILES = Counter(
+    "prewarm_tiles_total",
+    "Cache tiles handled by the density pre-warmer by kind (traffic, venues) and result (considered, warmed)",
+    ["kind", "result"],
+)
+ANALYTICS_EVENTS = Counter(
+    "analytics_events_total",
+    "Analytics events by outcome (buffered, counted, sampled_out, written, shed, dropped, failed, spilled, replayed)",
+    ["result"],
+)
+VENUE_ROLLUP_ROWS = Counter(
+    "venue_rollup_rows_total",
+    "Per-venue daily analytics rollup rows merged by outcome (written, dropped, failed)",
+    ["result"],
+)
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Merchant webhook delivery attempts by outcome (delivered, retried, deferred, failed)",
+    ["result"],
+)
+WEBHOOK_DELIVERY_LATENCY = Histogram(
+    "webhook_delivery_latency_seconds",
+    "Merchant webhook HTTP delivery time by outcome (ok, error)",
+    ["result"],
+)
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "webhook_queue_depth",
+    "Merchant webhook deliveries waiting, by queue (ready, delayed)",
+    ["queue"],
+)
+WEBHOOK_HOST_CIRCUITS = Gauge(
+    "webhook_host_circuits",
+    "Merchant hosts tracked by the webhook engine, by circuit state (closed, half_open, open)",
+    ["state"],
+)
 
 
 def _route_template(request: Request) -> str:
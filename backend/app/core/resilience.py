@@ -1,5 +1,9 @@
 import logging
-from collections.abc import Callable
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
 
 import httpx
 from tenacity import (
@@ -10,8 +14,12 @@ from tenacity import (
     wait_exponential,
 )
 
+from app.core.metrics import CIRCUIT_BREAKER_CALLS, CIRCUIT_BREAKER_STATE
+
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Standard Enterprise Retry Policy:
 # - Max 3 attempts
 # - Exponential backoff (1s, 2s, 4s)
@@ -52,3 +60,198 @@ def with_retry_async(
         return await fn(*args, **kwargs)
 
     return wrapped
+
+
+# ── Circuit breakers ──
+# One breaker per upstream dependency, shared process-wide through the
+# registry below. A breaker opens when the failure rate over a sliding time
+# window crosses its threshold, rejects calls while open, then lets a limited
+# number of half-open probes through; a successful probe closes it again.
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name}_circuit_open: retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Client errors (4xx other than 429) mean the upstream is healthy."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return not isinstance(exc, CircuitOpenError)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = counts_as_failure,
+        export_metrics: bool = True,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._window: deque[tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+        # Breakers created per remote host pass export_metrics=False so the
+        # metric label sets stay bounded; their owner exports an aggregate.
+        self._export = export_metrics
+        if export_metrics:
+            CIRCUIT_BREAKER_STATE.labels(name).set(0)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning("circuit_breaker %s: %s -> %s", self.name, self._state, state)
+        self._state = state
+        if self._export:
+            CIRCUIT_BREAKER_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._probes = 0
+            self._set_state(HALF_OPEN)
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._window.clear()
+        self._set_state(OPEN)
+
+    def before_call(self) -> None:
+        """Reserve a call slot or raise CircuitOpenError."""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == OPEN or (
+                self._state == HALF_OPEN and self._probes >= self.half_open_max_calls
+            ):
+                if self._export:
+                    CIRCUIT_BREAKER_CALLS.labels(self.name, "rejected").inc()
+                retry_after = max(0.0, self.open_seconds - (now - self._opened_at))
+                raise CircuitOpenError(self.name, retry_after)
+            if self._state == HALF_OPEN:
+                self._probes += 1
+
+    def _record(self, ok: bool) -> None:
+        if self._export:
+            CIRCUIT_BREAKER_CALLS.labels(self.name, "success" if ok else "failure").inc()
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if ok:
+                    self._window.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._open(now)
+                return
+            if self._state == OPEN:
+                return
+            self._window.append((now, ok))
+            while self._window and now - self._window[0][0] > self.window_seconds:
+                self._window.popleft()
+            failures = sum(1 for _, succeeded in self._window if not succeeded)
+            if len(self._window) >= self.min_calls and failures / len(self._window) >= self.failure_rate:
+                self._open(now)
+
+    def record_success(self) -> None:
+        self._record(True)
+
+    def record_failure(self) -> None:
+        self._record(False)
+
+    def guard(self) -> "_BreakerGuard":
+        """Context manager for sync or async blocks: ``with breaker.guard(): await ...``."""
+        return _BreakerGuard(self)
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        with self.guard():
+            return await fn(*args, **kwargs)
+
+    async def call_with_fallback(
+        self,
+        fn: Callable[..., Awaitable[T]],
+        fallback: Callable[[BaseException], Awaitable[T]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> T:
+        """Like ``call`` but any failure (including an open circuit) is handed to ``fallback``."""
+        try:
+            return await self.call(fn, *args, **kwargs)
+        except Exception as exc:
+            return await fallback(exc)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            failures = sum(1 for _, ok in self._window if not ok)
+            return {"state": self._state, "calls": len(self._window), "failures": failures}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._window.clear()
+            self._probes = 0
+            self._set_state(CLOSED)
+
+
+class _BreakerGuard:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def __enter__(self) -> CircuitBreaker:
+        self.breaker.before_call()
+        return self.breaker
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is None or not self.breaker.is_failure(exc):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **config: Any) -> CircuitBreaker:
+    """Return the process-wide breaker for ``name``; ``config`` applies on first use only."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **config)
+        return breaker
+
+
+def breaker_states() -> dict[str, str]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.state for breaker in breakers}
@@ -17,6 +17,7 @@ _ROUTING_TABLE: dict[str, DataStore] = {
     "chat_history": DataStore.HISTORY,
     "audit_logs": DataStore.HISTORY,
     "analytics": DataStore.HISTORY,
+    "traffic_history": DataStore.HISTORY,
     "vectors": DataStore.MEMORY,
     "semantic_search": DataStore.MEMORY,
 }
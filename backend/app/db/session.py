@@ -159,8 +159,9 @@ async_engine = get_core_engine()
 
 # ── Optional: Qdrant vector client ──
 
-from qdrant_client import QdrantClient  # noqa: E402
+from qdrant_client import AsyncQdrantClient, QdrantClient  # noqa: E402
 
+# Sync client kept for scripts and one-off tools; runtime paths use the async one.
 _qdrant_client = LazyClient(
     lambda: QdrantClient(
         url=settings.QDRANT_URL,
@@ -170,8 +171,29 @@ _qdrant_client = LazyClient(
     )
 )
 
+# Native asyncio gRPC client — vector I/O runs on the event loop, not in the
+# default threadpool. One channel is shared for the process lifetime.
+_async_qdrant_client = LazyClient(
+    lambda: AsyncQdrantClient(
+        url=settings.QDRANT_URL,
+        api_key=settings.QDRANT_API_KEY,
+        prefer_grpc=True,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+    )
+)
+
 
 async def get_vector_client():
-    """Yield a sync QdrantClient, guarded by vector_sem."""
+    """Yield the shared AsyncQdrantClient, guarded by vector_sem."""
     async with vector_sem:
-        yield _qdrant_client.instance
+        yield _async_qdrant_client.instance
+
+
+async def close_vector_clients() -> None:
+    """Close Qdrant channels on shutdown (called from lifespan)."""
+    if _async_qdrant_client.initialized:
+        await _async_qdrant_client.instance.close()
+        _async_qdrant_client.reset()
+    if _qdrant_client.initialized:
+        _qdrant_client.instance.close()
+        _qdrant_client.reset()
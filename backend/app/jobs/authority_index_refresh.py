@@ -0,0 +1,110 @@
+"""Keeps the in-process authority_places lexical index in sync with the DB.
+
+Runs every minute (started from lifespan). Each pass pulls only rows changed
+since the last watermark, paging on the indexed (changed_at, authority_id)
+keyset so rows that share a timestamp (one importer transaction) are never
+skipped. changed_at is stamped by a trigger on every insert and update; a
+full rebuild still runs hourly to pick up deletions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.services.places.lexical_index import LexicalIndex, authority_index, doc_from_row
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_SECONDS = 60
+_FULL_REBUILD_SECONDS = 3600
+_PAGE_SIZE = 5000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+SQL = """
+SELECT
+  authority_id,
+  name,
+  category,
+  province,
+  district,
+  address,
+  lat,
+  lng,
+  status,
+  updated_at,
+  changed_at
+FROM authority_places
+WHERE (changed_at, authority_id) > (:since, :last_id)
+ORDER BY changed_at ASC, authority_id ASC
+LIMIT :limit
+"""
+
+# (changed_at, authority_id) of the last row applied
+_watermark: tuple[datetime, str] = (_EPOCH, "")
+_last_full_rebuild = 0.0
+
+
+async def refresh_once(db, index: LexicalIndex = authority_index, full: bool = False) -> int:
+    """Apply changed rows to ``index``; returns the number of rows seen."""
+    global _watermark
+    since, last_id = (_EPOCH, "") if full else _watermark
+    fresh = LexicalIndex() if full else index
+    seen = 0
+    while True:
+        result = await db.execute(
+            text(SQL), {"since": since, "last_id": last_id, "limit": _PAGE_SIZE}
+        )
+        rows = result.mappings().all()
+        for row in rows:
+            doc_id = str(row["authority_id"])
+            if row.get("status") == "inactive":
+                fresh.remove(doc_id)
+            else:
+                fresh.upsert(doc_id, doc_from_row(row))
+        if rows:
+            since, last_id = rows[-1]["changed_at"], str(rows[-1]["authority_id"])
+        seen += len(rows)
+        if len(rows) < _PAGE_SIZE:
+            break
+
+    if full:
+        index.swap(fresh)
+    _watermark = (since, last_id)
+    return seen
+
+
+async def _refresh_tick() -> None:
+    global _last_full_rebuild
+    from app.db.session import get_core_db
+
+    full = time.monotonic() - _last_full_rebuild >= _FULL_REBUILD_SECONDS
+    seen = 0
+    async for db in get_core_db():
+        seen = await refresh_once(db, full=full)
+        break
+    if full:
+        _last_full_rebuild = time.monotonic()
+    if seen:
+        logger.info(
+            "authority_index: applied %d rows (full=%s, size=%d)",
+            seen,
+            full,
+            len(authority_index),
+        )
+
+
+async def run_forever() -> None:
+    """Background task: refresh every INTERVAL_SECONDS, resilient to errors."""
+    while True:
+        try:
+            await _refresh_tick()
+        except (SQLAlchemyError, OSError, RuntimeError) as exc:
+            logger.warning("authority_index: refresh failed — %s", exc)
+        await asyncio.sleep(_INTERVAL_SECONDS)
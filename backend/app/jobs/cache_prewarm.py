@@ -0,0 +1,26 @@
+"""Pre-warms traffic and venue tile caches around dense user areas.
+
+Started from lifespan. Every minute one worker (guarded by a Redis lock)
+refreshes the tiles covering the hottest user-density cells before their
+cache entries expire; see app.services.prewarm_service.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from app.services.prewarm_service import prewarm_service
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_SECONDS = 60
+
+
+async def run_forever() -> None:
+    while True:
+        try:
+            await prewarm_service.run_once()
+        except Exception as exc:  # redis, supabase and provider errors vary by backend
+            logger.warning("cache_prewarm: pass failed — %s", exc)
+        await asyncio.sleep(_INTERVAL_SECONDS)
@@ -0,0 +1,27 @@
+"""Keeps the admin dashboard stats snapshot warm.
+
+Started from lifespan. Every minute each worker recomputes its in-memory
+snapshot (see app.services.dashboard_stats), so admin page loads are served
+from memory and never wait on the count queries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from app.core.supabase import supabase
+from app.services.dashboard_stats import dashboard_stats
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_SECONDS = 60
+
+
+async def run_forever() -> None:
+    while True:
+        try:
+            await dashboard_stats.refresh(supabase)
+        except Exception as exc:  # supabase errors vary by backend
+            logger.warning("dashboard_stats_refresh: pass failed — %s", exc)
+        await asyncio.sleep(_INTERVAL_SECONDS)
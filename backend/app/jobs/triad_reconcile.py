@@ -1,7 +1,10 @@
 """S3: TRIAD reconciliation repair loop.
 
-Runs every 5 minutes (called from lifespan or a scheduler).
+Runs every 5 minutes when caught up, and back-to-back (short pause) while a
+backlog remains (started from lifespan).
 Finds venues whose vector index is stale/missing and re-upserts them to Qdrant.
+Venues whose embedding text hash matches the indexed point are only re-stamped,
+not re-embedded. Embeddings and upserts are batched per pass.
 This is NOT a queue — it is a background repair loop that prevents TRIAD split-brain.
 """
 
@@ -13,105 +16,218 @@ from datetime import UTC, datetime
 
 from postgrest import APIError
 
+from app.core.metrics import (
+    TRIAD_RECONCILE_BACKLOG,
+    TRIAD_RECONCILE_LAG,
+    TRIAD_RECONCILE_VENUES,
+)
+
 logger = logging.getLogger(__name__)
 
-_INTERVAL_SECONDS = 300  # 5 minutes
+_INTERVAL_SECONDS = 300  # 5 minutes when caught up
+_BACKLOG_INTERVAL_SECONDS = 5  # while stale venues remain
+_MIN_BATCH = 50
+_MAX_BATCH = 500
+_EMBED_CHUNK = 100  # texts per Gemini batch request
+_STAMP_CHUNK = 100  # ids per update; each UUID adds ~37 bytes to the request URL
+
+_STALE_FILTER = "last_vector_sync.is.null,last_vector_sync.lt.updated_at"
+
+
+def _embedding_text(venue: dict) -> str:
+    return f"{venue.get('name', '')} {venue.get('category', '')} {venue.get('description', '') or ''}"
+
+
+def _batch_size_for(backlog: int) -> int:
+    return max(_MIN_BATCH, min(_MAX_BATCH, backlog))
 
 
-async def _reconcile_once() -> None:
-    """Single reconciliation pass — import lazily to avoid startup cost."""
+def next_interval(remaining: int | None) -> int:
+    return _BACKLOG_INTERVAL_SECONDS if remaining else _INTERVAL_SECONDS
+
+
+def _lag_seconds(rows: list[dict]) -> float:
+    oldest: datetime | None = None
+    for row in rows:
+        raw = row.get("updated_at")
+        if not raw:
+            continue
+        try:
+            ts = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=UTC)
+        if oldest is None or ts < oldest:
+            oldest = ts
+    if oldest is None:
+        return 0.0
+    return max(0.0, (datetime.now(tz=UTC) - oldest).total_seconds())
+
+
+async def _indexed_hashes(client, collection_name: str, venue_ids: list[str]) -> dict[str, str]:
+    from app.services.vector.places_vector_service import qdrant_call
+
+    records = await qdrant_call(
+        client,
+        "retrieve",
+        collection_name=collection_name,
+        ids=venue_ids,
+        with_payload=["content_hash"],
+        with_vectors=False,
+    )
+    return {
+        str(record.id): (getattr(record, "payload", None) or {}).get("content_hash", "")
+        for record in records or []
+    }
+
+
+async def _reconcile_once() -> int | None:
+    """Single reconciliation pass — import lazily to avoid startup cost.
+
+    Returns the number of stale venues left after this pass, or None when the
+    pass was skipped or made no progress (so the loop backs off).
+    """
     try:
         from app.core.supabase import supabase_admin
-        from app.db.session import _qdrant_client
+        from app.db.session import _async_qdrant_client
         from app.services.vector.places_vector_service import (
+            COLLECTION_NAME,
             configure_genai_once,
-            embed_text,
+            content_hash,
+            embed_texts,
             upsert_points,
         )
     except ImportError as exc:
         logger.debug("triad_reconcile: optional deps missing, skipping — %s", exc)
-        return
+        return None
 
     if supabase_admin is None:
         logger.debug("triad_reconcile: supabase_admin not configured, skipping")
-        return
+        return None
 
     try:
-        client = _qdrant_client.instance
+        client = _async_qdrant_client.instance
     except AttributeError as exc:
         logger.debug("triad_reconcile: qdrant unavailable — %s", exc)
-        return
+        return None
 
-    # 1. Find stale venues (missing or outdated vector index)
+    # 1. Size the backlog, then fetch the oldest stale venues first
     try:
+        count_res = await asyncio.to_thread(
+            lambda: supabase_admin.table("venues")
+            .select("id", count="exact")
+            .or_(_STALE_FILTER)
+            .limit(1)
+            .execute()
+        )
+        backlog = count_res.count or 0
+        TRIAD_RECONCILE_BACKLOG.set(backlog)
+        if not backlog:
+            TRIAD_RECONCILE_LAG.set(0)
+            return 0
+
         res = await asyncio.to_thread(
             lambda: supabase_admin.table("venues")
             .select("id,name,category,description,updated_at")
-            .or_("last_vector_sync.is.null,last_vector_sync.lt.updated_at")
-            .limit(50)
+            .or_(_STALE_FILTER)
+            .order("updated_at", desc=False)
+            .limit(_batch_size_for(backlog))
             .execute()
         )
     except APIError as exc:
         logger.warning("triad_reconcile: DB query failed — %s", exc)
-        return
+        return None
 
     rows = res.data or []
     if not rows:
-        return
+        return 0
 
-    logger.info("triad_reconcile: %d stale venues found", len(rows))
+    TRIAD_RECONCILE_LAG.set(_lag_seconds(rows))
+    logger.info("triad_reconcile: %d stale venues (backlog %d)", len(rows), backlog)
 
-    # 2. Re-upsert each venue to Qdrant
+    # 2. Skip venues whose embedding text is unchanged since the last upsert
+    texts = {str(venue["id"]): _embedding_text(venue) for venue in rows}
+    hashes = {venue_id: content_hash(text) for venue_id, text in texts.items()}
     try:
-        await configure_genai_once()
-    except (RuntimeError, ValueError) as exc:
-        logger.warning("triad_reconcile: genai not available — %s", exc)
-        return
+        indexed = await _indexed_hashes(client, COLLECTION_NAME, list(texts))
+    except Exception as exc:
+        logger.warning("triad_reconcile: qdrant retrieve failed — %s", exc)
+        indexed = {}
+
+    unchanged = [venue_id for venue_id, h in hashes.items() if indexed.get(venue_id) == h]
+    unchanged_set = set(unchanged)
+    changed = [venue for venue in rows if str(venue["id"]) not in unchanged_set]
+    TRIAD_RECONCILE_VENUES.labels("unchanged").inc(len(unchanged))
+
+    synced_ids: list[str] = list(unchanged)
+
+    # 3. Batch-embed and batch-upsert the rest
+    if changed:
+        try:
+            await configure_genai_once()
+        except (RuntimeError, ValueError) as exc:
+            logger.warning("triad_reconcile: genai not available — %s", exc)
+            changed = []
 
     from qdrant_client.models import PointStruct  # type: ignore[import]
 
-    synced_ids: list[str] = []
-    for venue in rows:
-        venue_id = str(venue["id"])
-        text = f"{venue.get('name', '')} {venue.get('category', '')} {venue.get('description', '') or ''}"
+    for start in range(0, len(changed), _EMBED_CHUNK):
+        chunk = changed[start : start + _EMBED_CHUNK]
+        chunk_ids = [str(venue["id"]) for venue in chunk]
         try:
-            vector = await embed_text(text)
-            point = PointStruct(
-                id=venue_id,
-                vector=vector,
-                payload={
-                    "id": venue_id,
-                    "name": venue.get("name"),
-                    "category": venue.get("category"),
-                },
-            )
-            await upsert_points(client, [point])
-            synced_ids.append(venue_id)
+            vectors = await embed_texts([texts[venue_id] for venue_id in chunk_ids])
+            points = [
+                PointStruct(
+                    id=venue_id,
+                    vector=vector,
+                    payload={
+                        "id": venue_id,
+                        "name": venue.get("name"),
+                        "category": venue.get("category"),
+                        "content_hash": hashes[venue_id],
+                    },
+                )
+                for venue_id, venue, vector in zip(chunk_ids, chunk, vectors, strict=True)
+            ]
+            await upsert_points(client, points)
+            synced_ids.extend(chunk_ids)
+            TRIAD_RECONCILE_VENUES.labels("embedded").inc(len(chunk_ids))
         except (RuntimeError, TypeError, ValueError) as exc:
-            logger.warning("triad_reconcile: upsert failed for %s — %s", venue_id, exc)
+            TRIAD_RECONCILE_VENUES.labels("failed").inc(len(chunk_ids))
+            logger.warning("triad_reconcile: batch upsert failed (%d venues) — %s", len(chunk_ids), exc)
 
     if not synced_ids:
-        return
+        return None
 
-    # 3. Stamp last_vector_sync on successfully synced venues
+    # 4. Stamp last_vector_sync on successfully synced venues
     now_iso = datetime.now(tz=UTC).isoformat()
     try:
-        await asyncio.to_thread(
-            lambda: supabase_admin.table("venues")
-            .update({"last_vector_sync": now_iso})
-            .in_("id", synced_ids)
-            .execute()
+        for start in range(0, len(synced_ids), _STAMP_CHUNK):
+            query = (
+                supabase_admin.table("venues")
+                .update({"last_vector_sync": now_iso})
+                .in_("id", synced_ids[start : start + _STAMP_CHUNK])
+            )
+            await asyncio.to_thread(query.execute)
+        logger.info(
+            "triad_reconcile: stamped %d venues (%d unchanged)", len(synced_ids), len(unchanged)
         )
-        logger.info("triad_reconcile: stamped %d venues", len(synced_ids))
     except APIError as exc:
         logger.warning("triad_reconcile: timestamp update failed — %s", exc)
+        return None
+
+    remaining = max(0, backlog - len(synced_ids))
+    TRIAD_RECONCILE_BACKLOG.set(remaining)
+    return remaining
 
 
 async def run_forever() -> None:
-    """Background task: reconcile every INTERVAL_SECONDS, resilient to errors."""
+    """Background task: reconcile until caught up, then every INTERVAL_SECONDS."""
     while True:
+        remaining: int | None = None
         try:
-            await _reconcile_once()
-        except (APIError, RuntimeError, TypeError, ValueError) as exc:
+            remaining = await _reconcile_once()
+        except Exception as exc:  # keep the repair loop alive whatever a pass raises
             logger.warning("triad_reconcile: unexpected error — %s", exc)
-        await asyncio.sleep(_INTERVAL_SECONDS)
+        await asyncio.sleep(next_interval(remaining))
@@ -0,0 +1,74 @@
+"""Exports the authority Qdrant collection to the in-process fallback index.
+
+Started from lifespan. Loads any snapshot already on disk first (so a worker
+restarted during a Qdrant outage still has vector search), then re-exports
+every 6 hours and swaps the fresh snapshot in. A snapshot younger than the
+interval (written by another worker) is loaded instead of re-exported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.services.vector.local_vector_index import (
+    LocalVectorIndex,
+    export_snapshot,
+    snapshot_age_seconds,
+    snapshot_index,
+)
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_SECONDS = 6 * 3600
+_RETRY_SECONDS = 300
+
+
+def _snapshot_dir() -> Path | None:
+    raw = get_settings().VECTOR_SNAPSHOT_DIR
+    return Path(raw) if raw else None
+
+
+async def _load(directory: Path) -> bool:
+    try:
+        fresh = await asyncio.to_thread(LocalVectorIndex.load, directory)
+    except (OSError, ValueError, KeyError) as exc:
+        logger.debug("vector_snapshot: no usable snapshot in %s — %s", directory, exc)
+        return False
+    if fresh.version != snapshot_index.version:
+        snapshot_index.swap(fresh)
+        logger.info("vector_snapshot: loaded %d vectors (version %s)", len(fresh), fresh.version)
+    return True
+
+
+async def refresh_once(directory: Path) -> float:
+    """Export if the on-disk snapshot is stale, then load it; returns seconds until next run."""
+    age = snapshot_age_seconds(directory)
+    if age is None or age >= _INTERVAL_SECONDS:
+        from app.db.session import _async_qdrant_client
+
+        await export_snapshot(_async_qdrant_client.instance, directory)
+        age = 0.0
+    await _load(directory)
+    return max(60.0, _INTERVAL_SECONDS - age)
+
+
+async def run_forever() -> None:
+    """Background task: keep the fallback snapshot at most INTERVAL_SECONDS old."""
+    if not get_settings().QDRANT_URL:
+        logger.debug("vector_snapshot: QDRANT_URL not set, disabled")
+        return
+    directory = _snapshot_dir()
+    if directory is None:
+        logger.debug("vector_snapshot: VECTOR_SNAPSHOT_DIR not set, disabled")
+        return
+    await _load(directory)
+    while True:
+        delay: float = _RETRY_SECONDS
+        try:
+            delay = await refresh_once(directory)
+        except Exception as exc:  # qdrant transport errors vary by protocol
+            logger.warning("vector_snapshot: export failed — %s", exc)
+        await asyncio.sleep(delay)
@@ -0,0 +1,72 @@
+"""Folds new analytics_events rows into the per-venue daily rollups.
+
+Started from lifespan. Every 30 seconds each worker reads the rows past the
+shared analytics_venue_rollup_state watermark, whatever wrote them (the
+AnalyticsBuffer or the analytics-ingest edge function), and merges them
+through advance_analytics_venue_rollups. The RPC only merges if the
+watermark has not moved, so workers racing on a batch count it once.
+
+Rows younger than _SETTLE_SECONDS are left for the next pass: identity ids
+are handed out before commit, so a slow transaction can still land below
+the newest id seen.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from app.core.supabase import supabase_admin
+from app.services.venue_rollups import venue_rollups
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_SECONDS = 30
+_PAGE_SIZE = 1000
+_SETTLE_SECONDS = 60
+
+
+def _settled(rows: list[dict[str, Any]], cutoff: datetime) -> list[dict[str, Any]]:
+    """The leading rows created before `cutoff`; stops at the first newer one."""
+    for pos, row in enumerate(rows):
+        try:
+            created = datetime.fromisoformat(str(row.get("created_at")).replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if created >= cutoff:
+            return rows[:pos]
+    return rows
+
+
+async def sync_once(client) -> int:
+    """Apply every settled row past the watermark; returns the number of events merged."""
+    applied = 0
+    while True:
+        state_query = client.table("analytics_venue_rollup_state").select("last_event_id").eq("id", 1)
+        state = await asyncio.to_thread(state_query.execute)
+        after = int((state.data or [{}])[0].get("last_event_id") or 0)
+        query = client.table("analytics_events").select("*").gt("id", after).order("id").limit(_PAGE_SIZE)
+        response = await asyncio.to_thread(query.execute)
+        page = response.data or []
+        rows = _settled(page, datetime.now(UTC) - timedelta(seconds=_SETTLE_SECONDS))
+        if not rows:
+            return applied
+        if not await venue_rollups.apply_events(client, rows, after, int(rows[-1]["id"])):
+            return applied  # another worker merged this batch
+        applied += len(rows)
+        if len(rows) < _PAGE_SIZE:
+            return applied
+
+
+async def run_forever() -> None:
+    if supabase_admin is None:
+        logger.debug("venue_rollup_sync: no service-role Supabase client, disabled")
+        return
+    while True:
+        try:
+            await sync_once(supabase_admin)
+        except Exception as exc:  # supabase errors vary by backend
+            logger.warning("venue_rollup_sync: pass failed — %s", exc)
+        await asyncio.sleep(_INTERVAL_SECONDS)
@@ -42,6 +42,7 @@ from app.core.config import get_settings, validate_settings
 from app.core.logging import setup_logging
 from app.core.observability import setup_observability
 from app.core.rate_limit import limiter
+from app.core.resilience import CircuitOpenError, breaker_states, get_breaker
 
 settings = get_settings()
 validate_settings(settings)
@@ -54,18 +55,52 @@ request_logger = logging.getLogger("app.request")
 async def lifespan(_app: FastAPI):
     import asyncio
 
-    from app.jobs import triad_reconcile
+    from app.db.session import close_vector_clients
+    from app.jobs import (
+        authority_index_refresh,
+        cache_prewarm,
+        dashboard_stats_refresh,
+        triad_reconcile,
+        vector_snapshot,
+        venue_rollup_sync,
+    )
     from app.services.analytics_service import analytics_buffer
+    from app.services.traffic.history_sink import traffic_history_sink
+    from app.services.traffic.rollups import traffic_rollups
+    from app.services.vector.places_vector_service import bootstrap_collection
+    from app.services.venue_rollups import venue_rollups
+    from app.services.webhook_service import webhook_service
 
     await analytics_buffer.start_periodic_flush()
+    await venue_rollups.start_periodic_flush()
+    await traffic_history_sink.start_periodic_flush()
+    await traffic_rollups.start_periodic_flush()
+    await webhook_service.start()
     await vibes.start_background_tasks()
+    _schema_task = asyncio.create_task(bootstrap_collection())
     _reconcile_task = asyncio.create_task(triad_reconcile.run_forever())
+    _authority_index_task = asyncio.create_task(authority_index_refresh.run_forever())
+    _vector_snapshot_task = asyncio.create_task(vector_snapshot.run_forever())
+    _prewarm_task = asyncio.create_task(cache_prewarm.run_forever())
+    _dashboard_stats_task = asyncio.create_task(dashboard_stats_refresh.run_forever())
+    _venue_rollup_task = asyncio.create_task(venue_rollup_sync.run_forever())
     try:
         yield
     finally:
+        _venue_rollup_task.cancel()
+        _dashboard_stats_task.cancel()
+        _prewarm_task.cancel()
+        _vector_snapshot_task.cancel()
+        _authority_index_task.cancel()
         _reconcile_task.cancel()
+        _schema_task.cancel()
         await vibes.stop_background_tasks()
         await analytics_buffer.stop()
+        await venue_rollups.stop()
+        await traffic_history_sink.stop()
+        await traffic_rollups.stop()
+        await webhook_service.stop()
+        await close_vector_clients()
 
 
 app = FastAPI(
@@ -228,10 +263,11 @@ def _run_readiness_checks() -> tuple[str, dict[str, str]]:
     # H2: Redis — ping to verify cache layer
     try:
         from app.services.cache.redis_client import get_redis
-        redis_conn = get_redis()
-        redis_conn.ping()
+        with get_breaker("redis").guard():
+            redis_conn = get_redis()
+            redis_conn.ping()
         checks["redis"] = "ok"
-    except (ImportError, redis.RedisError, OSError):
+    except (ImportError, CircuitOpenError, redis.RedisError, OSError):
         checks["redis"] = "degraded"
         if strict_health:
             overall = "degraded"
@@ -243,6 +279,10 @@ def _run_readiness_checks() -> tuple[str, dict[str, str]]:
     except (ImportError, RuntimeError):
         checks["qdrant"] = "unknown"
 
+    # Upstream circuit breakers (also exported as circuit_breaker_state on /metrics)
+    for name, state in sorted(breaker_states().items()):
+        checks[f"circuit:{name}"] = state
+
     return overall, checks
 
 
@@ -1,73 +1,391 @@
 """
 Analytics event buffer — buffers analytics events in memory and flushes
 to Supabase in batches for performance.
+
+Appends never wait: events go into the active list and a flush swaps it for
+an empty one before writing in the background. The buffer is capped; past
+the soft limit events are shed with increasing probability and at the hard
+cap they are dropped. Batches that fail to write are appended to a local
+NDJSON spill file (ANALYTICS_SPILL_PATH), which is replayed once writes
+succeed again. Workers share the file: appends, and replays cutting a chunk
+off its head, hold an exclusive lock on a sidecar .lock file, so one worker's
+replay never rewrites lines another worker is appending. The lock is never
+held across a network insert.
+
+An IngestionPolicy thins out high-volume event types before they reach the
+buffer: sampled types are kept with a configured probability and carry a
+sample_weight of 1/rate, and counter-only types are pre-aggregated into one
+row per (venue, type, minute) whose sample_weight is the count. Aggregates
+over analytics_events should therefore sum sample_weight, not count rows.
+Counter rows carry no visitor, so their visitors are folded into the venue
+rollup sketches before aggregation.
+The per-venue daily rollups are built from the stored rows by
+app.jobs.venue_rollup_sync, not from this buffer.
 """
 import asyncio
+import fcntl
+import json
 import logging
+import os
+import random
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import UTC, datetime
+from pathlib import Path
 from typing import Any
 
+from app.core.config import get_settings
+from app.core.metrics import ANALYTICS_EVENTS
+from app.services.venue_rollups import venue_rollups
+
 logger = logging.getLogger(__name__)
 
 _FLUSH_THRESHOLD = 50
 _FLUSH_INTERVAL_SECONDS = 30
+_MAX_BUFFERED = 20_000
+_SHED_FROM = 0.75  # fraction of the cap where probabilistic shedding starts
+_WRITE_CHUNK = 500
+_MAX_SPILL_BYTES = 64 * 1024 * 1024
+_MAX_COUNTER_KEYS = 50_000
+
+
+def _spill_path() -> Path | None:
+    raw = get_settings().ANALYTICS_SPILL_PATH
+    return Path(raw) if raw else None
+
+
+@contextmanager
+def _spill_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive lock on `path` across workers; yields False if it is held and `blocking` is off."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.with_suffix(path.suffix + ".lock").open("a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _append_lines(path: Path, events: list[dict[str, Any]]) -> int:
+    """Append events as NDJSON; returns how many fit under the size cap."""
+    written = 0
+    with _spill_lock(path), path.open("a", encoding="utf-8") as fh:
+        size = path.stat().st_size
+        for event in events:
+            line = json.dumps(event, default=str) + "\n"
+            if size + len(line) > _MAX_SPILL_BYTES:
+                break
+            fh.write(line)
+            size += len(line)
+            written += 1
+    return written
+
+
+def _read_lines(path: Path, offset: int, limit: int) -> tuple[list[dict[str, Any]], int]:
+    """Up to `limit` events starting at byte `offset`; returns them and the next offset."""
+    events: list[dict[str, Any]] = []
+    with path.open("rb") as fh:
+        fh.seek(offset)
+        while len(events) < limit:
+            line = fh.readline()
+            if not line:
+                break
+            offset += len(line)
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping corrupt analytics spill line at byte %d", offset - len(line))
+    return events, offset
+
+
+def _keep_tail(path: Path, offset: int) -> None:
+    """Drop the first `offset` bytes of the file."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with path.open("rb") as src, tmp.open("wb") as dst:
+        src.seek(offset)
+        while chunk := src.read(1024 * 1024):
+            dst.write(chunk)
+    os.replace(tmp, path)
+
+
+def _take_lines(path: Path, limit: int) -> tuple[list[dict[str, Any]], int] | None:
+    """Cut up to `limit` events off the head of the spill file.
+
+    Returns the events and the bytes removed, or None if another worker holds
+    the lock. The lock is released before the caller writes the events.
+    """
+    with _spill_lock(path, blocking=False) as locked:
+        if not locked:
+            return None
+        if not path.exists():
+            return [], 0
+        events, offset = _read_lines(path, 0, limit)
+        if offset >= path.stat().st_size:
+            path.unlink()
+        elif offset:
+            _keep_tail(path, offset)
+        return events, offset
+
+
+@dataclass(frozen=True)
+class IngestionPolicy:
+    """Per-event-type sampling rates and the types that are only ever counted per venue."""
+
+    sample_rates: dict[str, float] = field(default_factory=dict)
+    counter_types: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_settings(cls) -> "IngestionPolicy":
+        settings = get_settings()
+        return cls(
+            sample_rates=dict(settings.ANALYTICS_SAMPLE_RATES),
+            counter_types=frozenset(settings.ANALYTICS_COUNTER_EVENTS),
+        )
+
+    def rate(self, event_type: str) -> float:
+        return min(1.0, max(0.0, self.sample_rates.get(event_type, 1.0)))
+
+
+def _venue_ref(data: dict[str, Any]) -> str | None:
+    for key in ("venue_id", "venue_ref", "shop_id"):
+        value = data.get(key)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def _venue_columns(venue_ref: str | None) -> dict[str, Any]:
+    """venue_ref always; venue_id only when the reference is a UUID (the column type)."""
+    if venue_ref is None:
+        return {}
+    try:
+        return {"venue_id": str(uuid.UUID(venue_ref)), "venue_ref": venue_ref}
+    except ValueError:
+        return {"venue_ref": venue_ref}
 
 
 class AnalyticsBuffer:
-    """Thread-safe, async-compatible analytics event buffer."""
+    """Async analytics event buffer with a non-blocking append path."""
 
-    def __init__(self, flush_threshold: int = _FLUSH_THRESHOLD):
+    def __init__(
+        self,
+        flush_threshold: int = _FLUSH_THRESHOLD,
+        max_buffered: int = _MAX_BUFFERED,
+        spill_path: Path | None = None,
+        policy: IngestionPolicy | None = None,
+    ):
         self._buffer: list[dict[str, Any]] = []
-        self._lock = asyncio.Lock()
+        self._counts: dict[tuple[str, str, str], int] = {}  # (venue_ref, event_type, minute) -> events
+        self._policy = policy if policy is not None else IngestionPolicy.from_settings()
+        self._flush_lock = asyncio.Lock()
         self._flush_threshold = flush_threshold
+        self._max_buffered = max_buffered
+        self._spill_path = spill_path if spill_path is not None else _spill_path()
         self._flush_task: asyncio.Task | None = None
+        self._pending_flush: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._buffer) + len(self._counts)
 
     async def log(
         self,
         event_type: str,
         data: dict[str, Any] | None = None,
         user_id: str | None = None,
+        visitor_id: str | None = None,
+        session_id: str | None = None,
     ) -> None:
-        """Append an event to the buffer. Flushes automatically when threshold is reached."""
-        event = {
-            "event_type": event_type,
-            "data": data or {},
-            "user_id": user_id,
-            "created_at": datetime.now(UTC).isoformat(),
-        }
-        async with self._lock:
-            self._buffer.append(event)
-            if len(self._buffer) >= self._flush_threshold:
-                await self._flush_locked()
-
-    async def flush(self) -> None:
-        """Manually flush all buffered events to Supabase."""
-        async with self._lock:
-            await self._flush_locked()
-
-    async def _flush_locked(self) -> None:
-        """Internal flush — must be called while holding ``self._lock``."""
-        if not self._buffer:
-            return
+        """Append an event to the buffer. Never waits on a flush; one is scheduled at the threshold."""
+        await self.log_many([(event_type, data, user_id, visitor_id, session_id)])
+
+    async def log_many(
+        self, events: list[tuple[str, dict[str, Any] | None, str | None, str | None, str | None]]
+    ) -> int:
+        """
+        Append (event_type, data, user_id, visitor_id, session_id) events in one go,
+        applying the ingestion policy; returns how many were accounted for (stored,
+        counted or sampled out).
+        """
+        now = datetime.now(UTC)
+        created_at = now.isoformat()
+        minute = now.replace(second=0, microsecond=0).isoformat()
+        accepted = 0
+        for event_type, data, user_id, visitor_id, session_id in events:
+            data = data or {}
+            venue_ref = _venue_ref(data)
+            if event_type in self._policy.counter_types and venue_ref is not None:
+                counted = self._count((venue_ref, event_type, minute))
+                if counted:
+                    # The aggregated row has no visitor; sketch this one now.
+                    visitor_row = {
+                        "venue_ref": venue_ref,
+                        "created_at": created_at,
+                        "data": data,
+                        "user_id": user_id,
+                        "visitor_id": visitor_id,
+                        "session_id": session_id,
+                    }
+                    venue_rollups.observe([visitor_row], counts=False)
+                accepted += counted
+                continue
+            rate = self._policy.rate(event_type)
+            if rate < 1.0 and random.random() >= rate:  # nosec B311 - sampling, not security
+                ANALYTICS_EVENTS.labels("sampled_out").inc()
+                accepted += 1
+                continue
+            if not self._admit():
+                continue
+            self._buffer.append(
+                {
+                    "event_type": event_type,
+                    "data": data,
+                    "user_id": user_id,
+                    "visitor_id": visitor_id,
+                    "session_id": session_id,
+                    "created_at": created_at,
+                    "sample_weight": 1.0 / rate if rate > 0 else 1.0,
+                    **_venue_columns(venue_ref),
+                }
+            )
+            ANALYTICS_EVENTS.labels("buffered").inc()
+            accepted += 1
+        if len(self._buffer) >= self._flush_threshold and not self._flush_scheduled():
+            self._pending_flush = asyncio.get_running_loop().create_task(self.flush())
+        return accepted
 
-        events = list(self._buffer)
-        self._buffer.clear()
+    def _count(self, key: tuple[str, str, str]) -> int:
+        if key not in self._counts and len(self._counts) >= _MAX_COUNTER_KEYS:
+            ANALYTICS_EVENTS.labels("dropped").inc()
+            return 0
+        self._counts[key] = self._counts.get(key, 0) + 1
+        ANALYTICS_EVENTS.labels("counted").inc()
+        return 1
 
+    @staticmethod
+    def _counter_rows(counts: dict[tuple[str, str, str], int]) -> list[dict[str, Any]]:
+        return [
+            {
+                "event_type": event_type,
+                "data": {"aggregated": True},
+                "user_id": None,
+                "visitor_id": None,
+                "session_id": None,
+                "created_at": minute,
+                "sample_weight": float(count),
+                **_venue_columns(venue_ref),
+            }
+            for (venue_ref, event_type, minute), count in counts.items()
+        ]
+
+    def _admit(self) -> bool:
+        """Backpressure: shed a growing share of events past the soft limit, drop all at the cap."""
+        size = len(self._buffer)
+        soft = int(self._max_buffered * _SHED_FROM)
+        if size < soft:
+            return True
+        if size >= self._max_buffered:
+            ANALYTICS_EVENTS.labels("dropped").inc()
+            return False
+        keep = (self._max_buffered - size) / max(1, self._max_buffered - soft)
+        if random.random() < keep:  # nosec B311 - load shedding, not security
+            return True
+        ANALYTICS_EVENTS.labels("shed").inc()
+        return False
+
+    def _flush_scheduled(self) -> bool:
+        return self._pending_flush is not None and not self._pending_flush.done()
+
+    async def flush(self) -> int:
+        """Write all buffered events, then replay any spill file; returns events written."""
+        async with self._flush_lock:
+            counts, self._counts = self._counts, {}
+            events, self._buffer = self._counter_rows(counts) + self._buffer, []
+            written, handled = await self._write_all(events)
+            if handled < len(events):
+                await self._spill(events[handled:])
+                return written
+            return written + await self._replay_spill()
+
+    async def _write_all(self, events: list[dict[str, Any]]) -> tuple[int, int]:
+        """Returns (written, handled); handled also counts events dropped without a store."""
+        written = handled = 0
         try:
-            from app.core.supabase import supabase
-
-            if supabase:
-                # Run blocking supabase-py call in thread — event loop must not be blocked
-                await asyncio.to_thread(
-                    lambda: supabase.table("analytics_events").insert(events).execute()
-                )
-                logger.debug("Flushed %d analytics events", len(events))
-            else:
-                logger.warning("Supabase not configured — dropping %d analytics events", len(events))
+            for start in range(0, len(events), _WRITE_CHUNK):
+                chunk = events[start : start + _WRITE_CHUNK]
+                if await self._insert(chunk):
+                    written += len(chunk)
+                handled += len(chunk)
         except Exception:
-            logger.exception("Failed to flush %d analytics events", len(events))
-            # Put events back so they aren't lost
-            self._buffer = events + self._buffer
+            logger.exception("Failed to flush %d analytics events", len(events) - handled)
+            ANALYTICS_EVENTS.labels("failed").inc(len(events) - handled)
+        ANALYTICS_EVENTS.labels("written").inc(written)
+        return written, handled
+
+    @staticmethod
+    async def _insert(events: list[dict[str, Any]]) -> bool:
+        """Insert one batch; False if there is no Supabase client and the batch was dropped."""
+        from app.core.supabase import supabase
+
+        if not supabase:
+            logger.warning("Supabase not configured — dropping %d analytics events", len(events))
+            ANALYTICS_EVENTS.labels("dropped").inc(len(events))
+            return False
+        # Run blocking supabase-py call in thread — event loop must not be blocked
+        await asyncio.to_thread(lambda: supabase.table("analytics_events").insert(events).execute())
+        return True
+
+    async def _spill(self, events: list[dict[str, Any]]) -> None:
+        """Persist unwritten events locally, or keep them in memory (bounded) without a spill file."""
+        if self._spill_path is None:
+            room = max(0, self._max_buffered - len(self._buffer))
+            kept = events[-room:] if room else []
+            self._buffer = kept + self._buffer
+            ANALYTICS_EVENTS.labels("dropped").inc(len(events) - len(kept))
+            return
+        try:
+            spilled = await asyncio.to_thread(_append_lines, self._spill_path, events)
+        except OSError:
+            logger.exception("Failed to spill %d analytics events", len(events))
+            spilled = 0
+        ANALYTICS_EVENTS.labels("spilled").inc(spilled)
+        if spilled < len(events):
+            ANALYTICS_EVENTS.labels("dropped").inc(len(events) - spilled)
+            logger.warning("Analytics spill file full; dropped %d events", len(events) - spilled)
+
+    async def _replay_spill(self) -> int:
+        """Write spilled events back a chunk at a time; a chunk that fails goes back on disk."""
+        path = self._spill_path
+        if path is None:
+            return 0
+        replayed = 0
+        while path.exists():
+            taken = await asyncio.to_thread(_take_lines, path, _WRITE_CHUNK)
+            if taken is None:
+                break  # another worker is cutting a chunk; leave the rest to it
+            events, removed = taken
+            if not removed:
+                break
+            if not events:
+                continue  # only corrupt lines
+            try:
+                stored = await self._insert(events)
+            except Exception:
+                logger.warning("Analytics spill replay paused after %d events", replayed)
+                stored = False
+            if not stored:
+                await self._spill(events)
+                break
+            replayed += len(events)
+        if replayed:
+            ANALYTICS_EVENTS.labels("replayed").inc(replayed)
+            logger.info("Replayed %d spilled analytics events", replayed)
+        return replayed
 
     async def start_periodic_flush(self) -> None:
         """Start a background task that periodically flushes the buffer."""
@@ -0,0 +1,95 @@
+"""
+Dashboard Stats - cached aggregates for the admin dashboard.
+The user, venue, OSM and review counts are recomputed by a background job
+(app.jobs.dashboard_stats_refresh) and served from memory. Refreshes are
+single-flight: concurrent callers that need a new snapshot, including
+admins asking for ?fresh=1, share one set of queries instead of each
+issuing their own.
+"""
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+logger = logging.getLogger("app.dashboard_stats")
+
+_MAX_AGE_SECONDS = 300  # served as-is below this age; the job refreshes every 60 s
+
+
+def _count(client, table: str, **eq: str) -> int | None:
+    query = client.table(table).select("id", count="estimated")
+    for column, value in eq.items():
+        query = query.eq(column, value)
+    return query.execute().count
+
+
+def _latest_osm_sync(client) -> str | None:
+    rows = (
+        client.table("venues")
+        .select("last_osm_sync")
+        .eq("source", "osm")
+        .order("last_osm_sync", desc=True)
+        .limit(1)
+        .execute()
+        .data
+        or []
+    )
+    return rows[0].get("last_osm_sync") if rows else None
+
+
+class DashboardStats:
+    """In-memory snapshot of the admin dashboard aggregates."""
+
+    def __init__(self, max_age: float = _MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._stats: dict[str, Any] | None = None
+        self._computed_at = 0.0  # monotonic
+        self._generated_at: str | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, client, fresh: bool = False) -> tuple[dict[str, Any], str]:
+        """Return (stats, generated_at), recomputing only when stale or `fresh`."""
+        if not fresh and self._stats is not None and time.monotonic() - self._computed_at < self.max_age:
+            return self._stats, self._generated_at
+        return await self.refresh(client)
+
+    async def refresh(self, client) -> tuple[dict[str, Any], str]:
+        """Recompute the snapshot, or join a refresh that started after this call."""
+        requested = time.monotonic()
+        async with self._lock:
+            if self._stats is not None and self._computed_at >= requested:
+                return self._stats, self._generated_at
+            stats = await self._query(client)
+            self._stats = stats
+            self._computed_at = time.monotonic()
+            self._generated_at = datetime.now(UTC).isoformat()
+            logger.debug("Dashboard stats refreshed")
+            return stats, self._generated_at
+
+    @staticmethod
+    async def _query(client) -> dict[str, Any]:
+        # Each query is a blocking supabase-py call; run them side by side in threads.
+        (
+            total_users,
+            total_venues,
+            total_osm_venues,
+            total_reviews,
+            latest_osm_sync,
+        ) = await asyncio.gather(
+            asyncio.to_thread(_count, client, "user_profiles"),
+            asyncio.to_thread(_count, client, "venues"),
+            asyncio.to_thread(_count, client, "venues", source="osm"),
+            asyncio.to_thread(_count, client, "reviews"),
+            asyncio.to_thread(_latest_osm_sync, client),
+        )
+        return {
+            "total_users": total_users,
+            "total_venues": total_venues,
+            "total_osm_venues": total_osm_venues,
+            "total_reviews": total_reviews,
+            "latest_osm_sync": latest_osm_sync,
+        }
+
+
+dashboard_stats = DashboardStats()
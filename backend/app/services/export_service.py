@@ -1,108 +1,132 @@
 """
 Export Service - Generates reports in CSV, Excel, and PDF formats.
 Handles data filtering by date, type, and merchant.
+
+Rows are read in keyset-paginated pages (ordered by id) and fed to the
+writers page by page, so memory stays bounded by the page size rather than
+the report size: CSV is streamed as it is written, Excel uses openpyxl's
+write-only mode and PDF tables are built in fixed-size chunks. Excel and PDF
+files are assembled in a spooled temporary file before being streamed.
 """
 
 import asyncio
 import csv
 import io
+import json
 import logging
-from typing import Any
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from typing import IO, Any
 
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 1000  # rows per keyset page
+PDF_MAX_ROWS = 5000  # a PDF beyond this is unreadable; CSV/Excel carry the full report
+_PDF_TABLE_ROWS = 250  # rows per PDF table chunk
+_SPOOL_BYTES = 8 * 1024 * 1024  # in-memory size before a generated file spills to disk
+_STREAM_CHUNK = 64 * 1024
+
+
+def _cell(value: Any) -> Any:
+    """openpyxl only takes scalars; JSON columns are written as text."""
+    if isinstance(value, dict | list):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _append_rows(sheet, headers: list[str], rows: list[dict[str, Any]]) -> None:
+    for item in rows:
+        sheet.append([_cell(item.get(h)) for h in headers])
+
+
+def iter_file(file: IO[bytes]) -> Iterator[bytes]:
+    """Stream a generated file in chunks and close it afterwards."""
+    try:
+        while chunk := file.read(_STREAM_CHUNK):
+            yield chunk
+    finally:
+        file.close()
+
+
+async def prefetch(pages: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[list[dict[str, Any]]]:
+    """
+    Fetch the first page now so query errors surface before a response is
+    started, then hand back an iterator over all pages.
+    """
+    first = await anext(pages, None)
+
+    async def _pages() -> AsyncIterator[list[dict[str, Any]]]:
+        if first is not None:
+            yield first
+            async for rows in pages:
+                yield rows
+
+    return _pages()
+
 
 class ExportService:
     """
     Service for exporting merchant data.
     """
 
-    async def generate_csv(self, data: list[dict[str, Any]], headers: list[str]) -> str:
+    async def generate_csv(self, pages: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[str]:
         """
-        Generates a CSV string from a list of dictionaries.
+        Yields CSV text page by page; headers come from the first row.
         """
         output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(data)
-        return output.getvalue()
+        writer = None
+        async for rows in pages:
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerows(rows)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        if writer is None:
+            csv.DictWriter(output, fieldnames=[]).writeheader()
+            yield output.getvalue()
 
-    async def generate_excel(self, data: list[dict[str, Any]], sheet_name: str = "Report") -> bytes:
+    async def generate_excel(
+        self, pages: AsyncIterator[list[dict[str, Any]]], sheet_name: str = "Report"
+    ) -> IO[bytes]:
         """
-        Generates an Excel (XLSX) binary from a list of dictionaries.
+        Writes an Excel (XLSX) workbook in write-only mode; returns the file rewound.
         """
         try:
-            import pandas as pd
-
-            df = pd.DataFrame(data)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name=sheet_name)
-            return output.getvalue()
+            from openpyxl import Workbook
         except ImportError as exc:
-            logger.error("pandas or openpyxl not installed for Excel export")
+            logger.error("openpyxl not installed for Excel export")
             raise HTTPException(
                 status_code=501,
                 detail="Excel export not supported on this server",
             ) from exc
 
-    async def generate_pdf(self, data: list[dict[str, Any]], title: str) -> bytes:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(sheet_name)
+        headers: list[str] | None = None
+        async for rows in pages:
+            if headers is None:
+                headers = list(rows[0].keys())
+                sheet.append(headers)
+            await asyncio.to_thread(_append_rows, sheet, headers, rows)
+
+        output = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        return output
+
+    async def generate_pdf(self, pages: AsyncIterator[list[dict[str, Any]]], title: str) -> IO[bytes]:
         """
-        Generates a PDF binary from data.
+        Generates a PDF from at most PDF_MAX_ROWS rows; returns the file rewound.
         """
         try:
             from reportlab.lib import colors
             from reportlab.lib.pagesizes import letter
             from reportlab.lib.styles import getSampleStyleSheet
             from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-
-            output = io.BytesIO()
-            doc = SimpleDocTemplate(output, pagesize=letter)
-            elements = []
-            
-            styles = getSampleStyleSheet()
-            elements.append(Paragraph(title, styles["Title"]))
-            elements.append(Spacer(1, 12))
-            
-            if not data:
-                elements.append(
-                    Paragraph(
-                        "No data available for the selected period.",
-                        styles["Normal"],
-                    ),
-                )
-            else:
-                # Prepare table data
-                headers = list(data[0].keys())
-                table_data = [headers]
-                for item in data:
-                    table_data.append([str(item.get(h, "")) for h in headers])
-
-                # Create table
-                t = Table(table_data)
-                table_styles = [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ]
-                table_styles.extend(
-                    (
-                        "BACKGROUND",
-                        (0, i),
-                        (-1, i),
-                        colors.beige if i % 2 == 0 else colors.white,
-                    )
-                    for i in range(1, len(table_data))
-                )
-                t.setStyle(TableStyle(table_styles))
-                elements.append(t)
-
-            doc.build(elements)
-            return output.getvalue()
         except ImportError as exc:
             logger.error("reportlab not installed for PDF export")
             raise HTTPException(
@@ -110,22 +134,83 @@ class ExportService:
                 detail="PDF export not supported on this server",
             ) from exc
 
-    async def fetch_merchant_data(self, visitor_id: str, report_type: str, start_date: str, end_date: str) -> list[dict[str, Any]]:
+        styles = getSampleStyleSheet()
+        elements = [Paragraph(title, styles["Title"]), Spacer(1, 12)]
+
+        def _table(headers: list[str], body: list[list[str]]) -> Table:
+            # One table per chunk keeps reportlab's layout work proportional to the chunk.
+            t = Table([headers, *body], repeatRows=1)
+            table_styles = [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+            ]
+            table_styles.extend(
+                (
+                    "BACKGROUND",
+                    (0, i),
+                    (-1, i),
+                    colors.beige if i % 2 == 0 else colors.white,
+                )
+                for i in range(1, len(body) + 1)
+            )
+            t.setStyle(TableStyle(table_styles))
+            return t
+
+        headers: list[str] | None = None
+        body: list[list[str]] = []
+        total = 0
+        truncated = False
+        async for rows in pages:
+            if headers is None:
+                headers = list(rows[0].keys())
+            for item in rows:
+                if total >= PDF_MAX_ROWS:
+                    truncated = True
+                    break
+                body.append([str(item.get(h, "")) for h in headers])
+                total += 1
+                if len(body) == _PDF_TABLE_ROWS:
+                    elements.append(_table(headers, body))
+                    body = []
+            if truncated:
+                break
+        if body:
+            elements.append(_table(headers, body))
+
+        if headers is None:
+            elements.append(
+                Paragraph(
+                    "No data available for the selected period.",
+                    styles["Normal"],
+                ),
+            )
+        elif truncated:
+            elements.append(Spacer(1, 12))
+            elements.append(
+                Paragraph(
+                    f"Showing the first {PDF_MAX_ROWS} rows. Export as CSV or Excel for the full report.",
+                    styles["Normal"],
+                ),
+            )
+
+        output = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+        await asyncio.to_thread(SimpleDocTemplate(output, pagesize=letter).build, elements)
+        output.seek(0)
+        return output
+
+    async def iter_merchant_pages(
+        self, visitor_id: str, report_type: str, start_date: str | None, end_date: str | None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
         """
-        Fetches data from Supabase based on filters.
+        Yields non-empty pages of matching rows from Supabase, keyset-paginated by id.
         """
         from app.core.supabase import supabase_admin as supabase
-        
+
         if report_type == "venues":
-            query = supabase.table("venues").select("*").eq("owner_visitor_id", visitor_id)
-            if start_date:
-                query = query.gte("created_at", start_date)
-            if end_date:
-                query = query.lte("created_at", end_date)
-            
-            response = await asyncio.to_thread(query.execute)
-            return response.data or []
-            
+            table, column, values = "venues", "owner_visitor_id", visitor_id
         elif report_type == "insights":
             # Fetch venues first
             venue_res = await asyncio.to_thread(
@@ -135,19 +220,31 @@ class ExportService:
                 .execute(),
             )
             venue_ids = [v["id"] for v in (venue_res.data or [])]
-            
             if not venue_ids:
-                return []
-                
-            query = supabase.table("analytics_events").select("*").in_("venue_id", venue_ids)
+                return
+            table, column, values = "analytics_events", "venue_id", venue_ids
+        else:
+            return
+
+        last_id = None
+        while True:
+            query = supabase.table(table).select("*")
+            query = query.in_(column, values) if isinstance(values, list) else query.eq(column, values)
             if start_date:
                 query = query.gte("created_at", start_date)
             if end_date:
                 query = query.lte("created_at", end_date)
-                
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            query = query.order("id").limit(PAGE_SIZE)
+
             response = await asyncio.to_thread(query.execute)
-            return response.data or []
-            
-        return []
+            rows = response.data or []
+            if rows:
+                yield rows
+            if len(rows) < PAGE_SIZE:
+                return
+            last_id = rows[-1]["id"]
+
 
 export_service = ExportService()
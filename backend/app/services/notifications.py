@@ -3,9 +3,11 @@ import logging
 import httpx
 
 from app.core.config import get_settings
+from app.core.resilience import CircuitOpenError, get_breaker
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
+_breaker = get_breaker("onesignal")
 
 async def send_push_notification(
     user_ids: list[str],
@@ -35,20 +37,26 @@ async def send_push_notification(
         "data": data or {}
     }
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code == 200:
-                return True
-            logger.warning(
-                "OneSignal returned a non-success response: status=%s body=%s",
-                response.status_code,
-                response.text,
-            )
-            return False
-        except httpx.HTTPError:
-            logger.exception("Failed to send OneSignal notification.")
-            return False
+    try:
+        with _breaker.guard():
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.post(url, json=payload, headers=headers)
+            if response.status_code >= 500:
+                response.raise_for_status()
+    except CircuitOpenError:
+        logger.warning("OneSignal circuit open. Skipping notification send.")
+        return False
+    except httpx.HTTPError:
+        logger.exception("Failed to send OneSignal notification.")
+        return False
+    if response.status_code == 200:
+        return True
+    logger.warning(
+        "OneSignal returned a non-success response: status=%s body=%s",
+        response.status_code,
+        response.text,
+    )
+    return False
 
 async def notify_shop_approved(user_id: str, shop_name: str, coins: int):
     return await send_push_notification(
@@ -0,0 +1,182 @@
+"""In-process BM25 index over authority places.
+
+Thai text has no word boundaries, so documents are tokenized into character
+bigrams and trigrams per whitespace-separated chunk (plus the whole chunk for
+short Latin words). This keeps search available without Qdrant or Gemini and
+gives a lexical signal to fuse with vector hits.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any
+
+from app.services.vector.places_vector_service import haversine_m
+
+_SPLIT_RE = re.compile(r"[\s\|,;/()\[\]\-_.:!?\"']+")
+_NGRAM_SIZES = (2, 3)
+
+# Reciprocal-rank-fusion constant (Cormack et al.); larger = flatter blend.
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    normalized = unicodedata.normalize("NFKC", text or "").casefold()
+    terms: list[str] = []
+    for chunk in _SPLIT_RE.split(normalized):
+        if not chunk:
+            continue
+        if len(chunk) <= 3 or chunk.isascii():
+            terms.append(f"w:{chunk}")
+        for size in _NGRAM_SIZES:
+            if len(chunk) < size:
+                continue
+            terms.extend(chunk[i : i + size] for i in range(len(chunk) - size + 1))
+    return terms
+
+
+def _document_text(doc: dict) -> str:
+    # Name is repeated so it outweighs address/district matches.
+    name = doc.get("name") or ""
+    parts = [name, name, doc.get("category"), doc.get("district"), doc.get("address")]
+    return " ".join(part for part in parts if part)
+
+
+class LexicalIndex:
+    """Incrementally updatable BM25 index keyed by authority_id."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: dict[str, dict] = {}
+        self._doc_terms: dict[str, Counter] = {}
+        self._doc_len: dict[str, int] = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.docs)
+
+    def upsert(self, doc_id: str, doc: dict) -> None:
+        self.remove(doc_id)
+        terms = Counter(tokenize(_document_text(doc)))
+        self.docs[doc_id] = doc
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = sum(terms.values())
+        self._total_len += self._doc_len[doc_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.docs.pop(doc_id, None)
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+
+    def clear(self) -> None:
+        self.docs.clear()
+        self._doc_terms.clear()
+        self._doc_len.clear()
+        self._postings.clear()
+        self._total_len = 0
+
+    def swap(self, other: LexicalIndex) -> None:
+        """Adopt ``other``'s contents in one step so readers never see a partial build."""
+        self.docs, self._doc_terms, self._doc_len, self._postings, self._total_len = (
+            other.docs,
+            other._doc_terms,
+            other._doc_len,
+            other._postings,
+            other._total_len,
+        )
+
+    def search(
+        self,
+        q: str,
+        limit: int,
+        province: str | None = None,
+        category: str | None = None,
+        lat: float | None = None,
+        lng: float | None = None,
+        radius_m: float | None = None,
+    ) -> list[tuple[dict, float]]:
+        # Runs in a worker thread while the refresh job may upsert on the event
+        # loop: postings are copied before iterating and lookups tolerate
+        # documents removed mid-search.
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs or 1.0
+
+        scores: dict[str, float] = {}
+        for term in set(tokenize(q)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in list(posting.items()):
+                doc_len = self._doc_len.get(doc_id, avg_len)
+                norm = tf + self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        geo = lat is not None and lng is not None and bool(radius_m)
+        out: list[tuple[dict, float]] = []
+        for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            doc = self.docs.get(doc_id)
+            if doc is None:
+                continue
+            if province and doc.get("province") != province:
+                continue
+            if category and doc.get("category") != category:
+                continue
+            if geo and haversine_m(lat, lng, doc["lat"], doc["lng"]) > radius_m:
+                continue
+            out.append((doc, score))
+            if len(out) >= limit:
+                break
+        return out
+
+
+def reciprocal_rank_fusion(*rankings: list[str]) -> list[str]:
+    """Merge ranked id lists; ids ranked high in several lists float to the top."""
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=lambda doc_id: fused[doc_id], reverse=True)
+
+
+def doc_from_row(row: Any) -> dict:
+    updated_at = row.get("updated_at")
+    if updated_at is not None and hasattr(updated_at, "isoformat"):
+        updated_at = updated_at.isoformat()
+    return {
+        "authority_id": str(row["authority_id"]),
+        "name": row.get("name"),
+        "category": row.get("category"),
+        "province": row.get("province"),
+        "district": row.get("district"),
+        "address": row.get("address"),
+        "lat": float(row["lat"]),
+        "lng": float(row["lng"]),
+        "updated_at": updated_at or "",
+    }
+
+
+authority_index = LexicalIndex()
@@ -0,0 +1,115 @@
+"""
+Prewarm Service - keeps traffic and map caches warm where users are.
+Takes the hottest cells of the user density overlay (user:h3:density, kept
+by scripts/workers.py) together with the density recorded for the upcoming
+hour of week in earlier weeks, converts them in batches to traffic tiles
+(H3 res 7) and venue map tiles (z14), and refreshes every tile that is
+missing or about to expire. OSM coverage for the same cells is boosted by
+the prewarm worker in scripts/workers.py.
+"""
+import asyncio
+import logging
+from datetime import UTC, datetime
+
+import h3
+
+from app.core.metrics import PREWARM_TILES
+from app.services import venue_tiles
+from app.services.cache import redis_client
+from app.services.traffic.fusion import traffic_fusion_service
+from app.services.traffic.rollups import hour_of_week
+from app.services.traffic.tiles import TILE_RESOLUTION
+
+logger = logging.getLogger("app.prewarm")
+
+USER_HEX_DENSITY_ZSET = "user:h3:density"
+_WEEKLY_DENSITY_PREFIX = "user:h3:density:how:"  # + hour of week, EWMA across weeks
+_WEEKLY_DECAY = 0.5  # weight of earlier weeks when folding in the current density
+_WEEKLY_TTL = 35 * 24 * 3600
+_TOP_CELLS = 500
+_MAX_TRAFFIC_TILES = 64
+_MAX_VENUE_TILES = 128
+_REFRESH_WITHIN_SECONDS = 60
+_LOCK_KEY = "prewarm:lock"
+_LOCK_SECONDS = 50
+
+
+class PrewarmService:
+    def _hot_cells(self, redis_conn, now: datetime) -> list[tuple[str, float]]:
+        """Current density merged with the density usually seen in the next hour."""
+        how = hour_of_week(now)
+        self._record_weekly_density(redis_conn, how, now)
+        current = redis_conn.zrevrange(USER_HEX_DENSITY_ZSET, 0, _TOP_CELLS - 1, withscores=True)
+        upcoming = redis_conn.zrevrange(
+            f"{_WEEKLY_DENSITY_PREFIX}{(how + 1) % 168}", 0, _TOP_CELLS - 1, withscores=True
+        )
+        scores: dict[str, float] = {}
+        for cell, score in [*current, *upcoming]:
+            scores[cell] = max(scores.get(cell, 0.0), float(score))
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:_TOP_CELLS]
+
+    @staticmethod
+    def _record_weekly_density(redis_conn, how: int, now: datetime) -> None:
+        """Fold the current density into this hour of week, once per hour."""
+        week = now.isocalendar()
+        marker = f"prewarm:weekly:{week.year}-{week.week}:{how}"
+        if not redis_conn.set(marker, "1", nx=True, ex=2 * 3600):
+            return
+        key = f"{_WEEKLY_DENSITY_PREFIX}{how}"
+        redis_conn.zunionstore(key, {key: _WEEKLY_DECAY, USER_HEX_DENSITY_ZSET: 1 - _WEEKLY_DECAY})
+        redis_conn.expire(key, _WEEKLY_TTL)
+
+    @staticmethod
+    def plan(cells: list[tuple[str, float]]) -> tuple[list[str], list[venue_tiles.Tile]]:
+        """Traffic cells and venue tiles covering `cells`, hottest first (scores summed per tile)."""
+        traffic: dict[str, float] = {}
+        venues: dict[venue_tiles.Tile, float] = {}
+        for cell, score in cells:
+            if not h3.is_valid_cell(cell):
+                continue
+            lat, lng = h3.cell_to_latlng(cell)
+            if h3.get_resolution(cell) >= TILE_RESOLUTION:
+                traffic_cell = h3.cell_to_parent(cell, TILE_RESOLUTION)
+            else:
+                traffic_cell = h3.latlng_to_cell(lat, lng, TILE_RESOLUTION)
+            traffic[traffic_cell] = traffic.get(traffic_cell, 0.0) + score
+            tile = venue_tiles.tile_for(lat, lng)
+            venues[tile] = venues.get(tile, 0.0) + score
+
+        def _hottest(scores: dict, limit: int) -> list:
+            return [key for key, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]]
+
+        return _hottest(traffic, _MAX_TRAFFIC_TILES), _hottest(venues, _MAX_VENUE_TILES)
+
+    async def run_once(self, now: datetime | None = None) -> dict[str, int]:
+        """One pre-warm pass; a no-op without real Redis or while another worker holds the lock."""
+        redis_conn = redis_client.get_redis()
+        if not hasattr(redis_conn, "zrevrange"):
+            return {}
+        acquired = await asyncio.to_thread(redis_conn.set, _LOCK_KEY, "1", nx=True, ex=_LOCK_SECONDS)
+        if not acquired:
+            return {}
+
+        cells = await asyncio.to_thread(self._hot_cells, redis_conn, now or datetime.now(UTC))
+        if not cells:
+            return {}
+        traffic_cells, map_tiles = self.plan(cells)
+
+        from app.core.supabase import supabase
+
+        warmed_traffic, warmed_venues = await asyncio.gather(
+            traffic_fusion_service.warm_tiles(traffic_cells, _REFRESH_WITHIN_SECONDS),
+            venue_tiles.warm_tiles(supabase, map_tiles, _REFRESH_WITHIN_SECONDS),
+        )
+        PREWARM_TILES.labels("traffic", "considered").inc(len(traffic_cells))
+        PREWARM_TILES.labels("traffic", "warmed").inc(warmed_traffic)
+        PREWARM_TILES.labels("venues", "considered").inc(len(map_tiles))
+        PREWARM_TILES.labels("venues", "warmed").inc(warmed_venues)
+        logger.info(
+            "Pre-warmed %d/%d traffic tiles and %d/%d venue tiles from %d hot cells",
+            warmed_traffic, len(traffic_cells), warmed_venues, len(map_tiles), len(cells),
+        )
+        return {"traffic": warmed_traffic, "venues": warmed_venues}
+
+
+prewarm_service = PrewarmService()
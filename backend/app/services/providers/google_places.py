@@ -5,6 +5,9 @@ from datetime import datetime
 import httpx
 
 from app.core.config import get_settings
+from app.core.resilience import get_breaker
+
+_breaker = get_breaker("google_places")
 
 
 def _iso_now() -> str:
@@ -31,16 +34,17 @@ class GooglePlacesProvider:
             "radius": radius,
         }
 
-        async with httpx.AsyncClient(
-            timeout=httpx.Timeout(5.0, read=20.0),
-            limits=httpx.Limits(max_connections=10),
-        ) as client:
-            response = await client.get(
-                "https://maps.googleapis.com/maps/api/place/nearbysearch/json",
-                params=params,
-            )
-            response.raise_for_status()
-            raw_data = response.json()
+        with _breaker.guard():
+            async with httpx.AsyncClient(
+                timeout=httpx.Timeout(5.0, read=20.0),
+                limits=httpx.Limits(max_connections=10),
+            ) as client:
+                response = await client.get(
+                    "https://maps.googleapis.com/maps/api/place/nearbysearch/json",
+                    params=params,
+                )
+                response.raise_for_status()
+                raw_data = response.json()
 
         out: list[dict] = []
         for item in raw_data.get("results", [])[:limit]:
@@ -4,8 +4,11 @@ from datetime import datetime
 
 import httpx
 
+from app.core.resilience import get_breaker
 from app.services.places.osm_transform import transform_osm_element
 
+_breaker = get_breaker("overpass")
+
 
 def _iso_now() -> str:
     return datetime.now(datetime.UTC).isoformat()
@@ -35,17 +38,18 @@ class OSMOverpassProvider:
           out body {limit};
         """
 
-        async with httpx.AsyncClient(
-            timeout=httpx.Timeout(5.0, read=20.0),
-            limits=httpx.Limits(max_connections=10),
-        ) as client:
-            response = await client.post(
-                "https://overpass-api.de/api/interpreter",
-                data={"data": query},
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            response.raise_for_status()
-            raw_data = response.json()
+        with _breaker.guard():
+            async with httpx.AsyncClient(
+                timeout=httpx.Timeout(5.0, read=20.0),
+                limits=httpx.Limits(max_connections=10),
+            ) as client:
+                response = await client.post(
+                    "https://overpass-api.de/api/interpreter",
+                    data={"data": query},
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                )
+                response.raise_for_status()
+                raw_data = response.json()
 
         out: list[dict] = []
         for element in raw_data.get("elements", []):
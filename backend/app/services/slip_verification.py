@@ -13,8 +13,10 @@ from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 
 from app.core.config import get_settings
+from app.core.resilience import get_breaker
 
 settings = get_settings()
+_vision_breaker = get_breaker("google_vision")
 
 GCV_SCOPE = "https://www.googleapis.com/auth/cloud-vision"
 VISION_ENDPOINT = "https://vision.googleapis.com/v1/images:annotate"
@@ -305,17 +307,20 @@ def detect_text_from_image(image_bytes: bytes) -> dict[str, Any]:
             }
         ]
     }
-    resp = requests.post(
-        VISION_ENDPOINT,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        },
-        data=json.dumps(payload),
-        timeout=30,
-    )
-    if resp.status_code >= 400:
-        raise RuntimeError(f"Vision API error: {resp.status_code}")
+    # An open circuit raises here; verify_slip_with_gcv turns it into pending_review.
+    with _vision_breaker.guard():
+        resp = requests.post(
+            VISION_ENDPOINT,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            },
+            data=json.dumps(payload),
+            timeout=30,
+        )
+        if resp.status_code >= 400:
+            # Carries the response so the breaker ignores client errors (4xx other than 429).
+            raise requests.HTTPError(f"Vision API error: {resp.status_code}", response=resp)
 
     body = resp.json()
     annotations = (body.get("responses") or [{}])[0] or {}
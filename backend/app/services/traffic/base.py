@@ -17,6 +17,25 @@ class TrafficDensity(Enum):
     STALLED = "stalled"
     UNKNOWN = "unknown"
 
+# Minimum speed / free-flow ratio for each density, checked in order.
+DENSITY_THRESHOLDS: tuple[tuple[float, TrafficDensity], ...] = (
+    (0.8, TrafficDensity.LOW),
+    (0.5, TrafficDensity.MODERATE),
+    (0.2, TrafficDensity.HEAVY),
+)
+
+
+def density_for(speed: float, free_flow: float) -> TrafficDensity:
+    """Density from the speed / free-flow ratio."""
+    if free_flow <= 0:
+        return TrafficDensity.UNKNOWN
+    ratio = speed / free_flow
+    for minimum, density in DENSITY_THRESHOLDS:
+        if ratio >= minimum:
+            return density
+    return TrafficDensity.STALLED
+
+
 @dataclass
 class StandardIncident:
     id: str
@@ -41,6 +60,9 @@ class StandardTrafficSegment:
     incidents: list[StandardIncident] = field(default_factory=list)
     provider: str = "unknown"
     confidence_score: float = 1.0  # 0.0 to 1.0
+    lat: float | None = None  # representative point (segment midpoint), if known
+    lng: float | None = None
+    path: list[tuple[float, float]] = field(default_factory=list)  # (lat, lng) polyline, start to end
 
 class TrafficProvider(ABC):
     """
@@ -69,15 +91,4 @@ class TrafficProvider(ABC):
         """
         Calculate density based on speed ratio.
         """
-        if free_flow <= 0:
-            return TrafficDensity.UNKNOWN
-        
-        ratio = speed / free_flow
-        if ratio >= 0.8:
-            return TrafficDensity.LOW
-        elif ratio >= 0.5:
-            return TrafficDensity.MODERATE
-        elif ratio >= 0.2:
-            return TrafficDensity.HEAVY
-        else:
-            return TrafficDensity.STALLED
+        return density_for(speed, free_flow)
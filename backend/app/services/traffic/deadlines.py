@@ -0,0 +1,53 @@
+"""
+Provider deadlines for traffic fusion.
+Each provider gets a deadline derived from its recently observed latency
+(a high quantile plus headroom), capped by the global fusion budget, so one
+slow upstream cannot hold a tile fetch for its full HTTP client timeout.
+"""
+import math
+from collections import deque
+from dataclasses import dataclass
+
+_WINDOW = 50
+_MIN_SAMPLES = 5
+_QUANTILE = 0.95
+_HEADROOM = 1.5
+_FLOOR_SECONDS = 0.3
+
+
+@dataclass
+class ProviderOutcome:
+    """How one provider fared for one tile fetch."""
+
+    provider: str
+    status: str  # ok | timeout | error
+    segments: int
+    latency_ms: int
+
+    def as_dict(self) -> dict[str, int | str]:
+        return {"status": self.status, "segments": self.segments, "latency_ms": self.latency_ms}
+
+
+class LatencyTracker:
+    """Rolling window of provider latencies."""
+
+    def __init__(self, window: int = _WINDOW):
+        self._window = window
+        self._samples: dict[str, deque[float]] = {}
+
+    def observe(self, provider: str, seconds: float) -> None:
+        self._samples.setdefault(provider, deque(maxlen=self._window)).append(seconds)
+
+    def quantile(self, provider: str, q: float = _QUANTILE) -> float | None:
+        samples = self._samples.get(provider)
+        if not samples or len(samples) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def deadline(self, provider: str, budget_s: float) -> float:
+        """Seconds to wait for `provider`; the whole budget until enough samples exist."""
+        observed = self.quantile(provider)
+        if observed is None:
+            return budget_s
+        return min(budget_s, max(_FLOOR_SECONDS, observed * _HEADROOM))
@@ -1,25 +1,54 @@
 """
 Traffic Fusion Service - Merges traffic data from multiple sources.
 Uses confidence scores and historical weighting for accuracy.
+Fetches and caches fused traffic per H3 tile so provider calls scale with
+the area covered rather than with the number of users. Provider calls run
+under per-provider deadlines within a global budget, so the slowest upstream
+no longer gates the response.
 """
+import asyncio
 import json
 import logging
-from datetime import UTC, datetime
+from collections.abc import Callable
 from typing import Any
 
 import anyio
+import h3
+import numpy as np
 
 from app.core.config import get_settings as get_app_settings
+from app.core.metrics import TRAFFIC_PROVIDER_LATENCY, TRAFFIC_PROVIDER_RESULTS
 from app.services.cache import redis_client
 
-from .base import StandardTrafficSegment, TrafficProvider
+from .base import DENSITY_THRESHOLDS, StandardTrafficSegment, TrafficDensity, TrafficProvider
+from .deadlines import LatencyTracker, ProviderOutcome
 from .google import GoogleTrafficProvider
+from .history_sink import traffic_history_sink
+from .matching import SegmentMatcher
 from .osm import OSMTrafficProvider
+from .rollups import traffic_rollups
 from .thai_gov import ThaiGovTrafficProvider
+from .tiles import TILE_FETCH_RADIUS_M, TILE_RESOLUTION, covering_cells, haversine_m, tile_center
 from .tomtom import TomTomTrafficProvider
 
 logger = logging.getLogger("app.traffic.fusion")
 
+_PARTIAL_TILE_TTL = 30  # tiles missing a provider are retried sooner
+_ASSEMBLY_GRACE_SECONDS = 0.25  # fusing and caching after the provider budget
+_PRIOR_TIMEOUT_SECONDS = 0.5  # historical priors are a fallback; never wait long for them
+
+def _segment_point(segment: dict[str, Any]) -> tuple[float, float] | None:
+    """Representative (lat, lng) of a segment: its midpoint, else the middle of its path."""
+    seg_lat, seg_lng = segment.get("lat"), segment.get("lng")
+    if seg_lat is not None and seg_lng is not None:
+        return seg_lat, seg_lng
+    path = segment.get("path") or []
+    if path:
+        mid_lat, mid_lng = path[len(path) // 2]
+        return mid_lat, mid_lng
+    return None
+
+
 class TrafficFusionService:
     """
     Service for merging and fusing traffic data from multiple providers.
@@ -39,127 +68,332 @@ class TrafficFusionService:
         self.providers.append(ThaiGovTrafficProvider()) # Public source (always active)
         
         self._cache_ttl = 180 # 3 minutes
+        self._budget_s = settings.TRAFFIC_FUSION_BUDGET_MS / 1000
+        self._latency = LatencyTracker()
+        # Created on first use inside the running loop (the service is built at import time).
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tile_concurrency: asyncio.Semaphore | None = None
+        # Single-flight: concurrent misses on the same tile share one fetch.
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _loop_state(self) -> tuple[asyncio.Semaphore, dict[str, asyncio.Task]]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._tile_concurrency = asyncio.Semaphore(8)
+            self._inflight = {}
+        return self._tile_concurrency, self._inflight
+
+    @staticmethod
+    def _tile_cache_key(cell: str) -> str:
+        return f"traffic:tile:{TILE_RESOLUTION}:{cell}"
 
     async def get_fused_traffic(self, lat: float, lng: float, radius_m: int = 1000) -> list[dict[str, Any]]:
         """
         Fetch, merge, and fuse traffic data from all active providers.
+        Assembled from the cached H3 tiles covering the radius.
         """
-        cache_key = f"traffic:fused:{round(lat, 4)}:{round(lng, 4)}:{radius_m}"
+        segments, _meta = await self.get_fused_traffic_with_meta(lat, lng, radius_m)
+        return segments
+
+    async def get_fused_traffic_with_meta(
+        self, lat: float, lng: float, radius_m: int = 1000
+    ) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+        """
+        Same as get_fused_traffic, plus `meta` describing which providers contributed.
+        Tiles still being fetched when the fusion budget runs out are left to finish
+        (and fill the cache) in the background and are reported as late.
+        """
+        cells = covering_cells(lat, lng, radius_m)
+        keys = [self._tile_cache_key(cell) for cell in cells]
         redis_conn = redis_client.get_redis()
-        
-        cached = await anyio.to_thread.run_sync(lambda: redis_conn.get(cache_key))
-        if cached:
-            return json.loads(cached)
-
-        # 1. Fetch from all providers in parallel
-        async with anyio.create_task_group() as tg:
-            results = []
-            for provider in self.providers:
-                tg.start_soon(self._fetch_and_append, provider, lat, lng, radius_m, results)
-        
+
+        cached = await anyio.to_thread.run_sync(lambda: [redis_conn.get(key) for key in keys])
+        tiles: dict[str, dict[str, Any]] = {
+            cell: self._load_tile(raw) for cell, raw in zip(cells, cached, strict=True) if raw
+        }
+        missing = [cell for cell, raw in zip(cells, cached, strict=True) if not raw]
+        late = 0
+        if missing:
+            waiters = {cell: asyncio.ensure_future(self._get_tile(cell)) for cell in missing}
+            done, pending = await asyncio.wait(waiters.values(), timeout=self._budget_s + _ASSEMBLY_GRACE_SECONDS)
+            for waiter in pending:
+                waiter.cancel()  # the shielded tile fetch itself keeps running
+            tiles.update((cell, waiter.result()) for cell, waiter in waiters.items() if waiter in done)
+            late = len(pending)
+
+        segments = self._assemble(
+            {cell: tile["segments"] for cell, tile in tiles.items()}, lat, lng, radius_m
+        )
+        meta = self._summarize(list(tiles.values()), total=len(cells), cached=len(cells) - len(missing), late=late)
+        return segments, meta
+
+    async def warm_tiles(self, cells: list[str], refresh_within: int) -> int:
+        """Fetch tiles that are uncached or expire within `refresh_within` seconds; returns how many."""
+        redis_conn = redis_client.get_redis()
+        keys = [self._tile_cache_key(cell) for cell in cells]
+        ttls = await anyio.to_thread.run_sync(lambda: [redis_conn.ttl(key) for key in keys])
+        # ttl is -2 for a missing key and -1 for a key without expiry
+        stale = [cell for cell, ttl in zip(cells, ttls, strict=True) if ttl == -2 or 0 <= ttl < refresh_within]
+        results = await asyncio.gather(*(self._get_tile(cell) for cell in stale), return_exceptions=True)
+        for cell, result in zip(stale, results, strict=True):
+            if isinstance(result, Exception):
+                logger.warning("Pre-warming traffic tile %s failed: %s", cell, result)
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    @staticmethod
+    def _load_tile(raw: str | bytes) -> dict[str, Any]:
+        tile = json.loads(raw)
+        if isinstance(tile, list):  # written before provider outcomes were cached
+            return {"segments": tile, "providers": {}}
+        return tile
+
+    async def _get_tile(self, cell: str) -> dict[str, Any]:
+        _, inflight = self._loop_state()
+        task = inflight.get(cell)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_tile(cell))
+            inflight[cell] = task
+            task.add_done_callback(lambda _t: inflight.pop(cell, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_tile(self, cell: str) -> dict[str, Any]:
+        """Fetch and fuse one tile from every provider, then cache it."""
+        tile_lat, tile_lng = tile_center(cell)
+        tile_concurrency, _ = self._loop_state()
+        async with tile_concurrency:
+            # 1. Fetch from all providers in parallel, map-matching results as each one finishes
+            matcher = SegmentMatcher()
+            outcomes = await self._fetch_providers(tile_lat, tile_lng, TILE_FETCH_RADIUS_M, matcher.add)
+
         # 2. Fuse the data
-        fused_segments = self._fuse_segments(results)
-        
-        # 3. Store historical snapshot (asynchronously)
-        anyio.from_thread.run_sync(self._store_historical, lat, lng, fused_segments)
-        
-        # 4. Convert to dict for API
-        serialized = self._serialize_segments(fused_segments)
-        
-        # 5. Cache results
+        fused_segments = self._fuse_matched(matcher)
+
+        # 3. Store historical snapshot (buffered, non-blocking)
+        self._store_historical(tile_lat, tile_lng, fused_segments)
+
+        # 4. Convert to dict for API and cache the tile; partial tiles expire sooner
+        tile = {
+            "segments": self._serialize_segments(fused_segments),
+            "providers": {outcome.provider: outcome.as_dict() for outcome in outcomes},
+        }
+        complete = all(outcome.status == "ok" for outcome in outcomes)
+        if not tile["segments"] and not complete:
+            # Live providers were too slow: fall back to typical speeds for this hour of week.
+            tile["segments"], tile["providers"]["history"] = await self._historical_priors(cell)
+        ttl = self._cache_ttl if complete else _PARTIAL_TILE_TTL
+        redis_conn = redis_client.get_redis()
         await anyio.to_thread.run_sync(
-            lambda: redis_conn.setex(cache_key, self._cache_ttl, json.dumps(serialized))
+            lambda: redis_conn.setex(self._tile_cache_key(cell), ttl, json.dumps(tile))
         )
-        
-        return serialized
+        return tile
+
+    async def _fetch_providers(
+        self,
+        lat: float,
+        lng: float,
+        radius_m: int,
+        on_segments: Callable[[list[StandardTrafficSegment]], object],
+    ) -> list[ProviderOutcome]:
+        """
+        Query every provider concurrently and hand each result to `on_segments` as
+        soon as it arrives. A provider still running at its deadline is cancelled
+        and reported as a timeout; no deadline exceeds the fusion budget.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        names: dict[asyncio.Task, str] = {}
+        deadlines: dict[asyncio.Task, float] = {}
+        for provider in self.providers:
+            task = asyncio.create_task(provider.get_traffic_nearby(lat, lng, radius_m))
+            names[task] = provider.name
+            deadlines[task] = started + self._latency.deadline(provider.name, self._budget_s)
 
-    async def _fetch_and_append(self, provider: TrafficProvider, lat: float, lng: float, radius_m: int, results: list):
+        outcomes: list[ProviderOutcome] = []
+        pending = set(names)
         try:
-            segments = await provider.get_traffic_nearby(lat, lng, radius_m)
-            results.extend(segments)
-        except Exception as e:
-            logger.error(f"Provider {provider.name} failed: {e}")
+            while pending:
+                timeout = max(0.0, min(deadlines[task] for task in pending) - loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                now = loop.time()
+                for task in done:
+                    outcomes.append(self._provider_outcome(names[task], task, now - started, on_segments))
+                expired = {task for task in pending if deadlines[task] <= now}
+                for task in expired:
+                    task.cancel()
+                    outcomes.append(self._provider_outcome(names[task], None, deadlines[task] - started))
+                pending -= expired
+        finally:
+            for task in pending:
+                task.cancel()
+        return outcomes
+
+    def _provider_outcome(
+        self,
+        name: str,
+        task: asyncio.Task | None,
+        elapsed: float,
+        on_segments: Callable[[list[StandardTrafficSegment]], object] | None = None,
+    ) -> ProviderOutcome:
+        """Record a finished (or, with task=None, timed-out) provider call."""
+        segments: list[StandardTrafficSegment] = []
+        if task is None:
+            status = "timeout"
+            logger.warning("Provider %s missed its %.2fs deadline", name, elapsed)
+            # A timeout counts as a sample at the deadline, so the next deadline grows.
+            self._latency.observe(name, elapsed)
+        else:
+            try:
+                segments = task.result()
+            except Exception as e:
+                status = "error"
+                logger.error(f"Provider {name} failed: {e}")
+            else:
+                status = "ok"
+                self._latency.observe(name, elapsed)
+                if on_segments is not None:
+                    on_segments(segments)
+        TRAFFIC_PROVIDER_LATENCY.labels(name).observe(elapsed)
+        TRAFFIC_PROVIDER_RESULTS.labels(name, status).inc()
+        return ProviderOutcome(name, status, len(segments), int(elapsed * 1000))
+
+    @staticmethod
+    def _summarize(tiles: list[dict[str, Any]], total: int, cached: int, late: int) -> dict[str, Any]:
+        """Aggregate per-tile provider outcomes into response metadata."""
+        providers: dict[str, dict[str, int]] = {}
+        for tile in tiles:
+            for name, outcome in tile.get("providers", {}).items():
+                entry = providers.setdefault(name, {"ok": 0, "timeout": 0, "error": 0, "segments": 0})
+                entry[outcome["status"]] = entry.get(outcome["status"], 0) + 1
+                entry["segments"] += outcome["segments"]
+        return {
+            "contributors": sorted(name for name, entry in providers.items() if entry["segments"]),
+            "providers": providers,
+            "partial": late > 0 or any(entry["timeout"] or entry["error"] for entry in providers.values()),
+            "tiles": {"total": total, "cached": cached, "late": late},
+        }
+
+    @staticmethod
+    def _assemble(
+        tiles: dict[str, list[dict[str, Any]]], lat: float, lng: float, radius_m: int
+    ) -> list[dict[str, Any]]:
+        """
+        Merge tile segments, keeping the most confident copy of a road seen by several tiles.
+        Segments are trimmed to the radius by their midpoint or path; segments
+        without geometry (most providers) are placed at their tile's centroid,
+        and the tile containing the query point is always kept.
+        """
+        home = h3.latlng_to_cell(lat, lng, TILE_RESOLUTION)
+        merged: dict[str, dict[str, Any]] = {}
+        for cell, tile in tiles.items():
+            tile_in_range = cell == home or haversine_m(lat, lng, *tile_center(cell)) <= radius_m
+            for segment in tile:
+                point = _segment_point(segment)
+                in_range = haversine_m(lat, lng, *point) <= radius_m if point else tile_in_range
+                if not in_range:
+                    continue
+                key = str(segment.get("way_id") or segment.get("name"))
+                current = merged.get(key)
+                if current is None or segment.get("confidence", 0) > current.get("confidence", 0):
+                    merged[key] = segment
+        return list(merged.values())
 
     def _fuse_segments(self, segments: list[StandardTrafficSegment]) -> list[StandardTrafficSegment]:
         """
-        Simple fusion algorithm:
-        - Group by way_id (if possible) or road name.
+        Fusion algorithm:
+        - Map-match segments onto shared roads (way_id, else snapped geometry).
         - Calculate weighted average of speed based on provider confidence.
         """
+        return self._fuse_matched(SegmentMatcher().add(segments))
+
+    @staticmethod
+    def _fuse_matched(matcher: SegmentMatcher) -> list[StandardTrafficSegment]:
+        """
+        Confidence-weighted speed per matched road, computed over columnar arrays.
+        The most confident segment of each road carries the fused values.
+        """
+        segments = matcher.segments
         if not segments:
             return []
-            
-        grouped: dict[str, list[StandardTrafficSegment]] = {}
-        for s in segments:
-            key = s.way_id or s.name
-            if key not in grouped:
-                grouped[key] = []
-            grouped[key].append(s)
-            
+        n = len(segments)
+        roads = matcher.road_count
+        labels = np.asarray(matcher.labels, dtype=np.intp)
+        speed = np.fromiter((s.speed_kmh for s in segments), dtype=np.float64, count=n)
+        confidence = np.fromiter((s.confidence_score for s in segments), dtype=np.float64, count=n)
+
+        # Weighted average speed (plain mean for roads whose confidences are all zero)
+        counts = np.bincount(labels, minlength=roads)
+        total_weight = np.bincount(labels, weights=confidence, minlength=roads)
+        weighted = np.bincount(labels, weights=speed * confidence, minlength=roads)
+        plain = np.bincount(labels, weights=speed, minlength=roads) / counts
+        has_weight = total_weight > 0
+        fused_speed = np.where(has_weight, weighted / np.where(has_weight, total_weight, 1.0), plain)
+
+        # Use data from provider with highest confidence for other fields (first reported wins ties)
+        order = np.lexsort((-np.arange(n), confidence, labels))
+        last_of_road = np.append(labels[order][1:] != labels[order][:-1], True)
+        primaries = order[last_of_road]
+
+        free_flow = np.fromiter(
+            (segments[i].free_flow_speed_kmh for i in primaries), dtype=np.float64, count=roads
+        )
+        ratio = np.divide(fused_speed, free_flow, out=np.zeros(roads), where=free_flow > 0)
+        density_index = np.select(
+            [free_flow <= 0] + [ratio >= minimum for minimum, _ in DENSITY_THRESHOLDS],
+            np.arange(len(DENSITY_THRESHOLDS) + 1),
+            default=len(DENSITY_THRESHOLDS) + 1,
+        )
+        densities = [TrafficDensity.UNKNOWN, *(d for _, d in DENSITY_THRESHOLDS), TrafficDensity.STALLED]
+
+        members: dict[int, list[StandardTrafficSegment]] = {}
+        for segment, label in zip(segments, matcher.labels, strict=True):
+            if counts[label] > 1:
+                members.setdefault(label, []).append(segment)
+
         fused = []
-        for _key, group in grouped.items():
-            if len(group) == 1:
-                fused.append(group[0])
-                continue
-            
-            # Weighted average speed
-            total_weight = sum(s.confidence_score for s in group)
-            weighted_speed = sum(s.speed_kmh * s.confidence_score for s in group) / total_weight
-            
-            # Use data from provider with highest confidence for other fields
-            primary = max(group, key=lambda x: x.confidence_score)
-            
-            primary.speed_kmh = weighted_speed
-            primary.density = primary.calculate_density(weighted_speed, primary.free_flow_speed_kmh)
-            
-            # Merge incidents
-            all_incidents = []
-            seen_incident_ids = set()
-            for s in group:
-                for inc in s.incidents:
-                    if inc.id not in seen_incident_ids:
-                        all_incidents.append(inc)
-                        seen_incident_ids.add(inc.id)
-            primary.incidents = all_incidents
-            
+        for label, index in enumerate(primaries):
+            primary = segments[index]
+            group = members.get(label)
+            if group:
+                primary.speed_kmh = float(fused_speed[label])
+                primary.density = densities[density_index[label]]
+
+                # Merge incidents
+                all_incidents = []
+                seen_incident_ids = set()
+                for s in group:
+                    for inc in s.incidents:
+                        if inc.id not in seen_incident_ids:
+                            all_incidents.append(inc)
+                            seen_incident_ids.add(inc.id)
+                primary.incidents = all_incidents
             fused.append(primary)
-            
+
         return fused
 
+    async def _historical_priors(self, cell: str) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+        """Rollup-based typical speeds for a tile, with the outcome reported like a provider's."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            segments = await asyncio.wait_for(traffic_rollups.priors(cell), _PRIOR_TIMEOUT_SECONDS)
+            status = "ok"
+        except Exception as e:
+            logger.warning("Historical priors unavailable for %s: %s", cell, e)
+            segments, status = [], "error"
+        latency_ms = int((loop.time() - started) * 1000)
+        return segments, ProviderOutcome("history", status, len(segments), latency_ms).as_dict()
+
     def _store_historical(self, lat: float, lng: float, segments: list[StandardTrafficSegment]):
         """
         Stores historical traffic snapshots for trend analysis.
-        Writes to 'traffic_history' table in Supabase.
+        Buffered by the traffic history sink and written in bulk; also folded
+        into the rollup store that backs trends and historical priors.
         """
-        import asyncio
-
-        from app.core.supabase import supabase_admin as supabase
-
-        if not segments:
-            return
-
-        try:
-            records = [
-                {
-                    "way_id": s.way_id,
-                    "name": s.name,
-                    "lat": lat,
-                    "lng": lng,
-                    "speed_kmh": s.speed_kmh,
-                    "density": s.density.value,
-                    "confidence": s.confidence_score,
-                    "provider": s.provider,
-                    "created_at": datetime.now(UTC).isoformat()
-                } for s in segments
-            ]
-            
-            # Non-blocking fire-and-forget insertion
-            asyncio.create_task(
-                asyncio.to_thread(lambda: supabase.table("traffic_history").insert(records).execute())
-            )
-            
-        except Exception as e:
-            logger.error(f"Failed to store historical traffic: {e}")
+        traffic_history_sink.add(lat, lng, segments)
+        traffic_rollups.observe(lat, lng, segments)
 
     def _serialize_segments(self, segments: list[StandardTrafficSegment]) -> list[dict[str, Any]]:
         """Converts dataclass objects to dictionaries for JSON response."""
@@ -184,7 +418,9 @@ class TrafficFusionService:
                     } for inc in s.incidents
                 ],
                 "provider": s.provider,
-                "confidence": round(s.confidence_score, 2)
+                "confidence": round(s.confidence_score, 2),
+                "lat": s.lat,
+                "lng": s.lng,
             } for s in segments
         ]
 
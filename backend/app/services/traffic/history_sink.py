@@ -0,0 +1,195 @@
+"""
+Traffic History Sink - buffers fused segment snapshots and writes them in bulk.
+Snapshots are deduplicated per (way_id, minute), so repeated fusions of the
+same road within a minute collapse into one row (latest wins). Flushes happen
+on size or time and go to the store chosen by core/router (HISTORY/Neon, with
+Supabase as the fallback when Neon is not configured).
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import get_settings
+from app.core.metrics import TRAFFIC_HISTORY_ROWS
+from app.core.router import DataStore, route
+
+from .base import StandardTrafficSegment
+
+logger = logging.getLogger("app.traffic.history")
+
+_FLUSH_THRESHOLD = 500
+_FLUSH_INTERVAL_SECONDS = 10
+_MAX_BUFFERED = 20_000  # oldest rows are dropped beyond this (backpressure)
+_WRITE_CHUNK = 1000
+
+UPSERT_SQL = """
+INSERT INTO traffic_history
+  (way_id, bucket_minute, name, lat, lng, speed_kmh, density, confidence, provider, created_at)
+VALUES
+  (:way_id, :bucket_minute, :name, :lat, :lng, :speed_kmh, :density, :confidence, :provider, :created_at)
+ON CONFLICT (way_id, bucket_minute) DO UPDATE SET
+  name = EXCLUDED.name,
+  lat = EXCLUDED.lat,
+  lng = EXCLUDED.lng,
+  speed_kmh = EXCLUDED.speed_kmh,
+  density = EXCLUDED.density,
+  confidence = EXCLUDED.confidence,
+  provider = EXCLUDED.provider,
+  created_at = EXCLUDED.created_at
+"""
+
+
+class TrafficHistorySink:
+    """In-memory, minute-deduplicated buffer of traffic snapshots."""
+
+    def __init__(self, flush_threshold: int = _FLUSH_THRESHOLD, max_buffered: int = _MAX_BUFFERED):
+        self._rows: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+        self._flush_threshold = flush_threshold
+        self._max_buffered = max_buffered
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._pending_flush: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, lat: float, lng: float, segments: list[StandardTrafficSegment]) -> None:
+        """Buffer a snapshot. Never blocks; schedules a flush once the threshold is reached."""
+        if not segments:
+            return
+        now = datetime.now(UTC)
+        bucket = now.replace(second=0, microsecond=0)
+        for s in segments:
+            key = (str(s.way_id or s.name), bucket.isoformat())
+            if key in self._rows:
+                TRAFFIC_HISTORY_ROWS.labels("deduped").inc()
+                self._rows.move_to_end(key)
+            self._rows[key] = {
+                "way_id": key[0],
+                "bucket_minute": bucket,
+                "name": s.name,
+                "lat": s.lat if s.lat is not None else lat,
+                "lng": s.lng if s.lng is not None else lng,
+                "speed_kmh": s.speed_kmh,
+                "density": s.density.value,
+                "confidence": s.confidence_score,
+                "provider": s.provider,
+                "created_at": now,
+            }
+        self._trim()
+        if len(self._rows) >= self._flush_threshold and not self._flush_scheduled():
+            self._pending_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def _flush_scheduled(self) -> bool:
+        return self._pending_flush is not None and not self._pending_flush.done()
+
+    def _trim(self) -> None:
+        overflow = len(self._rows) - self._max_buffered
+        for _ in range(max(0, overflow)):
+            self._rows.popitem(last=False)
+        if overflow > 0:
+            TRAFFIC_HISTORY_ROWS.labels("dropped").inc(overflow)
+            logger.warning("Traffic history buffer full; dropped %d oldest rows", overflow)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written."""
+        async with self._flush_lock:
+            if not self._rows:
+                return 0
+            batch = list(self._rows.values())
+            self._rows.clear()
+            written = 0
+            try:
+                for start in range(0, len(batch), _WRITE_CHUNK):
+                    chunk = batch[start : start + _WRITE_CHUNK]
+                    if await self._write(chunk):
+                        written += len(chunk)
+            except Exception:
+                logger.exception("Failed to flush %d traffic history rows", len(batch) - written)
+                TRAFFIC_HISTORY_ROWS.labels("failed").inc(len(batch) - written)
+                self._requeue(batch[written:])
+            TRAFFIC_HISTORY_ROWS.labels("written").inc(written)
+            return written
+
+    def _requeue(self, rows: list[dict[str, Any]]) -> None:
+        """Put unwritten rows back in front of anything buffered meanwhile."""
+        newer = self._rows
+        self._rows = OrderedDict(
+            ((row["way_id"], row["bucket_minute"].isoformat()), row) for row in rows
+        )
+        for key, row in newer.items():
+            self._rows[key] = row
+        self._trim()
+
+    async def _write(self, rows: list[dict[str, Any]]) -> bool:
+        """Store `rows`; False if no store is configured and they were dropped."""
+        if route("traffic_history") is DataStore.HISTORY and get_settings().NEON_DATABASE_URL:
+            return await self._write_history(rows)
+        return await self._write_core(rows)
+
+    @staticmethod
+    async def _write_history(rows: list[dict[str, Any]]) -> bool:
+        from app.db.session import get_history_db
+
+        async for db in get_history_db():
+            try:
+                await db.execute(text(UPSERT_SQL), rows)
+                await db.commit()
+            except SQLAlchemyError:
+                await db.rollback()
+                raise
+            return True
+        return False
+
+    @staticmethod
+    async def _write_core(rows: list[dict[str, Any]]) -> bool:
+        from app.core.supabase import supabase_admin
+
+        if supabase_admin is None:
+            logger.warning("No traffic history store configured — dropping %d rows", len(rows))
+            TRAFFIC_HISTORY_ROWS.labels("dropped").inc(len(rows))
+            return False
+        records = [
+            {
+                **row,
+                "bucket_minute": row["bucket_minute"].isoformat(),
+                "created_at": row["created_at"].isoformat(),
+            }
+            for row in rows
+        ]
+        await asyncio.to_thread(
+            lambda: supabase_admin.table("traffic_history")
+            .upsert(records, on_conflict="way_id,bucket_minute")
+            .execute()
+        )
+        return True
+
+    async def start_periodic_flush(self) -> None:
+        """Start a background task that flushes every _FLUSH_INTERVAL_SECONDS."""
+        if self._flush_task is not None:
+            return
+
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(_FLUSH_INTERVAL_SECONDS)
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Periodic traffic history flush failed")
+
+        self._flush_task = asyncio.create_task(_loop())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and drain remaining rows."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+traffic_history_sink = TrafficHistorySink()
@@ -0,0 +1,142 @@
+"""
+Map-matching of provider traffic segments onto shared road keys.
+Providers number roads differently, so beyond exact way_id matches segments
+are matched by geometry: endpoints (or, without a path, the midpoint plus the
+road name) are snapped into an H3 grid and merged with a known road lying
+within SNAP_DISTANCE_M.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+
+import h3
+
+from .base import StandardTrafficSegment
+from .tiles import haversine_m
+
+SNAP_DISTANCE_M = 30.0
+_SNAP_RESOLUTION = 10  # ~66 m hex edge
+_SNAP_EDGE_M = h3.average_hexagon_edge_length(_SNAP_RESOLUTION, unit="m")
+# Ring holding every cell that can contain a point within SNAP_DISTANCE_M (see tiles.covering_cells).
+_SNAP_RING = int(math.ceil((SNAP_DISTANCE_M + 2 * _SNAP_EDGE_M) / (1.5 * _SNAP_EDGE_M)))
+
+Point = tuple[float, float]
+
+
+def normalize_road_name(name: str) -> str:
+    return re.sub(r"\W+", " ", name or "").strip().casefold()
+
+
+def _snap_cell(point: Point) -> str:
+    return h3.latlng_to_cell(point[0], point[1], _SNAP_RESOLUTION)
+
+
+def _endpoints(segment: StandardTrafficSegment) -> tuple[Point, Point] | None:
+    if len(segment.path) < 2:
+        return None
+    return tuple(segment.path[0]), tuple(segment.path[-1])
+
+
+def _midpoint(segment: StandardTrafficSegment) -> Point | None:
+    if segment.lat is not None and segment.lng is not None:
+        return segment.lat, segment.lng
+    if segment.path:
+        return tuple(segment.path[len(segment.path) // 2])
+    return None
+
+
+@dataclass
+class _Road:
+    endpoints: tuple[Point, Point] | None
+    midpoint: Point | None
+    name: str
+    way_ids: dict[str, str] = field(default_factory=dict)  # provider -> way_id
+
+
+class SegmentMatcher:
+    """
+    Incrementally assigns segments to roads; `labels[i]` is the road of `segments[i]`.
+    Batches can be added as providers finish.
+    """
+
+    def __init__(self):
+        self.segments: list[StandardTrafficSegment] = []
+        self.labels: list[int] = []
+        self._roads: list[_Road] = []
+        self._by_way: dict[str, int] = {}
+        self._by_name: dict[str, int] = {}
+        self._by_start: dict[str, list[int]] = {}
+        self._by_midpoint: dict[str, list[int]] = {}
+
+    @property
+    def road_count(self) -> int:
+        return len(self._roads)
+
+    def add(self, segments: list[StandardTrafficSegment]) -> "SegmentMatcher":
+        for segment in segments:
+            label = self._match(segment)
+            if label is None:
+                label = self._register(segment)
+            self._roads[label].way_ids.setdefault(segment.provider, str(segment.way_id))
+            if segment.way_id:
+                self._by_way.setdefault(str(segment.way_id), label)
+            self.segments.append(segment)
+            self.labels.append(label)
+        return self
+
+    def _match(self, segment: StandardTrafficSegment) -> int | None:
+        if segment.way_id and str(segment.way_id) in self._by_way:
+            return self._by_way[str(segment.way_id)]
+
+        endpoints = _endpoints(segment)
+        if endpoints is not None:
+            start, end = endpoints
+            return self._nearest(
+                self._by_start,
+                start,
+                segment,
+                lambda road: road.endpoints[0],
+                lambda road: haversine_m(*road.endpoints[1], *end) <= SNAP_DISTANCE_M,
+            )
+
+        midpoint = _midpoint(segment)
+        if midpoint is not None:
+            name = normalize_road_name(segment.name)
+            return self._nearest(
+                self._by_midpoint,
+                midpoint,
+                segment,
+                lambda road: road.midpoint,
+                lambda road: road.name == name,
+            )
+
+        if not segment.way_id:
+            return self._by_name.get(normalize_road_name(segment.name))
+        return None
+
+    def _nearest(self, index, point, segment, anchor, accept) -> int | None:
+        """Closest indexed road within SNAP_DISTANCE_M of `point` that `accept`s the segment."""
+        best, best_distance = None, SNAP_DISTANCE_M
+        for cell in h3.grid_disk(_snap_cell(point), _SNAP_RING):
+            for label in index.get(cell, ()):
+                road = self._roads[label]
+                # A provider never reports one road under two ids.
+                known = road.way_ids.get(segment.provider)
+                if known is not None and known != str(segment.way_id):
+                    continue
+                distance = haversine_m(*point, *anchor(road))
+                if distance <= best_distance and accept(road):
+                    best, best_distance = label, distance
+        return best
+
+    def _register(self, segment: StandardTrafficSegment) -> int:
+        label = len(self._roads)
+        road = _Road(_endpoints(segment), _midpoint(segment), normalize_road_name(segment.name))
+        self._roads.append(road)
+        if road.endpoints is not None:
+            self._by_start.setdefault(_snap_cell(road.endpoints[0]), []).append(label)
+        if road.midpoint is not None:
+            self._by_midpoint.setdefault(_snap_cell(road.midpoint), []).append(label)
+        elif not segment.way_id:
+            self._by_name.setdefault(road.name, label)
+        return label
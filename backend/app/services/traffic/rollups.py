@@ -0,0 +1,459 @@
+"""
+Traffic Rollups - downsampled speed history per road.
+Fused snapshots are folded, once their minute has closed, into 15-minute and
+hourly buckets (traffic_rollup) and into an hour-of-week speed profile
+(traffic_speed_profile). Aggregates are sums and counts, so partial buckets
+from several flushes or workers merge additively. The profile backs the
+/traffic/trends endpoint and serves as a historical prior for fusion.
+Hour-of-week is computed in UTC (0 = Monday 00:00).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import h3
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import get_settings
+from app.core.metrics import TRAFFIC_ROLLUP_ROWS
+from app.core.router import DataStore, route
+
+from .base import StandardTrafficSegment, density_for
+from .tiles import TILE_RESOLUTION
+
+logger = logging.getLogger("app.traffic.rollups")
+
+RESOLUTIONS: dict[str, int] = {"15m": 900, "1h": 3600}  # rollup name -> bucket width (seconds)
+_FLUSH_INTERVAL_SECONDS = 60
+_PRIOR_MIN_SAMPLES = 3
+_PRIOR_CONFIDENCE = 0.3
+_PRIOR_CACHE_SECONDS = 900
+_CURRENT_WINDOW = timedelta(minutes=30)
+_MAX_KEYS = 200_000  # pending bucket + profile keys before new ones are dropped
+
+MERGE_ROLLUP_SQL = """
+INSERT INTO traffic_rollup
+  (way_id, resolution, bucket_start, samples, speed_sum, speed_min, speed_max)
+VALUES
+  (:way_id, :resolution, :bucket_start, :samples, :speed_sum, :speed_min, :speed_max)
+ON CONFLICT (way_id, resolution, bucket_start) DO UPDATE SET
+  samples = traffic_rollup.samples + EXCLUDED.samples,
+  speed_sum = traffic_rollup.speed_sum + EXCLUDED.speed_sum,
+  speed_min = LEAST(traffic_rollup.speed_min, EXCLUDED.speed_min),
+  speed_max = GREATEST(traffic_rollup.speed_max, EXCLUDED.speed_max)
+"""
+
+MERGE_PROFILE_SQL = """
+INSERT INTO traffic_speed_profile
+  (way_id, hour_of_week, cell, name, lat, lng, free_flow_kmh, samples, speed_sum, speed_sq_sum, updated_at)
+VALUES
+  (:way_id, :hour_of_week, :cell, :name, :lat, :lng, :free_flow_kmh, :samples, :speed_sum, :speed_sq_sum, :updated_at)
+ON CONFLICT (way_id, hour_of_week) DO UPDATE SET
+  cell = EXCLUDED.cell,
+  name = EXCLUDED.name,
+  lat = EXCLUDED.lat,
+  lng = EXCLUDED.lng,
+  free_flow_kmh = EXCLUDED.free_flow_kmh,
+  samples = traffic_speed_profile.samples + EXCLUDED.samples,
+  speed_sum = traffic_speed_profile.speed_sum + EXCLUDED.speed_sum,
+  speed_sq_sum = traffic_speed_profile.speed_sq_sum + EXCLUDED.speed_sq_sum,
+  updated_at = EXCLUDED.updated_at
+"""
+
+_PROFILE_COLUMNS = "way_id, hour_of_week, name, lat, lng, free_flow_kmh, samples, speed_sum"
+
+
+def hour_of_week(ts: datetime) -> int:
+    ts = ts.astimezone(UTC)
+    return ts.weekday() * 24 + ts.hour
+
+
+def _bucket_start(ts: datetime, width_seconds: int) -> datetime:
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % width_seconds, tz=UTC)
+
+
+@dataclass
+class _Minute:
+    """Latest reading of one road within an open minute."""
+
+    minute: datetime
+    speed: float
+    cell: str
+    name: str
+    lat: float | None
+    lng: float | None
+    free_flow: float
+
+
+class TrafficRollups:
+    """In-memory rollup accumulators, flushed additively to the history store."""
+
+    def __init__(self):
+        self._open: dict[str, _Minute] = {}
+        self._buckets: dict[tuple[str, str, datetime], dict[str, Any]] = {}
+        self._profile: dict[tuple[str, int], dict[str, Any]] = {}
+        self._prior_cache: dict[tuple[str, int], tuple[float, list[dict[str, Any]]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    # -- write side -----------------------------------------------------------
+
+    def observe(
+        self, lat: float, lng: float, segments: list[StandardTrafficSegment], now: datetime | None = None
+    ) -> None:
+        """Record fused segments; a road's reading for a minute is final once the minute closes."""
+        now = now or datetime.now(UTC)
+        minute = now.replace(second=0, microsecond=0)
+        cell = h3.latlng_to_cell(lat, lng, TILE_RESOLUTION)
+        for s in segments:
+            way_id = str(s.way_id or s.name)
+            previous = self._open.get(way_id)
+            if previous is not None and previous.minute < minute:
+                self._fold(way_id, previous)
+            self._open[way_id] = _Minute(
+                minute,
+                s.speed_kmh,
+                cell,
+                s.name,
+                s.lat if s.lat is not None else lat,
+                s.lng if s.lng is not None else lng,
+                s.free_flow_speed_kmh,
+            )
+
+    def _close_minutes(self, before: datetime) -> None:
+        closed = [way_id for way_id, reading in self._open.items() if reading.minute < before]
+        for way_id in closed:
+            self._fold(way_id, self._open.pop(way_id))
+
+    def _has_room(self) -> bool:
+        """False once the pending keys hit _MAX_KEYS (a long store outage); counts the drop."""
+        if len(self._buckets) + len(self._profile) < _MAX_KEYS:
+            return True
+        TRAFFIC_ROLLUP_ROWS.labels("dropped").inc()
+        return False
+
+    def _fold(self, way_id: str, reading: _Minute) -> None:
+        speed = reading.speed
+        for resolution, width in RESOLUTIONS.items():
+            key = (way_id, resolution, _bucket_start(reading.minute, width))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if not self._has_room():
+                    continue
+                bucket = self._buckets[key] = {
+                    "samples": 0, "speed_sum": 0.0, "speed_min": speed, "speed_max": speed
+                }
+            bucket["samples"] += 1
+            bucket["speed_sum"] += speed
+            bucket["speed_min"] = min(bucket["speed_min"], speed)
+            bucket["speed_max"] = max(bucket["speed_max"], speed)
+
+        key = (way_id, hour_of_week(reading.minute))
+        profile = self._profile.get(key)
+        if profile is None:
+            if not self._has_room():
+                return
+            profile = self._profile[key] = {"samples": 0, "speed_sum": 0.0, "speed_sq_sum": 0.0}
+        profile["samples"] += 1
+        profile["speed_sum"] += speed
+        profile["speed_sq_sum"] += speed * speed
+        profile.update(
+            cell=reading.cell,
+            name=reading.name,
+            lat=reading.lat,
+            lng=reading.lng,
+            free_flow_kmh=reading.free_flow,
+            updated_at=reading.minute,
+        )
+
+    async def flush(self, now: datetime | None = None) -> int:
+        """Write closed-minute aggregates; returns the number of rows merged."""
+        async with self._flush_lock:
+            self._close_minutes((now or datetime.now(UTC)).replace(second=0, microsecond=0))
+            if not self._buckets and not self._profile:
+                return 0
+            buckets, self._buckets = self._buckets, {}
+            profile, self._profile = self._profile, {}
+            bucket_rows = [
+                {"way_id": w, "resolution": r, "bucket_start": start, **acc}
+                for (w, r, start), acc in buckets.items()
+            ]
+            profile_rows = [
+                {"way_id": w, "hour_of_week": how, **acc} for (w, how), acc in profile.items()
+            ]
+            try:
+                stored = await self._write(bucket_rows, profile_rows)
+            except Exception:
+                logger.exception(
+                    "Failed to merge %d traffic rollup rows", len(bucket_rows) + len(profile_rows)
+                )
+                TRAFFIC_ROLLUP_ROWS.labels("failed").inc(len(bucket_rows) + len(profile_rows))
+                self._requeue(buckets, profile)
+                return 0
+            if not stored:
+                return 0  # no store configured; _write counted them as dropped
+            TRAFFIC_ROLLUP_ROWS.labels("written").inc(len(bucket_rows) + len(profile_rows))
+            return len(bucket_rows) + len(profile_rows)
+
+    def _requeue(self, buckets: dict, profile: dict) -> None:
+        """Merge unwritten aggregates back into whatever accumulated meanwhile."""
+        for key, acc in buckets.items():
+            current = self._buckets.get(key)
+            if current is None:
+                if self._has_room():
+                    self._buckets[key] = acc
+                continue
+            current["samples"] += acc["samples"]
+            current["speed_sum"] += acc["speed_sum"]
+            current["speed_min"] = min(current["speed_min"], acc["speed_min"])
+            current["speed_max"] = max(current["speed_max"], acc["speed_max"])
+        for key, acc in profile.items():
+            current = self._profile.get(key)
+            if current is None:
+                if self._has_room():
+                    self._profile[key] = acc
+                continue
+            for field_name in ("samples", "speed_sum", "speed_sq_sum"):
+                current[field_name] += acc[field_name]
+
+    @staticmethod
+    def _uses_history_store() -> bool:
+        return route("traffic_history") is DataStore.HISTORY and bool(get_settings().NEON_DATABASE_URL)
+
+    async def _write(self, bucket_rows: list[dict[str, Any]], profile_rows: list[dict[str, Any]]) -> bool:
+        """Merge the rows; False if no store is configured and they were dropped."""
+        if self._uses_history_store():
+            return await self._write_history(bucket_rows, profile_rows)
+        return await self._write_core(bucket_rows, profile_rows)
+
+    @staticmethod
+    async def _write_history(bucket_rows: list[dict[str, Any]], profile_rows: list[dict[str, Any]]) -> bool:
+        from app.db.session import get_history_db
+
+        async for db in get_history_db():
+            try:
+                if bucket_rows:
+                    await db.execute(text(MERGE_ROLLUP_SQL), bucket_rows)
+                if profile_rows:
+                    await db.execute(text(MERGE_PROFILE_SQL), profile_rows)
+                await db.commit()
+            except SQLAlchemyError:
+                await db.rollback()
+                raise
+            return True
+        return False
+
+    @staticmethod
+    async def _write_core(bucket_rows: list[dict[str, Any]], profile_rows: list[dict[str, Any]]) -> bool:
+        from app.core.supabase import supabase_admin
+
+        if supabase_admin is None:
+            logger.warning("No traffic history store configured — dropping rollups")
+            TRAFFIC_ROLLUP_ROWS.labels("dropped").inc(len(bucket_rows) + len(profile_rows))
+            return False
+        params = {
+            "p_buckets": [{**row, "bucket_start": row["bucket_start"].isoformat()} for row in bucket_rows],
+            "p_profile": [{**row, "updated_at": row["updated_at"].isoformat()} for row in profile_rows],
+        }
+        await asyncio.to_thread(lambda: supabase_admin.rpc("merge_traffic_rollups", params).execute())
+        return True
+
+    async def start_periodic_flush(self) -> None:
+        """Start a background task that flushes every _FLUSH_INTERVAL_SECONDS."""
+        if self._flush_task is not None:
+            return
+
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(_FLUSH_INTERVAL_SECONDS)
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Periodic traffic rollup flush failed")
+
+        self._flush_task = asyncio.create_task(_loop())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and merge everything observed so far."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush(now=datetime.now(UTC) + timedelta(minutes=1))
+
+    # -- read side ------------------------------------------------------------
+
+    async def trends(self, way_ids: list[str], now: datetime | None = None) -> list[dict[str, Any]]:
+        """Typical (same hour of week) vs current (latest 15-minute bucket) speed per road."""
+        now = now or datetime.now(UTC)
+        how = hour_of_week(now)
+        day_start = how - how % 24
+        profiles, current = await self._read_trends(way_ids, day_start, day_start + 23, now - _CURRENT_WINDOW)
+
+        by_way: dict[str, dict[int, dict[str, Any]]] = {}
+        for row in profiles:
+            by_way.setdefault(row["way_id"], {})[int(row["hour_of_week"])] = row
+
+        trends = []
+        for way_id in way_ids:
+            hours = by_way.get(way_id, {})
+            typical_row = hours.get(how)
+            typical = _mean(typical_row)
+            latest = current.get(way_id)
+            current_speed = _mean(latest)
+            delta_pct = None
+            if typical and current_speed is not None:
+                delta_pct = round((current_speed - typical) / typical * 100, 1)
+            trends.append(
+                {
+                    "way_id": way_id,
+                    "name": next((row.get("name") for row in hours.values() if row.get("name")), None),
+                    "typical_speed_kmh": _round(typical),
+                    "current_speed_kmh": _round(current_speed),
+                    "delta_pct": delta_pct,
+                    "samples": int(typical_row["samples"]) if typical_row else 0,
+                    "current_bucket": _iso(latest["bucket_start"]) if latest else None,
+                    "day_profile": [_round(_mean(hours.get(day_start + hour))) for hour in range(24)],
+                }
+            )
+        return trends
+
+    async def priors(self, cell: str, now: datetime | None = None) -> list[dict[str, Any]]:
+        """Typical speeds for the roads of one traffic tile at this hour of week, as fused segments."""
+        how = hour_of_week(now or datetime.now(UTC))
+        cached = self._prior_cache.get((cell, how))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        rows = await self._read_priors(cell, how)
+        segments = []
+        for row in rows:
+            if int(row["samples"]) < _PRIOR_MIN_SAMPLES:
+                continue
+            speed = float(row["speed_sum"]) / int(row["samples"])
+            free_flow = float(row.get("free_flow_kmh") or 0.0)
+            segments.append(
+                {
+                    "way_id": row["way_id"],
+                    "name": row.get("name") or "",
+                    "density": density_for(speed, free_flow).value,
+                    "speed_kmh": round(speed, 2),
+                    "free_flow_speed_kmh": free_flow,
+                    "travel_time_sec": None,
+                    "incidents": [],
+                    "provider": "history",
+                    "confidence": _PRIOR_CONFIDENCE,
+                    "lat": row.get("lat"),
+                    "lng": row.get("lng"),
+                }
+            )
+        self._prior_cache[(cell, how)] = (time.monotonic() + _PRIOR_CACHE_SECONDS, segments)
+        return segments
+
+    async def _read_trends(
+        self, way_ids: list[str], first_hour: int, last_hour: int, since: datetime
+    ) -> tuple[list[dict[str, Any]], dict[str, dict[str, Any]]]:
+        """Profile rows for the day plus the latest 15-minute bucket per road."""
+        if self._uses_history_store():
+            from app.db.session import get_history_db
+
+            async for db in get_history_db():
+                profiles = await db.execute(
+                    text(
+                        f"SELECT {_PROFILE_COLUMNS} FROM traffic_speed_profile "
+                        "WHERE way_id = ANY(:way_ids) AND hour_of_week BETWEEN :first AND :last"
+                    ),
+                    {"way_ids": way_ids, "first": first_hour, "last": last_hour},
+                )
+                latest = await db.execute(
+                    text(
+                        "SELECT DISTINCT ON (way_id) way_id, bucket_start, samples, speed_sum "
+                        "FROM traffic_rollup WHERE resolution = '15m' AND way_id = ANY(:way_ids) "
+                        "AND bucket_start >= :since ORDER BY way_id, bucket_start DESC"
+                    ),
+                    {"way_ids": way_ids, "since": since},
+                )
+                profile_rows = [dict(row) for row in profiles.mappings()]
+                current = {row["way_id"]: dict(row) for row in latest.mappings()}
+                return profile_rows, current
+            return [], {}
+
+        from app.core.supabase import supabase_admin
+
+        if supabase_admin is None:
+            return [], {}
+
+        def _query():
+            profiles = (
+                supabase_admin.table("traffic_speed_profile")
+                .select(_PROFILE_COLUMNS.replace(" ", ""))
+                .in_("way_id", way_ids)
+                .gte("hour_of_week", first_hour)
+                .lte("hour_of_week", last_hour)
+                .execute()
+            )
+            buckets = (
+                supabase_admin.table("traffic_rollup")
+                .select("way_id,bucket_start,samples,speed_sum")
+                .eq("resolution", "15m")
+                .in_("way_id", way_ids)
+                .gte("bucket_start", since.isoformat())
+                .order("bucket_start", desc=True)
+                .execute()
+            )
+            return profiles.data or [], buckets.data or []
+
+        profile_rows, bucket_rows = await asyncio.to_thread(_query)
+        current: dict[str, dict[str, Any]] = {}
+        for row in bucket_rows:
+            current.setdefault(row["way_id"], row)  # newest first
+        return profile_rows, current
+
+    async def _read_priors(self, cell: str, how: int) -> list[dict[str, Any]]:
+        if self._uses_history_store():
+            from app.db.session import get_history_db
+
+            async for db in get_history_db():
+                result = await db.execute(
+                    text(
+                        f"SELECT {_PROFILE_COLUMNS} FROM traffic_speed_profile "
+                        "WHERE cell = :cell AND hour_of_week = :how"
+                    ),
+                    {"cell": cell, "how": how},
+                )
+                return [dict(row) for row in result.mappings()]
+            return []
+
+        from app.core.supabase import supabase_admin
+
+        if supabase_admin is None:
+            return []
+        result = await asyncio.to_thread(
+            lambda: supabase_admin.table("traffic_speed_profile")
+            .select(_PROFILE_COLUMNS.replace(" ", ""))
+            .eq("cell", cell)
+            .eq("hour_of_week", how)
+            .execute()
+        )
+        return result.data or []
+
+
+def _mean(row: dict[str, Any] | None) -> float | None:
+    if not row or not row.get("samples"):
+        return None
+    return float(row["speed_sum"]) / int(row["samples"])
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+def _iso(value: datetime | str) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+traffic_rollups = TrafficRollups()
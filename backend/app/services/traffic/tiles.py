@@ -0,0 +1,40 @@
+"""
+H3 tiling for the traffic cache.
+Traffic is fetched and fused once per fixed H3 cell; radius queries are
+assembled from the cells that cover the circle.
+"""
+import math
+
+import h3
+
+TILE_RESOLUTION = 7  # ~1.4 km hex edge
+TILE_EDGE_M = h3.average_hexagon_edge_length(TILE_RESOLUTION, unit="m")
+# Provider query radius per tile: the hex circumradius equals its edge length.
+TILE_FETCH_RADIUS_M = int(math.ceil(TILE_EDGE_M))
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dlat = p2 - p1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlng / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(a))
+
+
+def tile_center(cell: str) -> tuple[float, float]:
+    return h3.cell_to_latlng(cell)
+
+
+def covering_cells(lat: float, lng: float, radius_m: float) -> list[str]:
+    """Cells that intersect the circle; a hex intersects it iff its center is within radius + edge."""
+    center = h3.latlng_to_cell(lat, lng, TILE_RESOLUTION)
+    reach = radius_m + TILE_EDGE_M
+    # Neighbouring centers are at least 1.5 edges apart along a ring.
+    k = int(math.ceil(reach / (1.5 * TILE_EDGE_M)))
+    cells = [
+        cell
+        for cell in h3.grid_disk(center, k)
+        if haversine_m(lat, lng, *tile_center(cell)) <= reach
+    ]
+    return sorted(cells) or [center]
@@ -22,11 +22,26 @@ class TrafficService:
         """
         return await traffic_fusion_service.get_fused_traffic(lat, lng, radius_m)
 
-    async def subscribe_merchant_webhook(self, merchant_id: str, url: str, conditions: list[dict[str, Any]]):
+    async def get_nearby_traffic_with_meta(
+        self, lat: float, lng: float, radius_m: int = 1000
+    ) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+        """
+        Fused traffic segments plus metadata on which providers contributed.
+        """
+        return await traffic_fusion_service.get_fused_traffic_with_meta(lat, lng, radius_m)
+
+    async def subscribe_merchant_webhook(
+        self,
+        merchant_id: str,
+        url: str,
+        conditions: list[dict[str, Any]],
+        lat: float | None = None,
+        lng: float | None = None,
+    ):
         """
         Registers a merchant for real-time traffic webhooks.
         """
-        return await webhook_service.subscribe(merchant_id, url, conditions)
+        return await webhook_service.subscribe(merchant_id, url, conditions, lat, lng)
 
     async def process_traffic_incident(self, event_type: str, payload: dict[str, Any]):
         """
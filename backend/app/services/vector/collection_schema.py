@@ -0,0 +1,202 @@
+"""Declarative Qdrant collection schema with blue/green aliases.
+
+Readers and writers address a collection through its alias; the physical
+collections behind it are named ``{alias}_v{n}``. ``apply_schema`` is
+idempotent: it creates the first version (or adopts an existing ``_v1``
+collection), then reconciles HNSW, quantization and payload indexes with the
+declared schema. A full re-index builds the next version with
+``create_next_version`` and flips the alias atomically with ``switch_alias``.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+try:
+    from qdrant_client.models import (
+        CreateAlias,
+        CreateAliasOperation,
+        DeleteAlias,
+        DeleteAliasOperation,
+        Distance,
+        HnswConfigDiff,
+        PayloadSchemaType,
+        QuantizationSearchParams,
+        ScalarQuantization,
+        ScalarQuantizationConfig,
+        ScalarType,
+        SearchParams,
+        VectorParams,
+    )
+
+    QDRANT_MODELS_AVAILABLE = True
+except ImportError:
+    QDRANT_MODELS_AVAILABLE = False
+    CreateAlias = None
+    CreateAliasOperation = None
+    DeleteAlias = None
+    DeleteAliasOperation = None
+    Distance = None
+    HnswConfigDiff = None
+    PayloadSchemaType = None
+    QuantizationSearchParams = None
+    ScalarQuantization = None
+    ScalarQuantizationConfig = None
+    ScalarType = None
+    SearchParams = None
+    VectorParams = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CollectionSchema:
+    alias: str
+    vector_size: int
+    distance: str = "Cosine"
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 128
+    search_hnsw_ef: int = 128
+    # int8 scalar quantization; the top oversampling * limit candidates are
+    # rescored against the original float vectors.
+    quantile: float = 0.99
+    rescore_oversampling: float = 2.0
+    payload_indexes: dict[str, str] = field(default_factory=dict)
+
+    def version_name(self, version: int) -> str:
+        return f"{self.alias}_v{version}"
+
+    def parse_version(self, collection_name: str) -> int | None:
+        match = re.fullmatch(rf"{re.escape(self.alias)}_v(\d+)", collection_name)
+        return int(match.group(1)) if match else None
+
+    def vectors_config(self) -> VectorParams:
+        return VectorParams(size=self.vector_size, distance=Distance(self.distance))
+
+    def hnsw_config(self) -> HnswConfigDiff:
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self) -> ScalarQuantization:
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=self.quantile, always_ram=True)
+        )
+
+    def search_params(self) -> SearchParams:
+        return SearchParams(
+            hnsw_ef=self.search_hnsw_ef,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=self.rescore_oversampling),
+        )
+
+
+async def _call(client: Any, method: str, **kwargs: Any) -> Any:
+    from app.services.vector.places_vector_service import qdrant_call
+
+    return await qdrant_call(client, method, **kwargs)
+
+
+async def resolve_alias(client: Any, alias: str) -> str | None:
+    """Physical collection behind ``alias``, or None if the alias does not exist."""
+    response = await _call(client, "get_aliases")
+    for description in getattr(response, "aliases", None) or []:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+async def _collection_names(client: Any) -> list[str]:
+    response = await _call(client, "get_collections")
+    return [collection.name for collection in response.collections]
+
+
+def _config_drifted(info: Any, schema: CollectionSchema) -> bool:
+    config = getattr(info, "config", None)
+    hnsw = getattr(config, "hnsw_config", None)
+    scalar = getattr(getattr(config, "quantization_config", None), "scalar", None)
+    return (
+        getattr(hnsw, "m", None) != schema.hnsw_m
+        or getattr(hnsw, "ef_construct", None) != schema.hnsw_ef_construct
+        or scalar is None
+        or getattr(scalar, "quantile", None) != schema.quantile
+    )
+
+
+async def _reconcile(client: Any, schema: CollectionSchema, collection_name: str) -> None:
+    info = await _call(client, "get_collection", collection_name=collection_name)
+    if _config_drifted(info, schema):
+        await _call(
+            client,
+            "update_collection",
+            collection_name=collection_name,
+            hnsw_config=schema.hnsw_config(),
+            quantization_config=schema.quantization_config(),
+        )
+        logger.info("Updated Qdrant HNSW/quantization config: %s", collection_name)
+
+    existing = set((getattr(info, "payload_schema", None) or {}).keys())
+    for field_name, field_schema in schema.payload_indexes.items():
+        if field_name in existing:
+            continue
+        await _call(
+            client,
+            "create_payload_index",
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType(field_schema),
+        )
+        logger.info("Created Qdrant payload index: %s.%s", collection_name, field_name)
+
+
+async def _create(client: Any, schema: CollectionSchema, collection_name: str) -> None:
+    await _call(
+        client,
+        "create_collection",
+        collection_name=collection_name,
+        vectors_config=schema.vectors_config(),
+        hnsw_config=schema.hnsw_config(),
+        quantization_config=schema.quantization_config(),
+    )
+    logger.info("Created Qdrant collection: %s", collection_name)
+
+
+async def switch_alias(client: Any, schema: CollectionSchema, collection_name: str) -> str | None:
+    """Point the alias at ``collection_name`` in one atomic update; returns the previous target."""
+    previous = await resolve_alias(client, schema.alias)
+    operations: list[Any] = []
+    if previous is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=schema.alias)))
+    operations.append(
+        CreateAliasOperation(
+            create_alias=CreateAlias(collection_name=collection_name, alias_name=schema.alias)
+        )
+    )
+    await _call(client, "update_collection_aliases", change_aliases_operations=operations)
+    logger.info("Qdrant alias %s -> %s (was %s)", schema.alias, collection_name, previous)
+    return previous
+
+
+async def apply_schema(client: Any, schema: CollectionSchema) -> str:
+    """Ensure the alias resolves to a collection matching ``schema``; returns its name."""
+    target = await resolve_alias(client, schema.alias)
+    if target is None:
+        target = schema.version_name(1)
+        if target not in await _collection_names(client):
+            await _create(client, schema, target)
+        await switch_alias(client, schema, target)
+    await _reconcile(client, schema, target)
+    return target
+
+
+async def create_next_version(client: Any, schema: CollectionSchema) -> str:
+    """Create ``{alias}_v{n+1}`` with the full schema, ready to be filled and switched to."""
+    versions = [
+        version
+        for name in await _collection_names(client)
+        if (version := schema.parse_version(name)) is not None
+    ]
+    target = schema.version_name(max(versions, default=0) + 1)
+    await _create(client, schema, target)
+    await _reconcile(client, schema, target)
+    return target
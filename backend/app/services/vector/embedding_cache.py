@@ -0,0 +1,93 @@
+"""Two-tier cache for search query embeddings.
+
+Tier 1 is the in-process ``query_embedding_cache`` LRU; tier 2 is Redis, shared
+across workers. Vectors are stored in Redis as base64-encoded little-endian
+float16, which is ~2 KB for a 768-dim embedding instead of ~15 KB of JSON.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import logging
+import re
+import struct
+import unicodedata
+
+import redis
+
+from app.core.cache import query_embedding_cache
+from app.core.metrics import QUERY_EMBEDDING_CACHE
+from app.core.resilience import CircuitOpenError, get_breaker
+from app.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "places:qemb"
+REDIS_TTL_SECONDS = 7 * 24 * 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_redis_breaker = get_breaker("redis")
+
+
+def normalize_query(q: str) -> str:
+    """Canonical form of a search query: NFKC, casefolded, single-spaced."""
+    normalized = unicodedata.normalize("NFKC", q or "").casefold()
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def encode_vector(vector: list[float]) -> str:
+    return base64.b64encode(struct.pack(f"<{len(vector)}e", *vector)).decode("ascii")
+
+
+def decode_vector(raw: str | bytes) -> list[float]:
+    data = base64.b64decode(raw)
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
+
+
+def _cache_key(model: str, normalized: str) -> str:
+    digest = hashlib.sha1(normalized.encode(), usedforsecurity=False).hexdigest()  # nosec B324
+    return f"{REDIS_KEY_PREFIX}:{model}:{digest}"
+
+
+async def get(model: str, normalized: str) -> list[float] | None:
+    key = _cache_key(model, normalized)
+    vector = query_embedding_cache.get(key)
+    if vector is not None:
+        QUERY_EMBEDDING_CACHE.labels("memory", "hit").inc()
+        return vector
+
+    try:
+        with _redis_breaker.guard():
+            redis_conn = redis_client.get_redis()
+            raw = await asyncio.to_thread(redis_conn.get, key)
+    except (CircuitOpenError, redis.RedisError, OSError) as exc:
+        logger.debug("query embedding cache read failed: %s", exc)
+        raw = None
+
+    if raw:
+        try:
+            vector = decode_vector(raw)
+        except (ValueError, struct.error):
+            vector = None
+        if vector:
+            query_embedding_cache[key] = vector
+            QUERY_EMBEDDING_CACHE.labels("redis", "hit").inc()
+            return vector
+
+    QUERY_EMBEDDING_CACHE.labels("redis", "miss").inc()
+    return None
+
+
+async def put(model: str, normalized: str, vector: list[float]) -> None:
+    key = _cache_key(model, normalized)
+    query_embedding_cache[key] = vector
+    try:
+        with _redis_breaker.guard():
+            redis_conn = redis_client.get_redis()
+            await asyncio.to_thread(
+                redis_conn.setex, key, REDIS_TTL_SECONDS, encode_vector(vector)
+            )
+    except (CircuitOpenError, redis.RedisError, OSError) as exc:
+        logger.debug("query embedding cache write failed: %s", exc)
@@ -1,21 +1,64 @@
+"""Streaming (re-)index of authority_places into Qdrant.
+
+Pipeline: server-side cursor read (keyset on authority_id) -> content-hash
+diff against points already in Qdrant -> batched Gemini embeddings with
+AIMD concurrency control -> queued Qdrant upserts. The last authority_id whose
+batch (and every batch before it) reached Qdrant is checkpointed to disk, so an
+interrupted run resumes where it stopped.
+
+With ``--blue-green`` the run fills a fresh ``places_authority_v{n+1}``
+collection and only then switches the alias to it, so searches never see a
+half-built index; the previous collection is kept for rollback. TRIAD venue
+vectors (app.jobs.triad_reconcile) share the alias, so they are copied into
+the new collection before the switch, and once more afterwards for any that
+were written to the old collection while it was still live.
+"""
+
 from __future__ import annotations
 
 import argparse
 import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
 
-from qdrant_client.models import PointStruct
+from qdrant_client.models import (
+    Filter,
+    IsEmptyCondition,
+    PayloadField,
+    PointStruct,
+    SetPayload,
+    SetPayloadOperation,
+)
 from sqlalchemy import text
 
+from app.core.resilience import CircuitOpenError
 from app.db.session import get_core_db, get_vector_client
+from app.services.vector.collection_schema import (
+    create_next_version,
+    resolve_alias,
+    switch_alias,
+)
 from app.services.vector.places_vector_service import (
+    COLLECTION_NAME,
+    PLACES_AUTHORITY_SCHEMA,
     build_embedding_text,
-    embed_text,
+    content_hash,
+    embed_texts,
     ensure_collection_once,
     make_payload,
     make_point_id,
+    qdrant_call,
     upsert_points,
 )
 
+logger = logging.getLogger(__name__)
+
 SQL = """
 SELECT
   authority_id,
@@ -31,46 +74,406 @@ SELECT
   source_ref,
   COALESCE(updated_at::text, '') AS updated_at
 FROM authority_places
-WHERE status IS NULL OR status != 'inactive'
-ORDER BY created_at DESC
+WHERE (status IS NULL OR status != 'inactive')
+  AND authority_id > :after
+ORDER BY authority_id ASC
 """
 
+DEFAULT_CHECKPOINT = Path(".index_authority_places.checkpoint.json")
 
-async def run(batch_size: int = 500) -> None:
-    async for vector_client in get_vector_client():
-        await ensure_collection_once(vector_client)
 
-        async for db in get_core_db():
-            result = await db.execute(text(SQL))
-            rows = result.mappings().all()
-
-            batch: list[PointStruct] = []
-            for row in rows:
-                embedding_text = build_embedding_text(row)
-                vector = await embed_text(embedding_text)
-                batch.append(
-                    PointStruct(
-                        id=make_point_id(str(row["authority_id"])),
-                        vector=vector,
-                        payload=make_payload(row),
-                    )
-                )
-                if len(batch) >= batch_size:
-                    await upsert_points(vector_client, batch)
-                    batch = []
+def _payload_hash(payload: dict) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode(), usedforsecurity=False).hexdigest()  # nosec B324
+
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    if isinstance(exc, CircuitOpenError) or getattr(exc, "code", None) == 429:
+        return True
+    message = str(exc)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+class EmbeddingRateController:
+    """AIMD limiter for concurrent embedding requests.
+
+    Concurrency grows by one after ``increase_after`` consecutive successes and
+    halves on a rate-limit response, which also pauses new requests for
+    ``backoff`` seconds (doubling while throttling persists).
+    """
+
+    def __init__(self, max_concurrency: int = 8, increase_after: int = 10):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = max(1, self.max_concurrency // 2)
+        self.increase_after = increase_after
+        self.in_flight = 0
+        self.backoff = 1.0
+        self._paused_until = 0.0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            while self.in_flight >= self.limit:
+                await self._cond.wait()
+            self.in_flight += 1
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, throttled: bool = False) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._paused_until = time.monotonic() + self.backoff
+                self.backoff = min(self.backoff * 2, 60.0)
+                self._successes = 0
+            else:
+                self.backoff = 1.0
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+@dataclass
+class Checkpoint:
+    path: Path | None
+    after: str = ""
+    collection: str = ""  # blue/green target collection, if any
+    stats: dict[str, int] = field(
+        default_factory=lambda: {"read": 0, "embedded": 0, "payload_only": 0, "skipped": 0}
+    )
+
+    @classmethod
+    def load(cls, path: Path | None) -> Checkpoint:
+        if path is None or not path.exists():
+            return cls(path=path)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        checkpoint = cls(path=path, after=data.get("after", ""), collection=data.get("collection", ""))
+        checkpoint.stats.update(data.get("stats", {}))
+        return checkpoint
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"after": self.after, "collection": self.collection, "stats": self.stats}),
+            encoding="utf-8",
+        )
+        tmp.replace(self.path)
+
+    def clear(self) -> None:
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+
+class _OrderedCommitter:
+    """Advances the checkpoint only over a contiguous prefix of finished batches."""
+
+    def __init__(self, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+        self._next_seq = 0
+        self._done: dict[int, str] = {}
 
-            if batch:
-                await upsert_points(vector_client, batch)
+    def done(self, seq: int, last_id: str) -> None:
+        self._done[seq] = last_id
+        advanced = False
+        while self._next_seq in self._done:
+            self.checkpoint.after = self._done.pop(self._next_seq)
+            self._next_seq += 1
+            advanced = True
+        if advanced:
+            self.checkpoint.save()
+
+
+async def iter_row_batches(db: Any, after: str, batch_size: int) -> AsyncIterator[list[dict]]:
+    """Stream rows after ``after`` through a server-side cursor, ``batch_size`` at a time."""
+    result = await db.stream(text(SQL), {"after": after})
+    async for partition in result.mappings().partitions(batch_size):
+        yield [dict(row) for row in partition]
+
+
+async def _fetch_existing_hashes(
+    client: Any, point_ids: list[str], collection_name: str = COLLECTION_NAME
+) -> dict[str, tuple[str, str]]:
+    records = await qdrant_call(
+        client,
+        "retrieve",
+        collection_name=collection_name,
+        ids=point_ids,
+        with_payload=["content_hash", "payload_hash"],
+        with_vectors=False,
+    )
+    out: dict[str, tuple[str, str]] = {}
+    for record in records or []:
+        payload = getattr(record, "payload", None) or {}
+        out[str(record.id)] = (payload.get("content_hash", ""), payload.get("payload_hash", ""))
+    return out
+
+
+async def _set_payloads(
+    client: Any, updates: list[tuple[str, dict]], collection_name: str = COLLECTION_NAME
+) -> None:
+    await qdrant_call(
+        client,
+        "batch_update_points",
+        collection_name=collection_name,
+        update_operations=[
+            SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+            for point_id, payload in updates
+        ],
+    )
+
+
+async def _process_batch(
+    rows: list[dict],
+    vector_client: Any,
+    controller: EmbeddingRateController,
+    upsert_queue: asyncio.Queue,
+    seq: int,
+    checkpoint: Checkpoint,
+    force: bool,
+    collection_name: str = COLLECTION_NAME,
+    max_retries: int = 5,
+) -> None:
+    prepared = []
+    for row in rows:
+        payload = make_payload(row)
+        embedding_text = build_embedding_text(row)
+        payload["payload_hash"] = _payload_hash(payload)
+        payload["content_hash"] = content_hash(embedding_text)
+        prepared.append((make_point_id(str(row["authority_id"])), embedding_text, payload))
+
+    existing: dict[str, tuple[str, str]] = {}
+    if not force:
+        existing = await _fetch_existing_hashes(
+            vector_client, [point_id for point_id, _, _ in prepared], collection_name
+        )
+
+    to_embed = []
+    payload_only = []
+    for point_id, embedding_text, payload in prepared:
+        old_content, old_payload = existing.get(point_id, ("", ""))
+        if old_content != payload["content_hash"]:
+            to_embed.append((point_id, embedding_text, payload))
+        elif old_payload != payload["payload_hash"]:
+            payload_only.append((point_id, payload))
+
+    vectors: list[list[float]] = []
+    if to_embed:
+        for attempt in range(max_retries):
+            await controller.acquire()
+            try:
+                vectors = await embed_texts([embedding_text for _, embedding_text, _ in to_embed])
+            except Exception as exc:
+                throttled = _is_rate_limited(exc)
+                await controller.release(throttled=throttled)
+                if attempt + 1 >= max_retries:
+                    raise
+                if isinstance(exc, CircuitOpenError):
+                    await asyncio.sleep(exc.retry_after)
+                elif not throttled:
+                    await asyncio.sleep(2**attempt)
+                logger.warning("embedding batch %d retry %d: %s", seq, attempt + 1, exc)
+                continue
+            await controller.release()
             break
 
+    points = [
+        PointStruct(id=point_id, vector=vector, payload=payload)
+        for (point_id, _, payload), vector in zip(to_embed, vectors, strict=True)
+    ]
+    checkpoint.stats["read"] += len(rows)
+    checkpoint.stats["embedded"] += len(points)
+    checkpoint.stats["payload_only"] += len(payload_only)
+    checkpoint.stats["skipped"] += len(rows) - len(points) - len(payload_only)
+    await upsert_queue.put((seq, str(rows[-1]["authority_id"]), points, payload_only))
+
+
+async def _upsert_worker(
+    vector_client: Any,
+    upsert_queue: asyncio.Queue,
+    committer: _OrderedCommitter,
+    collection_name: str = COLLECTION_NAME,
+) -> BaseException | None:
+    """Drain the queue until the ``None`` sentinel.
+
+    After a failed upsert the worker keeps draining (without writing) so
+    producers blocked on the bounded queue can finish; the error is returned.
+    """
+    error: BaseException | None = None
+    while True:
+        item = await upsert_queue.get()
+        if item is None:
+            return error
+        if error is not None:
+            continue
+        seq, last_id, points, payload_only = item
+        try:
+            if points:
+                await upsert_points(vector_client, points, collection_name=collection_name)
+            if payload_only:
+                await _set_payloads(vector_client, payload_only, collection_name)
+        except Exception as exc:
+            logger.error("upsert of batch %d failed: %s", seq, exc)
+            error = exc
+            continue
+        committer.done(seq, last_id)
+
+
+async def copy_venue_points(
+    client: Any, source: str, target: str, only_missing: bool = False, page_size: int = 256
+) -> int:
+    """Copy points without an authority_id (TRIAD venue vectors) from ``source`` to ``target``.
+
+    With ``only_missing`` points already present in ``target`` are left alone,
+    so a fresher write there is never replaced by the old copy.
+    """
+    venues_only = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="authority_id"))])
+    copied = 0
+    offset = None
+    while True:
+        records, offset = await qdrant_call(
+            client,
+            "scroll",
+            collection_name=source,
+            scroll_filter=venues_only,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        points = [PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records]
+        if only_missing and points:
+            present = await qdrant_call(
+                client,
+                "retrieve",
+                collection_name=target,
+                ids=[point.id for point in points],
+                with_payload=False,
+                with_vectors=False,
+            )
+            existing = {str(record.id) for record in present}
+            points = [point for point in points if str(point.id) not in existing]
+        if points:
+            await upsert_points(client, points, collection_name=target)
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+async def run(
+    batch_size: int = 100,
+    max_concurrency: int = 8,
+    checkpoint_path: Path | None = DEFAULT_CHECKPOINT,
+    reset: bool = False,
+    force: bool = False,
+    blue_green: bool = False,
+) -> dict[str, int]:
+    checkpoint = Checkpoint(path=checkpoint_path) if reset else Checkpoint.load(checkpoint_path)
+    if checkpoint.after:
+        logger.info("Resuming authority index after %s", checkpoint.after)
+
+    controller = EmbeddingRateController(max_concurrency=max_concurrency)
+    committer = _OrderedCommitter(checkpoint)
+    # Bounded so slow upserts apply backpressure to embedding.
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    in_flight: set[asyncio.Task] = set()
+
+    async for vector_client in get_vector_client():
+        await ensure_collection_once(vector_client)
+        collection_name = COLLECTION_NAME
+        if blue_green:
+            if not checkpoint.collection:
+                checkpoint.collection = await create_next_version(
+                    vector_client, PLACES_AUTHORITY_SCHEMA
+                )
+                checkpoint.save()
+            collection_name = checkpoint.collection
+            logger.info("Blue/green re-index into %s", collection_name)
+        upserter = asyncio.create_task(
+            _upsert_worker(vector_client, upsert_queue, committer, collection_name)
+        )
+        try:
+            async for db in get_core_db():
+                seq = 0
+                async for rows in iter_row_batches(db, checkpoint.after, batch_size):
+                    while len(in_flight) >= controller.max_concurrency:
+                        done, in_flight = await asyncio.wait(
+                            in_flight, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for finished in done:
+                            finished.result()
+                    task = asyncio.create_task(
+                        _process_batch(
+                            rows,
+                            vector_client,
+                            controller,
+                            upsert_queue,
+                            seq,
+                            checkpoint,
+                            force,
+                            collection_name,
+                        )
+                    )
+                    in_flight.add(task)
+                    seq += 1
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+                break
+            await upsert_queue.put(None)
+            upsert_error = await upserter
+            if upsert_error is not None:
+                raise upsert_error
+            if blue_green:
+                source = await resolve_alias(vector_client, PLACES_AUTHORITY_SCHEMA.alias)
+                if source and source != collection_name:
+                    copied = await copy_venue_points(vector_client, source, collection_name)
+                    logger.info("Copied %d venue points from %s", copied, source)
+                previous = await switch_alias(vector_client, PLACES_AUTHORITY_SCHEMA, collection_name)
+                if previous and previous != collection_name:
+                    # Venue vectors upserted through the alias between the copy and the switch
+                    await copy_venue_points(vector_client, previous, collection_name, only_missing=True)
+                logger.info("Previous collection %s kept for rollback", previous)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            upserter.cancel()
         break
 
+    logger.info("Authority index complete: %s", checkpoint.stats)
+    checkpoint.clear()
+    return checkpoint.stats
+
 
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--reset", action="store_true", help="ignore any saved checkpoint")
+    parser.add_argument("--force", action="store_true", help="re-embed unchanged rows")
+    parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="build a new collection version and switch the alias when done",
+    )
     args = parser.parse_args()
-    asyncio.run(run(args.batch_size))
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(
+        run(
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency,
+            checkpoint_path=args.checkpoint,
+            reset=args.reset,
+            force=args.force,
+            blue_green=args.blue_green,
+        )
+    )
 
 
 if __name__ == "__main__":
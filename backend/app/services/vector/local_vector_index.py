@@ -0,0 +1,310 @@
+"""In-process fallback vector index over a memory-mapped Qdrant snapshot.
+
+A snapshot directory holds one sub-directory per export version with
+``vectors.npy`` (unit-normalised float16 rows, memory-mapped on load) and
+``meta.json`` (point ids plus the payload fields search results need).
+Versions are named ``<epoch seconds>-<random>`` and built in a private
+staging directory, so workers exporting in the same second never share one.
+The ``CURRENT`` file names the live version and is replaced atomically.
+
+Search is NumPy brute force: a chunked matrix-vector product over the
+candidate rows. At 768 dims this serves /places/search while Qdrant is
+unavailable and answers small filtered subsets (one province) without a
+network round trip.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PAYLOAD_FIELDS = (
+    "authority_id",
+    "name",
+    "category",
+    "province",
+    "district",
+    "address",
+    "lat",
+    "lng",
+    "updated_at",
+)
+LOCAL_FIRST_TIER_MAX = 5000  # filtered subsets up to this size skip Qdrant
+_CHUNK_ROWS = 8192
+_KEEP_VERSIONS = 2
+_EMPTY = np.empty(0, dtype=np.int64)
+_STAGING_PREFIX = ".export-"
+
+
+@dataclass(frozen=True)
+class LocalHit:
+    """Shape-compatible with Qdrant's ScoredPoint for the fields callers read."""
+
+    id: str
+    score: float
+    payload: dict
+
+
+def _haversine_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    p1 = np.radians(lat)
+    p2 = np.radians(lats)
+    dlat = p2 - p1
+    dlng = np.radians(lngs - lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlng / 2) ** 2
+    return 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _group_rows(values: list[Any]) -> dict[str, np.ndarray]:
+    groups: dict[str, list[int]] = {}
+    for row, value in enumerate(values):
+        if value:
+            groups.setdefault(str(value), []).append(row)
+    return {key: np.asarray(rows, dtype=np.int64) for key, rows in groups.items()}
+
+
+class LocalVectorIndex:
+    def __init__(
+        self,
+        vectors: np.ndarray | None = None,
+        ids: list[str] | None = None,
+        payloads: list[dict] | None = None,
+        version: str = "",
+    ):
+        self._vectors = vectors
+        self._ids = ids or []
+        self._payloads = payloads or []
+        self.version = version
+        self._lat = np.asarray([_as_float(p.get("lat")) for p in self._payloads], dtype=np.float64)
+        self._lng = np.asarray([_as_float(p.get("lng")) for p in self._payloads], dtype=np.float64)
+        self._by_province = _group_rows([p.get("province") for p in self._payloads])
+        self._by_category = _group_rows([p.get("category") for p in self._payloads])
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def ready(self) -> bool:
+        return self._vectors is not None and len(self._ids) > 0
+
+    @classmethod
+    def load(cls, directory: Path) -> LocalVectorIndex:
+        """Open the CURRENT snapshot in ``directory`` (vectors stay on disk)."""
+        version = (directory / "CURRENT").read_text(encoding="utf-8").strip()
+        version_dir = directory / version
+        meta = json.loads((version_dir / "meta.json").read_text(encoding="utf-8"))
+        vectors = np.load(version_dir / "vectors.npy", mmap_mode="r")
+        if vectors.shape[0] != len(meta["ids"]):
+            raise ValueError(f"snapshot {version} is inconsistent")
+        return cls(vectors, meta["ids"], meta["payloads"], version)
+
+    def swap(self, other: LocalVectorIndex) -> None:
+        """Replace this index's contents with ``other`` (e.g. after a new export)."""
+        self.__dict__.update(other.__dict__)
+
+    def _candidates(self, province: str | None, category: str | None) -> np.ndarray | None:
+        rows = None
+        if province:
+            rows = self._by_province.get(province, _EMPTY)
+        if category:
+            by_category = self._by_category.get(category, _EMPTY)
+            rows = by_category if rows is None else np.intersect1d(rows, by_category, assume_unique=True)
+        return rows
+
+    def subset_size(self, province: str | None, category: str | None) -> int:
+        rows = self._candidates(province, category)
+        return len(self) if rows is None else len(rows)
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        total = len(self) if rows is None else len(rows)
+        out = np.empty(total, dtype=np.float32)
+        for start in range(0, total, _CHUNK_ROWS):
+            stop = min(total, start + _CHUNK_ROWS)
+            block = self._vectors[start:stop] if rows is None else self._vectors[rows[start:stop]]
+            out[start:stop] = block.astype(np.float32) @ query
+        return out
+
+    def search(
+        self,
+        vector: list[float],
+        limit: int,
+        province: str | None = None,
+        category: str | None = None,
+        lat: float | None = None,
+        lng: float | None = None,
+        radius_m: float | None = None,
+    ) -> list[LocalHit]:
+        """Top ``limit`` points by cosine similarity within the given filters."""
+        if not self.ready or limit <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self._vectors.shape[1],):
+            raise ValueError(f"query has {query.size} dims, snapshot has {self._vectors.shape[1]}")
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0:
+            return []
+        query /= norm
+
+        rows = self._candidates(province, category)
+        if lat is not None and lng is not None and radius_m:
+            if rows is None:
+                rows = np.arange(len(self), dtype=np.int64)
+            rows = rows[_haversine_m(lat, lng, self._lat[rows], self._lng[rows]) <= radius_m]
+        if rows is not None and not len(rows):
+            return []
+
+        scores = self._scores(query, rows)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        points = top if rows is None else rows[top]
+        return [
+            LocalHit(id=self._ids[point], score=float(scores[pos]), payload=self._payloads[point])
+            for pos, point in zip(top, points, strict=True)
+        ]
+
+
+snapshot_index = LocalVectorIndex()
+
+
+def prefers_local(province: str | None, category: str | None) -> bool:
+    """True when a filtered subset is small enough to skip Qdrant entirely."""
+    if not snapshot_index.ready or not province:
+        return False
+    return snapshot_index.subset_size(province, category) <= LOCAL_FIRST_TIER_MAX
+
+
+async def search_query(
+    q: str,
+    limit: int,
+    province: str | None,
+    category: str | None,
+    lat: float | None = None,
+    lng: float | None = None,
+    radius_m: float | None = None,
+) -> list[LocalHit]:
+    """Embed ``q`` and search the in-process snapshot; raises RuntimeError if unavailable."""
+    from app.services.vector.places_vector_service import embed_query
+
+    if not snapshot_index.ready:
+        raise RuntimeError("local vector snapshot not loaded")
+    try:
+        vector = await asyncio.wait_for(embed_query(q), timeout=2.5)
+        # The scan is CPU-bound; run it off the event loop on a shallow copy so
+        # a concurrent swap() cannot change the arrays mid-search.
+        index = copy.copy(snapshot_index)
+        return await asyncio.to_thread(index.search, vector, limit, province, category, lat, lng, radius_m)
+    except (TimeoutError, Exception) as exc:
+        raise RuntimeError(f"local vector search failed: {exc}") from exc
+
+
+def _exported_at(version: str) -> int:
+    """Export time of a version name; raises ValueError for anything else."""
+    return int(version.split("-", 1)[0])
+
+
+def snapshot_age_seconds(directory: Path) -> float | None:
+    """Seconds since the CURRENT snapshot was exported, or None if there is none."""
+    try:
+        version = (directory / "CURRENT").read_text(encoding="utf-8").strip()
+        return max(0.0, time.time() - _exported_at(version))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(directory: Path, vectors: np.ndarray, ids: list[str], payloads: list[dict]) -> str:
+    directory.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=_STAGING_PREFIX, dir=directory))
+    try:
+        np.save(staging / "vectors.npy", vectors)
+        (staging / "meta.json").write_text(
+            json.dumps({"ids": ids, "payloads": payloads}, ensure_ascii=False), encoding="utf-8"
+        )
+        version = f"{int(time.time())}-{staging.name.removeprefix(_STAGING_PREFIX)}"
+        os.replace(staging, directory / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    pointer = directory / f"CURRENT.{version}.tmp"
+    pointer.write_text(version, encoding="utf-8")
+    os.replace(pointer, directory / "CURRENT")
+
+    # Older versions may still be memory-mapped by other workers; keep the last few.
+    versions = []
+    for path in directory.iterdir():
+        try:
+            versions.append((_exported_at(path.name), path))
+        except ValueError:
+            continue
+    versions.sort(key=lambda item: (item[0], item[1].name))
+    for _, stale in versions[:-_KEEP_VERSIONS]:
+        if stale.name != version:
+            shutil.rmtree(stale, ignore_errors=True)
+    return version
+
+
+async def export_snapshot(client: Any, directory: Path, page_size: int = 1000) -> str:
+    """Scroll the authority points out of Qdrant into a new snapshot version.
+
+    TRIAD venue vectors share the collection but carry no authority_id; they
+    are filtered out of the scroll.
+    """
+    from qdrant_client.models import Filter, IsEmptyCondition, PayloadField
+
+    from app.services.vector.places_vector_service import COLLECTION_NAME, qdrant_call
+
+    authority_only = Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="authority_id"))])
+
+    ids: list[str] = []
+    payloads: list[dict] = []
+    rows: list[np.ndarray] = []
+    offset = None
+    while True:
+        points, offset = await qdrant_call(
+            client,
+            "scroll",
+            collection_name=COLLECTION_NAME,
+            scroll_filter=authority_only,
+            limit=page_size,
+            offset=offset,
+            with_payload=list(SNAPSHOT_PAYLOAD_FIELDS),
+            with_vectors=True,
+        )
+        for point in points or []:
+            vector = getattr(point, "vector", None)
+            if not vector or isinstance(vector, dict):
+                continue
+            ids.append(str(point.id))
+            payload = getattr(point, "payload", None) or {}
+            payloads.append({key: payload.get(key) for key in SNAPSHOT_PAYLOAD_FIELDS})
+            rows.append(np.asarray(vector, dtype=np.float32))
+        if offset is None:
+            break
+    if not rows:
+        raise RuntimeError("qdrant scroll returned no vectors")
+
+    matrix = np.vstack(rows)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = (matrix / np.where(norms == 0, 1.0, norms)).astype(np.float16)
+    version = await asyncio.to_thread(_write_snapshot, directory, matrix, ids, payloads)
+    logger.info("local_vector_index: exported %d vectors as version %s", len(ids), version)
+    return version
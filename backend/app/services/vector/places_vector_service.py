@@ -1,39 +1,30 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import inspect
 import logging
+import math
 import time
 from typing import Any
 
 from app.core.concurrency import vector_sem
 from app.core.config import get_settings
+from app.core.resilience import OPEN, get_breaker
+from app.services.vector import embedding_cache
+from app.services.vector.collection_schema import CollectionSchema, apply_schema
 
 logger = logging.getLogger(__name__)
 
-# C5: Simple circuit breaker — no external libs required
-# Tracks failure timestamps; opens circuit after 5 failures in 30s for 60s
-_cb_failures: list[float] = []
-_cb_open_until: float = 0.0
+# C5: Qdrant and Gemini breakers — ~5 failures in 30s open the circuit for 60s
+qdrant_breaker = get_breaker("qdrant", min_calls=5, window_seconds=30, open_seconds=60)
+gemini_breaker = get_breaker("gemini", min_calls=5, window_seconds=30, open_seconds=30)
 
 
 def _is_circuit_open() -> bool:
-    return time.monotonic() < _cb_open_until
+    return qdrant_breaker.state == OPEN
 
 
-def _record_cb_failure() -> None:
-    global _cb_open_until, _cb_failures
-    now = time.monotonic()
-    _cb_failures = [t for t in _cb_failures if now - t < 30]
-    _cb_failures.append(now)
-    if len(_cb_failures) >= 5:
-        _cb_open_until = now + 60
-        logger.warning("qdrant_circuit_open", extra={"failure_count": len(_cb_failures)})
-
-
-def _record_cb_success() -> None:
-    global _cb_failures
-    _cb_failures = []
-
 try:
     from google import genai
 
@@ -44,23 +35,28 @@ except ImportError:
 
 try:
     from qdrant_client.models import (
-        Distance,
         FieldCondition,
         Filter,
+        GeoPoint,
+        GeoRadius,
+        IsEmptyCondition,
         MatchValue,
-        VectorParams,
+        PayloadField,
     )
 
     QDRANT_MODELS_AVAILABLE = True
 except ImportError:
     QDRANT_MODELS_AVAILABLE = False
-    Distance = None
     FieldCondition = None
     Filter = None
+    GeoPoint = None
+    GeoRadius = None
+    IsEmptyCondition = None
     MatchValue = None
-    VectorParams = None
+    PayloadField = None
 
-COLLECTION_NAME = "places_authority_v1"
+# Alias; the physical collections behind it are places_authority_v{n}.
+COLLECTION_NAME = "places_authority"
 EMBEDDING_MODEL = "gemini-embedding-001"
 EMBEDDING_DIM = 768
 
@@ -70,6 +66,32 @@ _genai_client: Any | None = None
 _collection_ready = False
 _collection_lock = asyncio.Lock()
 
+# Payload field -> index type. `location` is the geo point written by make_payload.
+PAYLOAD_INDEXES: dict[str, str] = {
+    "location": "geo",
+    "province": "keyword",
+    "category": "keyword",
+    "status": "keyword",
+}
+
+PLACES_AUTHORITY_SCHEMA = CollectionSchema(
+    alias=COLLECTION_NAME,
+    vector_size=EMBEDDING_DIM,
+    payload_indexes=PAYLOAD_INDEXES,
+)
+
+# Adaptive over-fetch: ask Qdrant for limit * ratio hits, where ratio tracks how
+# many hits survive the post-filter (invalid payloads, radius edge rounding).
+_OVERFETCH_MIN = 1.0
+_OVERFETCH_MAX = 4.0
+_overfetch_ratio = 1.5
+
+# Whether the collection behind the alias still holds authority points without
+# the `location` geo payload, as (checked_at, answer). Re-checked after the TTL
+# so a re-index or alias switch is picked up.
+_LOCATIONLESS_TTL_SECONDS = 600
+_locationless: tuple[float, bool] | None = None
+
 
 def _settings():
     return get_settings()
@@ -91,18 +113,22 @@ async def configure_genai_once() -> None:
         logger.info("Gemini configured once for places vectors")
 
 
-def _ensure_collection_sync(client: Any) -> None:
-    collections = client.get_collections().collections
-    exists = any(collection.name == COLLECTION_NAME for collection in collections)
-    if exists:
-        return
+async def qdrant_call(client: Any, method: str, **kwargs: Any) -> Any:
+    """Invoke a Qdrant client method on either client flavour.
+
+    AsyncQdrantClient methods are awaited on the event loop; the sync
+    QdrantClient (scripts, tests) is pushed to a worker thread.
+    """
+    fn = getattr(client, method)
+    if inspect.iscoroutinefunction(fn):
+        return await fn(**kwargs)
+    return await asyncio.to_thread(fn, **kwargs)
+
+
+async def _ensure_collection(client: Any) -> None:
     if not QDRANT_MODELS_AVAILABLE:
         raise RuntimeError("qdrant_client models not available")
-    client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE),
-    )
-    logger.info("Created Qdrant collection: %s", COLLECTION_NAME)
+    await apply_schema(client, PLACES_AUTHORITY_SCHEMA)
 
 
 async def ensure_collection_once(client: Any) -> None:
@@ -113,27 +139,77 @@ async def ensure_collection_once(client: Any) -> None:
         if _collection_ready:
             return
         async with vector_sem:
-            await asyncio.to_thread(_ensure_collection_sync, client)
+            await _ensure_collection(client)
         _collection_ready = True
 
 
+async def bootstrap_collection() -> None:
+    """Apply the collection schema at startup; search retries lazily on failure."""
+    if not _settings().QDRANT_URL:
+        return
+    from app.db.session import _async_qdrant_client
+
+    try:
+        await ensure_collection_once(_async_qdrant_client.instance)
+    except Exception as exc:  # qdrant transport errors vary by protocol
+        logger.warning("qdrant schema bootstrap failed — %s", exc)
+
+
 async def embed_text(text: str) -> list[float]:
     if not GENAI_AVAILABLE:
         raise RuntimeError("google-genai not installed")
     await configure_genai_once()
     if _genai_client is None:
         raise RuntimeError("google-genai client not initialized")
-    result = await asyncio.to_thread(
-        _genai_client.models.embed_content,
-        model=EMBEDDING_MODEL,
-        contents=text,
-    )
+    with gemini_breaker.guard():
+        result = await asyncio.to_thread(
+            _genai_client.models.embed_content,
+            model=EMBEDDING_MODEL,
+            contents=text,
+        )
     embeddings = getattr(result, "embeddings", None) or []
     if not embeddings or not getattr(embeddings[0], "values", None):
         raise RuntimeError("google-genai returned empty embedding")
     return list(embeddings[0].values)
 
 
+async def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Embed several texts in a single Gemini request, preserving order."""
+    if not texts:
+        return []
+    if not GENAI_AVAILABLE:
+        raise RuntimeError("google-genai not installed")
+    await configure_genai_once()
+    if _genai_client is None:
+        raise RuntimeError("google-genai client not initialized")
+    with gemini_breaker.guard():
+        result = await asyncio.to_thread(
+            _genai_client.models.embed_content,
+            model=EMBEDDING_MODEL,
+            contents=texts,
+        )
+    embeddings = getattr(result, "embeddings", None) or []
+    if len(embeddings) != len(texts) or not all(getattr(e, "values", None) for e in embeddings):
+        raise RuntimeError("google-genai returned incomplete batch embedding")
+    return [list(e.values) for e in embeddings]
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of embedding input; unchanged hash means the vector can be reused."""
+    return hashlib.sha1(f"{EMBEDDING_MODEL}|{text}".encode(), usedforsecurity=False).hexdigest()  # nosec B324
+
+
+async def embed_query(q: str) -> list[float]:
+    """Embed a search query, reusing the cached vector for repeat queries."""
+    normalized = embedding_cache.normalize_query(q)
+    cached = await embedding_cache.get(EMBEDDING_MODEL, normalized)
+    if cached is not None:
+        return cached
+    vector = await embed_text(normalized)
+    await embedding_cache.put(EMBEDDING_MODEL, normalized, vector)
+    return vector
+
+
 def build_embedding_text(row: dict) -> str:
     parts = [
         (row.get("name") or ""),
@@ -150,6 +226,8 @@ def make_point_id(authority_id: str) -> str:
 
 
 def make_payload(row: dict) -> dict:
+    lat = float(row.get("lat"))
+    lng = float(row.get("lng"))
     return {
         "authority_id": row.get("authority_id"),
         "name": row.get("name"),
@@ -157,8 +235,10 @@ def make_payload(row: dict) -> dict:
         "province": row.get("province"),
         "district": row.get("district"),
         "address": row.get("address"),
-        "lat": float(row.get("lat")),
-        "lng": float(row.get("lng")),
+        "lat": lat,
+        "lng": lng,
+        # Qdrant geo index needs a {lat, lon} object.
+        "location": {"lat": lat, "lon": lng},
         "updated_at": row.get("updated_at") or "",
         "status": row.get("status"),
         "source": row.get("source"),
@@ -166,51 +246,162 @@ def make_payload(row: dict) -> dict:
     }
 
 
-async def upsert_points(client: Any, points: list[Any]) -> None:
+async def upsert_points(client: Any, points: list[Any], collection_name: str = COLLECTION_NAME) -> None:
     async with vector_sem:
-        await asyncio.to_thread(
-            client.upsert,
-            collection_name=COLLECTION_NAME,
+        await qdrant_call(
+            client,
+            "upsert",
+            collection_name=collection_name,
             points=points,
         )
 
 
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    earth_radius_m = 6371000.0
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * earth_radius_m * math.asin(math.sqrt(a))
+
+
+def build_search_filter(
+    province: str | None,
+    category: str | None,
+    lat: float | None = None,
+    lng: float | None = None,
+    radius_m: float | None = None,
+) -> Any:
+    must = []
+    if province:
+        must.append(FieldCondition(key="province", match=MatchValue(value=province)))
+    if category:
+        must.append(FieldCondition(key="category", match=MatchValue(value=category)))
+    if lat is not None and lng is not None and radius_m:
+        must.append(
+            FieldCondition(
+                key="location",
+                geo_radius=GeoRadius(
+                    center=GeoPoint(lat=lat, lon=lng),
+                    radius=float(radius_m),
+                ),
+            )
+        )
+    return Filter(must=must) if must else None
+
+
+def _overfetch_limit(limit: int) -> int:
+    return max(limit, math.ceil(limit * _overfetch_ratio))
+
+
+def _record_overfetch_yield(fetched: int, kept: int) -> None:
+    """Move the over-fetch ratio toward the observed fetched/kept ratio (EMA)."""
+    global _overfetch_ratio
+    if fetched <= 0:
+        return
+    observed = fetched / max(kept, 1)
+    ratio = 0.8 * _overfetch_ratio + 0.2 * observed * 1.1
+    _overfetch_ratio = min(_OVERFETCH_MAX, max(_OVERFETCH_MIN, ratio))
+
+
+async def _has_locationless_points(client: Any) -> bool:
+    """True if some authority point lacks `location`; cached for _LOCATIONLESS_TTL_SECONDS."""
+    global _locationless
+    now = time.monotonic()
+    if _locationless is not None and now - _locationless[0] < _LOCATIONLESS_TTL_SECONDS:
+        return _locationless[1]
+    count_filter = Filter(
+        must=[IsEmptyCondition(is_empty=PayloadField(key="location"))],
+        must_not=[IsEmptyCondition(is_empty=PayloadField(key="authority_id"))],
+    )
+    try:
+        with qdrant_breaker.guard():
+            async with vector_sem:
+                result = await asyncio.wait_for(
+                    qdrant_call(
+                        client, "count", collection_name=COLLECTION_NAME, count_filter=count_filter, exact=False
+                    ),
+                    timeout=2.5,
+                )
+    except (TimeoutError, Exception) as exc:
+        raise RuntimeError(f"qdrant_count failed: {exc}") from exc
+    answer = int(getattr(result, "count", 0) or 0) > 0
+    _locationless = (now, answer)
+    return answer
+
+
+def _within_radius(hit: Any, lat: float, lng: float, radius_m: float) -> bool:
+    payload = getattr(hit, "payload", {}) or {}
+    try:
+        place_lat = float(payload.get("lat"))
+        place_lng = float(payload.get("lng"))
+    except (TypeError, ValueError):
+        return False
+    return haversine_m(lat, lng, place_lat, place_lng) <= radius_m
+
+
 async def qdrant_search(
     client: Any,
     q: str,
     limit: int,
     province: str | None,
     category: str | None,
+    lat: float | None = None,
+    lng: float | None = None,
+    radius_m: float | None = None,
 ) -> Any:
+    """Semantic search over authority places.
+
+    When ``lat``/``lng``/``radius_m`` are given the radius is pushed down into
+    Qdrant as a geo filter, so a single call returns a localized page; hits are
+    re-checked against the radius and trimmed to ``limit``. If the geo-filtered
+    search finds nothing and the collection is known to still hold points
+    indexed before the ``location`` payload was added, it falls back to an
+    unfiltered over-fetch post-filtered by lat/lng.
+    """
     if not QDRANT_MODELS_AVAILABLE:
         raise RuntimeError("qdrant_client models not available")
 
-    # C5: Circuit breaker — fail fast if Qdrant is consistently down
+    # C5: Circuit breaker — fail fast (before embedding) if Qdrant is consistently down
     if _is_circuit_open():
         raise RuntimeError("qdrant_circuit_open: vector search temporarily disabled")
 
     try:
-        vector = await asyncio.wait_for(embed_text(q), timeout=2.5)
-        must = []
-        if province:
-            must.append(FieldCondition(key="province", match=MatchValue(value=province)))
-        if category:
-            must.append(FieldCondition(key="category", match=MatchValue(value=category)))
-        query_filter = Filter(must=must) if must else None
-
-        async with vector_sem:
-            result = await asyncio.wait_for(
-                asyncio.to_thread(
-                    client.search,
-                    collection_name=COLLECTION_NAME,
-                    query_vector=vector,
-                    query_filter=query_filter,
-                    limit=limit,
-                ),
-                timeout=2.5,
-            )
-        _record_cb_success()
-        return result
+        vector = await asyncio.wait_for(embed_query(q), timeout=2.5)
     except (TimeoutError, Exception) as exc:
-        _record_cb_failure()
-        raise RuntimeError(f"qdrant_search failed: {exc}") from exc
+        raise RuntimeError(f"query embedding failed: {exc}") from exc
+
+    async def _search(query_filter: Any, fetch_limit: int) -> Any:
+        try:
+            with qdrant_breaker.guard():
+                async with vector_sem:
+                    return await asyncio.wait_for(
+                        qdrant_call(
+                            client,
+                            "search",
+                            collection_name=COLLECTION_NAME,
+                            query_vector=vector,
+                            query_filter=query_filter,
+                            search_params=PLACES_AUTHORITY_SCHEMA.search_params(),
+                            limit=fetch_limit,
+                        ),
+                        timeout=2.5,
+                    )
+        except (TimeoutError, Exception) as exc:
+            raise RuntimeError(f"qdrant_search failed: {exc}") from exc
+
+    geo = lat is not None and lng is not None and bool(radius_m)
+    if not geo:
+        return await _search(build_search_filter(province, category), limit)
+
+    hits = list(await _search(build_search_filter(province, category, lat, lng, radius_m), _overfetch_limit(limit)) or [])
+    kept = [hit for hit in hits if _within_radius(hit, lat, lng, radius_m)]
+    _record_overfetch_yield(len(hits), len(kept))
+    if kept or not await _has_locationless_points(client):
+        return kept[:limit]
+
+    # Points indexed before the `location` payload existed never match the geo
+    # condition; search without it and post-filter on their lat/lng instead.
+    hits = list(await _search(build_search_filter(province, category), math.ceil(limit * _OVERFETCH_MAX)) or [])
+    return [hit for hit in hits if _within_radius(hit, lat, lng, radius_m)][:limit]
@@ -0,0 +1,273 @@
+"""
+Venue Rollups - per-venue daily analytics for the owner dashboards.
+Weighted event counts per (venue, day, event_type) live in
+analytics_venue_daily and a HyperLogLog sketch of visitor hashes per
+(venue, day) in analytics_venue_visitors. Both merge additively (counts add,
+sketches union) through merge_analytics_venue_rollups, so partial rollups
+from several batches or workers combine. Days are UTC.
+
+The rollups are fed from analytics_events itself (app.jobs.venue_rollup_sync
+follows the id watermark through apply_events), so events from every
+ingestion path are counted, not only those written by AnalyticsBuffer.
+Counter-only event types reach the table pre-aggregated and without a
+visitor, so AnalyticsBuffer sketches their visitors here first (observe with
+counts off) and the periodic flush merges those sketches.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import UTC, date, datetime
+from typing import Any
+
+from postgrest import APIError
+
+from app.core.metrics import VENUE_ROLLUP_ROWS
+from app.services.hll import HyperLogLog
+
+logger = logging.getLogger("app.venue_rollups")
+
+_FLUSH_INTERVAL_SECONDS = 30
+_MAX_KEYS = 100_000  # pending (venue, day, type) count keys before new ones are dropped
+_MAX_SKETCHES = 10_000  # pending (venue, day) sketches, 4 KiB each
+_READ_CHUNK = 50  # venue ids per read query
+_READ_CONCURRENCY = 4  # concurrent read queries per call
+
+
+def visitor_hash(visitor: str) -> int:
+    """Signed 64-bit hash; matches ('x' || substr(md5(v), 1, 16))::bit(64)::bigint in SQL."""
+    return int.from_bytes(hashlib.md5(visitor.encode(), usedforsecurity=False).digest()[:8], "big", signed=True)
+
+
+def _visitor_of(row: dict[str, Any]) -> str | None:
+    """visitor_id, then user_id, then session_id; the SQL backfill uses the same order."""
+    data = row.get("data") or {}
+    metadata = row.get("metadata") or {}
+    for visitor in (
+        row.get("visitor_id"),
+        data.get("visitor_id"),
+        metadata.get("visitor_id"),
+        row.get("user_id"),
+        row.get("session_id"),
+        data.get("session_id"),
+    ):
+        if visitor:
+            return str(visitor)
+    return None
+
+
+def _venue_of(row: dict[str, Any]) -> str | None:
+    venue = row.get("venue_ref") or row.get("venue_id")
+    if not venue:
+        # analytics-ingest keeps the ref in the JSON payload
+        venue = (row.get("data") or {}).get("venue_ref") or (row.get("metadata") or {}).get("venue_ref")
+    return str(venue) if venue else None
+
+
+def _day_of(value: Any) -> date | None:
+    if isinstance(value, datetime):
+        return value.astimezone(UTC).date()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).astimezone(UTC).date()
+    except ValueError:
+        return None
+
+
+def _aggregate(counts: list[dict[str, Any]], visitors: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Fold raw rollup rows into the analytics_venue_trend shape."""
+    days: dict[str, dict[str, Any]] = {}
+    venues: dict[str, set[str]] = {}
+
+    def _day(key: str) -> dict[str, Any]:
+        return days.setdefault(key, {"events": 0.0, "active_venues": 0, "sketch": HyperLogLog()})
+
+    for row in counts:
+        key = str(row.get("day"))
+        _day(key)["events"] += float(row.get("events") or 0)
+        venues.setdefault(key, set()).add(str(row.get("venue_ref")))
+    for row in visitors:
+        _day(str(row.get("day")))["sketch"].merge(HyperLogLog.from_hex(row.get("sketch")))
+    for key, refs in venues.items():
+        days[key]["active_venues"] = len(refs)
+    return days
+
+
+class VenueRollups:
+    """In-memory venue rollup accumulators, flushed additively to Supabase."""
+
+    def __init__(self):
+        self._counts: dict[tuple[str, date, str], float] = {}
+        self._visitors: dict[tuple[str, date], HyperLogLog] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._counts) + len(self._visitors)
+
+    # -- write side -----------------------------------------------------------
+
+    def observe(self, rows: list[dict[str, Any]], counts: bool = True) -> None:
+        """Fold analytics_events rows; with `counts` off only their visitors are sketched."""
+        for row in rows:
+            venue = _venue_of(row)
+            day = _day_of(row.get("created_at"))
+            if not venue or day is None:
+                continue
+            key = (venue, day, str(row.get("event_type") or ""))
+            if counts:
+                if key in self._counts or len(self._counts) < _MAX_KEYS:
+                    self._counts[key] = self._counts.get(key, 0.0) + float(row.get("sample_weight") or 1.0)
+                else:
+                    VENUE_ROLLUP_ROWS.labels("dropped").inc()
+            visitor = _visitor_of(row)
+            if visitor is None:
+                continue
+            sketch = self._visitors.get(key[:2])
+            if sketch is None:
+                if len(self._visitors) >= _MAX_SKETCHES:
+                    VENUE_ROLLUP_ROWS.labels("dropped").inc()
+                    continue
+                sketch = self._visitors[key[:2]] = HyperLogLog()
+            sketch.add(visitor_hash(visitor))
+
+    async def flush(self) -> int:
+        """Merge pending rollups into the store; returns the number of rows merged."""
+        async with self._flush_lock:
+            counts, self._counts = self._counts, {}
+            visitors, self._visitors = self._visitors, {}
+            if not counts and not visitors:
+                return 0
+            count_rows, visitor_rows = self._payload(counts, visitors)
+            try:
+                stored = await self._write(count_rows, visitor_rows)
+            except Exception:
+                logger.exception("Failed to flush %d venue rollup rows", len(count_rows) + len(visitor_rows))
+                VENUE_ROLLUP_ROWS.labels("failed").inc(len(count_rows) + len(visitor_rows))
+                self._requeue(counts, visitors)
+                return 0
+            if not stored:
+                return 0  # no store configured; _write counted them as dropped
+            VENUE_ROLLUP_ROWS.labels("written").inc(len(count_rows) + len(visitor_rows))
+            return len(count_rows) + len(visitor_rows)
+
+    @staticmethod
+    def _payload(
+        counts: dict[tuple[str, date, str], float], visitors: dict[tuple[str, date], HyperLogLog]
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        count_rows = [
+            {"venue_ref": venue, "day": day.isoformat(), "event_type": event_type, "events": events}
+            for (venue, day, event_type), events in counts.items()
+        ]
+        visitor_rows = [
+            {"venue_ref": venue, "day": day.isoformat(), "sketch": sketch.to_hex()}
+            for (venue, day), sketch in visitors.items()
+        ]
+        return count_rows, visitor_rows
+
+    async def apply_events(self, client, rows: list[dict[str, Any]], after: int, through: int) -> bool:
+        """Merge analytics_events rows (after, through] and move the shared watermark.
+
+        Returns False, merging nothing, if another worker already advanced the
+        watermark past `after`.
+        """
+        batch = VenueRollups()
+        batch.observe(rows)
+        count_rows, visitor_rows = self._payload(batch._counts, batch._visitors)
+        params = {"p_counts": count_rows, "p_visitors": visitor_rows, "p_after": after, "p_through": through}
+        response = await asyncio.to_thread(lambda: client.rpc("advance_analytics_venue_rollups", params).execute())
+        return bool(response.data)
+
+    def _requeue(
+        self, counts: dict[tuple[str, date, str], float], visitors: dict[tuple[str, date], HyperLogLog]
+    ) -> None:
+        for key, events in counts.items():
+            self._counts[key] = self._counts.get(key, 0.0) + events
+        for key, sketch in visitors.items():
+            pending = self._visitors.get(key)
+            self._visitors[key] = pending.merge(sketch) if pending is not None else sketch
+
+    @staticmethod
+    async def _write(count_rows: list[dict[str, Any]], visitor_rows: list[dict[str, Any]]) -> bool:
+        from app.core.supabase import supabase_admin
+
+        if supabase_admin is None:
+            logger.warning("No service-role Supabase client — dropping %d venue rollup rows", len(count_rows))
+            VENUE_ROLLUP_ROWS.labels("dropped").inc(len(count_rows) + len(visitor_rows))
+            return False
+        params = {"p_counts": count_rows, "p_visitors": visitor_rows}
+        await asyncio.to_thread(lambda: supabase_admin.rpc("merge_analytics_venue_rollups", params).execute())
+        return True
+
+    # -- read side ------------------------------------------------------------
+
+    async def trend(self, client, venue_ids: list[str], since: date) -> dict[str, dict[str, Any]]:
+        """Per-day totals for `venue_ids` from `since` (inclusive), keyed by ISO day.
+
+        Each value has the weighted `events`, the number of `active_venues` and
+        the day's visitor `sketch` across all the venues. One
+        analytics_venue_trend call returns the per-venue rows (or, if it fails,
+        the rollup tables are read in parallel chunks); sketches are unioned
+        here rather than in SQL.
+        """
+        if client is None or not venue_ids:
+            return {}
+        params = {"p_venue_refs": venue_ids, "p_since": since.isoformat()}
+        try:
+            response = await asyncio.to_thread(lambda: client.rpc("analytics_venue_trend", params).execute())
+        except APIError as exc:
+            logger.warning("analytics_venue_trend failed, aggregating rollup rows: %s", exc)
+            counts, visitors = await self.daily(client, venue_ids, since)
+        else:
+            rows = response.data or []
+            counts = [row for row in rows if row.get("events") is not None]
+            visitors = [row for row in rows if row.get("sketch")]
+        # Decoding and merging hundreds of 4 KiB sketches is CPU work.
+        return await asyncio.to_thread(_aggregate, counts, visitors)
+
+    async def daily(
+        self, client, venue_ids: list[str], since: date
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """Count rows and visitor rows for `venue_ids` from `since` (inclusive)."""
+        if client is None or not venue_ids:
+            return [], []
+
+        gate = asyncio.Semaphore(_READ_CONCURRENCY)
+
+        async def _read(table: str, columns: str, chunk: list[str]) -> list[dict[str, Any]]:
+            query = client.table(table).select(columns).in_("venue_ref", chunk).gte("day", since.isoformat())
+            async with gate:
+                response = await asyncio.to_thread(query.execute)
+            return list(response.data or [])
+
+        chunks = [venue_ids[start : start + _READ_CHUNK] for start in range(0, len(venue_ids), _READ_CHUNK)]
+        results = await asyncio.gather(
+            *(_read("analytics_venue_daily", "venue_ref,day,event_type,events", chunk) for chunk in chunks),
+            *(_read("analytics_venue_visitors", "venue_ref,day,sketch", chunk) for chunk in chunks),
+        )
+        counts = [row for rows in results[: len(chunks)] for row in rows]
+        visitors = [row for rows in results[len(chunks) :] for row in rows]
+        return counts, visitors
+
+    async def start_periodic_flush(self) -> None:
+        """Start a background task that flushes every _FLUSH_INTERVAL_SECONDS."""
+        if self._flush_task is not None:
+            return
+
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(_FLUSH_INTERVAL_SECONDS)
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Periodic venue rollup flush failed")
+
+        self._flush_task = asyncio.create_task(_loop())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and drain pending rollups."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+venue_rollups = VenueRollups()
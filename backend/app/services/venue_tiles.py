@@ -0,0 +1,133 @@
+"""
+Venue Tiles - slippy-tile cache for the /venues map endpoint.
+Viewport queries covering a handful of tiles are assembled from per-tile
+snapshots of mv_venue_geodata instead of hitting the materialized view with
+an arbitrary bbox, so neighbouring viewports share work and hot areas can be
+pre-warmed ahead of demand.
+"""
+import asyncio
+import json
+import logging
+import math
+from typing import Any
+
+from app.services.cache import redis_client
+
+logger = logging.getLogger("app.venue_tiles")
+
+VENUE_TILE_ZOOM = 14  # ~2.4 km tiles in Thailand
+VENUE_TILE_TTL = 300  # mv_venue_geodata refreshes every 15 minutes
+VENUE_TILE_LIMIT = 500
+MAX_VENUE_TILES = 36  # larger viewports query the view directly
+_FETCH_CONCURRENCY = 8
+
+_fetch_gate: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+Tile = tuple[int, int]
+
+
+def tile_for(lat: float, lng: float, z: int = VENUE_TILE_ZOOM) -> Tile:
+    n = 2**z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bbox(x: int, y: int, z: int = VENUE_TILE_ZOOM) -> tuple[float, float, float, float]:
+    """(minLng, minLat, maxLng, maxLat) of a tile."""
+    n = 2**z
+
+    def _lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi - 2.0 * math.pi * row / n)))
+
+    return x / n * 360.0 - 180.0, _lat(y + 1), (x + 1) / n * 360.0 - 180.0, _lat(y)
+
+
+def tiles_for_bbox(
+    mn_lng: float, mn_lat: float, mx_lng: float, mx_lat: float, max_tiles: int = MAX_VENUE_TILES
+) -> list[Tile] | None:
+    """Tiles covering a bbox, or None when more than `max_tiles` would be needed."""
+    x0, y0 = tile_for(mx_lat, mn_lng)  # north-west corner: smallest x and y
+    x1, y1 = tile_for(mn_lat, mx_lng)
+    # Count from the corners first: a country- or world-sized bbox spans millions of tiles.
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+        return None
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _fetch_slots() -> asyncio.Semaphore:
+    """Tile fetch semaphore for the running loop (created on first use, not at import)."""
+    global _fetch_gate
+    loop = asyncio.get_running_loop()
+    if _fetch_gate is None or _fetch_gate[0] is not loop:
+        _fetch_gate = (loop, asyncio.Semaphore(_FETCH_CONCURRENCY))
+    return _fetch_gate[1]
+
+
+def cache_key(tile: Tile) -> str:
+    return f"venues:tile:{VENUE_TILE_ZOOM}:{tile[0]}:{tile[1]}"
+
+
+def _fetch_rows(sb, tile: Tile) -> list[dict[str, Any]]:
+    mn_lng, mn_lat, mx_lng, mx_lat = tile_bbox(*tile)
+    polygon = (
+        f"SRID=4326;POLYGON(({mn_lng} {mn_lat},{mn_lng} {mx_lat},{mx_lng} {mx_lat},"
+        f"{mx_lng} {mn_lat},{mn_lng} {mn_lat}))"
+    )
+    resp = (
+        sb.table("mv_venue_geodata")
+        .select("*")
+        .filter("location", "ov", polygon)
+        # Crowded tiles keep their most-viewed venues rather than an arbitrary 500.
+        .order("total_views", desc=True)
+        .order("id")
+        .limit(VENUE_TILE_LIMIT)
+        .execute()
+    )
+    return resp.data or []
+
+
+async def refresh_tile(sb, tile: Tile) -> list[dict[str, Any]]:
+    """Query one tile from the materialized view and cache it."""
+    async with _fetch_slots():
+        rows = await asyncio.to_thread(_fetch_rows, sb, tile)
+    redis_conn = redis_client.get_redis()
+    payload = json.dumps(rows, default=str)
+    await asyncio.to_thread(redis_conn.setex, cache_key(tile), VENUE_TILE_TTL, payload)
+    return rows
+
+
+async def warm_tiles(sb, tiles: list[Tile], refresh_within: int) -> int:
+    """Refresh tiles that are uncached or expire within `refresh_within` seconds; returns how many."""
+    redis_conn = redis_client.get_redis()
+    ttls = await asyncio.to_thread(lambda: [redis_conn.ttl(cache_key(tile)) for tile in tiles])
+    # ttl is -2 for a missing key and -1 for a key without expiry
+    stale = [tile for tile, ttl in zip(tiles, ttls, strict=True) if ttl == -2 or 0 <= ttl < refresh_within]
+    results = await asyncio.gather(*(refresh_tile(sb, tile) for tile in stale), return_exceptions=True)
+    for tile, result in zip(stale, results, strict=True):
+        if isinstance(result, Exception):
+            logger.warning("Pre-warming venue tile %s failed: %s", tile, result)
+    return sum(1 for result in results if not isinstance(result, Exception))
+
+
+async def get_tiles(sb, tiles: list[Tile]) -> list[dict[str, Any]]:
+    """Rows of all `tiles`, from cache where possible; duplicates across tiles are removed."""
+    redis_conn = redis_client.get_redis()
+    cached = await asyncio.to_thread(lambda: [redis_conn.get(cache_key(tile)) for tile in tiles])
+    chunks = [json.loads(raw) for raw in cached if raw]
+    missing = [tile for tile, raw in zip(tiles, cached, strict=True) if not raw]
+    if missing:
+        chunks.extend(await asyncio.gather(*(refresh_tile(sb, tile) for tile in missing)))
+
+    seen: set[str] = set()
+    rows = []
+    for chunk in chunks:
+        for row in chunk:
+            row_id = row.get("id")
+            if row_id is not None:
+                if str(row_id) in seen:
+                    continue
+                seen.add(str(row_id))
+            rows.append(row)
+    return rows
@@ -0,0 +1,305 @@
+"""
+Webhook Delivery Engine - concurrent, non-blocking delivery of merchant webhooks.
+Ready deliveries sit in a Redis list; failed ones are rescheduled into a
+ZSET scored by due time and promoted back by a scheduler loop, so a slow or
+failing merchant never holds a worker while it waits. Each target host has
+its own concurrency cap and circuit breaker, kept for the most recently
+used _MAX_TRACKED_HOSTS hosts. Without Redis an in-process queue is used
+(development and tests).
+"""
+import asyncio
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import random
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable, Callable
+from itertools import count
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+import redis.asyncio as aioredis
+
+from app.core.config import get_settings
+from app.core.metrics import (
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_DELIVERY_LATENCY,
+    WEBHOOK_HOST_CIRCUITS,
+    WEBHOOK_QUEUE_DEPTH,
+)
+from app.core.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger("app.webhooks.delivery")
+
+READY_KEY = "webhooks:outbound:queue"
+DELAYED_KEY = "webhooks:outbound:delayed"
+_MAX_TRACKED_HOSTS = 1024
+
+_PROMOTE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+  redis.call('ZREM', KEYS[1], member)
+  redis.call('RPUSH', KEYS[2], member)
+end
+return #due
+"""
+
+
+def generate_signature(secret: str, body: str) -> str:
+    """HMAC-SHA256 signature for security verification by the merchant."""
+    if not secret:
+        return ""
+    return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+class _RedisQueue:
+    def __init__(self, client: aioredis.Redis):
+        self._client = client
+        self._promote = client.register_script(_PROMOTE_DUE)
+
+    async def push(self, raw: str) -> None:
+        await self._client.rpush(READY_KEY, raw)
+
+    async def push_delayed(self, raw: str, due: float) -> None:
+        await self._client.zadd(DELAYED_KEY, {raw: due})
+
+    async def pop(self, timeout: float) -> str | None:
+        item = await self._client.blpop([READY_KEY], timeout=timeout)
+        return item[1] if item else None
+
+    async def promote_due(self, now: float, limit: int) -> int:
+        return int(await self._promote(keys=[DELAYED_KEY, READY_KEY], args=[now, limit]))
+
+    async def depth(self) -> tuple[int, int]:
+        async with self._client.pipeline(transaction=False) as pipe:
+            ready, delayed = await pipe.llen(READY_KEY).zcard(DELAYED_KEY).execute()
+        return int(ready), int(delayed)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class _MemoryQueue:
+    def __init__(self):
+        self._ready: asyncio.Queue[str] = asyncio.Queue()
+        self._delayed: list[tuple[float, int, str]] = []
+        self._seq = count()
+
+    async def push(self, raw: str) -> None:
+        self._ready.put_nowait(raw)
+
+    async def push_delayed(self, raw: str, due: float) -> None:
+        heapq.heappush(self._delayed, (due, next(self._seq), raw))
+
+    async def pop(self, timeout: float) -> str | None:
+        try:
+            return await asyncio.wait_for(self._ready.get(), timeout)
+        except TimeoutError:
+            return None
+
+    async def promote_due(self, now: float, limit: int) -> int:
+        moved = 0
+        while self._delayed and self._delayed[0][0] <= now and moved < limit:
+            self._ready.put_nowait(heapq.heappop(self._delayed)[2])
+            moved += 1
+        return moved
+
+    async def depth(self) -> tuple[int, int]:
+        return self._ready.qsize(), len(self._delayed)
+
+    async def close(self) -> None:
+        return None
+
+
+class _HostState:
+    """Concurrency cap and circuit breaker for one merchant host."""
+
+    def __init__(self, host: str, limit: int):
+        self.slots = asyncio.Semaphore(limit)
+        # Not in the shared registry and not exported per host: merchant hosts
+        # are unbounded, so they stay out of readiness and /metrics labels.
+        self.breaker = CircuitBreaker(
+            f"webhook:{host}", min_calls=3, window_seconds=60, open_seconds=60, export_metrics=False
+        )
+
+
+class WebhookDeliveryEngine:
+    """
+    N async workers pull ready deliveries; retries back off exponentially
+    through the delay queue and exhausted deliveries go to the fallback hook.
+    """
+
+    MAX_RETRIES = 5
+    BASE_DELAY = 30  # seconds; doubles per attempt
+    MAX_DELAY = 3600
+    HOST_BUSY_DELAY = 1.0  # host at its concurrency cap: retry shortly without counting an attempt
+    PROMOTE_BATCH = 500
+
+    def __init__(
+        self,
+        on_exhausted: Callable[[dict, dict], Awaitable[None]],
+        workers: int = 8,
+        per_host_limit: int = 4,
+        timeout: float = 10.0,
+    ):
+        self._on_exhausted = on_exhausted
+        self._worker_count = workers
+        self._per_host_limit = per_host_limit
+        self._http_client = httpx.AsyncClient(timeout=timeout)
+        self._queue: _RedisQueue | _MemoryQueue | None = None
+        self._queue_lock = asyncio.Lock()
+        self._tasks: list[asyncio.Task] = []
+        self._hosts: OrderedDict[str, _HostState] = OrderedDict()
+
+    def _host(self, host: str) -> _HostState:
+        """Per-host state, least recently used first; the oldest is evicted past the cap."""
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(host, self._per_host_limit)
+            if len(self._hosts) > _MAX_TRACKED_HOSTS:
+                self._hosts.popitem(last=False)
+        else:
+            self._hosts.move_to_end(host)
+        return state
+
+    async def _get_queue(self) -> "_RedisQueue | _MemoryQueue":
+        async with self._queue_lock:
+            if self._queue is None:
+                self._queue = await self._connect()
+            return self._queue
+
+    @staticmethod
+    async def _connect() -> "_RedisQueue | _MemoryQueue":
+        url = get_settings().REDIS_URL
+        if url:
+            client = aioredis.from_url(url, decode_responses=True, socket_connect_timeout=5)
+            try:
+                await client.ping()
+                return _RedisQueue(client)
+            except (aioredis.RedisError, OSError) as e:
+                logger.warning(f"Webhook queue: Redis unavailable ({e}), delivering in-process")
+                await client.aclose()
+        return _MemoryQueue()
+
+    async def enqueue(self, task: dict[str, Any]) -> None:
+        queue = await self._get_queue()
+        await queue.push(json.dumps(task))
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self._get_queue()
+        self._tasks = [asyncio.create_task(self._scheduler())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+        logger.info("Started %d webhook delivery workers", self._worker_count)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._hosts.clear()
+        if self._queue is not None:
+            await self._queue.close()
+            self._queue = None
+
+    async def _scheduler(self) -> None:
+        """Promote due retries to the ready list and export queue depth."""
+        queue = await self._get_queue()
+        while True:
+            try:
+                moved = await queue.promote_due(time.time(), self.PROMOTE_BATCH)
+                ready, delayed = await queue.depth()
+                WEBHOOK_QUEUE_DEPTH.labels("ready").set(ready)
+                WEBHOOK_QUEUE_DEPTH.labels("delayed").set(delayed)
+                self._export_host_circuits()
+            except (aioredis.RedisError, OSError) as e:
+                logger.error(f"Webhook scheduler error: {e}")
+                moved = 0
+            await asyncio.sleep(0 if moved >= self.PROMOTE_BATCH else 1)
+
+    async def _worker(self) -> None:
+        queue = await self._get_queue()
+        while True:
+            try:
+                raw = await queue.pop(timeout=1)
+                if raw is not None:
+                    await self.deliver(json.loads(raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in webhook worker: {e}")
+                await asyncio.sleep(1)
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        return self._host(host).breaker
+
+    def _export_host_circuits(self) -> None:
+        states = Counter(state.breaker.state for state in list(self._hosts.values()))
+        for name in (CLOSED, HALF_OPEN, OPEN):
+            WEBHOOK_HOST_CIRCUITS.labels(name).set(states[name])
+
+    async def deliver(self, task: dict[str, Any]) -> str:
+        """Attempt one delivery; returns delivered, deferred, retried or failed."""
+        sub = task["subscription"]
+        msg = task["message"]
+        url = str(sub["target_url"])
+        host = urlsplit(url).hostname or url
+        state = self._host(host)
+        slots = state.slots
+
+        if slots.locked():
+            return await self._defer(task, self.HOST_BUSY_DELAY, "deferred")
+
+        body = json.dumps(msg["payload"])
+        headers = {
+            "Content-Type": "application/json",
+            "X-VibeCity-Event": msg["event_type"],
+            "X-VibeCity-Signature": generate_signature(sub.get("secret") or "", body),
+        }
+        started = time.perf_counter()
+        try:
+            async with slots:
+                with state.breaker.guard():
+                    response = await self._http_client.post(url, content=body, headers=headers)
+                    response.raise_for_status()
+        except CircuitOpenError as e:
+            # The host is known to be down: wait out the breaker without spending an attempt.
+            return await self._defer(task, e.retry_after, "deferred")
+        except httpx.HTTPError as e:
+            WEBHOOK_DELIVERY_LATENCY.labels("error").observe(time.perf_counter() - started)
+            return await self._retry_or_give_up(task, e)
+
+        WEBHOOK_DELIVERY_LATENCY.labels("ok").observe(time.perf_counter() - started)
+        WEBHOOK_DELIVERIES.labels("delivered").inc()
+        logger.info(f"Webhook delivered successfully to {url} [ID: {msg['id']}]")
+        return "delivered"
+
+    async def _defer(self, task: dict[str, Any], delay: float, result: str) -> str:
+        queue = await self._get_queue()
+        await queue.push_delayed(json.dumps(task), time.time() + delay)
+        WEBHOOK_DELIVERIES.labels(result).inc()
+        return result
+
+    async def _retry_or_give_up(self, task: dict[str, Any], error: httpx.HTTPError) -> str:
+        sub = task["subscription"]
+        msg = task["message"]
+        status = error.response.status_code if isinstance(error, httpx.HTTPStatusError) else None
+        permanent = status is not None and 400 <= status < 500 and status not in (408, 429)
+        msg["retry_count"] += 1
+        if not permanent and msg["retry_count"] <= self.MAX_RETRIES:
+            delay = min(self.MAX_DELAY, self.BASE_DELAY * 2 ** (msg["retry_count"] - 1))
+            delay *= random.uniform(0.8, 1.2)  # nosec B311 - jitter, not security
+            logger.warning(
+                f"Webhook delivery failed for {sub['target_url']} (Retry {msg['retry_count']} in {delay:.0f}s): {error}"
+            )
+            return await self._defer(task, delay, "retried")
+
+        logger.error(f"Webhook failed after {msg['retry_count']} attempts for {sub['target_url']}. Falling back.")
+        WEBHOOK_DELIVERIES.labels("failed").inc()
+        await self._on_exhausted(sub, msg)
+        return "failed"
@@ -0,0 +1,138 @@
+"""
+Webhook Subscription Index - in-memory spatial index of merchant webhooks.
+Each subscription condition is registered under the H3 cells covering its
+radius, bucketed by event type and severity threshold, so finding the
+merchants for an incident costs a few dict lookups per bucket instead of a
+scan over every subscription. Large radii use coarser cells to keep the
+number of cells per condition bounded.
+"""
+import math
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+import h3
+
+from app.services.traffic.tiles import haversine_m
+
+if TYPE_CHECKING:
+    from app.services.webhook_service import WebhookSubscription
+
+SEVERITY_LEVELS = ("minor", "moderate", "major", "critical")
+_SEVERITY_RANK = {level: rank for rank, level in enumerate(SEVERITY_LEVELS)}
+
+# (max radius in metres, resolution): radii up to ~4 hex edges per resolution
+_RESOLUTIONS = ((2_000, 8), (5_500, 7), (15_000, 6), (math.inf, 5))
+_EDGE_M = {res: h3.average_hexagon_edge_length(res, unit="m") for _, res in _RESOLUTIONS}
+
+BucketKey = tuple[str, str, int]  # (event_type, severity_threshold, resolution)
+
+
+def resolution_for(radius_m: float) -> int:
+    return next(res for max_radius, res in _RESOLUTIONS if radius_m <= max_radius)
+
+
+def covering_cells(lat: float, lng: float, radius_m: float, res: int) -> list[str]:
+    """Cells whose hexagon may intersect the circle (center within radius + circumradius)."""
+    edge = _EDGE_M[res]
+    center = h3.latlng_to_cell(lat, lng, res)
+    # Real hexagons deviate from the average edge length; pad the circumradius.
+    reach = radius_m + 1.5 * edge
+    k = int(math.ceil(reach / (1.5 * edge)))
+    cells = [cell for cell in h3.grid_disk(center, k) if haversine_m(lat, lng, *h3.cell_to_latlng(cell)) <= reach]
+    return cells or [center]
+
+
+class SubscriptionIndex:
+    def __init__(self):
+        self._subs: dict[str, WebhookSubscription] = {}
+        self._by_merchant: dict[str, set[str]] = defaultdict(set)
+        self._buckets: dict[BucketKey, dict[str, set[str]]] = {}
+        # (sub id, event type, threshold) -> largest radius among its matching conditions
+        self._radius: dict[tuple[str, str, str], float] = {}
+        self._entries: dict[str, list[tuple[BucketKey, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def upsert(self, sub: "WebhookSubscription") -> None:
+        self.remove(sub.id)
+        if not sub.active:
+            return
+        self._subs[sub.id] = sub
+        self._by_merchant[sub.merchant_id].add(sub.id)
+        entries: list[tuple[BucketKey, str]] = []
+        for condition in sub.conditions:
+            radius_key = (sub.id, condition.event_type, condition.severity_threshold)
+            self._radius[radius_key] = max(self._radius.get(radius_key, 0.0), float(condition.radius_m))
+            if sub.lat is None or sub.lng is None:
+                continue
+            res = resolution_for(condition.radius_m)
+            key = (condition.event_type, condition.severity_threshold, res)
+            bucket = self._buckets.setdefault(key, {})
+            for cell in covering_cells(sub.lat, sub.lng, condition.radius_m, res):
+                bucket.setdefault(cell, set()).add(sub.id)
+                entries.append((key, cell))
+        self._entries[sub.id] = entries
+
+    def remove(self, sub_id: str) -> None:
+        sub = self._subs.pop(sub_id, None)
+        if sub is None:
+            return
+        merchant_subs = self._by_merchant.get(sub.merchant_id)
+        if merchant_subs is not None:
+            merchant_subs.discard(sub_id)
+            if not merchant_subs:
+                del self._by_merchant[sub.merchant_id]
+        for key, cell in self._entries.pop(sub_id, []):
+            bucket = self._buckets.get(key)
+            if bucket is None or cell not in bucket:
+                continue
+            bucket[cell].discard(sub_id)
+            if not bucket[cell]:
+                del bucket[cell]
+            if not bucket:
+                del self._buckets[key]
+        for condition in sub.conditions:
+            self._radius.pop((sub_id, condition.event_type, condition.severity_threshold), None)
+
+    def match(
+        self,
+        event_type: str,
+        severity: str,
+        lat: float | None = None,
+        lng: float | None = None,
+        merchant_id: str | None = None,
+    ) -> list["WebhookSubscription"]:
+        """
+        Active subscriptions with a condition for `event_type` whose threshold is at or
+        below `severity` and whose radius reaches the incident. Without a location only
+        the subscriptions of `merchant_id` are considered, regardless of radius.
+        """
+        rank = _SEVERITY_RANK.get(severity, _SEVERITY_RANK["moderate"])
+        thresholds = SEVERITY_LEVELS[: rank + 1]
+
+        if lat is None or lng is None:
+            if merchant_id is None:
+                return []
+            return [
+                self._subs[sub_id]
+                for sub_id in sorted(self._by_merchant.get(merchant_id, ()))
+                if any((sub_id, event_type, threshold) in self._radius for threshold in thresholds)
+            ]
+
+        event_cells = {res: h3.latlng_to_cell(lat, lng, res) for _, res in _RESOLUTIONS}
+        matched: set[str] = set()
+        for threshold in thresholds:
+            for res, cell in event_cells.items():
+                bucket = self._buckets.get((event_type, threshold, res))
+                if not bucket:
+                    continue
+                for sub_id in bucket.get(cell, ()):
+                    if sub_id in matched:
+                        continue
+                    sub = self._subs[sub_id]
+                    if merchant_id is not None and sub.merchant_id != merchant_id:
+                        continue
+                    if haversine_m(lat, lng, sub.lat, sub.lng) <= self._radius[(sub_id, event_type, threshold)]:
+                        matched.add(sub_id)
+        return [self._subs[sub_id] for sub_id in sorted(matched)]
@@ -1,74 +1,142 @@
 """
 Webhook Service - Manages real-time notifications for merchants.
-Handles subscription, queuing, delivery, and retries.
+Handles subscription and queuing; delivery and retries run in the
+WebhookDeliveryEngine (app/services/webhook_delivery.py). Subscriptions live
+in the Supabase webhook_subscriptions table and are mirrored into an
+in-memory spatial index (app/services/webhook_index.py) that is synced
+incrementally by (updated_at, id).
 """
 import asyncio
-import json
 import logging
 import uuid
 from datetime import UTC, datetime
 from typing import Any, Literal
 
-import httpx
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 
-from app.services.cache import redis_client
+from app.core.config import get_settings
+from app.services.webhook_delivery import WebhookDeliveryEngine
+from app.services.webhook_index import SubscriptionIndex
 
 logger = logging.getLogger("app.webhooks")
 
 class WebhookCondition(BaseModel):
     event_type: Literal["traffic_jam", "accident", "road_closure", "special_event"]
     severity_threshold: Literal["minor", "moderate", "major", "critical"] = "moderate"
-    radius_m: int = 2000
+    radius_m: int = Field(2000, gt=0, le=50_000)
 
 class WebhookSubscription(BaseModel):
     id: str
     merchant_id: str
     target_url: HttpUrl
     conditions: list[WebhookCondition]
+    lat: float | None = None
+    lng: float | None = None
     active: bool = True
     secret: str | None = None
 
 class WebhookMessage(BaseModel):
-    id: str = str(uuid.uuid4())
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     event_type: str
     payload: dict[str, Any]
-    timestamp: str = datetime.now(UTC).isoformat()
+    timestamp: str = Field(default_factory=lambda: datetime.now(UTC).isoformat())
     retry_count: int = 0
 
 class WebhookService:
     """
     Service for handling real-time merchant webhooks.
     """
-    
-    QUEUE_KEY = "webhooks:outbound:queue"
-    MAX_RETRIES = 5
-    RETRY_DELAY = 60 # seconds
 
-    def __init__(self):
-        self._http_client = httpx.AsyncClient(timeout=10.0)
-        self._redis = redis_client.get_redis()
+    TABLE = "webhook_subscriptions"
+    SYNC_INTERVAL = 30  # seconds
+    SYNC_PAGE_SIZE = 1000
 
-    async def subscribe(self, merchant_id: str, url: str, conditions: list[dict[str, Any]]) -> WebhookSubscription:
+    def __init__(self):
+        settings = get_settings()
+        self._engine = WebhookDeliveryEngine(
+            on_exhausted=self._handle_fallback,
+            workers=settings.WEBHOOK_DELIVERY_WORKERS,
+            per_host_limit=settings.WEBHOOK_HOST_CONCURRENCY,
+        )
+        self._index = SubscriptionIndex()
+        self._cursor: tuple[str, str] | None = None  # (updated_at, id) of the last row applied to the index
+        self._sync_task: asyncio.Task | None = None
+
+    @staticmethod
+    def _store():
+        from app.core.supabase import supabase, supabase_admin
+
+        return supabase_admin or supabase
+
+    async def subscribe(
+        self,
+        merchant_id: str,
+        url: str,
+        conditions: list[dict[str, Any]],
+        lat: float | None = None,
+        lng: float | None = None,
+    ) -> WebhookSubscription:
         """
         Registers a new webhook subscription for a merchant.
         """
-        # In a real app, this would write to Supabase 'webhook_subscriptions' table.
-        sub_id = str(uuid.uuid4())
-        secret = str(uuid.uuid4())
-        
         subscription = WebhookSubscription(
-            id=sub_id,
+            id=str(uuid.uuid4()),
             merchant_id=merchant_id,
             target_url=url,
             conditions=[WebhookCondition(**c) for c in conditions],
-            secret=secret
+            lat=lat,
+            lng=lng,
+            secret=str(uuid.uuid4()),
         )
-        
-        # Mock DB write
+        row = subscription.model_dump(mode="json")
+        await asyncio.to_thread(lambda: self._store().table(self.TABLE).insert(row).execute())
+        self._index.upsert(subscription)
         logger.info(f"Merchant {merchant_id} subscribed to webhook {url}")
         return subscription
 
+    async def unsubscribe(self, subscription_id: str) -> None:
+        """Deactivates a subscription; rows are kept so incremental syncs see the change."""
+        await asyncio.to_thread(
+            lambda: self._store().table(self.TABLE).update({"active": False}).eq("id", subscription_id).execute()
+        )
+        self._index.remove(subscription_id)
+
+    async def sync_subscriptions(self) -> int:
+        """Applies rows changed since the last sync to the index; returns how many."""
+        def _page(after: tuple[str, str] | None) -> list[dict[str, Any]]:
+            query = self._store().table(self.TABLE).select("*")
+            if after:
+                # Keyset on (updated_at, id): rows sharing a timestamp are split
+                # across pages without being skipped or re-read.
+                updated_at, row_id = after
+                query = query.or_(
+                    f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt."{row_id}")'
+                )
+            return query.order("updated_at").order("id").limit(self.SYNC_PAGE_SIZE).execute().data or []
+
+        applied = 0
+        while True:
+            rows = await asyncio.to_thread(_page, self._cursor)
+            for row in rows:
+                try:
+                    self._index.upsert(WebhookSubscription(**row))
+                except ValueError as e:
+                    logger.warning(f"Skipping invalid webhook subscription {row.get('id')}: {e}")
+                    self._index.remove(str(row.get("id")))
+            applied += len(rows)
+            if rows:
+                self._cursor = (rows[-1]["updated_at"], str(rows[-1]["id"]))
+            if len(rows) < self.SYNC_PAGE_SIZE:
+                return applied
+
+    async def _sync_forever(self):
+        while True:
+            try:
+                await self.sync_subscriptions()
+            except Exception as e:
+                logger.error(f"Webhook subscription sync failed: {e}")
+            await asyncio.sleep(self.SYNC_INTERVAL)
+
     async def dispatch_event(self, event_type: str, payload: dict[str, Any], merchant_id: str | None = None):
         """
         Analyzes traffic events and dispatches webhooks to eligible merchants.
@@ -91,84 +159,38 @@ class WebhookService:
         """
         Filters subscriptions based on location, severity, and event type.
         """
-        # Placeholder for DB query to find matching merchants
-        # Logic: find merchants whose venue location is within 'radius_m' of the incident 'lat/lng'
-        # and match the event_type and severity_threshold.
-        return []
+        lat, lng = payload.get("lat"), payload.get("lng")
+        return self._index.match(
+            event_type,
+            str(payload.get("severity") or "moderate"),
+            float(lat) if lat is not None else None,
+            float(lng) if lng is not None else None,
+            merchant_id,
+        )
 
     async def _enqueue_delivery(self, sub: WebhookSubscription, message: WebhookMessage):
         """
-        Pushes a webhook message to the Redis queue for asynchronous delivery.
+        Pushes a webhook message to the delivery queue for asynchronous delivery.
         """
         delivery_task = {
-            "subscription": sub.model_dump(),
+            "subscription": sub.model_dump(mode="json"),
             "message": message.model_dump(),
             "timestamp": datetime.now(UTC).timestamp()
         }
-        await asyncio.to_thread(
-            lambda: self._redis.rpush(self.QUEUE_KEY, json.dumps(delivery_task))
-        )
+        await self._engine.enqueue(delivery_task)
         logger.debug(f"Queued webhook delivery for {sub.target_url}")
 
-    async def process_delivery_queue(self):
-        """
-        Worker task that pulls from the queue and attempts HTTP delivery.
-        """
-        logger.info("Starting webhook delivery worker...")
-        while True:
-            try:
-                task_raw = await asyncio.to_thread(lambda: self._redis.blpop(self.QUEUE_KEY, timeout=5))
-                if not task_raw:
-                    continue
-                
-                _, task_data = task_raw
-                task = json.loads(task_data)
-                
-                await self._deliver_with_retry(task)
-                
-            except Exception as e:
-                logger.error(f"Error in webhook worker: {e}")
-                await asyncio.sleep(1)
-
-    async def _deliver_with_retry(self, task: dict):
-        """
-        Attempts to deliver a webhook with HTTP POST. 
-        Implements exponential backoff/retry logic.
-        """
-        sub = task["subscription"]
-        msg = task["message"]
-        url = sub["target_url"]
-        
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "X-VibeCity-Event": msg["event_type"],
-                "X-VibeCity-Signature": self._generate_signature(sub["secret"], json.dumps(msg["payload"]))
-            }
-            
-            response = await self._http_client.post(url, json=msg["payload"], headers=headers)
-            response.raise_for_status()
-            
-            logger.info(f"Webhook delivered successfully to {url} [ID: {msg['id']}]")
-            
-        except (httpx.HTTPError, Exception) as e:
-            msg["retry_count"] += 1
-            if msg["retry_count"] <= self.MAX_RETRIES:
-                logger.warning(f"Webhook delivery failed for {url} (Retry {msg['retry_count']}): {e}")
-                # Re-queue with delay (in a real app, use a delayed task system or separate queue)
-                await asyncio.sleep(self.RETRY_DELAY * msg["retry_count"])
-                await asyncio.to_thread(lambda: self._redis.rpush(self.QUEUE_KEY, json.dumps(task)))
-            else:
-                logger.error(f"Webhook failed after {self.MAX_RETRIES} retries for {url}. Falling back.")
-                await self._handle_fallback(sub, msg)
-
-    def _generate_signature(self, secret: str, body: str) -> str:
-        """HMAC-SHA256 signature for security verification by the merchant."""
-        import hashlib
-        import hmac
-        if not secret:
-            return ""
-        return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+    async def start(self):
+        """Starts the subscription sync, the delivery workers and the retry scheduler."""
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_forever())
+        await self._engine.start()
+
+    async def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        await self._engine.stop()
 
     async def _handle_fallback(self, sub: dict, msg: dict):
         """
@@ -7,7 +7,7 @@ Usage:
 
 1. Applies TRIAD contract migrations (supabase/migrations/20260220_*_triad_*.sql)
 2. Applies legacy migrations (supabase/migrations/legacy/) in phase order
-3. Provisions memory_metadata table in NEON_DIRECT_DATABASE_URL
+3. Provisions memory_metadata and traffic history/rollup tables in NEON_DIRECT_DATABASE_URL
 """
 
 import asyncio
@@ -48,6 +48,52 @@ NEON_METADATA_STATEMENTS = [
     """,
     "CREATE INDEX IF NOT EXISTS idx_memory_metadata_user_id ON memory_metadata(user_id)",
     "CREATE INDEX IF NOT EXISTS idx_memory_metadata_created_at ON memory_metadata(created_at DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS traffic_history (
+        way_id text not null,
+        bucket_minute timestamptz not null,
+        name text,
+        lat double precision,
+        lng double precision,
+        speed_kmh real,
+        density text,
+        confidence real,
+        provider text,
+        created_at timestamptz not null default now(),
+        primary key (way_id, bucket_minute)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_traffic_history_bucket ON traffic_history(bucket_minute DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS traffic_rollup (
+        way_id text not null,
+        resolution text not null,
+        bucket_start timestamptz not null,
+        samples integer not null default 0,
+        speed_sum double precision not null default 0,
+        speed_min real,
+        speed_max real,
+        primary key (way_id, resolution, bucket_start)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_traffic_rollup_bucket ON traffic_rollup(resolution, bucket_start DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS traffic_speed_profile (
+        way_id text not null,
+        hour_of_week smallint not null,
+        cell text,
+        name text,
+        lat double precision,
+        lng double precision,
+        free_flow_kmh real,
+        samples bigint not null default 0,
+        speed_sum double precision not null default 0,
+        speed_sq_sum double precision not null default 0,
+        updated_at timestamptz not null default now(),
+        primary key (way_id, hour_of_week)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_traffic_speed_profile_cell ON traffic_speed_profile(cell, hour_of_week)",
 ]
 
 
@@ -8,6 +8,7 @@ import time
 from datetime import UTC, datetime
 from typing import Any
 
+import h3
 import redis
 from dotenv import load_dotenv
 
@@ -91,6 +92,7 @@ class Config:
     # Prewarm tiles (optional worker mode)
     PREWARM_TOPK = int(os.getenv("PREWARM_TOPK", "2000"))
     PREWARM_ACTIVITY_BOOST = float(os.getenv("PREWARM_ACTIVITY_BOOST", "10.0"))
+    PREWARM_BATCH = int(os.getenv("PREWARM_BATCH", "500"))  # tiles per Redis pipeline
     # scheduler keys (same as sync)
     Z_TILES_NEXT_RUN = "osm:tiles:next_run"
     Z_TILES_ACTIVITY = "osm:tiles:activity"
@@ -431,10 +433,12 @@ class HeatmapInvalidateConsumer(BaseConsumer):
 # =========================
 class PrewarmTilesWorker:
     """
-    Reads top user density h3 cells and:
+    Reads top user density h3 cells, converts them to OSM sync tiles and:
       - bump osm:tiles:activity
       - set osm:tiles:next_run = now
-    This makes sync loop prioritize tiles where users are active.
+    This makes sync loop prioritize tiles where users are active, so nearby
+    places stay covered there. Traffic and /venues caches for the same cells
+    are pre-warmed by the API (app/services/prewarm_service.py).
     """
     def __init__(self, r: redis.Redis):
         self.r = r
@@ -450,27 +454,38 @@ class PrewarmTilesWorker:
 
     def tick(self):
         dens = self.r.zrevrange(Config.USER_HEX_DENSITY_ZSET, 0, Config.PREWARM_TOPK - 1, withscores=True)
-        if not dens:
+        tiles = cells_to_tiles(dens, Config.TILE_Z)
+
+        # Apps that already track tile density directly still take part.
+        for tid, score in self.r.zrevrange("user:tile:density", 0, 5000, withscores=True):
+            tiles[tid] = tiles.get(tid, 0.0) + float(score)
+        if not tiles:
             return
 
-        # Convert h3 -> tile using h3_to_geo then your slippy math.
-        # To avoid bringing in h3 + heavy math here, we use a shortcut:
-        # we require the app to also write "user:tile:density" if you want perfect.
-        # BUT we still can infer tile from stored mapping venue:tile etc.
-        #
-        # Enterprise approach: maintain a second ZSET "user:tile:density".
-        # If exists -> use it. else -> do nothing.
-        if self.r.exists("user:tile:density"):
-            td = self.r.zrevrange("user:tile:density", 0, 5000, withscores=True)
+        now = time.time()
+        items = sorted(tiles.items(), key=lambda item: item[1], reverse=True)
+        for start in range(0, len(items), Config.PREWARM_BATCH):
             pipe = self.r.pipeline()
-            for tid, score in td:
-                pipe.zincrby(Config.Z_TILES_ACTIVITY, float(score) * Config.PREWARM_ACTIVITY_BOOST, tid)
-                pipe.zadd(Config.Z_TILES_NEXT_RUN, {tid: time.time()})
+            for tid, score in items[start : start + Config.PREWARM_BATCH]:
+                pipe.zincrby(Config.Z_TILES_ACTIVITY, score * Config.PREWARM_ACTIVITY_BOOST, tid)
+                pipe.zadd(Config.Z_TILES_NEXT_RUN, {tid: now})
             pipe.execute()
-            logger.info(f"🧲 prewarm from user:tile:density tiles={len(td)}")
-        else:
-            # safe no-op
-            return
+        logger.info(f"🧲 prewarm h3_cells={len(dens)} tiles={len(tiles)}")
+
+
+def cells_to_tiles(cells: list[tuple[str, float]], z: int) -> dict[str, float]:
+    """Sum h3 cell density per z/x/y slippy tile (cell centers decide the tile)."""
+    tiles: dict[str, float] = {}
+    n = 2 ** z
+    for cell, score in cells:
+        if not h3.is_valid_cell(cell):
+            continue
+        lat, lon = h3.cell_to_latlng(cell)
+        x = min(n - 1, int((lon + 180.0) / 360.0 * n))
+        y = min(n - 1, int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n))
+        tid = f"{z}/{x}/{y}"
+        tiles[tid] = tiles.get(tid, 0.0) + float(score)
+    return tiles
 
 
 # =========================
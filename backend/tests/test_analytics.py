@@ -1,8 +1,12 @@
+import asyncio
 from types import SimpleNamespace
 from unittest.mock import AsyncMock
 
+import pytest
+
 import app.api.routers.analytics as analytics
 from app.main import app
+from app.services.dashboard_stats import DashboardStats
 
 
 class _FakeQuery:
@@ -78,6 +82,7 @@ def test_dashboard_stats_use_canonical_venues(client, monkeypatch):
         }
     )
     monkeypatch.setattr(analytics, "supabase", fake)
+    monkeypatch.setattr(analytics, "dashboard_stats", DashboardStats())
     app.dependency_overrides[analytics.verify_admin] = lambda: SimpleNamespace(id="admin-1")
 
     response = client.get("/api/v1/analytics/dashboard/stats")
@@ -94,6 +99,26 @@ def test_dashboard_stats_use_canonical_venues(client, monkeypatch):
     assert "shops" not in fake.tables
 
 
+def test_dashboard_stats_are_cached_until_fresh_is_requested(client, monkeypatch):
+    fake = _FakeSupabase({"user_profiles": 10, "venues": 7, "reviews": 3})
+    monkeypatch.setattr(analytics, "supabase", fake)
+    monkeypatch.setattr(analytics, "dashboard_stats", DashboardStats())
+    app.dependency_overrides[analytics.verify_admin] = lambda: SimpleNamespace(id="admin-1")
+
+    first = client.get("/api/v1/analytics/dashboard/stats").json()
+    queried = len(fake.tables)
+    fake.counts["user_profiles"] = 11
+
+    cached = client.get("/api/v1/analytics/dashboard/stats").json()
+    assert cached["stats"]["total_users"] == 10
+    assert cached["generated_at"] == first["generated_at"]
+    assert len(fake.tables) == queried
+
+    fresh = client.get("/api/v1/analytics/dashboard/stats", params={"fresh": 1}).json()
+    assert fresh["stats"]["total_users"] == 11
+    assert len(fake.tables) == 2 * queried
+
+
 def test_log_event_prefers_authenticated_user_id(client, monkeypatch):
     log_mock = AsyncMock(return_value=None)
     monkeypatch.setattr(analytics.analytics_buffer, "log", log_mock)
@@ -114,4 +139,76 @@ def test_log_event_prefers_authenticated_user_id(client, monkeypatch):
         "checkout_start",
         {"sku": "verified"},
         "user-777",
+        None,
+        None,
     )
+
+
+def test_batch_accepts_json_arrays_and_ndjson_beacons(client, monkeypatch):
+    logged = []
+
+    async def log_many(events):
+        logged.append(events)
+        return len(events)
+
+    monkeypatch.setattr(analytics.analytics_buffer, "log_many", log_many)
+    sheets = AsyncMock(return_value=True)
+    monkeypatch.setattr(analytics.sheets_logger, "log_event", sheets)
+
+    response = client.post(
+        "/api/v1/analytics/batch",
+        json=[
+            {"event_type": "map_view", "data": {"zoom": 14}},
+            {"event_type": "pin_impression", "data": {"venue_id": 7}, "user_id": "visitor-1"},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "accepted": 2, "received": 2}
+
+    beacon = '{"event_type": "map_view"}\n\n{"event_type": "venue_click", "data": {"venue_id": 3}}\n'
+    response = client.post("/api/v1/analytics/batch", content=beacon, headers={"Content-Type": "text/plain"})
+    assert response.status_code == 200
+
+    assert logged == [
+        [("map_view", {"zoom": 14}, None, None, None), ("pin_impression", {"venue_id": 7}, "visitor-1", None, None)],
+        [("map_view", {}, None, None, None), ("venue_click", {"venue_id": 3}, None, None, None)],
+    ]
+    sheets.assert_not_called()  # no per-event Sheets POSTs for a batch
+
+
+def test_batch_rejects_invalid_and_oversized_bodies(client, monkeypatch):
+    monkeypatch.setattr(analytics.analytics_buffer, "log_many", AsyncMock(return_value=0))
+
+    invalid = client.post("/api/v1/analytics/batch", content='{"data": {}}\n', headers={"Content-Type": "text/plain"})
+    assert invalid.status_code == 422
+
+    too_many = [{"event_type": "map_view"}] * (analytics.MAX_BATCH_EVENTS + 1)
+    assert client.post("/api/v1/analytics/batch", json=too_many).status_code == 413
+
+
+def test_batch_caps_the_body_before_buffering_it(client, monkeypatch):
+    log_many = AsyncMock(return_value=0)
+    monkeypatch.setattr(analytics.analytics_buffer, "log_many", log_many)
+    oversized = b"x" * (analytics.MAX_BATCH_BYTES + 1)
+
+    declared = client.post("/api/v1/analytics/batch", content=oversized)
+    assert declared.status_code == 413
+
+    def chunks():  # no Content-Length: sent chunked
+        for start in range(0, len(oversized), 64 * 1024):
+            yield oversized[start : start + 64 * 1024]
+
+    streamed = client.post("/api/v1/analytics/batch", content=chunks())
+    assert streamed.status_code == 413
+    log_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_dashboard_refreshes_share_one_set_of_queries():
+    fake = _FakeSupabase({"user_profiles": 10})
+    stats = DashboardStats()
+
+    results = await asyncio.gather(*(stats.get(fake, fresh=True) for _ in range(5)))
+
+    assert len(fake.tables) == 5  # one round of the five dashboard queries
+    assert {generated_at for _, generated_at in results} == {results[0][1]}
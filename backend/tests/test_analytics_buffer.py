@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+
+from app.services import analytics_service
+from app.services.analytics_service import AnalyticsBuffer, IngestionPolicy
+from app.services.venue_rollups import VenueRollups
+
+
+@pytest.fixture()
+def store(monkeypatch):
+    state = {"rows": [], "down": False, "gate": None}
+
+    async def insert(events):
+        if state["gate"] is not None:
+            await state["gate"].wait()
+        if state["down"]:
+            raise OSError("supabase unavailable")
+        state["rows"].extend(events)
+        return True
+
+    monkeypatch.setattr(AnalyticsBuffer, "_insert", staticmethod(insert))
+    return state
+
+
+@pytest.mark.asyncio
+async def test_log_does_not_wait_for_a_running_flush(store, tmp_path):
+    buffer = AnalyticsBuffer(flush_threshold=2, spill_path=tmp_path / "spill.ndjson")
+    store["gate"] = asyncio.Event()
+
+    await buffer.log("venue_click", {"venue_id": 1})
+    await buffer.log("venue_click", {"venue_id": 2})  # schedules a flush that blocks on the gate
+    await asyncio.sleep(0)
+    await asyncio.wait_for(buffer.log("venue_click", {"venue_id": 3}), timeout=0.1)
+    assert len(buffer) == 1  # the first two were swapped out to the flushing batch
+
+    store["gate"].set()
+    await buffer.flush()
+    assert [row["data"]["venue_id"] for row in store["rows"]] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_capped(store, monkeypatch):
+    monkeypatch.setattr(analytics_service.random, "random", lambda: 0.99)
+    buffer = AnalyticsBuffer(flush_threshold=10_000, max_buffered=100)
+    for i in range(200):
+        await buffer.log("pin_impression", {"i": i})
+    # Events are shed past 75% of the cap and never exceed it.
+    assert 75 <= len(buffer) < 100
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_spill_to_disk_and_replay_after_recovery(store, tmp_path):
+    spill = tmp_path / "spill.ndjson"
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=spill)
+    store["down"] = True
+    for i in range(3):
+        await buffer.log("venue_view", {"i": i})
+    assert await buffer.flush() == 0
+    assert len(buffer) == 0
+    assert len(spill.read_text().splitlines()) == 3
+
+    store["down"] = False
+    await buffer.log("venue_view", {"i": 3})
+    assert await buffer.flush() == 4
+    assert sorted(row["data"]["i"] for row in store["rows"]) == [0, 1, 2, 3]
+    assert not spill.exists()
+
+
+@pytest.mark.asyncio
+async def test_replay_skips_while_another_worker_holds_the_spill(store, tmp_path):
+    spill = tmp_path / "spill.ndjson"
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=spill)
+    store["down"] = True
+    await buffer.log("venue_view", {"i": 0})
+    await buffer.flush()
+    store["down"] = False
+
+    with analytics_service._spill_lock(spill):  # e.g. another worker mid-replay
+        assert await buffer.flush() == 0
+        assert len(spill.read_text().splitlines()) == 1
+    assert await buffer.flush() == 1
+    assert not spill.exists()
+
+
+@pytest.mark.asyncio
+async def test_replay_releases_the_spill_lock_before_inserting(store, tmp_path, monkeypatch):
+    spill = tmp_path / "spill.ndjson"
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=spill)
+    store["down"] = True
+    await buffer.log("venue_view", {"i": 0})
+    await buffer.flush()
+
+    lock_free = []
+
+    async def insert(events):
+        with analytics_service._spill_lock(spill, blocking=False) as locked:
+            lock_free.append(locked)
+        store["rows"].extend(events)
+        return True
+
+    monkeypatch.setattr(AnalyticsBuffer, "_insert", staticmethod(insert))
+    assert await buffer.flush() == 1
+    assert lock_free == [True]
+
+
+@pytest.mark.asyncio
+async def test_events_dropped_without_supabase_are_not_counted_as_written(tmp_path, monkeypatch):
+    from app.core import supabase as supabase_module
+
+    monkeypatch.setattr(supabase_module, "supabase", None)
+    spill = tmp_path / "spill.ndjson"
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=spill)
+    await buffer.log("venue_view", {"venue_id": "v1"})
+
+    assert await buffer.flush() == 0
+    assert not spill.exists()
+
+
+@pytest.mark.asyncio
+async def test_partial_replay_keeps_the_unreplayed_tail(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_service, "_WRITE_CHUNK", 2)
+    spill = tmp_path / "spill.ndjson"
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=spill)
+    store["down"] = True
+    for i in range(5):
+        await buffer.log("venue_view", {"i": i})
+    await buffer.flush()
+
+    calls = 0
+
+    async def flaky(events):
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            raise OSError("down again")
+        store["rows"].extend(events)
+        return True
+
+    monkeypatch.setattr(AnalyticsBuffer, "_insert", staticmethod(flaky))
+    assert await buffer.flush() == 2
+    assert [line.count('"i"') for line in spill.read_text().splitlines()] == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_sampled_types_keep_a_weighted_share(store, tmp_path, monkeypatch):
+    draws = iter([0.05, 0.5, 0.95, 0.15])
+    monkeypatch.setattr(analytics_service.random, "random", lambda: next(draws))
+    policy = IngestionPolicy(sample_rates={"map_pan": 0.2})
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=tmp_path / "spill.ndjson", policy=policy)
+
+    assert await buffer.log_many([("map_pan", {}, None, None, None)] * 4 + [("venue_click", {"venue_id": "v-1"}, None, None, None)]) == 5
+    await buffer.flush()
+
+    assert [(row["event_type"], row["sample_weight"]) for row in store["rows"]] == [
+        ("map_pan", 5.0),
+        ("map_pan", 5.0),
+        ("venue_click", 1.0),
+    ]
+    assert store["rows"][2]["venue_ref"] == "v-1" and "venue_id" not in store["rows"][2]
+
+
+@pytest.mark.asyncio
+async def test_counter_types_are_pre_aggregated_per_venue_and_minute(store, tmp_path, monkeypatch):
+    rollups = VenueRollups()
+    monkeypatch.setattr(analytics_service, "venue_rollups", rollups)
+    venue = "6f1c1f4e-8f0c-4a53-9b76-0b6b4f1f2a10"
+    policy = IngestionPolicy(counter_types=frozenset({"pin_impression"}))
+    buffer = AnalyticsBuffer(flush_threshold=10_000, spill_path=tmp_path / "spill.ndjson", policy=policy)
+
+    await buffer.log_many([("pin_impression", {"venue_id": venue}, f"u{i}", None, None) for i in range(40)])
+    await buffer.log_many([("pin_impression", {"venue_id": "osm-42"}, None, None, None)] * 3)
+    await buffer.log("pin_impression", {}, None)  # no venue: stored as a plain event
+    assert len(buffer) == 3
+
+    await buffer.flush()
+    rows = {(row.get("venue_ref"), row["sample_weight"]) for row in store["rows"]}
+    assert rows == {(venue, 40.0), ("osm-42", 3.0), (None, 1.0)}
+    assert next(row for row in store["rows"] if row.get("venue_ref") == venue)["venue_id"] == venue
+    # The aggregated rows carry no visitor; the 40 visitors were sketched before aggregation.
+    assert {key[0]: sketch.count() for key, sketch in rollups._visitors.items()} == {venue: 40}
+    assert rollups._counts == {}
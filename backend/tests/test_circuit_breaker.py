@@ -0,0 +1,129 @@
+import httpx
+import pytest
+
+from app.api.routers import proxy
+from app.core import resilience
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+def _fail(breaker: CircuitBreaker, exc: Exception | None = None) -> None:
+    with pytest.raises(type(exc) if exc else RuntimeError), breaker.guard():
+        raise exc or RuntimeError("upstream down")
+
+
+def test_opens_on_failure_rate_then_rejects(clock):
+    breaker = CircuitBreaker("test_rate", failure_rate=0.5, min_calls=4, open_seconds=10)
+    with breaker.guard():
+        pass
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.state == resilience.CLOSED  # 3 calls < min_calls
+    _fail(breaker)
+
+    assert breaker.state == resilience.OPEN
+    with pytest.raises(CircuitOpenError) as excinfo, breaker.guard():
+        pass
+    assert excinfo.value.retry_after == pytest.approx(10)
+
+
+def test_failures_outside_window_are_forgotten(clock):
+    breaker = CircuitBreaker("test_window", min_calls=2, window_seconds=30)
+    _fail(breaker)
+    clock.now += 31
+    _fail(breaker)
+    assert breaker.state == resilience.CLOSED
+
+
+def test_half_open_admits_limited_probes(clock):
+    breaker = CircuitBreaker("test_probe", min_calls=1, open_seconds=5, half_open_max_calls=1)
+    _fail(breaker)
+    clock.now += 5
+    assert breaker.state == resilience.HALF_OPEN
+
+    breaker.before_call()  # first probe in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+
+    clock.now += 5
+    with breaker.guard():
+        pass
+    assert breaker.state == resilience.CLOSED
+
+
+def test_client_errors_do_not_trip_breaker(clock):
+    breaker = CircuitBreaker("test_4xx", min_calls=1)
+    request = httpx.Request("GET", "https://example.test")
+    not_found = httpx.HTTPStatusError(
+        "not found", request=request, response=httpx.Response(404, request=request)
+    )
+    _fail(breaker, not_found)
+    assert breaker.state == resilience.CLOSED
+
+    throttled = httpx.HTTPStatusError(
+        "slow down", request=request, response=httpx.Response(429, request=request)
+    )
+    _fail(breaker, throttled)
+    assert breaker.state == resilience.OPEN
+
+
+def test_mapbox_proxy_passes_upstream_5xx_through(client, monkeypatch):
+    breaker = CircuitBreaker("test_mapbox", min_calls=1)
+    upstream = httpx.MockTransport(lambda request: httpx.Response(503, json={"message": "Service Unavailable"}))
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(proxy, "_mapbox_breaker", breaker)
+    monkeypatch.setattr(proxy.httpx, "AsyncClient", lambda **kwargs: real_client(transport=upstream, **kwargs))
+
+    params = {"start_lat": 13.74, "start_lng": 100.53, "end_lat": 13.75, "end_lng": 100.54, "token": "pk.test"}
+    response = client.get(f"{settings.API_V1_STR}/proxy/mapbox-directions", params=params)
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Service Unavailable"
+    assert breaker.state == resilience.OPEN
+
+
+@pytest.mark.asyncio
+async def test_call_with_fallback_serves_fallback_when_open(clock):
+    breaker = CircuitBreaker("test_fallback", min_calls=1)
+    breaker.record_failure()
+
+    async def upstream():
+        raise AssertionError("should not be called while open")
+
+    async def fallback(exc):
+        return f"fallback:{type(exc).__name__}"
+
+    assert await breaker.call_with_fallback(upstream, fallback) == "fallback:CircuitOpenError"
+
+
+def test_breaker_states_exported_to_readiness_and_metrics(client):
+    breaker = resilience.get_breaker("test_exported", min_calls=1)
+    breaker.record_failure()
+    original = settings.METRICS_AUTH_TOKEN
+    settings.METRICS_AUTH_TOKEN = ""
+    try:
+        checks = client.get("/health/readiness").json()["checks"]
+        assert checks["circuit:test_exported"] == "open"
+        assert "circuit:supabase" not in checks  # the probe is not breaker-guarded
+        metrics = client.get("/metrics").text
+        assert 'circuit_breaker_state{name="test_exported"} 2.0' in metrics
+    finally:
+        settings.METRICS_AUTH_TOKEN = original
+        breaker.reset()
@@ -0,0 +1,133 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import load_workbook
+
+import app.core.supabase as supabase_module
+import app.services.export_service as export_module
+from app.services.export_service import ExportService, iter_file, prefetch
+
+
+class FakeTable:
+    def __init__(self, rows, calls):
+        self.rows = rows
+        self.calls = calls
+        self.filters = []
+        self.n = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r[column] >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r[column] <= value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r[column] > value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        rows = sorted((r for r in self.rows if all(f(r) for f in self.filters)), key=lambda r: r["id"])
+        self.calls.append(len(rows[: self.n]))
+        return SimpleNamespace(data=rows[: self.n])
+
+
+@pytest.fixture()
+def store(monkeypatch):
+    venues = [{"id": f"v{i}", "owner_visitor_id": "owner-1", "name": f"Venue {i}", "created_at": "2026-10-01"} for i in range(3)]
+    events = [
+        {"id": i, "venue_id": f"v{i % 3}", "event_type": "venue_view", "data": {"i": i}, "created_at": f"2026-10-{1 + i % 28:02d}"}
+        for i in range(25)
+    ]
+    calls = []
+    tables = {"venues": venues, "analytics_events": events}
+    client = SimpleNamespace(table=lambda name: FakeTable(tables[name], calls))
+    monkeypatch.setattr(supabase_module, "supabase_admin", client)
+    monkeypatch.setattr(export_module, "PAGE_SIZE", 10)
+    return calls
+
+
+async def _collect(pages):
+    return [rows async for rows in pages]
+
+
+@pytest.mark.asyncio
+async def test_merchant_rows_are_read_in_keyset_pages(store):
+    pages = await _collect(ExportService().iter_merchant_pages("owner-1", "insights", None, None))
+    assert [len(rows) for rows in pages] == [10, 10, 5]
+    assert [row["id"] for rows in pages for row in rows] == list(range(25))
+
+    since = await _collect(ExportService().iter_merchant_pages("owner-1", "insights", "2026-10-20", None))
+    assert sorted(row["id"] for rows in since for row in rows) == [19, 20, 21, 22, 23, 24]
+    assert await _collect(ExportService().iter_merchant_pages("nobody", "insights", None, None)) == []
+
+
+@pytest.mark.asyncio
+async def test_csv_is_streamed_page_by_page(store):
+    service = ExportService()
+    pages = await prefetch(service.iter_merchant_pages("owner-1", "insights", None, None))
+    assert store == [3, 10]  # venue lookup and the first page, before any output
+
+    chunks = [chunk async for chunk in service.generate_csv(pages)]
+    assert len(chunks) == 3
+    lines = "".join(chunks).splitlines()
+    assert lines[0] == "id,venue_id,event_type,data,created_at"
+    assert len(lines) == 26
+
+    empty = [chunk async for chunk in service.generate_csv(await prefetch(service.iter_merchant_pages("nobody", "venues", None, None)))]
+    assert empty == ["\r\n"]
+
+
+@pytest.mark.asyncio
+async def test_excel_is_written_in_write_only_mode(store):
+    service = ExportService()
+    pages = await prefetch(service.iter_merchant_pages("owner-1", "insights", None, None))
+    data = b"".join(iter_file(await service.generate_excel(pages, sheet_name="Insights")))
+
+    sheet = load_workbook(io.BytesIO(data))["Insights"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == ("id", "venue_id", "event_type", "data", "created_at")
+    assert len(rows) == 26
+    assert rows[1][3] == '{"i": 0}'
+
+
+@pytest.mark.asyncio
+async def test_pdf_stops_reading_at_the_row_cap(store, monkeypatch):
+    monkeypatch.setattr(export_module, "PDF_MAX_ROWS", 12)
+    service = ExportService()
+    pages = await prefetch(service.iter_merchant_pages("owner-1", "insights", None, None))
+    data = b"".join(iter_file(await service.generate_pdf(pages, title="Merchant Insights Report")))
+
+    assert data.startswith(b"%PDF")
+    assert store == [3, 10, 10]  # the last page was never fetched
+
+
+def test_export_endpoint_streams_csv(client, store, monkeypatch):
+    import app.api.routers.export as export_router
+
+    monkeypatch.setattr(export_router, "require_valid_visitor", lambda visitor_id, token: visitor_id)
+    response = client.get("/api/v1/export/merchant", params={"visitor_id": "owner-1", "report_type": "venues"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[1:] == ["v0,owner-1,Venue 0,2026-10-01", "v1,owner-1,Venue 1,2026-10-01", "v2,owner-1,Venue 2,2026-10-01"]
@@ -0,0 +1,38 @@
+import pytest
+
+from app.services.hll import REGISTERS, HyperLogLog, union
+from app.services.venue_rollups import visitor_hash
+
+
+def _sketch(ids):
+    sketch = HyperLogLog()
+    for i in ids:
+        sketch.add(visitor_hash(f"visitor-{i}"))
+    return sketch
+
+
+def test_small_counts_are_near_exact():
+    assert HyperLogLog().count() == 0
+    assert abs(_sketch(range(100)).count() - 100) <= 1
+    assert _sketch([1, 1, 1, 2]).count() == 2
+
+
+@pytest.mark.parametrize("n", [10_000, 200_000])
+def test_large_counts_stay_within_two_percent(n):
+    assert abs(_sketch(range(n)).count() - n) / n < 0.02
+
+
+def test_union_matches_a_sketch_of_the_combined_ids():
+    days = [_sketch(range(start, start + 5_000)) for start in (0, 2_500, 5_000)]
+    combined = union(days)
+    assert combined.count() == _sketch(range(10_000)).count()
+    assert (combined.registers == _sketch(range(10_000)).registers).all()
+
+
+def test_hex_round_trip_and_rejects_foreign_sizes():
+    sketch = _sketch(range(50))
+    restored = HyperLogLog.from_hex(sketch.to_hex())
+    assert restored.count() == 50 and len(restored.registers) == REGISTERS
+    assert HyperLogLog.from_hex(None).count() == 0
+    with pytest.raises(ValueError):
+        HyperLogLog.from_hex("\\x00ff")
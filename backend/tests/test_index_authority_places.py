@@ -0,0 +1,227 @@
+import json
+
+import pytest
+
+from app.services.vector import index_authority_places as indexer
+
+ROWS = [
+    {
+        "authority_id": f"a{i}",
+        "name": f"Place {i}",
+        "lat": 13.7 + i / 100,
+        "lng": 100.5,
+        "province": "กรุงเทพมหานคร",
+        "category": "museum",
+        "district": None,
+        "address": None,
+        "status": None,
+        "source": "tat",
+        "source_ref": None,
+        "updated_at": "",
+    }
+    for i in range(1, 6)
+]
+
+
+class FakeRecord:
+    def __init__(self, point_id, payload):
+        self.id = point_id
+        self.payload = payload
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.points: dict[str, dict] = {}
+        self.payload_updates = 0
+
+    def retrieve(self, collection_name, ids, with_payload, with_vectors):
+        return [FakeRecord(i, self.points[i]) for i in ids if i in self.points]
+
+    def batch_update_points(self, collection_name, update_operations):
+        for op in update_operations:
+            for point_id in op.set_payload.points:
+                self.points[point_id].update(op.set_payload.payload)
+                self.payload_updates += 1
+
+
+@pytest.fixture()
+def pipeline(monkeypatch):
+    qdrant = FakeQdrant()
+    state = {"rows": [dict(r) for r in ROWS], "embed_calls": 0}
+
+    async def fake_get_vector_client():
+        yield qdrant
+
+    async def fake_get_core_db():
+        yield object()
+
+    async def fake_iter_row_batches(_db, after, batch_size):
+        rows = [r for r in state["rows"] if r["authority_id"] > after]
+        for i in range(0, len(rows), batch_size):
+            yield rows[i : i + batch_size]
+
+    async def fake_embed_texts(texts):
+        state["embed_calls"] += 1
+        return [[0.1, 0.2] for _ in texts]
+
+    async def fake_upsert_points(_client, points, **_kwargs):
+        for point in points:
+            qdrant.points[point.id] = dict(point.payload)
+
+    async def noop_ensure(_client):
+        return None
+
+    monkeypatch.setattr(indexer, "get_vector_client", fake_get_vector_client)
+    monkeypatch.setattr(indexer, "get_core_db", fake_get_core_db)
+    monkeypatch.setattr(indexer, "iter_row_batches", fake_iter_row_batches)
+    monkeypatch.setattr(indexer, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(indexer, "upsert_points", fake_upsert_points)
+    monkeypatch.setattr(indexer, "ensure_collection_once", noop_ensure)
+    return qdrant, state
+
+
+@pytest.mark.asyncio
+async def test_full_run_batches_embeddings_and_clears_checkpoint(pipeline, tmp_path):
+    qdrant, state = pipeline
+    checkpoint = tmp_path / "ckpt.json"
+
+    stats = await indexer.run(batch_size=2, checkpoint_path=checkpoint)
+
+    assert state["embed_calls"] == 3
+    assert len(qdrant.points) == 5
+    assert stats["embedded"] == 5
+    assert not checkpoint.exists()
+
+
+@pytest.mark.asyncio
+async def test_unchanged_rows_skip_embedding(pipeline, tmp_path):
+    qdrant, state = pipeline
+    await indexer.run(batch_size=2, checkpoint_path=tmp_path / "ckpt.json")
+    state["embed_calls"] = 0
+    state["rows"][0]["lat"] = 14.0  # payload-only change
+
+    stats = await indexer.run(batch_size=2, checkpoint_path=tmp_path / "ckpt.json")
+
+    assert state["embed_calls"] == 0
+    assert stats["skipped"] == 4
+    assert stats["payload_only"] == 1
+    assert qdrant.points["auth-a1"]["lat"] == 14.0
+
+
+@pytest.mark.asyncio
+async def test_resumes_after_checkpoint(pipeline, tmp_path):
+    qdrant, _ = pipeline
+    checkpoint = tmp_path / "ckpt.json"
+    checkpoint.write_text(json.dumps({"after": "a3", "stats": {}}), encoding="utf-8")
+
+    stats = await indexer.run(batch_size=2, checkpoint_path=checkpoint)
+
+    assert stats["read"] == 2
+    assert sorted(qdrant.points) == ["auth-a4", "auth-a5"]
+
+
+@pytest.mark.asyncio
+async def test_rate_controller_halves_on_throttle():
+    controller = indexer.EmbeddingRateController(max_concurrency=8, increase_after=2)
+    assert controller.limit == 4
+    await controller.acquire()
+    await controller.release(throttled=True)
+    assert controller.limit == 2
+    for _ in range(2):
+        await controller.acquire()
+        await controller.release()
+    assert controller.limit == 3
+
+
+def test_ordered_committer_waits_for_contiguous_prefix(tmp_path):
+    checkpoint = indexer.Checkpoint(path=tmp_path / "ckpt.json")
+    committer = indexer._OrderedCommitter(checkpoint)
+    committer.done(1, "a4")
+    assert checkpoint.after == ""
+    committer.done(0, "a2")
+    assert checkpoint.after == "a4"
+
+
+@pytest.mark.asyncio
+async def test_blue_green_fills_new_collection_then_switches_alias(pipeline, tmp_path, monkeypatch):
+    qdrant, _ = pipeline
+    events: list[str] = []
+    upsert_targets: set[str] = set()
+
+    async def fake_create_next_version(_client, schema):
+        events.append("create")
+        return f"{schema.alias}_v2"
+
+    async def fake_switch_alias(_client, schema, target):
+        events.append(f"switch:{target}")
+        return f"{schema.alias}_v1"
+
+    async def fake_upsert_points(_client, points, collection_name):
+        upsert_targets.add(collection_name)
+        for point in points:
+            qdrant.points[point.id] = dict(point.payload)
+
+    async def fake_resolve_alias(_client, alias):
+        return f"{alias}_v1"
+
+    async def fake_copy_venue_points(_client, source, target, only_missing=False):
+        events.append(f"copy:{source}->{target}{':missing' if only_missing else ''}")
+        return 0
+
+    monkeypatch.setattr(indexer, "create_next_version", fake_create_next_version)
+    monkeypatch.setattr(indexer, "switch_alias", fake_switch_alias)
+    monkeypatch.setattr(indexer, "resolve_alias", fake_resolve_alias)
+    monkeypatch.setattr(indexer, "copy_venue_points", fake_copy_venue_points)
+    monkeypatch.setattr(indexer, "upsert_points", fake_upsert_points)
+
+    await indexer.run(batch_size=2, checkpoint_path=tmp_path / "ckpt.json", blue_green=True)
+
+    assert events == [
+        "create",
+        "copy:places_authority_v1->places_authority_v2",
+        "switch:places_authority_v2",
+        "copy:places_authority_v1->places_authority_v2:missing",
+    ]
+    assert upsert_targets == {"places_authority_v2"}
+
+
+class FakeCollections:
+    """Two named collections with scroll/retrieve over {id: (vector, payload)}."""
+
+    def __init__(self, collections):
+        self.collections = collections
+
+    def scroll(self, collection_name, scroll_filter, limit, offset, with_payload, with_vectors):
+        assert scroll_filter.must[0].is_empty.key == "authority_id"
+        points = sorted(
+            (pid, vec, payload)
+            for pid, (vec, payload) in self.collections[collection_name].items()
+            if not payload.get("authority_id")
+        )
+        start = offset or 0
+        page = points[start : start + limit]
+        records = [type("Record", (), {"id": pid, "vector": vec, "payload": payload})() for pid, vec, payload in page]
+        return records, (start + limit if start + limit < len(points) else None)
+
+    def retrieve(self, collection_name, ids, with_payload, with_vectors):
+        return [FakeRecord(i, None) for i in ids if i in self.collections[collection_name]]
+
+
+@pytest.mark.asyncio
+async def test_copy_venue_points_carries_triad_vectors_across(monkeypatch):
+    old = {f"venue-{i}": ([float(i)], {"id": f"venue-{i}", "name": f"Venue {i}"}) for i in range(5)}
+    old["auth"] = ([9.0], {"authority_id": "a1"})
+    new = {"venue-0": ([42.0], {"id": "venue-0", "name": "fresher"})}
+    qdrant = FakeCollections({"v1": old, "v2": new})
+
+    async def fake_upsert_points(_client, points, collection_name):
+        for point in points:
+            qdrant.collections[collection_name][point.id] = (point.vector, point.payload)
+
+    monkeypatch.setattr(indexer, "upsert_points", fake_upsert_points)
+
+    assert await indexer.copy_venue_points(qdrant, "v1", "v2", only_missing=True, page_size=2) == 4
+    assert new["venue-0"][1]["name"] == "fresher"
+    assert "auth" not in new
+    assert await indexer.copy_venue_points(qdrant, "v1", "v2", page_size=2) == 5
+    assert sorted(new) == [f"venue-{i}" for i in range(5)]
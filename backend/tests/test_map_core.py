@@ -38,6 +38,11 @@ class _FakeTable:
             self._parent_sb.calls.append(("filter", args, kwargs))
         return self
 
+    def order(self, *args, **kwargs):
+        if self._parent_sb:
+            self._parent_sb.calls.append(("order", args, kwargs))
+        return self
+
     def limit(self, _n):
         if self._parent_sb:
             self._parent_sb.calls.append(("limit", _n))
@@ -192,3 +197,52 @@ def test_hot_roads_v1_alias(client, fake_supabase):
     assert "snapshot_id" in data
     assert "unchanged" in data
     assert "segments" in data
+
+
+def test_venues_small_viewport_served_from_tile_cache(client, fake_supabase, monkeypatch):
+    from app.services import venue_tiles
+
+    class _Cache(dict):
+        def get(self, key):
+            return super().get(key)
+
+        def setex(self, key, _ttl, value):
+            self[key] = value
+
+    cache = _Cache()
+    monkeypatch.setattr(venue_tiles.redis_client, "get_redis", lambda: cache)
+    # mv_venue_geodata rows: coordinates are latitude/longitude
+    sb = fake_supabase([
+        {"id": "in", "name": "Thonglor Bar", "latitude": 13.7326, "longitude": 100.5830, "category": "bar", "total_views": 9},
+        {"id": "out", "name": "Edge Cafe", "latitude": 13.7450, "longitude": 100.5830, "category": "cafe", "total_views": 3},
+    ])
+    url = "/api/v1/venues?bbox=100.575,13.725,100.590,13.740"
+
+    first = client.get(url).json()
+    table_calls = sum(1 for call in sb.calls if call[0] == "table")
+    second = client.get(url).json()
+
+    assert [v["id"] for v in first["venues"]] == ["in"]
+    assert (first["venues"][0]["lat"], first["venues"][0]["lng"]) == (13.7326, 100.5830)
+    assert ("order", ("total_views",), {"desc": True}) in sb.calls
+    assert second["venues"] == first["venues"]
+    assert table_calls == len(venue_tiles.tiles_for_bbox(100.575, 13.725, 100.590, 13.740))
+    assert sum(1 for call in sb.calls if call[0] == "table") == table_calls
+
+
+def test_venues_world_viewport_skips_the_tile_cache(client, fake_supabase, monkeypatch):
+    from app.services import venue_tiles
+
+    assert venue_tiles.tiles_for_bbox(-180, -85, 180, 85) is None
+    assert venue_tiles.tiles_for_bbox(97.3, 5.6, 105.6, 20.5) is None  # all of Thailand
+    assert len(venue_tiles.tiles_for_bbox(100.575, 13.725, 100.590, 13.740)) <= venue_tiles.MAX_VENUE_TILES
+
+    async def _no_tiles(sb, tiles):
+        raise AssertionError("world viewport must not be assembled from tiles")
+
+    monkeypatch.setattr(venue_tiles, "get_tiles", _no_tiles)
+    sb = fake_supabase([{"id": "v1", "name": "Anywhere", "lat": 13.7, "lng": 100.5, "category": "bar"}])
+
+    resp = client.get("/api/v1/venues?bbox=-180,-85,180,85")
+    assert resp.status_code == 200
+    assert [call for call in sb.calls if call[0] == "table"]
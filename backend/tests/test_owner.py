@@ -6,6 +6,7 @@ import app.api.routers.owner as owner
 class FakeQuery:
     def __init__(self, owner_id):
         self.owner_id = owner_id
+        self.rollup = False
 
     def select(self, *_args, **_kwargs):
         return self
@@ -13,10 +14,19 @@ class FakeQuery:
     def eq(self, *_args, **_kwargs):
         return self
 
+    def in_(self, *_args, **_kwargs):
+        self.rollup = True
+        return self
+
+    def gte(self, *_args, **_kwargs):
+        return self
+
     def single(self):
         return self
 
     def execute(self):
+        if self.rollup:
+            return SimpleNamespace(data=[])
         return SimpleNamespace(data={"owner_id": self.owner_id})
 
 
@@ -27,6 +37,11 @@ class FakeSupabase:
     def table(self, _name):
         return FakeQuery(self.owner_id)
 
+    def rpc(self, _name, _params):
+        query = FakeQuery(self.owner_id)
+        query.rollup = True
+        return query
+
 
 def test_owner_stats_success(client, override_auth, monkeypatch):
     fake_db = FakeSupabase(owner_id=override_auth.id)
@@ -37,6 +52,7 @@ def test_owner_stats_success(client, override_auth, monkeypatch):
     assert response.status_code == 200
     data = response.json()
     assert data["shop_id"] == "123"
+    assert data["events_7d"] == 0
 
 
 def test_owner_stats_forbidden(client, override_auth, monkeypatch):
@@ -1,3 +1,5 @@
+from types import SimpleNamespace
+
 import pytest
 
 from app.api.routers import places as places_router
@@ -26,6 +28,33 @@ class FakeHit:
 
 
 class FakeQdrant:
+    def __init__(self):
+        self.search_kwargs: dict = {}
+        self.created_indexes: list[str] = []
+        self.aliases: dict[str, str] = {}
+
+    def get_aliases(self):
+        return SimpleNamespace(
+            aliases=[
+                SimpleNamespace(alias_name=alias, collection_name=target)
+                for alias, target in self.aliases.items()
+            ]
+        )
+
+    def update_collection_aliases(self, change_aliases_operations):
+        for op in change_aliases_operations:
+            if getattr(op, "create_alias", None):
+                self.aliases[op.create_alias.alias_name] = op.create_alias.collection_name
+
+    def update_collection(self, collection_name, hnsw_config, quantization_config):
+        return True
+
+    def get_collection(self, collection_name):
+        return SimpleNamespace(payload_schema={}, config=None)
+
+    def create_payload_index(self, collection_name, field_name, field_schema):
+        self.created_indexes.append(field_name)
+
     def get_collections(self):
         class Response:
             pass
@@ -35,6 +64,7 @@ class FakeQdrant:
         return response
 
     def search(self, *args, **kwargs):
+        self.search_kwargs = kwargs
         return [
             FakeHit(
                 {
@@ -47,7 +77,19 @@ class FakeQdrant:
                     "address": "123 ถนน...",
                     "updated_at": "2026-02-17T10:00:00Z",
                 }
-            )
+            ),
+            FakeHit(
+                {
+                    "authority_id": "auth-0002",
+                    "name": "Bangkok City Hall",
+                    "category": "municipal",
+                    "province": "กรุงเทพมหานคร",
+                    "lat": 13.7525,
+                    "lng": 100.5017,
+                    "address": "173 ถนนดินสอ",
+                    "updated_at": "2026-02-17T10:00:00Z",
+                }
+            ),
         ]
 
 
@@ -76,3 +118,136 @@ def test_search_endpoint_override_qdrant(client, monkeypatch):
     assert len(data) >= 1
     assert data[0]["source"] == "authority"
     assert response.headers["X-Provider"] == "qdrant"
+
+
+def test_search_pushes_geo_radius_into_qdrant(client, monkeypatch):
+    async def fake_embed_text(_text: str):
+        return [0.1] * 768
+
+    fake_qdrant = FakeQdrant()
+
+    async def get_fake_qdrant():
+        yield fake_qdrant
+
+    monkeypatch.setattr(vector_service, "embed_text", fake_embed_text)
+    monkeypatch.setattr(vector_service, "_collection_ready", False)
+    app.dependency_overrides[get_vector_client] = get_fake_qdrant
+
+    response = client.get(
+        "/api/v1/places/search?"
+        "q=city%20hall&lat=18.7883&lng=98.9853&radius=2000&limit=5"
+    )
+    assert response.status_code == 200
+    assert [place["id"] for place in response.json()] == ["auth-0001"]
+
+    conditions = fake_qdrant.search_kwargs["query_filter"].must
+    geo = [c for c in conditions if c.key == "location"]
+    assert geo and geo[0].geo_radius.radius == 2000.0
+    assert fake_qdrant.search_kwargs["limit"] >= 5
+    assert set(fake_qdrant.created_indexes) == {"location", "province", "category", "status"}
+    assert fake_qdrant.aliases == {"places_authority": "places_authority_v1"}
+    assert fake_qdrant.search_kwargs["search_params"].quantization.rescore is True
+
+
+class LegacyPayloadQdrant(FakeQdrant):
+    """Points indexed before `location` existed: the geo condition matches nothing."""
+
+    def __init__(self, locationless: int = 1):
+        super().__init__()
+        self.calls: list[dict] = []
+        self.locationless = locationless
+
+    def search(self, *args, **kwargs):
+        self.calls.append(kwargs)
+        query_filter = kwargs.get("query_filter")
+        if query_filter and any(c.key == "location" for c in query_filter.must):
+            return []
+        return super().search(*args, **kwargs)
+
+    def count(self, collection_name, count_filter, exact):
+        return SimpleNamespace(count=self.locationless)
+
+
+@pytest.mark.asyncio
+async def test_geo_search_falls_back_to_lat_lng_for_points_without_location(monkeypatch):
+    async def fake_embed_query(_text: str):
+        return [0.1] * 768
+
+    monkeypatch.setattr(vector_service, "embed_query", fake_embed_query)
+    monkeypatch.setattr(vector_service, "_locationless", None)
+    qdrant = LegacyPayloadQdrant()
+
+    hits = await vector_service.qdrant_search(qdrant, "city hall", 5, None, None, 18.7883, 98.9853, 2000)
+
+    assert [hit.payload["authority_id"] for hit in hits] == ["auth-0001"]
+    assert len(qdrant.calls) == 2
+    assert qdrant.calls[1]["query_filter"] is None
+    assert qdrant.calls[1]["limit"] > 5
+
+
+@pytest.mark.asyncio
+async def test_empty_geo_search_skips_fallback_once_every_point_has_location(monkeypatch):
+    async def fake_embed_query(_text: str):
+        return [0.1] * 768
+
+    monkeypatch.setattr(vector_service, "embed_query", fake_embed_query)
+    monkeypatch.setattr(vector_service, "_locationless", None)
+    qdrant = LegacyPayloadQdrant(locationless=0)
+
+    assert await vector_service.qdrant_search(qdrant, "city hall", 5, None, None, 18.7883, 98.9853, 2000) == []
+    assert await vector_service.qdrant_search(qdrant, "city hall", 5, None, None, 18.7883, 98.9853, 2000) == []
+    assert len(qdrant.calls) == 2  # one geo-filtered search each, no fallback
+
+
+def test_make_payload_writes_geo_point():
+    payload = vector_service.make_payload(
+        {"authority_id": "a1", "name": "x", "lat": "13.7", "lng": "100.5"}
+    )
+    assert payload["location"] == {"lat": 13.7, "lon": 100.5}
+
+
+class AsyncFakeQdrant(FakeQdrant):
+    """Mimics AsyncQdrantClient: every method is a coroutine."""
+
+    async def get_aliases(self):
+        return super().get_aliases()
+
+    async def update_collection_aliases(self, change_aliases_operations):
+        super().update_collection_aliases(change_aliases_operations)
+
+    async def update_collection(self, collection_name, hnsw_config, quantization_config):
+        return super().update_collection(collection_name, hnsw_config, quantization_config)
+
+    async def get_collection(self, collection_name):
+        return super().get_collection(collection_name)
+
+    async def create_payload_index(self, collection_name, field_name, field_schema):
+        super().create_payload_index(collection_name, field_name, field_schema)
+
+    async def get_collections(self):
+        return super().get_collections()
+
+    async def search(self, *args, **kwargs):
+        return super().search(*args, **kwargs)
+
+
+def test_search_awaits_async_qdrant_client(client, monkeypatch):
+    async def fake_embed_text(_text: str):
+        return [0.1] * 768
+
+    fake_qdrant = AsyncFakeQdrant()
+
+    async def get_fake_qdrant():
+        yield fake_qdrant
+
+    monkeypatch.setattr(vector_service, "embed_text", fake_embed_text)
+    monkeypatch.setattr(vector_service, "_collection_ready", False)
+    app.dependency_overrides[get_vector_client] = get_fake_qdrant
+
+    response = client.get(
+        "/api/v1/places/search?"
+        "q=city%20office%20async&lat=18.7883&lng=98.9853&radius=2000&limit=5"
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Provider"] == "qdrant"
+    assert fake_qdrant.search_kwargs["collection_name"] == "places_authority"
@@ -0,0 +1,71 @@
+import pytest
+
+from app.core.cache import query_embedding_cache
+from app.services.cache import redis_client
+from app.services.vector import embedding_cache
+from app.services.vector import places_vector_service as vector_service
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store: dict[str, str] = {}
+
+    def get(self, key: str) -> str | None:
+        return self.store.get(key)
+
+    def setex(self, key: str, ttl: int, value: str) -> bool:
+        self.store[key] = value
+        return True
+
+
+@pytest.fixture()
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_client, "get_redis", lambda: redis)
+    query_embedding_cache.clear()
+    yield redis
+    query_embedding_cache.clear()
+
+
+@pytest.fixture()
+def embed_calls(monkeypatch):
+    calls: list[str] = []
+
+    async def fake_embed_text(text: str):
+        calls.append(text)
+        return [0.25, -0.5, 1.0]
+
+    monkeypatch.setattr(vector_service, "embed_text", fake_embed_text)
+    return calls
+
+
+def test_normalize_query():
+    assert embedding_cache.normalize_query("  Rooftop   BAR ") == "rooftop bar"
+    assert embedding_cache.normalize_query("Ｃａｆｅ") == "cafe"
+
+
+def test_vector_round_trip_float16():
+    vector = [0.1, -0.25, 0.333, 1.0]
+    decoded = embedding_cache.decode_vector(embedding_cache.encode_vector(vector))
+    assert len(decoded) == len(vector)
+    assert all(abs(a - b) < 1e-3 for a, b in zip(decoded, vector, strict=True))
+
+
+@pytest.mark.asyncio
+async def test_embed_query_skips_embedding_on_repeat(fake_redis, embed_calls):
+    first = await vector_service.embed_query("Cafe")
+    second = await vector_service.embed_query("  cafe ")
+    assert first == second
+    assert embed_calls == ["cafe"]
+    assert len(fake_redis.store) == 1
+
+
+@pytest.mark.asyncio
+async def test_embed_query_uses_redis_tier(fake_redis, embed_calls):
+    await vector_service.embed_query("rooftop bar")
+    query_embedding_cache.clear()
+
+    vector = await vector_service.embed_query("Rooftop Bar")
+    assert embed_calls == ["rooftop bar"]
+    assert vector == [0.25, -0.5, 1.0]
+    assert len(query_embedding_cache) == 1
@@ -0,0 +1,174 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from app.api.routers import places as places_router
+from app.db.session import get_vector_client
+from app.jobs import authority_index_refresh
+from app.main import app
+from app.services.places import lexical_index
+from app.services.vector import places_vector_service as vector_service
+
+DOCS = [
+    {
+        "authority_id": "auth-0001",
+        "name": "วัดพระธาตุดอยสุเทพ",
+        "category": "temple",
+        "province": "เชียงใหม่",
+        "district": "เมืองเชียงใหม่",
+        "lat": 18.8048,
+        "lng": 98.9216,
+    },
+    {
+        "authority_id": "auth-0002",
+        "name": "Chiang Mai Night Bazaar",
+        "category": "market",
+        "province": "เชียงใหม่",
+        "lat": 18.7851,
+        "lng": 99.0006,
+    },
+    {
+        "authority_id": "auth-0003",
+        "name": "วัดอรุณราชวราราม",
+        "category": "temple",
+        "province": "กรุงเทพมหานคร",
+        "lat": 13.7437,
+        "lng": 100.4889,
+    },
+]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store: dict[str, str] = {}
+
+    def get(self, key: str) -> str | None:
+        return self.store.get(key)
+
+    def setex(self, key: str, ttl: int, value: str) -> bool:
+        self.store[key] = value
+        return True
+
+
+@pytest.fixture()
+def seeded_index(monkeypatch):
+    index = lexical_index.LexicalIndex()
+    for doc in DOCS:
+        index.upsert(doc["authority_id"], doc)
+    monkeypatch.setattr(lexical_index, "authority_index", index)
+    monkeypatch.setattr(places_router.redis_client, "get_redis", lambda: FakeRedis())
+    return index
+
+
+def test_thai_substring_matches_without_word_boundaries(seeded_index):
+    hits = seeded_index.search("ดอยสุเทพ", limit=5)
+    assert hits[0][0]["authority_id"] == "auth-0001"
+
+
+def test_search_applies_province_and_radius(seeded_index):
+    assert [d["authority_id"] for d, _ in seeded_index.search("วัด", 5, province="กรุงเทพมหานคร")] == [
+        "auth-0003"
+    ]
+    near_bazaar = seeded_index.search("night bazaar", 5, lat=18.7851, lng=99.0006, radius_m=500)
+    assert [d["authority_id"] for d, _ in near_bazaar] == ["auth-0002"]
+
+
+def test_upsert_replaces_and_remove_drops(seeded_index):
+    seeded_index.upsert("auth-0002", {**DOCS[1], "name": "Warorot Market"})
+    assert not seeded_index.search("night", 5)
+    seeded_index.remove("auth-0002")
+    assert len(seeded_index) == 2
+    assert not seeded_index.search("warorot", 5)
+
+
+def test_reciprocal_rank_fusion_prefers_shared_hits():
+    assert lexical_index.reciprocal_rank_fusion(["a", "b"], ["b", "c"])[0] == "b"
+
+
+def test_search_falls_back_to_lexical_when_qdrant_fails(client, seeded_index, monkeypatch):
+    async def failing_search(*args, **kwargs):
+        raise RuntimeError("qdrant_circuit_open: vector search temporarily disabled")
+
+    async def noop_ensure(_client):
+        return None
+
+    async def fake_get_vector_client():
+        yield object()
+
+    monkeypatch.setattr(vector_service, "qdrant_search", failing_search)
+    monkeypatch.setattr(vector_service, "ensure_collection_once", noop_ensure)
+    app.dependency_overrides[get_vector_client] = fake_get_vector_client
+
+    response = client.get(
+        "/api/v1/places/search?q=ดอยสุเทพ&lat=18.8048&lng=98.9216&radius=1000&limit=10"
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Provider"] == "lexical"
+    assert response.json()[0]["id"] == "auth-0001"
+
+
+def test_authority_endpoint_uses_lexical_index(client, seeded_index):
+    response = client.get("/api/v1/places/authority?q=bazaar&limit=5")
+    assert response.status_code == 200
+    assert response.headers["X-Search-Index"] == "lexical"
+    assert [place["id"] for place in response.json()] == ["auth-0002"]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.since: list[datetime] = []
+
+    async def execute(self, _sql, params):
+        self.since.append(params["since"])
+        key = (params["since"], params["last_id"])
+        rows = sorted(
+            (r for r in self.rows if (r["changed_at"], r["authority_id"]) > key),
+            key=lambda r: (r["changed_at"], r["authority_id"]),
+        )
+        return FakeResult(rows[: params["limit"]])
+
+
+@pytest.mark.asyncio
+async def test_refresh_applies_changes_incrementally(monkeypatch):
+    monkeypatch.setattr(authority_index_refresh, "_watermark", (authority_index_refresh._EPOCH, ""))
+    t1 = datetime(2026, 3, 1, tzinfo=UTC)
+    t2 = datetime(2026, 3, 2, tzinfo=UTC)
+    rows = [{**DOCS[0], "status": None, "updated_at": None, "changed_at": t1}]
+    index = lexical_index.LexicalIndex()
+    session = FakeSession(rows)
+
+    assert await authority_index_refresh.refresh_once(session, index) == 1
+    assert len(index) == 1
+
+    session.rows = rows + [{**DOCS[0], "status": "inactive", "updated_at": t2, "changed_at": t2}]
+    assert await authority_index_refresh.refresh_once(session, index) == 1
+    assert session.since[-1] == t1
+    assert len(index) == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_pages_through_rows_sharing_one_timestamp(monkeypatch):
+    monkeypatch.setattr(authority_index_refresh, "_PAGE_SIZE", 3)
+    monkeypatch.setattr(authority_index_refresh, "_watermark", (authority_index_refresh._EPOCH, ""))
+    t1 = datetime(2026, 3, 1, tzinfo=UTC)
+    rows = [
+        {**DOCS[0], "authority_id": f"auth-{i:04d}", "status": None, "updated_at": None, "changed_at": t1}
+        for i in range(8)
+    ]
+    index = lexical_index.LexicalIndex()
+
+    assert await authority_index_refresh.refresh_once(FakeSession(rows), index, full=True) == 8
+    assert len(index) == 8
+    assert authority_index_refresh._watermark == (t1, "auth-0007")
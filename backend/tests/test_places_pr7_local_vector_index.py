@@ -0,0 +1,172 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.routers import places as places_router
+from app.db.session import get_vector_client
+from app.jobs import vector_snapshot
+from app.main import app
+from app.services.places import lexical_index
+from app.services.vector import local_vector_index
+from app.services.vector import places_vector_service as vector_service
+
+POINTS = [
+    ("auth-0001", [1.0, 0.0, 0.0], "เชียงใหม่", "temple", 18.8048, 98.9216),
+    ("auth-0002", [0.0, 1.0, 0.0], "เชียงใหม่", "market", 18.7851, 99.0006),
+    ("auth-0003", [0.9, 0.1, 0.0], "กรุงเทพมหานคร", "temple", 13.7437, 100.4889),
+]
+
+
+class FakeQdrant:
+    def __init__(self, page_size=2):
+        self.page_size = page_size
+        self.points = [
+            SimpleNamespace(
+                id=point_id,
+                vector=vector,
+                payload={
+                    "authority_id": point_id,
+                    "name": f"Place {point_id}",
+                    "province": province,
+                    "category": category,
+                    "lat": lat,
+                    "lng": lng,
+                    "source": "tat",
+                },
+            )
+            for point_id, vector, province, category, lat, lng in POINTS
+        ]
+        # A TRIAD venue vector in the same collection: no authority_id.
+        self.points.append(
+            SimpleNamespace(id="venue-1", vector=[0.0, 0.0, 1.0], payload={"id": "venue-1", "name": "Venue"})
+        )
+
+    def scroll(self, collection_name, scroll_filter, limit, offset, with_payload, with_vectors):
+        points = [
+            point
+            for point in self.points
+            if scroll_filter is None or point.payload.get("authority_id") is not None
+        ]
+        start = offset or 0
+        page = points[start : start + limit]
+        next_offset = start + limit if start + limit < len(points) else None
+        return page, next_offset
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        self.ttls[key] = ttl
+        return True
+
+
+@pytest.fixture()
+async def snapshot(tmp_path, monkeypatch):
+    await local_vector_index.export_snapshot(FakeQdrant(), tmp_path, page_size=2)
+    index = local_vector_index.LocalVectorIndex.load(tmp_path)
+    monkeypatch.setattr(local_vector_index, "snapshot_index", index)
+    return index
+
+
+@pytest.mark.asyncio
+async def test_export_writes_memory_mapped_float16(snapshot, tmp_path):
+    assert len(snapshot) == 3
+    assert snapshot._vectors.dtype.name == "float16"
+    assert snapshot.version == (tmp_path / "CURRENT").read_text(encoding="utf-8")
+    assert "source" not in snapshot._payloads[0]
+    assert "venue-1" not in snapshot._ids
+
+
+@pytest.mark.asyncio
+async def test_exports_in_the_same_second_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_vector_index.time, "time", lambda: 1_800_000_000.0)
+    first = await local_vector_index.export_snapshot(FakeQdrant(), tmp_path)
+    second = await local_vector_index.export_snapshot(FakeQdrant(), tmp_path)
+
+    assert first != second
+    assert (tmp_path / "CURRENT").read_text(encoding="utf-8") == second
+    assert {path.name for path in tmp_path.iterdir() if path.is_dir()} == {first, second}
+    assert local_vector_index.snapshot_age_seconds(tmp_path) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_by_cosine_within_filters(snapshot):
+    assert [h.id for h in snapshot.search([1.0, 0.0, 0.0], 3)] == ["auth-0001", "auth-0003", "auth-0002"]
+    assert [h.id for h in snapshot.search([1.0, 0.0, 0.0], 3, province="เชียงใหม่")] == [
+        "auth-0001",
+        "auth-0002",
+    ]
+    near_market = snapshot.search([1.0, 0.0, 0.0], 3, lat=18.7851, lng=99.0006, radius_m=500)
+    assert [h.id for h in near_market] == ["auth-0002"]
+    assert snapshot.search([1.0, 0.0, 0.0], 3, province="ภูเก็ต") == []
+
+
+@pytest.mark.asyncio
+async def test_search_falls_back_to_snapshot_when_qdrant_fails(client, snapshot, monkeypatch):
+    async def failing_search(*args, **kwargs):
+        raise RuntimeError("qdrant_circuit_open: vector search temporarily disabled")
+
+    async def noop_ensure(_client):
+        return None
+
+    async def fake_embed_query(_q):
+        return [0.0, 1.0, 0.0]
+
+    async def fake_get_vector_client():
+        yield object()
+
+    redis = FakeRedis()
+    monkeypatch.setattr(vector_service, "qdrant_search", failing_search)
+    monkeypatch.setattr(vector_service, "ensure_collection_once", noop_ensure)
+    monkeypatch.setattr(vector_service, "embed_query", fake_embed_query)
+    monkeypatch.setattr(lexical_index, "authority_index", lexical_index.LexicalIndex())
+    monkeypatch.setattr(places_router.redis_client, "get_redis", lambda: redis)
+    app.dependency_overrides[get_vector_client] = fake_get_vector_client
+
+    response = client.get("/api/v1/places/search?q=market&lat=18.7851&lng=99.0006&radius=1000")
+    assert response.status_code == 200
+    assert response.headers["X-Provider"] == "local"
+    assert [place["id"] for place in response.json()] == ["auth-0002"]
+    assert list(redis.ttls.values()) == [120]
+
+
+@pytest.mark.asyncio
+async def test_small_province_subset_skips_qdrant(client, snapshot, monkeypatch):
+    async def unexpected_search(*args, **kwargs):
+        raise AssertionError("qdrant should not be queried")
+
+    async def fake_embed_query(_q):
+        return [1.0, 0.0, 0.0]
+
+    async def fake_get_vector_client():
+        yield object()
+
+    monkeypatch.setattr(vector_service, "qdrant_search", unexpected_search)
+    monkeypatch.setattr(vector_service, "embed_query", fake_embed_query)
+    monkeypatch.setattr(lexical_index, "authority_index", lexical_index.LexicalIndex())
+    monkeypatch.setattr(places_router.redis_client, "get_redis", lambda: FakeRedis())
+    app.dependency_overrides[get_vector_client] = fake_get_vector_client
+
+    response = client.get(
+        "/api/v1/places/search?q=temple&lat=18.8048&lng=98.9216&radius=5000&province=เชียงใหม่"
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Provider"] == "local"
+    assert response.json()[0]["id"] == "auth-0001"
+
+
+@pytest.mark.asyncio
+async def test_snapshot_job_disabled_without_qdrant(tmp_path, monkeypatch):
+    settings = SimpleNamespace(QDRANT_URL="", VECTOR_SNAPSHOT_DIR=str(tmp_path))
+    monkeypatch.setattr(vector_snapshot, "get_settings", lambda: settings)
+
+    await vector_snapshot.run_forever()  # returns instead of looping on exports
+
+    assert not (tmp_path / "CURRENT").exists()
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.vector import collection_schema
+from app.services.vector.places_vector_service import PLACES_AUTHORITY_SCHEMA as SCHEMA
+
+
+class FakeQdrant:
+    """Stateful stand-in for collections, aliases, configs and payload indexes."""
+
+    def __init__(self):
+        self.collections: dict[str, SimpleNamespace] = {}
+        self.aliases: dict[str, str] = {}
+        self.calls: list[str] = []
+
+    def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in self.collections])
+
+    def get_aliases(self):
+        return SimpleNamespace(
+            aliases=[
+                SimpleNamespace(alias_name=alias, collection_name=target)
+                for alias, target in self.aliases.items()
+            ]
+        )
+
+    def create_collection(self, collection_name, vectors_config, hnsw_config, quantization_config):
+        self.calls.append(f"create:{collection_name}")
+        self.collections[collection_name] = SimpleNamespace(
+            payload_schema={},
+            config=SimpleNamespace(hnsw_config=hnsw_config, quantization_config=quantization_config),
+        )
+
+    def get_collection(self, collection_name):
+        return self.collections[collection_name]
+
+    def update_collection(self, collection_name, hnsw_config, quantization_config):
+        self.calls.append(f"update:{collection_name}")
+        self.collections[collection_name].config = SimpleNamespace(
+            hnsw_config=hnsw_config, quantization_config=quantization_config
+        )
+
+    def create_payload_index(self, collection_name, field_name, field_schema):
+        self.calls.append(f"index:{collection_name}.{field_name}")
+        self.collections[collection_name].payload_schema[field_name] = field_schema
+
+    def update_collection_aliases(self, change_aliases_operations):
+        self.calls.append(f"aliases:{len(change_aliases_operations)}")
+        for op in change_aliases_operations:
+            if getattr(op, "delete_alias", None):
+                self.aliases.pop(op.delete_alias.alias_name, None)
+            else:
+                self.aliases[op.create_alias.alias_name] = op.create_alias.collection_name
+
+
+@pytest.mark.asyncio
+async def test_apply_schema_bootstraps_then_is_idempotent():
+    qdrant = FakeQdrant()
+
+    assert await collection_schema.apply_schema(qdrant, SCHEMA) == "places_authority_v1"
+    config = qdrant.collections["places_authority_v1"].config
+    assert config.hnsw_config.m == SCHEMA.hnsw_m
+    assert config.quantization_config.scalar.type.value == "int8"
+    assert set(qdrant.collections["places_authority_v1"].payload_schema) == set(SCHEMA.payload_indexes)
+    assert qdrant.aliases == {"places_authority": "places_authority_v1"}
+
+    qdrant.calls.clear()
+    await collection_schema.apply_schema(qdrant, SCHEMA)
+    assert qdrant.calls == []
+
+
+@pytest.mark.asyncio
+async def test_apply_schema_adopts_legacy_collection_and_fixes_drift():
+    qdrant = FakeQdrant()
+    qdrant.collections["places_authority_v1"] = SimpleNamespace(
+        payload_schema={"province": "keyword"},
+        config=SimpleNamespace(hnsw_config=SimpleNamespace(m=8, ef_construct=100), quantization_config=None),
+    )
+
+    await collection_schema.apply_schema(qdrant, SCHEMA)
+
+    assert "create:places_authority_v1" not in qdrant.calls
+    assert "update:places_authority_v1" in qdrant.calls
+    assert "index:places_authority_v1.province" not in qdrant.calls
+    assert qdrant.aliases == {"places_authority": "places_authority_v1"}
+
+
+@pytest.mark.asyncio
+async def test_blue_green_switch_is_a_single_alias_update():
+    qdrant = FakeQdrant()
+    await collection_schema.apply_schema(qdrant, SCHEMA)
+
+    target = await collection_schema.create_next_version(qdrant, SCHEMA)
+    qdrant.calls.clear()
+    previous = await collection_schema.switch_alias(qdrant, SCHEMA, target)
+
+    assert (target, previous) == ("places_authority_v2", "places_authority_v1")
+    assert qdrant.calls == ["aliases:2"]
+    assert qdrant.aliases == {"places_authority": "places_authority_v2"}
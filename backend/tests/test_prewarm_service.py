@@ -0,0 +1,91 @@
+from datetime import UTC, datetime
+
+import h3
+import pytest
+
+from app.services import prewarm_service as prewarm_module
+from app.services import venue_tiles
+from app.services.prewarm_service import PrewarmService
+from app.services.traffic.tiles import TILE_RESOLUTION
+
+NIMMAN = (18.7998, 98.9676)
+THONGLOR = (13.7326, 100.5830)
+FRIDAY_NIGHT = datetime(2026, 10, 16, 14, 30, tzinfo=UTC)  # 21:30 in Bangkok
+
+
+class FakeRedis:
+    def __init__(self, zsets=None):
+        self.zsets: dict[str, dict[str, float]] = zsets or {}
+        self.strings: dict[str, str] = {}
+
+    def zrevrange(self, key, start, end, withscores=False):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1], reverse=True)
+        return items[start : end + 1]
+
+    def zunionstore(self, dest, keys):
+        merged: dict[str, float] = {}
+        for key, weight in keys.items():
+            for member, score in self.zsets.get(key, {}).items():
+                merged[member] = merged.get(member, 0.0) + score * weight
+        self.zsets[dest] = merged
+
+    def expire(self, key, seconds):
+        return True
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+
+def _cell(lat, lng, offset=0.0):
+    return h3.latlng_to_cell(lat + offset, lng, 9)
+
+
+def test_plan_groups_hot_cells_into_tiles_hottest_first():
+    cells = [
+        (_cell(*NIMMAN), 5.0),
+        (_cell(*THONGLOR), 4.0),
+        (_cell(*THONGLOR, 0.001), 3.0),  # same tiles as the cell above
+        ("not-a-cell", 100.0),
+    ]
+
+    traffic, map_tiles = PrewarmService.plan(cells)
+
+    assert traffic[0] == h3.latlng_to_cell(*THONGLOR, TILE_RESOLUTION)
+    assert traffic[1] == h3.latlng_to_cell(*NIMMAN, TILE_RESOLUTION)
+    assert map_tiles == [venue_tiles.tile_for(*THONGLOR), venue_tiles.tile_for(*NIMMAN)]
+
+
+@pytest.mark.asyncio
+async def test_run_once_warms_upcoming_hot_spots_once_per_lock(monkeypatch):
+    upcoming_key = f"user:h3:density:how:{prewarm_module.hour_of_week(FRIDAY_NIGHT) + 1}"
+    redis = FakeRedis(
+        {
+            "user:h3:density": {_cell(*THONGLOR): 8.0},
+            upcoming_key: {_cell(*NIMMAN): 6.0},  # busy at this hour in earlier weeks
+        }
+    )
+    monkeypatch.setattr(prewarm_module.redis_client, "get_redis", lambda: redis)
+    warmed = {}
+
+    async def warm_traffic(cells, refresh_within):
+        warmed["traffic"] = cells
+        return len(cells)
+
+    async def warm_venues(sb, tiles, refresh_within):
+        warmed["venues"] = tiles
+        return len(tiles)
+
+    monkeypatch.setattr(prewarm_module.traffic_fusion_service, "warm_tiles", warm_traffic)
+    monkeypatch.setattr(prewarm_module.venue_tiles, "warm_tiles", warm_venues)
+
+    assert await PrewarmService().run_once(now=FRIDAY_NIGHT) == {"traffic": 2, "venues": 2}
+    assert set(warmed["venues"]) == {venue_tiles.tile_for(*THONGLOR), venue_tiles.tile_for(*NIMMAN)}
+    # The current density was folded into this hour of week for next week's prediction.
+    current_key = f"user:h3:density:how:{prewarm_module.hour_of_week(FRIDAY_NIGHT)}"
+    assert redis.zsets[current_key] == {_cell(*THONGLOR): 4.0}
+
+    # Another worker's pass within the lock window is skipped.
+    assert await PrewarmService().run_once(now=FRIDAY_NIGHT) == {}
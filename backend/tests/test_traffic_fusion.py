@@ -0,0 +1,304 @@
+import asyncio
+import json
+import time
+
+import h3
+import numpy as np
+import pytest
+
+from app.services.traffic import fusion as fusion_module
+from app.services.traffic import tiles
+from app.services.traffic.base import (
+    StandardIncident,
+    StandardTrafficSegment,
+    TrafficDensity,
+    TrafficProvider,
+)
+from app.services.traffic.deadlines import LatencyTracker
+
+SIAM = (13.7456, 100.5347)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    def ttl(self, key):
+        return self.ttls.get(key, -2)
+
+
+class CountingProvider(TrafficProvider):
+    def __init__(self, name="fake", confidence=0.8, delay=0.0):
+        super().__init__(name)
+        self.calls: list[tuple[float, float, int]] = []
+        self.confidence = confidence
+        self.delay = delay
+
+    async def get_traffic_nearby(self, lat, lng, radius_m=1000):
+        self.calls.append((lat, lng, radius_m))
+        await asyncio.sleep(self.delay)
+        return [
+            StandardTrafficSegment(
+                way_id=f"{self.name}-{round(lat, 3)}",
+                name="Rama I Rd",
+                density=TrafficDensity.MODERATE,
+                speed_kmh=30.0,
+                free_flow_speed_kmh=50.0,
+                current_travel_time_sec=120,
+                free_flow_travel_time_sec=90,
+                provider=self.name,
+                confidence_score=self.confidence,
+                lat=lat,
+                lng=lng,
+            )
+        ]
+
+    async def get_incidents_nearby(self, lat, lng, radius_m=5000) -> list[StandardIncident]:
+        return []
+
+
+@pytest.fixture()
+def service(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(fusion_module.redis_client, "get_redis", lambda: redis)
+    svc = fusion_module.TrafficFusionService()
+    svc.providers = [CountingProvider()]
+    monkeypatch.setattr(svc, "_store_historical", lambda *args: None)
+    return svc, redis
+
+
+def test_covering_cells_scale_with_radius():
+    small = tiles.covering_cells(*SIAM, 100)
+    large = tiles.covering_cells(*SIAM, 5000)
+    assert 1 <= len(small) <= 3
+    assert set(small) <= set(large)
+    assert len(large) > len(small)
+    reach = 5000 + tiles.TILE_EDGE_M
+    assert all(tiles.haversine_m(*SIAM, *tiles.tile_center(cell)) <= reach for cell in large)
+
+
+@pytest.mark.asyncio
+async def test_nearby_users_share_cached_tiles(service):
+    service, _redis = service
+    provider = service.providers[0]
+
+    await service.get_fused_traffic(*SIAM, 100)
+    first_calls = len(provider.calls)
+    await service.get_fused_traffic(SIAM[0] + 0.0003, SIAM[1] - 0.0002, 100)
+
+    assert first_calls == len(tiles.covering_cells(*SIAM, 100))
+    assert all(radius == tiles.TILE_FETCH_RADIUS_M for _, _, radius in provider.calls)
+    extra = set(tiles.covering_cells(SIAM[0] + 0.0003, SIAM[1] - 0.0002, 100)) - set(
+        tiles.covering_cells(*SIAM, 100)
+    )
+    assert len(provider.calls) == first_calls + len(extra)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_fetch_each_tile_once(service):
+    service, _redis = service
+    provider = service.providers[0]
+
+    await asyncio.gather(*(service.get_fused_traffic(*SIAM, 1000) for _ in range(5)))
+
+    assert len(provider.calls) == len(tiles.covering_cells(*SIAM, 1000))
+
+
+@pytest.mark.asyncio
+async def test_assembly_trims_to_radius_and_keeps_most_confident(service):
+    service, _redis = service
+    near = {"way_id": "w1", "lat": SIAM[0], "lng": SIAM[1], "confidence": 0.5}
+    near_better = {**near, "confidence": 0.9}
+    far = {"way_id": "w2", "lat": SIAM[0] + 0.05, "lng": SIAM[1], "confidence": 0.9}
+    unplaced = {"way_id": "w3", "lat": None, "lng": None, "confidence": 0.4}
+
+    home, neighbour = tiles.covering_cells(*SIAM, 1000)[:2]
+    out = service._assemble({home: [near, far], neighbour: [near_better, unplaced]}, *SIAM, 1000)
+
+    assert {s["way_id"]: s["confidence"] for s in out} == {"w1": 0.9}
+
+
+@pytest.mark.asyncio
+async def test_assembly_places_segments_without_geometry_at_their_tile(service):
+    service, _redis = service
+    home = h3.latlng_to_cell(*SIAM, tiles.TILE_RESOLUTION)
+    far_cell = next(cell for cell in h3.grid_ring(home, 2))
+    unplaced = {"way_id": "w-home", "lat": None, "lng": None, "confidence": 0.4}
+    elsewhere = {"way_id": "w-far", "lat": None, "lng": None, "confidence": 0.4}
+    far_lat, far_lng = tiles.tile_center(far_cell)
+    with_path = {"way_id": "w-path", "path": [(far_lat, far_lng), SIAM, SIAM], "confidence": 0.4}
+
+    out = service._assemble({home: [unplaced], far_cell: [elsewhere, with_path]}, *SIAM, 200)
+
+    assert sorted(s["way_id"] for s in out) == ["w-home", "w-path"]
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_cut_off_at_budget(service):
+    service, redis = service
+    service._budget_s = 0.2
+    service.providers = [CountingProvider("fast"), CountingProvider("slow", delay=5.0)]
+
+    center = tiles.tile_center(tiles.covering_cells(*SIAM, 100)[0])
+    started = time.monotonic()
+    segments, meta = await service.get_fused_traffic_with_meta(*center, 100)
+
+    assert time.monotonic() - started < 1.0
+    assert {s["provider"] for s in segments} == {"fast"}
+    assert meta["contributors"] == ["fast"]
+    assert meta["partial"] is True
+    assert meta["providers"]["slow"]["timeout"] == meta["tiles"]["total"]
+    assert set(redis.ttls.values()) == {fusion_module._PARTIAL_TILE_TTL}
+
+
+@pytest.mark.asyncio
+async def test_cached_tiles_report_their_providers(service):
+    service, redis = service
+    await service.get_fused_traffic_with_meta(*SIAM, 100)
+
+    segments, meta = await service.get_fused_traffic_with_meta(*SIAM, 100)
+
+    assert meta["tiles"]["cached"] == meta["tiles"]["total"]
+    assert meta["contributors"] == ["fake"]
+    assert meta["partial"] is False
+    assert set(redis.ttls.values()) == {service._cache_ttl}
+    key = next(iter(redis.store))
+    assert json.loads(redis.store[key])["providers"]["fake"]["status"] == "ok"
+
+
+def test_deadline_follows_observed_latency():
+    tracker = LatencyTracker()
+    assert tracker.deadline("tomtom", 2.5) == 2.5  # no samples yet: the whole budget
+
+    for seconds in (0.2, 0.25, 0.3, 0.3, 0.4):
+        tracker.observe("tomtom", seconds)
+    assert tracker.deadline("tomtom", 2.5) == pytest.approx(0.6)
+
+    for _ in range(5):
+        tracker.observe("tomtom", 4.0)
+    assert tracker.deadline("tomtom", 2.5) == 2.5
+
+
+def _road(way_id, provider, speed, confidence, path=None, lat=None, lng=None, name="Rama I Rd"):
+    return StandardTrafficSegment(
+        way_id=way_id,
+        name=name,
+        density=TrafficDensity.UNKNOWN,
+        speed_kmh=speed,
+        free_flow_speed_kmh=50.0,
+        current_travel_time_sec=120,
+        free_flow_travel_time_sec=90,
+        provider=provider,
+        confidence_score=confidence,
+        lat=lat,
+        lng=lng,
+        path=path or [],
+    )
+
+
+def test_segments_with_different_ids_merge_by_endpoints(service):
+    service, _redis = service
+    path = [(13.7460, 100.5290), (13.7462, 100.5340)]
+    nudged = [(lat + 0.0001, lng) for lat, lng in path]  # ~11 m away
+    opposite = list(reversed(path))
+
+    fused = service._fuse_segments(
+        [
+            _road("g-1", "google", 20.0, 0.9, path=path),
+            _road("t-77", "tomtom", 40.0, 0.3, path=nudged),
+            _road("g-2", "google", 45.0, 0.9, path=opposite),
+        ]
+    )
+
+    assert [s.way_id for s in fused] == ["g-1", "g-2"]
+    assert fused[0].speed_kmh == pytest.approx((20.0 * 0.9 + 40.0 * 0.3) / 1.2)
+    assert fused[0].density == TrafficDensity.MODERATE
+
+
+def test_provider_never_merges_two_of_its_own_roads(service):
+    service, _redis = service
+    path = [(13.7460, 100.5290), (13.7462, 100.5340)]
+
+    fused = service._fuse_segments(
+        [_road("o-1", "osm", 20.0, 0.7, path=path), _road("o-2", "osm", 40.0, 0.7, path=path)]
+    )
+
+    assert len(fused) == 2
+
+
+def test_midpoint_matching_requires_same_road_name(service):
+    service, _redis = service
+    fused = service._fuse_segments(
+        [
+            _road("a", "gov", 10.0, 0.5, lat=13.7460, lng=100.5300, name="Rama I Rd"),
+            _road("b", "osm", 30.0, 0.5, lat=13.7461, lng=100.5300, name="rama i rd."),
+            _road("c", "tomtom", 50.0, 0.5, lat=13.7461, lng=100.5300, name="Phaya Thai Rd"),
+        ]
+    )
+
+    assert {s.way_id: s.speed_kmh for s in fused} == {"a": pytest.approx(20.0), "c": 50.0}
+
+
+def test_vectorized_fusion_matches_per_group_average(service):
+    service, _redis = service
+    rng = np.random.default_rng(7)
+    segments = [
+        _road(f"w{rng.integers(0, 40)}", f"p{i}", float(rng.uniform(5, 60)), float(rng.uniform(0, 1)))
+        for i in range(400)
+    ]
+    expected: dict[str, tuple[float, float]] = {}
+    for s in segments:
+        total, weight = expected.get(s.way_id, (0.0, 0.0))
+        expected[s.way_id] = (total + s.speed_kmh * s.confidence_score, weight + s.confidence_score)
+
+    fused = service._fuse_segments(segments)
+
+    assert len(fused) == len(expected)
+    for s in fused:
+        total, weight = expected[s.way_id]
+        assert s.speed_kmh == pytest.approx(total / weight)
+
+
+@pytest.mark.asyncio
+async def test_historical_priors_fill_in_when_providers_are_slow(service, monkeypatch):
+    service, redis = service
+    service._budget_s = 0.1
+    service.providers = [CountingProvider("slow", delay=5.0)]
+    center = tiles.tile_center(tiles.covering_cells(*SIAM, 100)[0])
+
+    async def priors(cell):
+        return [{"way_id": "w9", "name": "Rama I Rd", "provider": "history", "confidence": 0.3,
+                 "lat": center[0], "lng": center[1]}]
+
+    monkeypatch.setattr(fusion_module.traffic_rollups, "priors", priors)
+
+    segments, meta = await service.get_fused_traffic_with_meta(*center, 100)
+
+    assert [s["way_id"] for s in segments] == ["w9"]
+    assert meta["contributors"] == ["history"]
+    assert meta["partial"] is True
+
+
+@pytest.mark.asyncio
+async def test_warm_tiles_refreshes_only_missing_or_expiring(service):
+    service, redis = service
+    provider = service.providers[0]
+    fresh, expiring, missing = tiles.covering_cells(*SIAM, 1000)[:3]
+    redis.setex(service._tile_cache_key(fresh), 170, "{}")
+    redis.setex(service._tile_cache_key(expiring), 20, "{}")
+
+    warmed = await service.warm_tiles([fresh, expiring, missing], refresh_within=60)
+
+    assert warmed == 2
+    assert sorted(call[:2] for call in provider.calls) == sorted(
+        tiles.tile_center(cell) for cell in (expiring, missing)
+    )
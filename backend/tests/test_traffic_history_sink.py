@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services.traffic import history_sink as sink_module
+from app.services.traffic.base import StandardTrafficSegment, TrafficDensity
+
+
+def _segment(way_id: str, speed: float = 30.0) -> StandardTrafficSegment:
+    return StandardTrafficSegment(
+        way_id=way_id,
+        name=f"Road {way_id}",
+        density=TrafficDensity.MODERATE,
+        speed_kmh=speed,
+        free_flow_speed_kmh=50.0,
+        current_travel_time_sec=120,
+        free_flow_travel_time_sec=90,
+        provider="osm",
+    )
+
+
+@pytest.fixture()
+def writes(monkeypatch):
+    calls: list[tuple[str, list[dict]]] = []
+
+    async def write_history(rows):
+        calls.append(("history", rows))
+        return True
+
+    async def write_core(rows):
+        calls.append(("core", rows))
+        return True
+
+    monkeypatch.setattr(sink_module.TrafficHistorySink, "_write_history", staticmethod(write_history))
+    monkeypatch.setattr(sink_module.TrafficHistorySink, "_write_core", staticmethod(write_core))
+    return calls
+
+
+def _settings(neon_url: str):
+    return lambda: SimpleNamespace(NEON_DATABASE_URL=neon_url)
+
+
+@pytest.mark.asyncio
+async def test_dedupes_by_way_and_minute_and_routes_to_history(writes, monkeypatch):
+    monkeypatch.setattr(sink_module, "get_settings", _settings("postgresql://neon"))
+    sink = sink_module.TrafficHistorySink()
+
+    sink.add(13.7, 100.5, [_segment("w1", 20.0), _segment("w2")])
+    sink.add(13.7, 100.5, [_segment("w1", 25.0)])
+    assert len(sink) == 2
+
+    assert await sink.flush() == 2
+    store, rows = writes[0]
+    assert store == "history"
+    assert {row["way_id"]: row["speed_kmh"] for row in rows} == {"w1": 25.0, "w2": 30.0}
+    assert len(sink) == 0
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_core_without_neon(writes, monkeypatch):
+    monkeypatch.setattr(sink_module, "get_settings", _settings(""))
+    sink = sink_module.TrafficHistorySink()
+    sink.add(13.7, 100.5, [_segment("w1")])
+
+    await sink.flush()
+
+    assert [store for store, _ in writes] == ["core"]
+
+
+@pytest.mark.asyncio
+async def test_threshold_schedules_background_flush(writes, monkeypatch):
+    monkeypatch.setattr(sink_module, "get_settings", _settings("postgresql://neon"))
+    sink = sink_module.TrafficHistorySink(flush_threshold=3)
+
+    sink.add(13.7, 100.5, [_segment(f"w{i}") for i in range(3)])
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert len(writes) == 1
+    assert len(writes[0][1]) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_and_cap_drops_oldest(monkeypatch):
+    monkeypatch.setattr(sink_module, "get_settings", _settings("postgresql://neon"))
+
+    async def failing(rows):
+        raise OSError("neon unreachable")
+
+    monkeypatch.setattr(sink_module.TrafficHistorySink, "_write_history", staticmethod(failing))
+    sink = sink_module.TrafficHistorySink(max_buffered=3)
+    sink.add(13.7, 100.5, [_segment("w1"), _segment("w2")])
+
+    assert await sink.flush() == 0
+    assert len(sink) == 2
+
+    sink.add(13.7, 100.5, [_segment("w3"), _segment("w4")])
+    assert len(sink) == 3
+    assert [way_id for way_id, _ in sink._rows] == ["w2", "w3", "w4"]
+
+
+@pytest.mark.asyncio
+async def test_rows_dropped_without_a_store_are_not_counted_as_written(monkeypatch):
+    import app.core.supabase as supabase_module
+
+    monkeypatch.setattr(sink_module, "get_settings", _settings(""))
+    monkeypatch.setattr(supabase_module, "supabase_admin", None)
+    before = REGISTRY.get_sample_value("traffic_history_rows_total", {"result": "written"}) or 0.0
+    sink = sink_module.TrafficHistorySink()
+    sink.add(13.7, 100.5, [_segment("w1"), _segment("w2")])
+
+    assert await sink.flush() == 0
+    assert (REGISTRY.get_sample_value("traffic_history_rows_total", {"result": "written"}) or 0.0) == before
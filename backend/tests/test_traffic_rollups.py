@@ -0,0 +1,162 @@
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services.traffic import rollups as rollups_module
+from app.services.traffic.base import StandardTrafficSegment, TrafficDensity
+from app.services.traffic.rollups import TrafficRollups, hour_of_week
+
+SIAM = (13.7456, 100.5347)
+# Friday 2026-10-16 18:07 UTC
+FRIDAY = datetime(2026, 10, 16, 18, 7, tzinfo=UTC)
+
+
+def _segment(way_id: str, speed: float) -> StandardTrafficSegment:
+    return StandardTrafficSegment(
+        way_id=way_id,
+        name="Sukhumvit 55",
+        density=TrafficDensity.MODERATE,
+        speed_kmh=speed,
+        free_flow_speed_kmh=50.0,
+        current_travel_time_sec=120,
+        free_flow_travel_time_sec=90,
+        provider="osm",
+    )
+
+
+@pytest.fixture()
+def writes(monkeypatch):
+    calls: list[tuple[list[dict], list[dict]]] = []
+
+    async def write_core(bucket_rows, profile_rows):
+        calls.append((bucket_rows, profile_rows))
+        return True
+
+    monkeypatch.setattr(rollups_module, "get_settings", lambda: SimpleNamespace(NEON_DATABASE_URL=""))
+    monkeypatch.setattr(TrafficRollups, "_write_core", staticmethod(write_core))
+    return calls
+
+
+def test_hour_of_week_starts_monday_utc():
+    assert hour_of_week(datetime(2026, 10, 12, 0, 30, tzinfo=UTC)) == 0
+    assert hour_of_week(FRIDAY) == 4 * 24 + 18
+
+
+@pytest.mark.asyncio
+async def test_closed_minutes_fold_into_buckets_and_profile(writes):
+    rollups = TrafficRollups()
+    rollups.observe(*SIAM, [_segment("w1", 10.0)], now=FRIDAY)
+    rollups.observe(*SIAM, [_segment("w1", 20.0)], now=FRIDAY + timedelta(seconds=30))  # same minute: replaces
+    rollups.observe(*SIAM, [_segment("w1", 40.0)], now=FRIDAY + timedelta(minutes=1))
+
+    # Only the closed minute is folded; 18:08 is still open.
+    assert await rollups.flush(now=FRIDAY + timedelta(minutes=1)) == 3
+    bucket_rows, profile_rows = writes[0]
+    by_resolution = {row["resolution"]: row for row in bucket_rows}
+    assert by_resolution["15m"]["bucket_start"] == datetime(2026, 10, 16, 18, 0, tzinfo=UTC)
+    assert by_resolution["1h"]["samples"] == 1
+    assert by_resolution["1h"]["speed_sum"] == 20.0
+    assert profile_rows[0]["hour_of_week"] == hour_of_week(FRIDAY)
+    assert profile_rows[0]["speed_sq_sum"] == 400.0
+
+    await rollups.flush(now=FRIDAY + timedelta(minutes=2))
+    assert writes[1][0][0]["speed_sum"] == 40.0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_merges_back_additively(writes, monkeypatch):
+    rollups = TrafficRollups()
+
+    async def failing(bucket_rows, profile_rows):
+        raise OSError("store down")
+
+    monkeypatch.setattr(TrafficRollups, "_write_core", staticmethod(failing))
+    rollups.observe(*SIAM, [_segment("w1", 10.0)], now=FRIDAY)
+    assert await rollups.flush(now=FRIDAY + timedelta(minutes=1)) == 0
+
+    rollups.observe(*SIAM, [_segment("w1", 30.0)], now=FRIDAY + timedelta(minutes=1))
+    rollups._close_minutes(FRIDAY + timedelta(minutes=2))
+    hourly = rollups._buckets[("w1", "1h", datetime(2026, 10, 16, 18, 0, tzinfo=UTC))]
+    assert (hourly["samples"], hourly["speed_sum"], hourly["speed_min"]) == (2, 40.0, 10.0)
+
+
+@pytest.mark.asyncio
+async def test_pending_keys_are_capped_during_an_outage(writes, monkeypatch):
+    rollups = TrafficRollups()
+
+    async def failing(bucket_rows, profile_rows):
+        raise OSError("store down")
+
+    monkeypatch.setattr(TrafficRollups, "_write_core", staticmethod(failing))
+    monkeypatch.setattr(rollups_module, "_MAX_KEYS", 5)
+    for hour in range(4):
+        rollups.observe(*SIAM, [_segment("w1", 30.0)], now=FRIDAY + timedelta(hours=hour))
+        await rollups.flush(now=FRIDAY + timedelta(hours=hour, minutes=1))
+
+    assert len(rollups._buckets) + len(rollups._profile) == 5
+    assert rollups._buckets[("w1", "1h", datetime(2026, 10, 16, 18, 0, tzinfo=UTC))]["samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_trends_compare_current_with_typical(monkeypatch):
+    rollups = TrafficRollups()
+    how = hour_of_week(FRIDAY)
+
+    async def read_trends(way_ids, first_hour, last_hour, since):
+        assert (first_hour, last_hour) == (96, 119)
+        profiles = [
+            {"way_id": "w1", "hour_of_week": how, "name": "Thonglor", "samples": 4, "speed_sum": 120.0},
+            {"way_id": "w1", "hour_of_week": how - 1, "name": "Thonglor", "samples": 2, "speed_sum": 80.0},
+        ]
+        current = {"w1": {"way_id": "w1", "bucket_start": FRIDAY, "samples": 3, "speed_sum": 45.0}}
+        return profiles, current
+
+    monkeypatch.setattr(rollups, "_read_trends", read_trends)
+
+    trends = await rollups.trends(["w1", "w2"], now=FRIDAY)
+
+    assert trends[0]["typical_speed_kmh"] == 30.0
+    assert trends[0]["current_speed_kmh"] == 15.0
+    assert trends[0]["delta_pct"] == -50.0
+    assert trends[0]["day_profile"][17:19] == [40.0, 30.0]
+    assert trends[1]["typical_speed_kmh"] is None and trends[1]["samples"] == 0
+
+
+@pytest.mark.asyncio
+async def test_priors_skip_sparse_roads_and_are_cached(monkeypatch):
+    rollups = TrafficRollups()
+    reads = []
+
+    async def read_priors(cell, how):
+        reads.append((cell, how))
+        return [
+            {"way_id": "w1", "name": "Nimman", "samples": 10, "speed_sum": 200.0, "free_flow_kmh": 50.0},
+            {"way_id": "w2", "name": "Nimman Soi 1", "samples": 1, "speed_sum": 40.0, "free_flow_kmh": 50.0},
+        ]
+
+    monkeypatch.setattr(rollups, "_read_priors", read_priors)
+
+    priors = await rollups.priors("87283472bffffff", now=FRIDAY)
+    await rollups.priors("87283472bffffff", now=FRIDAY)
+
+    assert [(p["way_id"], p["speed_kmh"], p["density"], p["provider"]) for p in priors] == [
+        ("w1", 20.0, "heavy", "history")
+    ]
+    assert len(reads) == 1
+
+
+def test_trends_endpoint(client, monkeypatch):
+    async def fake_trends(way_ids):
+        return [{"way_id": way_id, "typical_speed_kmh": 30.0} for way_id in way_ids]
+
+    monkeypatch.setattr(rollups_module.traffic_rollups, "trends", fake_trends)
+    url = f"{settings.API_V1_STR}/traffic/trends"
+
+    response = client.get(url, params=[("way_id", "w1"), ("way_id", "w1"), ("way_id", "w2")])
+    assert response.status_code == 200
+    assert [t["way_id"] for t in response.json()["trends"]] == ["w1", "w2"]
+
+    too_many = client.get(url, params=[("way_id", f"w{i}") for i in range(51)])
+    assert too_many.status_code == 400
@@ -0,0 +1,171 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.core.supabase as supabase_module
+import app.db.session as session_module
+from app.jobs import triad_reconcile
+from app.services.vector import places_vector_service as vector_service
+
+VENUES = [
+    {
+        "id": f"00000000-0000-0000-0000-00000000000{i}",
+        "name": f"Bar {i}",
+        "category": "bar",
+        "description": None,
+        "updated_at": "2026-03-01T00:00:00+00:00",
+    }
+    for i in range(1, 4)
+]
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.count_mode = None
+        self.update_payload = None
+        self.ids = None
+        self.limit_value = None
+
+    def select(self, _cols, count=None):
+        self.count_mode = count
+        return self
+
+    def or_(self, _filter):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, value):
+        self.limit_value = value
+        return self
+
+    def update(self, payload):
+        self.update_payload = payload
+        return self
+
+    def in_(self, _col, ids):
+        self.ids = ids
+        return self
+
+    def execute(self):
+        if self.update_payload is not None:
+            self.db.stamp_batches.append(len(self.ids))
+            self.db.stamped.extend(self.ids)
+            return SimpleNamespace(data=[], count=None)
+        if self.count_mode:
+            return SimpleNamespace(data=[], count=len(self.db.venues))
+        self.db.limits.append(self.limit_value)
+        return SimpleNamespace(data=self.db.venues[: self.limit_value], count=None)
+
+
+class FakeSupabase:
+    def __init__(self, venues):
+        self.venues = venues
+        self.stamped: list[str] = []
+        self.stamp_batches: list[int] = []
+        self.limits: list[int] = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.points: dict[str, dict] = {}
+
+    def retrieve(self, collection_name, ids, with_payload, with_vectors):
+        return [SimpleNamespace(id=i, payload=self.points[i]) for i in ids if i in self.points]
+
+
+@pytest.fixture()
+def reconcile_env(monkeypatch):
+    db = FakeSupabase([dict(v) for v in VENUES])
+    qdrant = FakeQdrant()
+    embed_batches: list[int] = []
+
+    async def fake_embed_texts(texts):
+        embed_batches.append(len(texts))
+        return [[0.1] for _ in texts]
+
+    async def fake_upsert_points(_client, points):
+        for point in points:
+            qdrant.points[point.id] = point.payload
+
+    async def noop():
+        return None
+
+    monkeypatch.setattr(supabase_module, "supabase_admin", db)
+    monkeypatch.setattr(session_module, "_async_qdrant_client", SimpleNamespace(instance=qdrant))
+    monkeypatch.setattr(vector_service, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(vector_service, "upsert_points", fake_upsert_points)
+    monkeypatch.setattr(vector_service, "configure_genai_once", noop)
+    return db, qdrant, embed_batches
+
+
+@pytest.mark.asyncio
+async def test_reconcile_batches_embeddings(reconcile_env):
+    db, qdrant, embed_batches = reconcile_env
+
+    remaining = await triad_reconcile._reconcile_once()
+
+    assert remaining == 0
+    assert embed_batches == [3]
+    assert len(qdrant.points) == 3
+    assert sorted(db.stamped) == sorted(v["id"] for v in VENUES)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_skips_unchanged_text(reconcile_env):
+    db, _, embed_batches = reconcile_env
+    await triad_reconcile._reconcile_once()
+    embed_batches.clear()
+    db.stamped.clear()
+    db.venues[0]["name"] = "Renamed Bar"
+
+    await triad_reconcile._reconcile_once()
+
+    assert embed_batches == [1]
+    assert len(db.stamped) == 3
+
+
+@pytest.mark.asyncio
+async def test_stamps_are_chunked(reconcile_env, monkeypatch):
+    db, _, _ = reconcile_env
+    monkeypatch.setattr(triad_reconcile, "_STAMP_CHUNK", 2)
+
+    await triad_reconcile._reconcile_once()
+
+    assert db.stamp_batches == [2, 1]
+    assert sorted(db.stamped) == sorted(v["id"] for v in VENUES)
+
+
+@pytest.mark.asyncio
+async def test_run_forever_survives_unexpected_errors(monkeypatch):
+    passes = []
+
+    async def flaky():
+        passes.append(1)
+        if len(passes) == 1:
+            raise KeyError("id")
+        raise asyncio.CancelledError
+
+    async def no_sleep(_seconds):
+        return None
+
+    monkeypatch.setattr(triad_reconcile, "_reconcile_once", flaky)
+    monkeypatch.setattr(triad_reconcile.asyncio, "sleep", no_sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await triad_reconcile.run_forever()
+    assert len(passes) == 2
+
+
+def test_batch_size_and_interval_follow_backlog():
+    assert triad_reconcile._batch_size_for(3) == triad_reconcile._MIN_BATCH
+    assert triad_reconcile._batch_size_for(10_000) == triad_reconcile._MAX_BATCH
+    assert triad_reconcile.next_interval(120) == triad_reconcile._BACKLOG_INTERVAL_SECONDS
+    assert triad_reconcile.next_interval(0) == triad_reconcile._INTERVAL_SECONDS
+    assert triad_reconcile.next_interval(None) == triad_reconcile._INTERVAL_SECONDS
@@ -0,0 +1,327 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from postgrest import APIError
+
+import app.api.routers.owner as owner
+import app.services.venue_rollups as venue_rollups_module
+from app.jobs import venue_rollup_sync
+from app.services.hll import HyperLogLog
+from app.services.venue_rollups import VenueRollups, visitor_hash
+
+
+def _row(venue, event_type="venue_view", user=None, weight=1.0, at="2026-10-19T08:00:00+00:00"):
+    return {"venue_ref": venue, "event_type": event_type, "user_id": user, "sample_weight": weight, "created_at": at, "data": {}}
+
+
+def test_visitor_hash_matches_the_sql_expression():
+    # SELECT ('x' || substr(md5('abc'), 1, 16))::bit(64)::bigint
+    assert visitor_hash("abc") == -8070080442485551184
+
+
+@pytest.mark.asyncio
+async def test_observe_and_flush_merge_counts_and_visitors(monkeypatch):
+    rollups = VenueRollups()
+    written = []
+
+    async def write(count_rows, visitor_rows):
+        written.append((count_rows, visitor_rows))
+        return True
+
+    monkeypatch.setattr(VenueRollups, "_write", staticmethod(write))
+    rollups.observe([_row("v1", user="u1"), _row("v1", user="u1"), _row("v1", "map_pan", user="u2", weight=20.0)])
+    rollups.observe([_row("v1", user="u3", at="2026-10-19T23:30:00-02:00"), _row(None, user="u4")])
+
+    assert await rollups.flush() == 5
+    count_rows, visitor_rows = written[0]
+    assert sorted((r["day"], r["event_type"], r["events"]) for r in count_rows) == [
+        ("2026-10-19", "map_pan", 20.0),
+        ("2026-10-19", "venue_view", 2.0),
+        ("2026-10-20", "venue_view", 1.0),
+    ]
+    assert {r["day"]: HyperLogLog.from_hex(r["sketch"]).count() for r in visitor_rows} == {"2026-10-19": 2, "2026-10-20": 1}
+    assert len(rollups) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_without_a_store_reports_nothing_written(monkeypatch):
+    import app.core.supabase as supabase_module
+
+    monkeypatch.setattr(supabase_module, "supabase_admin", None)
+    rollups = VenueRollups()
+    rollups.observe([_row("v1", user="u1")])
+
+    assert await rollups.flush() == 0
+    assert len(rollups) == 0
+
+
+def test_visitor_precedence_matches_the_sql_backfill():
+    row = {"visitor_id": "anon-1", "user_id": "user-1", "session_id": "s-1", "data": {"visitor_id": "anon-2"}}
+    assert venue_rollups_module._visitor_of(row) == "anon-1"
+    assert venue_rollups_module._visitor_of({**row, "visitor_id": None}) == "anon-2"
+    assert venue_rollups_module._visitor_of({"user_id": "user-1", "session_id": "s-1"}) == "user-1"
+    assert venue_rollups_module._visitor_of({"session_id": "s-1", "data": {}}) == "s-1"
+
+
+@pytest.mark.asyncio
+async def test_anonymous_visitors_are_counted(client, monkeypatch):
+    from app.api.routers import analytics
+    from app.services.analytics_service import AnalyticsBuffer
+
+    buffer = AnalyticsBuffer(flush_threshold=10_000)
+    monkeypatch.setattr(analytics, "analytics_buffer", buffer)
+
+    response = client.post(
+        "/api/v1/analytics/batch",
+        json=[{"event_type": "venue_view", "data": {"venue_id": "v1"}, "visitor_id": "anon-1"}],
+        headers={"X-Visitor-Id": "anon-header"},
+    )
+    assert response.status_code == 200
+    client.post("/api/v1/analytics/log", json={"event_type": "venue_view", "data": {"venue_id": "v1"}},
+                headers={"X-Visitor-Id": "anon-2"})
+
+    assert [row["visitor_id"] for row in buffer._buffer] == ["anon-1", "anon-2"]
+    rollups = VenueRollups()
+    rollups.observe([{**row, "id": i} for i, row in enumerate(buffer._buffer)])
+    assert [sketch.count() for sketch in rollups._visitors.values()] == [2]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_additively(monkeypatch):
+    rollups = VenueRollups()
+
+    async def down(count_rows, visitor_rows):
+        raise OSError("supabase unavailable")
+
+    monkeypatch.setattr(VenueRollups, "_write", staticmethod(down))
+    rollups.observe([_row("v1", user="u1")])
+    assert await rollups.flush() == 0
+    rollups.observe([_row("v1", user="u2")])
+
+    written = []
+
+    async def write(count_rows, visitor_rows):
+        written.append((count_rows, visitor_rows))
+        return True
+
+    monkeypatch.setattr(VenueRollups, "_write", staticmethod(write))
+    assert await rollups.flush() == 2
+    count_rows, visitor_rows = written[0]
+    assert count_rows[0]["events"] == 2.0
+    assert HyperLogLog.from_hex(visitor_rows[0]["sketch"]).count() == 2
+
+
+def _sketch(*visitors):
+    sketch = HyperLogLog()
+    for visitor in visitors:
+        sketch.add(visitor_hash(visitor))
+    return sketch.to_hex()
+
+
+def _rollup_rows(today, yesterday):
+    counts = [
+        {"venue_ref": "v1", "day": today.isoformat(), "event_type": "venue_view", "events": 3},
+        {"venue_ref": "v2", "day": today.isoformat(), "event_type": "map_pan", "events": 20.0},
+        {"venue_ref": "v1", "day": yesterday.isoformat(), "event_type": "venue_view", "events": 1},
+    ]
+    visitors = [
+        {"venue_ref": "v1", "day": today.isoformat(), "sketch": _sketch("a", "b")},
+        {"venue_ref": "v2", "day": today.isoformat(), "sketch": _sketch("b", "c")},
+        {"venue_ref": "v1", "day": yesterday.isoformat(), "sketch": _sketch("a")},
+    ]
+    return counts, visitors
+
+
+class FakeRollupStore:
+    """Serves the rollup tables; the trend RPC is missing, as before its migration."""
+
+    def __init__(self, counts, visitors):
+        self.tables = {"analytics_venue_daily": counts, "analytics_venue_visitors": visitors}
+        self.reads = []
+
+    def rpc(self, name, params):
+        def execute():
+            raise APIError({"message": f"function {name} does not exist", "code": "42883"})
+
+        return SimpleNamespace(execute=execute)
+
+    def table(self, name):
+        store, state = self, {}
+
+        class Query:
+            def select(self, columns):
+                return self
+
+            def in_(self, column, values):
+                state["refs"] = set(values)
+                return self
+
+            def gte(self, column, value):
+                state["since"] = value
+                return self
+
+            def execute(self):
+                store.reads.append((name, sorted(state["refs"])))
+                rows = [r for r in store.tables[name] if r["venue_ref"] in state["refs"] and r["day"] >= state["since"]]
+                return SimpleNamespace(data=rows)
+
+        return Query()
+
+
+@pytest.mark.asyncio
+async def test_trend_falls_back_to_parallel_chunked_reads(monkeypatch):
+    monkeypatch.setattr(venue_rollups_module, "_READ_CHUNK", 1)
+    today = datetime.now(UTC).date()
+    store = FakeRollupStore(*_rollup_rows(today, today - timedelta(days=1)))
+
+    days = await VenueRollups().trend(store, ["v1", "v2", "v3"], today)
+
+    assert len(store.reads) == 6  # three chunks per table
+    assert list(days) == [today.isoformat()]
+    assert days[today.isoformat()]["events"] == 23.0
+    assert days[today.isoformat()]["active_venues"] == 2
+    assert days[today.isoformat()]["sketch"].count() == 3
+
+
+@pytest.mark.asyncio
+async def test_trend_unions_per_venue_rpc_rows():
+    today = datetime.now(UTC).date()
+    rows = [
+        {"venue_ref": "v1", "day": today.isoformat(), "events": 3.0, "sketch": _sketch("a", "b")},
+        {"venue_ref": "v2", "day": today.isoformat(), "events": 20.0, "sketch": _sketch("b", "c")},
+        {"venue_ref": "v3", "day": today.isoformat(), "events": None, "sketch": _sketch("d")},
+    ]
+    store = SimpleNamespace(rpc=lambda name, params: SimpleNamespace(execute=lambda: SimpleNamespace(data=rows)))
+
+    days = await VenueRollups().trend(store, ["v1", "v2", "v3"], today)
+
+    assert days[today.isoformat()]["events"] == 23.0
+    assert days[today.isoformat()]["active_venues"] == 2
+    assert days[today.isoformat()]["sketch"].count() == 4
+
+
+def test_insights_are_read_from_the_rollups(client, monkeypatch):
+    today = datetime.now(UTC).date()
+    yesterday = today - timedelta(days=1)
+    day_rows = {
+        today.isoformat(): {"events": 23.0, "active_venues": 2, "sketch": HyperLogLog.from_hex(_sketch("a", "b", "c"))},
+        yesterday.isoformat(): {"events": 1.0, "active_venues": 1, "sketch": HyperLogLog.from_hex(_sketch("a"))},
+    }
+
+    async def owned(visitor_id, limit=200):
+        return [{"id": "v1"}, {"id": "v2"}]
+
+    async def trend(client, venue_ids, since):
+        assert venue_ids == ["v1", "v2"]
+        return day_rows
+
+    monkeypatch.setattr(owner, "require_valid_visitor", lambda visitor_id, token: visitor_id)
+    monkeypatch.setattr(owner, "_fetch_owned_venues", owned)
+    monkeypatch.setattr(owner.venue_rollups, "trend", trend)
+
+    response = client.get("/api/v1/owner/insights", params={"visitor_id": "owner-1", "days": 7})
+    assert response.status_code == 200
+    trend_rows = {row["date"]: row for row in response.json()["trend"]}
+    assert trend_rows[today.isoformat()] == {"date": today.isoformat(), "events": 23, "active_venues": 2, "unique_visitors": 3}
+    assert trend_rows[yesterday.isoformat()]["events"] == 1
+    assert trend_rows[yesterday.isoformat()]["unique_visitors"] == 1
+    assert response.json()["summary"]["unique_visitors_total"] == 3
+
+
+class FakeEventStore(FakeRollupStore):
+    """analytics_events plus the watermark; advance_analytics_venue_rollups merges like the SQL."""
+
+    def __init__(self, events):
+        super().__init__([], [])
+        self.tables["analytics_events"] = events
+        self.last_event_id = 0
+
+    def rpc(self, name, params):
+        if name != "advance_analytics_venue_rollups":
+            return super().rpc(name, params)
+
+        def execute():
+            if params["p_after"] != self.last_event_id:
+                return SimpleNamespace(data=False)
+            self.last_event_id = params["p_through"]
+            daily, visitors = self.tables["analytics_venue_daily"], self.tables["analytics_venue_visitors"]
+            for row in params["p_counts"]:
+                match = next((r for r in daily if r["venue_ref"] == row["venue_ref"] and r["day"] == row["day"] and r["event_type"] == row["event_type"]), None)
+                if match:
+                    match["events"] += row["events"]
+                else:
+                    daily.append(dict(row))
+            for row in params["p_visitors"]:
+                match = next((r for r in visitors if r["venue_ref"] == row["venue_ref"] and r["day"] == row["day"]), None)
+                if match:
+                    match["sketch"] = HyperLogLog.from_hex(match["sketch"]).merge(HyperLogLog.from_hex(row["sketch"])).to_hex()
+                else:
+                    visitors.append(dict(row))
+            return SimpleNamespace(data=True)
+
+        return SimpleNamespace(execute=execute)
+
+    def table(self, name):
+        if name not in ("analytics_events", "analytics_venue_rollup_state"):
+            return super().table(name)
+        store, state = self, {}
+
+        class Query:
+            def select(self, columns):
+                return self
+
+            def eq(self, column, value):
+                return self
+
+            def gt(self, column, value):
+                state["after"] = value
+                return self
+
+            def order(self, column):
+                return self
+
+            def limit(self, n):
+                state["limit"] = n
+                return self
+
+            def execute(self):
+                if name == "analytics_venue_rollup_state":
+                    return SimpleNamespace(data=[{"last_event_id": store.last_event_id}])
+                rows = [r for r in store.tables[name] if r["id"] > state["after"]]
+                return SimpleNamespace(data=rows[: state["limit"]])
+
+        return Query()
+
+
+def test_events_inserted_outside_the_buffer_reach_insights(client, monkeypatch):
+    settled = (datetime.now(UTC) - timedelta(minutes=5)).isoformat()
+    # As the analytics-ingest edge function stores them: no buffer, venue ref in metadata.
+    events = [
+        {"id": 1, "event_type": "venue_view", "venue_ref": None, "venue_id": None, "user_id": None,
+         "session_id": "s-1", "data": {}, "metadata": {"venue_ref": "v1"}, "sample_weight": None, "created_at": settled},
+        {"id": 2, "event_type": "venue_view", "venue_ref": "v1", "venue_id": None, "user_id": None,
+         "session_id": "s-2", "data": {}, "sample_weight": 1.0, "created_at": settled},
+        {"id": 3, "event_type": "venue_view", "venue_ref": "v1", "venue_id": None, "user_id": None,
+         "session_id": "s-3", "data": {}, "sample_weight": 1.0, "created_at": datetime.now(UTC).isoformat()},
+    ]
+    store = FakeEventStore(events)
+
+    assert asyncio.run(venue_rollup_sync.sync_once(store)) == 2
+    assert store.last_event_id == 2  # the unsettled row waits for the next pass
+    assert asyncio.run(venue_rollup_sync.sync_once(store)) == 0
+
+    async def owned(visitor_id, limit=200):
+        return [{"id": "v1"}]
+
+    monkeypatch.setattr(owner, "require_valid_visitor", lambda visitor_id, token: visitor_id)
+    monkeypatch.setattr(owner, "_fetch_owned_venues", owned)
+    monkeypatch.setattr(owner, "supabase_admin", store)
+
+    response = client.get("/api/v1/owner/insights", params={"visitor_id": "owner-1", "days": 7})
+    assert response.status_code == 200
+    day = datetime.fromisoformat(settled).date().isoformat()
+    trend_rows = {row["date"]: row for row in response.json()["trend"]}
+    assert trend_rows[day]["events"] == 2
+    assert trend_rows[day]["unique_visitors"] == 2  # anonymous sessions s-1 and s-2
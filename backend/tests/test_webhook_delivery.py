@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services import webhook_delivery as delivery_module
+from app.services.webhook_delivery import WebhookDeliveryEngine, _MemoryQueue, generate_signature
+
+
+def _task(url: str, message_id: str = "m1") -> dict:
+    return {
+        "subscription": {"id": "s1", "merchant_id": "shop-1", "target_url": url, "secret": "s3cret"},
+        "message": {"id": message_id, "event_type": "traffic_jam", "payload": {"road": "Sukhumvit"}, "retry_count": 0},
+    }
+
+
+@pytest.fixture()
+def engine(monkeypatch):
+    failed = []
+
+    async def on_exhausted(sub, msg):
+        failed.append(msg["id"])
+
+    async def memory_queue():
+        return _MemoryQueue()
+
+    monkeypatch.setattr(WebhookDeliveryEngine, "_connect", staticmethod(memory_queue))
+    engine = WebhookDeliveryEngine(on_exhausted=on_exhausted, workers=4, per_host_limit=2)
+    engine.failed = failed
+    return engine
+
+
+def _serve(engine, handler):
+    engine._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_failures_are_rescheduled_with_backoff_instead_of_sleeping(engine, monkeypatch):
+    monkeypatch.setattr(delivery_module.random, "uniform", lambda a, b: 1.0)
+    _serve(engine, lambda request: httpx.Response(503))
+    task = _task("https://down.example/hook")
+
+    started = time.monotonic()
+    assert await engine.deliver(task) == "retried"
+    assert await engine.deliver(task) == "retried"
+    assert time.monotonic() - started < 1  # the worker never waits out the backoff
+
+    queue = await engine._get_queue()
+    due = sorted(item[0] for item in queue._delayed)
+    now = time.time()
+    assert due[0] - now == pytest.approx(30, abs=2)
+    assert due[1] - now == pytest.approx(60, abs=2)
+    assert await queue.promote_due(now, 10) == 0
+    assert await queue.promote_due(now + 61, 10) == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_and_exhausted_retries_fall_back(engine):
+    _serve(engine, lambda request: httpx.Response(410))
+    assert await engine.deliver(_task("https://gone.example/hook", "m-gone")) == "failed"
+
+    _serve(engine, lambda request: httpx.Response(500))
+    task = _task("https://flaky.example/hook", "m-flaky")
+    task["message"]["retry_count"] = WebhookDeliveryEngine.MAX_RETRIES
+    engine._breaker("flaky.example").min_calls = 100
+    assert await engine.deliver(task) == "failed"
+    assert engine.failed == ["m-gone", "m-flaky"]
+
+
+@pytest.mark.asyncio
+async def test_signed_body_matches_sent_body(engine):
+    seen = {}
+
+    def handler(request):
+        seen["body"] = request.content.decode()
+        seen["signature"] = request.headers["X-VibeCity-Signature"]
+        return httpx.Response(204)
+
+    _serve(engine, handler)
+    assert await engine.deliver(_task("https://shop.example/hook")) == "delivered"
+    assert seen["signature"] == generate_signature("s3cret", seen["body"])
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_defers_without_spending_retries(engine):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.host)
+        return httpx.Response(502)
+
+    _serve(engine, handler)
+    for i in range(3):
+        await engine.deliver(_task("https://down.example/hook", f"m{i}"))
+    assert engine._breaker("down.example").state == "open"
+
+    task = _task("https://down.example/hook", "m-late")
+    assert await engine.deliver(task) == "deferred"
+    assert task["message"]["retry_count"] == 0
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_slow_host_does_not_block_other_merchants(engine):
+    release = asyncio.Event()
+    delivered = []
+
+    async def handler(request):
+        if request.url.host == "slow.example":
+            await release.wait()
+        delivered.append(request.url.host)
+        return httpx.Response(200)
+
+    _serve(engine, handler)
+    for i in range(3):
+        await engine.enqueue(_task("https://slow.example/hook", f"slow{i}"))
+    await engine.enqueue(_task("https://fast.example/hook", "fast"))
+    await engine.start()
+    try:
+        for _ in range(50):
+            if "fast.example" in delivered:
+                break
+            await asyncio.sleep(0.01)
+        assert delivered == ["fast.example"]
+
+        # The slow host is capped at two in-flight deliveries; the third waits in the delay queue.
+        queue = await engine._get_queue()
+        assert any('"slow2"' in raw for _, _, raw in queue._delayed)
+        release.set()
+        for _ in range(50):
+            if delivered.count("slow.example") == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert delivered.count("slow.example") == 2
+    finally:
+        await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_host_state_is_bounded_and_not_exported_per_host(engine, monkeypatch):
+    from prometheus_client import REGISTRY
+
+    from app.core import resilience
+
+    monkeypatch.setattr(delivery_module, "_MAX_TRACKED_HOSTS", 3)
+    _serve(engine, lambda request: httpx.Response(502))
+    for i in range(5):
+        await engine.deliver(_task(f"https://shop{i}.example/hook", f"m{i}"))
+    engine._breaker("shop4.example").record_failure()
+    engine._breaker("shop4.example").record_failure()
+
+    assert list(engine._hosts) == ["shop2.example", "shop3.example", "shop4.example"]
+    assert not any(name.startswith("webhook:") for name in resilience.breaker_states())
+    assert REGISTRY.get_sample_value("circuit_breaker_state", {"name": "webhook:shop4.example"}) is None
+    engine._export_host_circuits()
+    assert REGISTRY.get_sample_value("webhook_host_circuits", {"state": "open"}) == 1
+    assert REGISTRY.get_sample_value("webhook_host_circuits", {"state": "closed"}) == 2
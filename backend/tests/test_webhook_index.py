@@ -0,0 +1,158 @@
+import random
+
+import pytest
+
+from app.services.webhook_index import SubscriptionIndex
+from app.services.webhook_service import WebhookService, WebhookSubscription
+
+SIAM = (13.7456, 100.5347)
+ASOK = (13.7370, 100.5603)  # ~2.9 km from Siam
+
+
+def _sub(sub_id, lat=None, lng=None, merchant="shop-1", **condition):
+    return WebhookSubscription(
+        id=sub_id,
+        merchant_id=merchant,
+        target_url="https://shop.example/hook",
+        conditions=[{"event_type": "traffic_jam", **condition}],
+        lat=lat,
+        lng=lng,
+    )
+
+
+def test_match_respects_radius_severity_and_event_type():
+    index = SubscriptionIndex()
+    index.upsert(_sub("near", *SIAM, radius_m=500))
+    index.upsert(_sub("wide", *SIAM, radius_m=5000))
+    index.upsert(_sub("critical-only", *SIAM, radius_m=5000, severity_threshold="critical"))
+
+    assert [s.id for s in index.match("traffic_jam", "major", *ASOK)] == ["wide"]
+    assert [s.id for s in index.match("traffic_jam", "major", *SIAM)] == ["near", "wide"]
+    assert [s.id for s in index.match("traffic_jam", "critical", *ASOK)] == ["critical-only", "wide"]
+    assert index.match("traffic_jam", "minor", *SIAM) == []
+    assert index.match("accident", "critical", *SIAM) == []
+
+
+def test_updates_and_deactivation_replace_index_entries():
+    index = SubscriptionIndex()
+    index.upsert(_sub("s1", *SIAM, radius_m=500))
+    index.upsert(_sub("s1", *ASOK, radius_m=500))  # merchant moved
+
+    assert index.match("traffic_jam", "major", *SIAM) == []
+    assert [s.id for s in index.match("traffic_jam", "major", *ASOK)] == ["s1"]
+
+    index.upsert(_sub("s1", *ASOK, radius_m=500).model_copy(update={"active": False}))
+    assert index.match("traffic_jam", "major", *ASOK) == []
+    assert len(index) == 0 and index._buckets == {} and index._radius == {}
+
+
+def test_events_without_location_only_reach_the_addressed_merchant():
+    index = SubscriptionIndex()
+    index.upsert(_sub("placed", *SIAM, merchant="shop-1"))
+    index.upsert(_sub("unplaced", merchant="shop-1"))
+    index.upsert(_sub("other", merchant="shop-2"))
+
+    assert [s.id for s in index.match("traffic_jam", "major", merchant_id="shop-1")] == ["placed", "unplaced"]
+    assert index.match("traffic_jam", "major") == []
+    assert [s.id for s in index.match("traffic_jam", "major", *SIAM, merchant_id="shop-1")] == ["placed"]
+
+
+def test_match_agrees_with_a_full_scan():
+    rng = random.Random(7)
+    index = SubscriptionIndex()
+    subs = []
+    for i in range(2000):
+        sub = _sub(
+            f"s{i}",
+            13.70 + rng.random() * 0.1,
+            100.50 + rng.random() * 0.1,
+            radius_m=rng.choice([300, 1500, 4000, 12000]),
+        )
+        index.upsert(sub)
+        subs.append(sub)
+
+    from app.services.traffic.tiles import haversine_m
+
+    for _ in range(20):
+        lat, lng = 13.70 + rng.random() * 0.1, 100.50 + rng.random() * 0.1
+        expected = sorted(
+            s.id for s in subs if haversine_m(lat, lng, s.lat, s.lng) <= s.conditions[0].radius_m
+        )
+        assert sorted(s.id for s in index.match("traffic_jam", "major", lat, lng)) == expected
+
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.after = None
+        self.pages = 0
+
+    def select(self, columns):
+        return self
+
+    def or_(self, filters):
+        # updated_at.gt."<ts>",and(updated_at.eq."<ts>",id.gt."<id>")
+        quoted = filters.split('"')
+        self.after = (quoted[1], quoted[5])
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        ordered = sorted(self.rows, key=lambda r: (r["updated_at"], r["id"]))
+        rows = [r for r in ordered if not self.after or (r["updated_at"], r["id"]) > self.after]
+        self.after = None
+        self.pages += 1
+        return type("Resp", (), {"data": rows[: self.n]})()
+
+
+def _client(table):
+    return type("Client", (), {"table": lambda self, name: table})()
+
+
+@pytest.mark.asyncio
+async def test_sync_and_dispatch_use_the_index(monkeypatch):
+    rows = [
+        {**_sub("s1", *SIAM).model_dump(mode="json"), "updated_at": "2026-10-19T10:00:00+00:00"},
+        {**_sub("s2", *ASOK, merchant="shop-2").model_dump(mode="json"), "updated_at": "2026-10-19T10:00:01+00:00"},
+    ]
+    table = FakeTable(rows)
+    service = WebhookService()
+    monkeypatch.setattr(service, "_store", lambda: _client(table))
+    queued = []
+
+    async def enqueue(task):
+        queued.append(task)
+
+    monkeypatch.setattr(service._engine, "enqueue", enqueue)
+
+    assert await service.sync_subscriptions() == 2
+    await service.dispatch_event("traffic_jam", {"lat": SIAM[0], "lng": SIAM[1], "severity": "major"})
+    assert [t["subscription"]["id"] for t in queued] == ["s1"]
+    assert queued[0]["message"]["payload"]["merchant_id"] == "shop-1"
+
+    rows[0] = {**rows[0], "active": False, "updated_at": "2026-10-19T10:05:00+00:00"}
+    await service.sync_subscriptions()
+    queued.clear()
+    await service.dispatch_event("traffic_jam", {"lat": SIAM[0], "lng": SIAM[1], "severity": "major"})
+    assert queued == []
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_through_rows_sharing_a_timestamp(monkeypatch):
+    stamp = "2026-10-19T10:00:00+00:00"
+    rows = [{**_sub(f"s{i}", *SIAM).model_dump(mode="json"), "updated_at": stamp} for i in range(5)]
+    table = FakeTable(rows)
+    service = WebhookService()
+    monkeypatch.setattr(service, "SYNC_PAGE_SIZE", 2)
+    monkeypatch.setattr(service, "_store", lambda: _client(table))
+
+    assert await service.sync_subscriptions() == 5
+    assert table.pages == 3
+    assert len(service._index.match("traffic_jam", "major", *SIAM)) == 5
+    assert await service.sync_subscriptions() == 0
@@ -235,7 +235,9 @@ const buildInsightsFallback = async (venues, days) => {
 		try {
 			const { data, error } = await supabase
 				.from("analytics_events")
-				.select("created_at,venue_id,event_type,session_id,visitor_id,user_id")
+				.select(
+					"created_at,venue_id,event_type,session_id,visitor_id,user_id,sample_weight",
+				)
 				.in("venue_id", venueIds)
 				.gte("created_at", since.toISOString())
 				.order("created_at", { ascending: true })
@@ -252,7 +254,8 @@ const buildInsightsFallback = async (venues, days) => {
 		const key = dt.toISOString().slice(0, 10);
 		const current = trendMap.get(key);
 		if (!current) continue;
-		current.events += 1;
+		// Sampled and pre-aggregated rows stand for sample_weight events.
+		current.events += Number(event?.sample_weight) || 1;
 
 		const venueSet = venuesByDay.get(key) || new Set();
 		const venueId = String(event?.venue_id || "").trim();
@@ -0,0 +1,48 @@
+-- =============================================================================
+-- Traffic history: one row per (way_id, minute)
+-- The backend traffic history sink batches snapshots and upserts on
+-- (way_id, bucket_minute); this is the Supabase fallback store used when the
+-- Neon HISTORY database is not configured.
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.traffic_history (
+  way_id text NOT NULL,
+  bucket_minute timestamptz,
+  name text,
+  lat double precision,
+  lng double precision,
+  speed_kmh real,
+  density text,
+  confidence real,
+  provider text,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.traffic_history
+  ADD COLUMN IF NOT EXISTS bucket_minute timestamptz;
+
+UPDATE public.traffic_history
+SET bucket_minute = date_trunc('minute', created_at)
+WHERE bucket_minute IS NULL;
+
+-- Keep the latest row per (way_id, minute) before adding the unique index.
+DELETE FROM public.traffic_history t
+USING public.traffic_history newer
+WHERE t.way_id = newer.way_id
+  AND t.bucket_minute = newer.bucket_minute
+  AND (t.created_at, t.ctid) < (newer.created_at, newer.ctid);
+
+ALTER TABLE public.traffic_history
+  ALTER COLUMN bucket_minute SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS traffic_history_way_minute_uidx
+  ON public.traffic_history (way_id, bucket_minute);
+
+CREATE INDEX IF NOT EXISTS traffic_history_bucket_minute_idx
+  ON public.traffic_history (bucket_minute DESC);
+
+ALTER TABLE public.traffic_history ENABLE ROW LEVEL SECURITY;
+
+COMMIT;
@@ -0,0 +1,95 @@
+-- =============================================================================
+-- Traffic rollups: downsampled speed history per road
+-- traffic_rollup holds 15-minute and hourly buckets; traffic_speed_profile
+-- holds per-road averages by hour of week (UTC, 0 = Monday 00:00) and backs
+-- /traffic/trends and the fusion service's historical priors.
+-- Both store sums and counts, so the backend merges partial aggregates
+-- additively through merge_traffic_rollups (Supabase fallback store; the Neon
+-- HISTORY database runs the same upserts directly).
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.traffic_rollup (
+  way_id text NOT NULL,
+  resolution text NOT NULL CHECK (resolution IN ('15m', '1h')),
+  bucket_start timestamptz NOT NULL,
+  samples integer NOT NULL DEFAULT 0,
+  speed_sum double precision NOT NULL DEFAULT 0,
+  speed_min real,
+  speed_max real,
+  PRIMARY KEY (way_id, resolution, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS traffic_rollup_bucket_idx
+  ON public.traffic_rollup (resolution, bucket_start DESC);
+
+CREATE TABLE IF NOT EXISTS public.traffic_speed_profile (
+  way_id text NOT NULL,
+  hour_of_week smallint NOT NULL CHECK (hour_of_week BETWEEN 0 AND 167),
+  cell text,
+  name text,
+  lat double precision,
+  lng double precision,
+  free_flow_kmh real,
+  samples bigint NOT NULL DEFAULT 0,
+  speed_sum double precision NOT NULL DEFAULT 0,
+  speed_sq_sum double precision NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (way_id, hour_of_week)
+);
+
+CREATE INDEX IF NOT EXISTS traffic_speed_profile_cell_idx
+  ON public.traffic_speed_profile (cell, hour_of_week);
+
+ALTER TABLE public.traffic_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.traffic_speed_profile ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- RPC: merge_traffic_rollups
+-- Adds partial aggregates onto existing buckets / profile rows.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.merge_traffic_rollups(p_buckets JSONB, p_profile JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  INSERT INTO public.traffic_rollup AS t
+    (way_id, resolution, bucket_start, samples, speed_sum, speed_min, speed_max)
+  SELECT way_id, resolution, bucket_start, samples, speed_sum, speed_min, speed_max
+  FROM jsonb_to_recordset(COALESCE(p_buckets, '[]'::jsonb)) AS r(
+    way_id text, resolution text, bucket_start timestamptz, samples integer,
+    speed_sum double precision, speed_min real, speed_max real
+  )
+  ON CONFLICT (way_id, resolution, bucket_start) DO UPDATE SET
+    samples = t.samples + EXCLUDED.samples,
+    speed_sum = t.speed_sum + EXCLUDED.speed_sum,
+    speed_min = LEAST(t.speed_min, EXCLUDED.speed_min),
+    speed_max = GREATEST(t.speed_max, EXCLUDED.speed_max);
+
+  INSERT INTO public.traffic_speed_profile AS p
+    (way_id, hour_of_week, cell, name, lat, lng, free_flow_kmh, samples, speed_sum, speed_sq_sum, updated_at)
+  SELECT way_id, hour_of_week, cell, name, lat, lng, free_flow_kmh, samples, speed_sum, speed_sq_sum, updated_at
+  FROM jsonb_to_recordset(COALESCE(p_profile, '[]'::jsonb)) AS r(
+    way_id text, hour_of_week smallint, cell text, name text, lat double precision,
+    lng double precision, free_flow_kmh real, samples bigint, speed_sum double precision,
+    speed_sq_sum double precision, updated_at timestamptz
+  )
+  ON CONFLICT (way_id, hour_of_week) DO UPDATE SET
+    cell = EXCLUDED.cell,
+    name = EXCLUDED.name,
+    lat = EXCLUDED.lat,
+    lng = EXCLUDED.lng,
+    free_flow_kmh = EXCLUDED.free_flow_kmh,
+    samples = p.samples + EXCLUDED.samples,
+    speed_sum = p.speed_sum + EXCLUDED.speed_sum,
+    speed_sq_sum = p.speed_sq_sum + EXCLUDED.speed_sq_sum,
+    updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.merge_traffic_rollups(JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+
+COMMIT;
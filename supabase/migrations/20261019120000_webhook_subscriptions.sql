@@ -0,0 +1,49 @@
+-- =============================================================================
+-- Merchant traffic webhook subscriptions
+-- One row per subscription; conditions is the list of
+-- {event_type, severity_threshold, radius_m} the merchant wants alerts for
+-- around (lat, lng). The backend keeps an in-memory H3 index of active rows
+-- and syncs it incrementally by updated_at, so deactivate rows instead of
+-- deleting them.
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.webhook_subscriptions (
+  id uuid PRIMARY KEY,
+  merchant_id text NOT NULL,
+  target_url text NOT NULL,
+  conditions jsonb NOT NULL DEFAULT '[]'::jsonb,
+  lat double precision,
+  lng double precision,
+  secret text,
+  active boolean NOT NULL DEFAULT true,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS webhook_subscriptions_updated_idx
+  ON public.webhook_subscriptions (updated_at);
+CREATE INDEX IF NOT EXISTS webhook_subscriptions_merchant_idx
+  ON public.webhook_subscriptions (merchant_id);
+
+CREATE OR REPLACE FUNCTION public.touch_webhook_subscription()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.updated_at := now();
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS webhook_subscriptions_touch ON public.webhook_subscriptions;
+CREATE TRIGGER webhook_subscriptions_touch
+  BEFORE UPDATE ON public.webhook_subscriptions
+  FOR EACH ROW EXECUTE FUNCTION public.touch_webhook_subscription();
+
+-- Secrets are only readable by the service role.
+ALTER TABLE public.webhook_subscriptions ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.webhook_subscriptions FROM anon, authenticated;
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- =============================================================================
+-- Analytics ingestion policy: weighted rows
+-- The backend samples high-volume event types and pre-aggregates counter-only
+-- types per (venue, type, minute). Each stored row carries the number of
+-- events it stands for, so aggregates must SUM(sample_weight) instead of
+-- counting rows. Existing rows represent one event each.
+-- =============================================================================
+
+BEGIN;
+
+ALTER TABLE public.analytics_events
+  ADD COLUMN IF NOT EXISTS sample_weight real NOT NULL DEFAULT 1;
+
+COMMENT ON COLUMN public.analytics_events.sample_weight IS
+  'Events represented by this row: 1/sample rate for sampled types, the per-minute count for pre-aggregated rows.';
+
+COMMIT;
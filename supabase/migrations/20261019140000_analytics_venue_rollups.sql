@@ -0,0 +1,90 @@
+-- =============================================================================
+-- Per-venue daily analytics rollups for the owner dashboards
+-- analytics_venue_daily holds weighted event counts per (venue, UTC day,
+-- event type); analytics_venue_visitors holds the hashed visitor ids seen per
+-- (venue, day). The backend folds events in as it writes them and merges
+-- partial rollups through merge_analytics_venue_rollups (counts add, visitor
+-- sets union). Visitor hashes are the first 64 bits of md5(visitor id).
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.analytics_venue_daily (
+  venue_ref text NOT NULL,
+  day date NOT NULL,
+  event_type text NOT NULL,
+  events double precision NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_ref, day, event_type)
+);
+
+CREATE TABLE IF NOT EXISTS public.analytics_venue_visitors (
+  venue_ref text NOT NULL,
+  day date NOT NULL,
+  visitor_hashes bigint[] NOT NULL DEFAULT '{}',
+  PRIMARY KEY (venue_ref, day)
+);
+
+ALTER TABLE public.analytics_venue_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.analytics_venue_visitors ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.analytics_venue_daily FROM anon, authenticated;
+REVOKE ALL ON public.analytics_venue_visitors FROM anon, authenticated;
+
+-- ============================================================
+-- RPC: merge_analytics_venue_rollups
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.merge_analytics_venue_rollups(p_counts JSONB, p_visitors JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  INSERT INTO public.analytics_venue_daily AS d (venue_ref, day, event_type, events)
+  SELECT venue_ref, day, event_type, events
+  FROM jsonb_to_recordset(COALESCE(p_counts, '[]'::jsonb))
+    AS r(venue_ref text, day date, event_type text, events double precision)
+  ON CONFLICT (venue_ref, day, event_type) DO UPDATE SET
+    events = d.events + EXCLUDED.events;
+
+  INSERT INTO public.analytics_venue_visitors AS v (venue_ref, day, visitor_hashes)
+  SELECT r.venue_ref, r.day, ARRAY(SELECT jsonb_array_elements_text(r.visitor_hashes)::bigint)
+  FROM jsonb_to_recordset(COALESCE(p_visitors, '[]'::jsonb))
+    AS r(venue_ref text, day date, visitor_hashes jsonb)
+  ON CONFLICT (venue_ref, day) DO UPDATE SET
+    visitor_hashes = ARRAY(
+      SELECT DISTINCT h FROM unnest(v.visitor_hashes || EXCLUDED.visitor_hashes) AS h ORDER BY h
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.merge_analytics_venue_rollups(JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================
+-- Backfill from the raw events of the last 35 days
+-- ============================================================
+
+INSERT INTO public.analytics_venue_daily (venue_ref, day, event_type, events)
+SELECT
+  COALESCE(venue_ref, venue_id::text),
+  (created_at AT TIME ZONE 'UTC')::date,
+  event_type,
+  SUM(sample_weight)
+FROM public.analytics_events
+WHERE created_at >= now() - interval '35 days'
+  AND COALESCE(venue_ref, venue_id::text) IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (venue_ref, day, event_type) DO NOTHING;
+
+INSERT INTO public.analytics_venue_visitors (venue_ref, day, visitor_hashes)
+SELECT
+  COALESCE(venue_ref, venue_id::text),
+  (created_at AT TIME ZONE 'UTC')::date,
+  array_agg(DISTINCT ('x' || substr(md5(COALESCE(user_id::text, data->>'visitor_id', session_id)), 1, 16))::bit(64)::bigint)
+FROM public.analytics_events
+WHERE created_at >= now() - interval '35 days'
+  AND COALESCE(venue_ref, venue_id::text) IS NOT NULL
+  AND COALESCE(user_id::text, data->>'visitor_id', session_id) IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (venue_ref, day) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,79 @@
+-- =============================================================================
+-- HyperLogLog unique-visitor sketches for the venue rollups
+-- analytics_venue_visitors kept every hashed visitor id per (venue, day), so
+-- rows and dashboard reads grew with traffic. Each row now holds a fixed
+-- 4 KiB HyperLogLog sketch (2^12 one-byte registers, ~1.6% standard error)
+-- that unions register-wise, matching app/services/hll.py. Register index is
+-- the top 12 bits of the 64-bit visitor hash; the value is the position of the
+-- first set bit in the remaining 52 bits (53 when they are all zero).
+-- =============================================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.hll_from_hashes(p_hashes BIGINT[])
+RETURNS BYTEA
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT decode(string_agg(lpad(to_hex(COALESCE(r.rank, 0)), 2, '0'), '' ORDER BY i), 'hex')
+  FROM generate_series(0, 4095) AS i
+  LEFT JOIN (
+    SELECT
+      substring(h::bit(64) FROM 1 FOR 12)::int AS idx,
+      max(COALESCE(NULLIF(position(B'1' IN substring(h::bit(64) FROM 13)), 0), 53)) AS rank
+    FROM unnest(p_hashes) AS h
+    GROUP BY 1
+  ) AS r ON r.idx = i;
+$$;
+
+CREATE OR REPLACE FUNCTION public.hll_union(a BYTEA, b BYTEA)
+RETURNS BYTEA
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN a IS NULL THEN b
+    WHEN b IS NULL THEN a
+    ELSE (
+      SELECT decode(string_agg(lpad(to_hex(greatest(get_byte(a, i), get_byte(b, i))), 2, '0'), '' ORDER BY i), 'hex')
+      FROM generate_series(0, length(a) - 1) AS i
+    )
+  END;
+$$;
+
+ALTER TABLE public.analytics_venue_visitors ADD COLUMN IF NOT EXISTS sketch BYTEA;
+UPDATE public.analytics_venue_visitors
+SET sketch = public.hll_from_hashes(visitor_hashes)
+WHERE sketch IS NULL;
+ALTER TABLE public.analytics_venue_visitors ALTER COLUMN sketch SET NOT NULL;
+ALTER TABLE public.analytics_venue_visitors DROP COLUMN IF EXISTS visitor_hashes;
+
+-- ============================================================
+-- RPC: merge_analytics_venue_rollups (sketches instead of hash sets)
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.merge_analytics_venue_rollups(p_counts JSONB, p_visitors JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  INSERT INTO public.analytics_venue_daily AS d (venue_ref, day, event_type, events)
+  SELECT venue_ref, day, event_type, events
+  FROM jsonb_to_recordset(COALESCE(p_counts, '[]'::jsonb))
+    AS r(venue_ref text, day date, event_type text, events double precision)
+  ON CONFLICT (venue_ref, day, event_type) DO UPDATE SET
+    events = d.events + EXCLUDED.events;
+
+  INSERT INTO public.analytics_venue_visitors AS v (venue_ref, day, sketch)
+  SELECT venue_ref, day, sketch
+  FROM jsonb_to_recordset(COALESCE(p_visitors, '[]'::jsonb))
+    AS r(venue_ref text, day date, sketch bytea)
+  ON CONFLICT (venue_ref, day) DO UPDATE SET
+    sketch = public.hll_union(v.sketch, EXCLUDED.sketch);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.merge_analytics_venue_rollups(JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+
+COMMIT;
@@ -0,0 +1,50 @@
+-- =============================================================================
+-- Server-side daily trend for the owner dashboards
+-- analytics_venue_trend returns one row per UTC day for a set of venues:
+-- summed weighted events, the number of venues with activity and the union
+-- of their HyperLogLog visitor sketches. Owners with hundreds of venues get
+-- their whole window in a single call instead of chunked table reads.
+-- =============================================================================
+
+BEGIN;
+
+CREATE OR REPLACE AGGREGATE public.hll_union_agg(BYTEA) (
+  SFUNC = public.hll_union,
+  STYPE = BYTEA
+);
+
+-- ============================================================
+-- RPC: analytics_venue_trend
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.analytics_venue_trend(p_venue_refs TEXT[], p_since DATE)
+RETURNS TABLE (day DATE, events DOUBLE PRECISION, active_venues INTEGER, sketch BYTEA)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  WITH counts AS (
+    SELECT d.day, SUM(d.events) AS events, COUNT(DISTINCT d.venue_ref)::int AS active_venues
+    FROM public.analytics_venue_daily AS d
+    WHERE d.venue_ref = ANY(p_venue_refs) AND d.day >= p_since
+    GROUP BY d.day
+  ),
+  visitors AS (
+    SELECT v.day, public.hll_union_agg(v.sketch) AS sketch
+    FROM public.analytics_venue_visitors AS v
+    WHERE v.venue_ref = ANY(p_venue_refs) AND v.day >= p_since
+    GROUP BY v.day
+  )
+  SELECT
+    COALESCE(c.day, v.day),
+    COALESCE(c.events, 0),
+    COALESCE(c.active_venues, 0),
+    v.sketch
+  FROM counts AS c
+  FULL JOIN visitors AS v ON v.day = c.day
+  ORDER BY 1;
+$$;
+
+REVOKE ALL ON FUNCTION public.analytics_venue_trend(TEXT[], DATE) FROM PUBLIC, anon, authenticated;
+
+COMMIT;
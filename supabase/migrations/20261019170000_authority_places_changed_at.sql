@@ -0,0 +1,39 @@
+-- =============================================================================
+-- authority_places.changed_at for the lexical index refresh
+-- The backend refresh job paged on GREATEST(COALESCE(updated_at, created_at),
+-- created_at), an expression no index covers, so every minute it scanned the
+-- whole table. changed_at is a plain column stamped on every insert and
+-- update (including importer upserts that keep updated_at), and the job pages
+-- on the (changed_at, authority_id) keyset backed by the index below.
+-- =============================================================================
+
+BEGIN;
+
+ALTER TABLE public.authority_places ADD COLUMN IF NOT EXISTS changed_at timestamptz;
+
+UPDATE public.authority_places
+SET changed_at = GREATEST(COALESCE(updated_at, created_at), created_at)
+WHERE changed_at IS NULL;
+
+ALTER TABLE public.authority_places ALTER COLUMN changed_at SET DEFAULT now();
+ALTER TABLE public.authority_places ALTER COLUMN changed_at SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.authority_places_touch_changed_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.changed_at := now();
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_authority_places_changed_at ON public.authority_places;
+CREATE TRIGGER trg_authority_places_changed_at
+  BEFORE INSERT OR UPDATE ON public.authority_places
+  FOR EACH ROW EXECUTE FUNCTION public.authority_places_touch_changed_at();
+
+CREATE INDEX IF NOT EXISTS idx_authority_places_changed_keyset
+  ON public.authority_places (changed_at, authority_id);
+
+COMMIT;
@@ -0,0 +1,48 @@
+-- =============================================================================
+-- analytics_venue_trend: per-venue rows instead of an in-database sketch union
+-- hll_union_agg rebuilt a 4 KiB sketch through generate_series and string_agg
+-- for every row it folded in, so an owner with hundreds of venues paid that
+-- per venue and day. The RPC now returns one plain set-based row per
+-- (venue, day) with the summed events and the stored sketch; the API unions
+-- the sketches register-wise in NumPy (app/services/venue_rollups.py).
+-- =============================================================================
+
+BEGIN;
+
+DROP FUNCTION IF EXISTS public.analytics_venue_trend(TEXT[], DATE);
+DROP AGGREGATE IF EXISTS public.hll_union_agg(BYTEA);
+
+-- ============================================================
+-- RPC: analytics_venue_trend
+-- ============================================================
+
+CREATE FUNCTION public.analytics_venue_trend(p_venue_refs TEXT[], p_since DATE)
+RETURNS TABLE (venue_ref TEXT, day DATE, events DOUBLE PRECISION, sketch BYTEA)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  WITH counts AS (
+    SELECT d.venue_ref, d.day, SUM(d.events) AS events
+    FROM public.analytics_venue_daily AS d
+    WHERE d.venue_ref = ANY(p_venue_refs) AND d.day >= p_since
+    GROUP BY d.venue_ref, d.day
+  ),
+  visitors AS (
+    SELECT v.venue_ref, v.day, v.sketch
+    FROM public.analytics_venue_visitors AS v
+    WHERE v.venue_ref = ANY(p_venue_refs) AND v.day >= p_since
+  )
+  SELECT
+    COALESCE(c.venue_ref, v.venue_ref),
+    COALESCE(c.day, v.day),
+    c.events,
+    v.sketch
+  FROM counts AS c
+  FULL JOIN visitors AS v ON v.venue_ref = c.venue_ref AND v.day = c.day
+  ORDER BY 2, 1;
+$$;
+
+REVOKE ALL ON FUNCTION public.analytics_venue_trend(TEXT[], DATE) FROM PUBLIC, anon, authenticated;
+
+COMMIT;
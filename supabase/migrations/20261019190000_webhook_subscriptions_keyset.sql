@@ -0,0 +1,13 @@
+-- =============================================================================
+-- Keyset index for the webhook subscription sync
+-- The backend pages webhook_subscriptions by (updated_at, id) so rows that
+-- share one updated_at are not skipped at a page boundary; index the pair.
+-- =============================================================================
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS webhook_subscriptions_updated_id_idx
+  ON public.webhook_subscriptions (updated_at, id);
+DROP INDEX IF EXISTS public.webhook_subscriptions_updated_idx;
+
+COMMIT;
@@ -0,0 +1,109 @@
+-- =============================================================================
+-- Maintain the venue rollups from analytics_events itself
+-- The rollups were folded in by the backend's AnalyticsBuffer, so events the
+-- analytics-ingest edge function inserts directly never reached them. A
+-- backend job now follows analytics_events.id past a shared watermark and
+-- merges each batch through advance_analytics_venue_rollups, which moves the
+-- watermark and merges in one transaction: workers racing on the same batch
+-- merge it exactly once. The last 35 days are rebuilt from the raw events so
+-- edge-ingested events already stored are counted.
+--
+-- Venue: venue_ref, venue_id, then data/metadata ->> 'venue_ref'.
+-- Visitor: visitor_id, then user_id, then session_id (the order the owner
+-- dashboards used when they read analytics_events). Columns that only exist
+-- in some environments (visitor_id, metadata) are read through to_jsonb.
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.analytics_venue_rollup_state (
+  id smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  last_event_id bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.analytics_venue_rollup_state ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.analytics_venue_rollup_state FROM anon, authenticated;
+
+-- ============================================================
+-- RPC: advance_analytics_venue_rollups
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION public.advance_analytics_venue_rollups(
+  p_counts JSONB,
+  p_visitors JSONB,
+  p_after BIGINT,
+  p_through BIGINT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  -- The row lock serialises racing workers; the loser sees the moved watermark.
+  UPDATE public.analytics_venue_rollup_state
+  SET last_event_id = p_through, updated_at = now()
+  WHERE id = 1 AND last_event_id = p_after;
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+  PERFORM public.merge_analytics_venue_rollups(p_counts, p_visitors);
+  RETURN true;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.advance_analytics_venue_rollups(JSONB, JSONB, BIGINT, BIGINT)
+  FROM PUBLIC, anon, authenticated;
+
+-- ============================================================
+-- Rebuild the last 35 days up to the starting watermark
+-- ============================================================
+
+LOCK TABLE public.analytics_venue_daily, public.analytics_venue_visitors IN EXCLUSIVE MODE;
+
+INSERT INTO public.analytics_venue_rollup_state (id, last_event_id)
+SELECT 1, COALESCE(max(id), 0) FROM public.analytics_events
+ON CONFLICT (id) DO NOTHING;
+
+DELETE FROM public.analytics_venue_daily WHERE day >= (now() AT TIME ZONE 'UTC')::date - 35;
+DELETE FROM public.analytics_venue_visitors WHERE day >= (now() AT TIME ZONE 'UTC')::date - 35;
+
+CREATE TEMP TABLE analytics_rollup_source ON COMMIT DROP AS
+SELECT
+  COALESCE(
+    e.venue_ref,
+    e.venue_id::text,
+    e.data->>'venue_ref',
+    to_jsonb(e)->'metadata'->>'venue_ref'
+  ) AS venue_ref,
+  (e.created_at AT TIME ZONE 'UTC')::date AS day,
+  e.event_type,
+  COALESCE(e.sample_weight, 1) AS weight,
+  COALESCE(
+    to_jsonb(e)->>'visitor_id',
+    e.data->>'visitor_id',
+    to_jsonb(e)->'metadata'->>'visitor_id',
+    e.user_id::text,
+    e.session_id,
+    e.data->>'session_id'
+  ) AS visitor
+FROM public.analytics_events AS e
+WHERE e.created_at >= ((now() AT TIME ZONE 'UTC')::date - 35)::timestamp AT TIME ZONE 'UTC'
+  AND e.id <= (SELECT last_event_id FROM public.analytics_venue_rollup_state WHERE id = 1);
+
+INSERT INTO public.analytics_venue_daily (venue_ref, day, event_type, events)
+SELECT venue_ref, day, event_type, SUM(weight)
+FROM analytics_rollup_source
+WHERE venue_ref IS NOT NULL
+GROUP BY 1, 2, 3;
+
+INSERT INTO public.analytics_venue_visitors (venue_ref, day, sketch)
+SELECT
+  venue_ref,
+  day,
+  public.hll_from_hashes(array_agg(('x' || substr(md5(visitor), 1, 16))::bit(64)::bigint))
+FROM analytics_rollup_source
+WHERE venue_ref IS NOT NULL AND visitor IS NOT NULL
+GROUP BY 1, 2;
+
+COMMIT;
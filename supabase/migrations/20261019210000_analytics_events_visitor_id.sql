@@ -0,0 +1,13 @@
+-- =============================================================================
+-- Anonymous visitor ids on analytics_events
+-- The backend now stores the visitor id (body visitor_id or X-Visitor-Id) and
+-- session id with every buffered event, so unique-visitor rollups count
+-- anonymous visitors and not only signed-in users. Visitor precedence across
+-- the backend and SQL is visitor_id, then user_id, then session_id.
+-- =============================================================================
+
+BEGIN;
+
+ALTER TABLE public.analytics_events ADD COLUMN IF NOT EXISTS visitor_id text;
+
+COMMIT;